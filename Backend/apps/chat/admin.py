@@ -1,6 +1,7 @@
 from django.contrib import admin
 
-from .models import ChatChannel, ChatMessage
+from .models import ChatArchiveSegment, ChatAttachment, ChatChannel, ChatMessage
+from .search import search_backend
 
 
 @admin.register(ChatChannel)
@@ -9,12 +10,34 @@ class ChatChannelAdmin(admin.ModelAdmin):
     search_fields = ["name"]
 
 
+@admin.register(ChatArchiveSegment)
+class ChatArchiveSegmentAdmin(admin.ModelAdmin):
+    list_display = ["id", "channel", "month", "count", "size", "created_at"]
+    list_filter = ["channel"]
+    exclude = ["blocks"]
+    readonly_fields = ["channel", "month", "path", "count", "size", "first_at", "last_at"]
+
+
+@admin.register(ChatAttachment)
+class ChatAttachmentAdmin(admin.ModelAdmin):
+    list_display = ["id", "sha256", "content_type", "size", "variants", "created_at"]
+    list_filter = ["variants", "content_type"]
+    search_fields = ["sha256"]
+    readonly_fields = ["sha256", "file", "size", "content_type", "width", "height"]
+
+
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
     list_display = ["id", "channel", "sender", "text_preview", "created_at"]
     list_filter = ["channel"]
+    # Shows the search box; the lookup itself goes through the search index.
     search_fields = ["text"]
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_backend.filter(queryset, search_term), False
+
     @admin.display(description="Text")
     def text_preview(self, obj):
         return obj.text[:80]
@@ -0,0 +1,186 @@
+"""
+Cold storage for old chat history.
+
+``manage.py archive_chat`` moves whole calendar months older than
+``CHAT_ARCHIVE_AFTER_DAYS`` out of the message table into one segment file
+per channel and month under ``CHAT_ARCHIVE_DIR``::
+
+    <channel id>/<YYYY-MM>.ndjson.gz
+
+A segment holds NDJSON rows in the API's message shape, oldest first. It is
+gzip-compressed in blocks of ``CHAT_ARCHIVE_BLOCK_SIZE`` rows. Each block is
+a separate gzip member, so the file is still a valid .gz (zcat reads it) and
+any one block can be inflated on its own. ChatArchiveSegment.blocks is the
+offset index: the byte range of each block and the (created_at, id) of its
+first row. A history page seeks to the one or two blocks it needs instead of
+inflating the month.
+
+Months are archived whole, and only once every message in them is past the
+threshold, so every archived message is older than every message left in
+the table. History reads therefore take hot rows first and continue into the
+segments, newest first, once the table runs out. Archived messages leave the
+search index (the FTS delete trigger fires) and are read-only.
+"""
+
+import gzip
+import json
+import os
+from bisect import bisect_left, bisect_right
+from datetime import UTC, date, datetime
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import encoding
+from .models import ChatArchiveSegment, ChatMessage
+from .recent import recent_messages, serialize_many
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def row_key(row) -> tuple[datetime, int]:
+    """(created_at, id) of a message or of an archived/serialized row."""
+    if isinstance(row, dict):
+        return parse_datetime(row["created_at"]), row["id"]
+    return row.created_at, row.id
+
+
+def month_bounds(month: date) -> tuple[datetime, datetime]:
+    start = datetime(month.year, month.month, 1, tzinfo=UTC)
+    if month.month == 12:
+        return start, start.replace(year=month.year + 1, month=1)
+    return start, start.replace(month=month.month + 1)
+
+
+def archive_month(channel_id: int, month: date) -> ChatArchiveSegment | None:
+    """
+    Write one channel-month to a segment, then record it and delete the rows
+    in one transaction. A crash before the commit leaves only a file that the
+    next run overwrites.
+    """
+    start, end = month_bounds(month)
+    messages = (
+        ChatMessage.objects.filter(channel_id=channel_id, created_at__gte=start, created_at__lt=end)
+        .select_related("sender", "blob")
+        .order_by("created_at", "id")
+    )
+    relative = f"{channel_id}/{month:%Y-%m}.ndjson.gz"
+    path = Path(settings.CHAT_ARCHIVE_DIR) / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+
+    blocks, blobs, count, first, last = [], set(), 0, None, None
+    iterator = messages.iterator(chunk_size=2000)
+    with open(partial, "wb") as out:
+        while chunk := list(islice(iterator, settings.CHAT_ARCHIVE_BLOCK_SIZE)):
+            rows = serialize_many(chunk)
+            blobs.update(m.blob_id for m in chunk if m.blob_id)
+            data = gzip.compress(
+                "".join(encoding.dumps(row) + "\n" for row in rows).encode(), mtime=0
+            )
+            blocks.append([out.tell(), len(data), rows[0]["created_at"], rows[0]["id"]])
+            out.write(data)
+            count += len(rows)
+            first = first or rows[0]
+            last = rows[-1]
+        out.flush()
+        os.fsync(out.fileno())
+    if not count:
+        partial.unlink()
+        return None
+    os.replace(partial, path)
+
+    ids, params = messages.values("id").query.sql_with_params()
+    with transaction.atomic():
+        segment = ChatArchiveSegment.objects.create(
+            channel_id=channel_id,
+            month=month,
+            path=relative,
+            count=count,
+            size=path.stat().st_size,
+            first_at=row_key(first)[0],
+            last_at=row_key(last)[0],
+            blocks=blocks,
+        )
+        segment.attachments.set(blobs)
+        # Raw DELETE: a queryset delete would load every row to send post_delete.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {ChatMessage._meta.db_table} WHERE id IN ({ids})", params
+            )
+            if cursor.rowcount != count:
+                raise ArchiveError(
+                    f"Channel {channel_id} {month:%Y-%m}: wrote {count} messages "
+                    f"but would delete {cursor.rowcount}; rolled back."
+                )
+    recent_messages.invalidate(channel_id)
+    return segment
+
+
+@lru_cache(maxsize=256)
+def _block(segment_id: int, path: str, offset: int, length: int) -> tuple[dict, ...]:
+    with open(Path(settings.CHAT_ARCHIVE_DIR) / path, "rb") as f:
+        f.seek(offset)
+        data = f.read(length)
+    return tuple(json.loads(line) for line in gzip.decompress(data).splitlines())
+
+
+def _scan(segment, position, reverse: bool, limit: int) -> list[dict]:
+    keys = [(parse_datetime(created_at), pk) for _, _, created_at, pk in segment.blocks]
+    if reverse:
+        # Newer than position, oldest first: from the block holding it onwards.
+        start = 0 if position is None else max(bisect_right(keys, position) - 1, 0)
+        indexes = range(start, len(keys))
+    else:
+        # Older than position, newest first: blocks that start before it, backwards.
+        stop = len(keys) if position is None else bisect_left(keys, position)
+        indexes = range(stop - 1, -1, -1)
+
+    found = []
+    for i in indexes:
+        offset, length, _, _ = segment.blocks[i]
+        rows = _block(segment.id, segment.path, offset, length)
+        if reverse:
+            found += [r for r in rows if position is None or row_key(r) > position]
+        else:
+            found += [r for r in reversed(rows) if position is None or row_key(r) < position]
+        if len(found) >= limit:
+            break
+    return found[:limit]
+
+
+def exists(channel_id: int) -> bool:
+    """Whether the channel has any archived messages."""
+    return ChatArchiveSegment.objects.filter(channel_id=channel_id).exists()
+
+
+def page(channel_id: int, position, reverse: bool, limit: int) -> list[dict]:
+    """
+    Up to ``limit`` archived rows after ``position`` (created_at, id): older
+    ones newest first, or with ``reverse`` newer ones oldest first. A None
+    position starts from the newest archived message.
+    """
+    segments = ChatArchiveSegment.objects.filter(channel_id=channel_id)
+    if position is not None:
+        if reverse:
+            segments = segments.filter(last_at__gte=position[0])
+        else:
+            segments = segments.filter(first_at__lte=position[0])
+    segments = segments.order_by("month" if reverse else "-month").only("id", "path", "blocks")
+
+    rows = []
+    for segment in segments.iterator(chunk_size=4):
+        rows += _scan(segment, position, reverse, limit - len(rows))
+        if len(rows) >= limit:
+            break
+    return rows
+
+
+def remove_file(segment: ChatArchiveSegment) -> None:
+    (Path(settings.CHAT_ARCHIVE_DIR) / segment.path).unlink(missing_ok=True)
@@ -0,0 +1,158 @@
+"""
+Content-addressed attachment storage.
+
+Every attachment is stored once, under the SHA-256 of its bytes::
+
+    chat_attachments/<first two hex digits>/<sha256><.ext>
+
+and recorded as a ChatAttachment. A message points at it with ``blob``, and
+its ``attachment`` field names the same file, so older clients still get a
+plain URL. Uploading bytes that are already stored creates no new file; the
+staged copy is discarded and the existing attachment returned.
+
+Large files arrive in chunks (``ChatUpload``): each ``PUT`` carries an
+``Upload-Offset`` header and is streamed to a staging file under
+``CHAT_UPLOAD_DIR`` in small pieces, so neither a chunk nor the whole file is
+held in memory. A client that loses its connection asks for ``received`` and
+resumes from there. The last chunk hashes the staged file, stores it (a rename
+on the filesystem storage) and hands images to the thumbnail pool
+(apps.chat.thumbnails) once the transaction commits.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from PIL import Image, UnidentifiedImageError
+
+from .models import ChatAttachment, ChatUpload
+from .thumbnails import thumbnail_pool
+
+READ_SIZE = 64 * 1024
+EXTENSION_RE = re.compile(r"\.[a-z0-9]{1,8}$")
+
+
+class UploadError(Exception):
+    pass
+
+
+class UploadConflict(UploadError):
+    """The chunk does not start where the upload left off."""
+
+
+class StagedFile(File):
+    """A file already on local disk; FileSystemStorage moves it instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def staging_path(upload: ChatUpload) -> Path:
+    return Path(settings.CHAT_UPLOAD_DIR) / f"{upload.id}.part"
+
+
+def storage_name(digest: str, filename: str) -> str:
+    ext = os.path.splitext(filename)[1].lower()
+    return f"chat_attachments/{digest[:2]}/{digest}{ext if EXTENSION_RE.match(ext) else ''}"
+
+
+def write_chunk(upload: ChatUpload, offset: int, stream) -> int:
+    """
+    Append ``stream`` to the staged file at ``offset``, which must equal the
+    bytes received so far. Reads at most CHAT_UPLOAD_CHUNK_SIZE bytes and
+    never past the declared size. Returns the new received count.
+    """
+    if offset != upload.received:
+        raise UploadConflict(f"Expected offset {upload.received}, got {offset}.")
+    limit = min(settings.CHAT_UPLOAD_CHUNK_SIZE, upload.size - offset)
+    path = staging_path(upload)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    written = 0
+    with open(path, "r+b" if offset else "wb") as out:
+        out.seek(offset)
+        while piece := stream.read(READ_SIZE):
+            written += len(piece)
+            if written > limit:
+                raise UploadError(f"Chunk exceeds {limit} bytes.")
+            out.write(piece)
+        out.truncate()
+
+    # Conditional, so a duplicate PUT of the same chunk cannot count twice.
+    if not ChatUpload.objects.filter(pk=upload.pk, received=offset).update(
+        received=offset + written
+    ):
+        raise UploadConflict("Upload changed concurrently; re-read its offset.")
+    upload.received = offset + written
+    return upload.received
+
+
+def finish_upload(upload: ChatUpload) -> ChatAttachment:
+    """Store a completely received upload and drop its staging state."""
+    try:
+        with open(staging_path(upload), "rb") as f:
+            return store(StagedFile(f), upload.filename)
+    finally:
+        discard_upload(upload)
+
+
+def discard_upload(upload: ChatUpload) -> None:
+    staging_path(upload).unlink(missing_ok=True)
+    upload.delete()
+
+
+def store(file: File, filename: str) -> ChatAttachment:
+    """Store ``file`` by content, or return the attachment already holding it."""
+    sha = hashlib.sha256()
+    size = 0
+    for piece in file.chunks(READ_SIZE):
+        sha.update(piece)
+        size += len(piece)
+    digest = sha.hexdigest()
+
+    existing = ChatAttachment.objects.filter(sha256=digest).first()
+    if existing is not None:
+        return existing
+
+    fields = _probe(file, filename)
+    name = storage_name(digest, filename)
+    # The file may be there from a run that died before its row was written.
+    if not default_storage.exists(name):
+        file.seek(0)
+        name = default_storage.save(name, file)
+    try:
+        with transaction.atomic():
+            attachment = ChatAttachment.objects.create(
+                sha256=digest, file=name, size=size, **fields
+            )
+    except IntegrityError:
+        # The same bytes finished uploading concurrently.
+        return ChatAttachment.objects.get(sha256=digest)
+
+    if attachment.variants == ChatAttachment.Variants.PENDING:
+        transaction.on_commit(lambda: thumbnail_pool.submit(attachment.id))
+    return attachment
+
+
+def _probe(file: File, filename: str) -> dict:
+    """Content type and dimensions, read from the image header only."""
+    file.seek(0)
+    try:
+        with Image.open(file) as img:
+            return {
+                "content_type": Image.MIME.get(img.format, ""),
+                "width": img.width,
+                "height": img.height,
+                "variants": ChatAttachment.Variants.PENDING,
+            }
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        return {
+            "content_type": mimetypes.guess_type(filename)[0] or "",
+            "variants": ChatAttachment.Variants.NONE,
+        }
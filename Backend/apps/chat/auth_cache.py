@@ -0,0 +1,174 @@
+"""
+Process-wide user cache for WebSocket handshakes.
+
+JWTAuthMiddleware resolves ``user_id`` claims through UserCache instead of
+querying the database on every handshake. Entries expire after a TTL and the
+least recently used ones are evicted past ``maxsize``. Concurrent lookups for
+the same user while a load is in flight share that single query, which keeps
+reconnect storms (deploys, network blips) from saturating the DB thread pool.
+
+Entries are invalidated from User post_save/post_delete signals (see
+apps/chat/signals.py). The signal only fires in the process that saved the
+user, so every entry also records the user's version from a shared store
+(``WS_USER_CACHE_VERSIONS``): an invalidation bumps it, and an entry whose
+version is no longer current is a miss in every worker. With ``redis`` (the
+default when ``REDIS_URL`` is set) a hit costs one GET instead of a query;
+``local`` keeps versions in process memory, for a single worker. If the
+store cannot be read the user is loaded from the database and not cached.
+
+Counters are served by the admin-only ``/api/chat/stats/`` (see
+apps/chat/views.py).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+import redis.asyncio as aioredis
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def _load_user(user_id: int):
+    return User.objects.filter(id=user_id).first()
+
+
+class LocalUserVersions:
+    def __init__(self):
+        self._versions: dict[int, int] = {}
+
+    async def current(self, user_id: int) -> int:
+        return self._versions.get(user_id, 0)
+
+    def bump(self, user_id: int) -> None:
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+
+class RedisUserVersions:
+    def __init__(self, url: str, ttl: float, prefix: str = "ws:user:v:"):
+        # Signal handlers bump from sync code; handshakes read from the event loop.
+        self._sync = redis.Redis.from_url(url)
+        self._async = aioredis.Redis.from_url(url)
+        self._prefix = prefix
+        # Outlives every entry that could hold an older version.
+        self._expire = max(int(ttl * 2), 1)
+
+    async def current(self, user_id: int) -> int:
+        return int(await self._async.get(f"{self._prefix}{user_id}") or 0)
+
+    def bump(self, user_id: int) -> None:
+        key = f"{self._prefix}{user_id}"
+        with self._sync.pipeline() as pipe:
+            pipe.incr(key)
+            pipe.expire(key, self._expire)
+            pipe.execute()
+
+
+class UserCache:
+    def __init__(self, maxsize: int, ttl: float, versions=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.versions = versions or LocalUserVersions()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        # user_id -> (expires at, version, user)
+        self._entries: OrderedDict[int, tuple[float, int, object]] = OrderedDict()
+        self._inflight: dict[tuple[int, int | None], asyncio.Future] = {}
+        # Signal handlers invalidate from sync threads.
+        self._lock = threading.Lock()
+
+    async def get(self, user_id: int):
+        """Return the user for ``user_id``, or None if it doesn't exist."""
+        try:
+            version = await self.versions.current(user_id)
+        except Exception as exc:
+            logger.warning("User cache versions unavailable, loading user %s: %s", user_id, exc)
+            version = None  # loaded, never stored
+        key = (user_id, version)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > time.monotonic() and entry[1] == version:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2]
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                self.misses += 1
+                future = asyncio.get_running_loop().create_future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        try:
+            user = await database_sync_to_async(_load_user)(user_id)
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # waiters re-raise; don't warn if there are none
+            raise
+        finally:
+            with self._lock:
+                # A concurrent invalidate() drops the in-flight marker; only
+                # store the result if this load is still current.
+                current = self._inflight.get(key) is future
+                if current:
+                    del self._inflight[key]
+
+        future.set_result(user)
+        if user is not None and current and version is not None:
+            with self._lock:
+                self._entries[user_id] = (time.monotonic() + self.ttl, version, user)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop the user here, and (through the version) in every other worker."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            for key in [key for key in self._inflight if key[0] == user_id]:
+                del self._inflight[key]
+        try:
+            self.versions.bump(user_id)
+        except Exception:
+            logger.exception("Could not publish invalidation of cached user %s", user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+        }
+
+
+def _build() -> UserCache:
+    if settings.WS_USER_CACHE_VERSIONS == "redis":
+        versions = RedisUserVersions(settings.REDIS_URL, settings.WS_USER_CACHE_TTL)
+    else:
+        versions = LocalUserVersions()
+    return UserCache(
+        maxsize=settings.WS_USER_CACHE_SIZE,
+        ttl=settings.WS_USER_CACHE_TTL,
+        versions=versions,
+    )
+
+
+user_cache = _build()
@@ -1,65 +1,360 @@
+from urllib.parse import parse_qs
+
 from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from django.db.models import Subquery
+
+from . import encoding
+from .ingest import get_writer
+from .models import ChatChannel, ChatMessage, group_name
+from .notify import chat_push
+from .outbound import SLOW_CONSUMER_CLOSE_CODE, OutboundQueue
+from .presence import presence
+from .recent import recent_messages, serialize
+
+REPLAY_GAP_DETAIL = "Cannot replay from last_seen_id; refetch history over REST."
 
-from .models import ChatChannel, ChatMessage
 
+def message_payload(msg: ChatMessage) -> dict:
+    """Wire format shared by the inline and write-behind ingest paths."""
+    return {
+        "id": msg.id,
+        "text": msg.text,
+        "sender": {
+            "id": msg.sender.id,
+            "username": msg.sender.username,
+        },
+        "created_at": msg.created_at.isoformat(),
+    }
+
+
+class BaseChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Channel mechanics shared by the per-channel and multiplexed consumers:
+    channel lookup, ingest, encode-once broadcast, resume replay, presence,
+    the bounded outbound queue (see apps.chat.outbound) and Web Push for
+    users not in the channel (see apps.chat.notify).
 
-class ChatConsumer(AsyncJsonWebsocketConsumer):
+    With CHAT_WRITE_BEHIND on, messages are broadcast before they are
+    written and persisted in batches by apps.chat.ingest.MessageWriter.
+    """
+
+    _outbound: OutboundQueue | None = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Channels this socket has reported typing in, so sends can clear it.
+        self._typing: set[int] = set()
+
+    async def accept(self, subprotocol=None, headers=None):
+        await super().accept(subprotocol, headers)
+        if settings.CHAT_OUTBOUND_POLICY != "off":
+            self._outbound = OutboundQueue(
+                self._write,
+                settings.CHAT_OUTBOUND_QUEUE_SIZE,
+                settings.CHAT_OUTBOUND_POLICY,
+                on_error=lambda: self.close(code=1011),
+            )
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if self._outbound is None or text_data is None or close:
+            await super().send(text_data, bytes_data, close)
+        elif not self._outbound.put(text_data):
+            await self.close(code=SLOW_CONSUMER_CLOSE_CODE)
+
+    async def _write(self, frame: str) -> None:
+        await super().send(text_data=frame)
+
+    async def disconnect(self, close_code):
+        if self._outbound is not None:
+            self._outbound.close()
+        if settings.CHAT_WRITE_BEHIND:
+            await get_writer().flush()
+
+    async def post_message(self, channel: ChatChannel, text: str) -> None:
+        if settings.CHAT_WRITE_BEHIND:
+            message = await self.enqueue_message(channel, text)
+        else:
+            message = await self.save_message(channel, text)
+        if channel.id in self._typing:
+            await self.set_typing(channel, False)
+
+        await self.channel_layer.group_send(
+            group_name(channel.id), self.broadcast_event(message, channel.id)
+        )
+        await chat_push.message_posted(channel.id, self.user, text)
+
+    def broadcast_event(self, message: dict, channel_id: int) -> dict:
+        # Encode once here; every subscriber forwards the same text frame.
+        return {"type": "chat_message", "channel": channel_id, "frame": encoding.dumps(message)}
+
+    async def chat_message(self, event):
+        if "frame" in event:
+            frame = self.frame_for(event)
+        else:
+            # Un-encoded event from a worker running an older release.
+            frame = await self.encode_json(event["message"])
+        await self.send(text_data=frame)
+
+    def frame_for(self, event) -> str:
+        return event["frame"]
+
+    async def chat_presence(self, event):
+        await self.send(text_data=event["frame"])
+
+    async def set_typing(self, channel: ChatChannel, active: bool) -> None:
+        if active:
+            self._typing.add(channel.id)
+        else:
+            self._typing.discard(channel.id)
+        await presence.typing(channel.id, self.user, active)
+
+    async def replay(self, channel: ChatChannel, last_seen_id, tags: dict | None = None) -> None:
+        """Send everything after last_seen_id as one frame, or a replay.gap."""
+        tags = tags or {}
+        try:
+            last_seen_id = int(last_seen_id)
+        except (TypeError, ValueError):
+            await self.send_json({"type": "replay.gap", **tags, "detail": "Invalid last_seen_id."})
+            return
+
+        if settings.CHAT_WRITE_BEHIND:
+            await get_writer().flush()
+        missed = await self.get_missed(channel, last_seen_id)
+        if missed is None:
+            await self.send_json({"type": "replay.gap", **tags, "detail": REPLAY_GAP_DETAIL})
+        else:
+            await self.send_json({"type": "replay", **tags, "messages": missed})
+
+    @classmethod
+    async def encode_json(cls, content):
+        return encoding.dumps(content)
+
+    @database_sync_to_async
+    def get_channel(self, channel_id) -> ChatChannel | None:
+        return ChatChannel.objects.filter(id=channel_id).first()
+
+    @database_sync_to_async
+    def get_missed(self, channel: ChatChannel, last_seen_id: int) -> list[dict] | None:
+        """
+        Messages after ``last_seen_id`` in (created_at, id) order, or None for a gap.
+
+        One statement on the (channel, created_at, id) index. The anchor row is
+        included so a deleted or foreign anchor shows up as a gap rather than
+        as "nothing missed".
+        """
+        anchor = ChatMessage.objects.filter(
+            pk=last_seen_id, channel_id=channel.id
+        ).values("created_at")[:1]
+        limit = settings.CHAT_REPLAY_LIMIT
+        rows = list(
+            ChatMessage.objects.filter(
+                channel_id=channel.id, created_at__gte=Subquery(anchor)
+            )
+            .exclude(created_at=Subquery(anchor), id__lt=last_seen_id)
+            .select_related("sender")
+            .order_by("created_at", "id")[: limit + 2]
+        )
+        if not rows or rows[0].id != last_seen_id or len(rows) > limit + 1:
+            return None
+        return [message_payload(msg) for msg in rows[1:]]
+
+    @database_sync_to_async
+    def save_message(self, channel: ChatChannel, text: str) -> dict:
+        msg = ChatMessage.objects.create(
+            channel=channel,
+            sender=self.user,
+            text=text,
+        )
+        recent_messages.append(msg.channel_id, serialize(msg))
+        return message_payload(msg)
+
+    async def enqueue_message(self, channel: ChatChannel, text: str) -> dict:
+        msg = await get_writer().enqueue(
+            channel_id=channel.id,
+            sender=self.user,
+            text=text,
+        )
+        return message_payload(msg)
+
+
+class ChatConsumer(BaseChatConsumer):
     """
     WebSocket consumer for real-time chat.
 
-    Connect: ws://host/ws/chat/<channel_id>/?token=<jwt>
+    Connect: ws://host/ws/chat/<channel_id>/?token=<jwt>[&last_seen_id=<id>]
+             closes with 4001 if unauthenticated, 4004 if the channel doesn't exist
     Send:    {"type": "chat.message", "text": "Hello!"}
+             {"type": "resume", "last_seen_id": 41}
+             {"type": "heartbeat"}
+             {"type": "typing"[, "active": false]}
     Receive: {"id": 1, "text": "Hello!", "sender": {"id": 1, "username": "alice"}, "created_at": "..."}
+             {"type": "replay", "messages": [<message>, ...]}
+             {"type": "replay.gap", "detail": "..."}
+             {"type": "presence", "channel": 1, "online": [{"id": 1, "username": "alice"}],
+              "typing": [1]}
+
+    Resuming replays everything after last_seen_id in one frame, or sends
+    replay.gap when the anchor is unknown or more than CHAT_REPLAY_LIMIT
+    messages were missed (refetch over REST). Channels dispatches one event at
+    a time per consumer, so live messages that arrive while the replay is
+    built are sent after it. One may be in both; clients dedupe by id.
+
+    Heartbeats keep the socket listed as online (see apps.chat.presence);
+    presence frames are coalesced per channel, not sent per event.
     """
 
     async def connect(self):
         self.channel_id = self.scope["url_route"]["kwargs"]["channel_id"]
-        self.room_group = f"chat_{self.channel_id}"
+        self.room_group = group_name(self.channel_id)
         self.user = self.scope.get("user")
 
         if not self.user or self.user.is_anonymous:
             await self.close(code=4001)
             return
 
+        # Resolve the channel once; every message afterwards is a bare INSERT.
+        self.channel = await self.get_channel(self.channel_id)
+        if self.channel is None:
+            await self.close(code=4004)
+            return
+
         await self.channel_layer.group_add(self.room_group, self.channel_name)
         await self.accept()
+        await presence.join(self.channel.id, self.user, self.channel_name)
+
+        last_seen_id = parse_qs(self.scope.get("query_string", b"").decode()).get(
+            "last_seen_id", [None]
+        )[0]
+        if last_seen_id is not None:
+            await self.replay(self.channel, last_seen_id)
 
     async def disconnect(self, close_code):
         if hasattr(self, "room_group"):
             await self.channel_layer.group_discard(
                 self.room_group, self.channel_name
             )
+        if getattr(self, "channel", None) is not None:
+            await presence.leave(self.channel.id, self.user, self.channel_name)
+        await super().disconnect(close_code)
 
     async def receive_json(self, content, **kwargs):
+        kind = content.get("type")
+        if kind == "resume":
+            await self.replay(self.channel, content.get("last_seen_id"))
+            return
+        if kind == "heartbeat":
+            await presence.join(self.channel.id, self.user, self.channel_name)
+            return
+        if kind == "typing":
+            await self.set_typing(self.channel, content.get("active", True) is not False)
+            return
+
         text = content.get("text", "").strip()
         if not text:
             return
 
-        message = await self.save_message(text)
+        await self.post_message(self.channel, text)
 
-        await self.channel_layer.group_send(
-            self.room_group,
-            {"type": "chat_message", "message": message},
-        )
 
-    async def chat_message(self, event):
-        await self.send_json(event["message"])
+class MultiplexChatConsumer(BaseChatConsumer):
+    """
+    Many chat channels over one WebSocket.
 
-    @database_sync_to_async
-    def save_message(self, text: str) -> dict:
-        channel = ChatChannel.objects.get(id=self.channel_id)
-        msg = ChatMessage.objects.create(
-            channel=channel,
-            sender=self.user,
-            text=text,
-        )
-        return {
-            "id": msg.id,
-            "text": msg.text,
-            "sender": {
-                "id": msg.sender.id,
-                "username": msg.sender.username,
-            },
-            "created_at": msg.created_at.isoformat(),
-        }
+    Connect: ws://host/ws/chat/?token=<jwt>    (closes with 4001 if unauthenticated)
+    Send:    {"type": "subscribe", "channel": 7[, "last_seen_id": 41]}
+             {"type": "unsubscribe", "channel": 7}
+             {"type": "chat.message", "channel": 7, "text": "Hello!"}
+             {"type": "typing", "channel": 7[, "active": false]}
+             {"type": "heartbeat"}    (refreshes presence in every subscribed channel)
+    Receive: {"channel": 7, "message": <message>}
+             {"type": "presence", "channel": 7, "online": [...], "typing": [...]}
+             {"type": "subscribed" | "unsubscribed", "channel": 7}
+             {"type": "replay" | "replay.gap", "channel": 7, ...}
+             {"type": "error", "channel": 7, "detail": "..."}
+
+    Each subscription joins the same ``chat_<id>`` group the per-channel
+    consumer uses, so both kinds of client see each other's messages.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get("user")
+        self.subscriptions: dict[int, ChatChannel] = {}
+
+        if not self.user or self.user.is_anonymous:
+            await self.close(code=4001)
+            return
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for channel_id in getattr(self, "subscriptions", {}):
+            await self.channel_layer.group_discard(group_name(channel_id), self.channel_name)
+            await presence.leave(channel_id, self.user, self.channel_name)
+        await super().disconnect(close_code)
+
+    async def receive_json(self, content, **kwargs):
+        kind = content.get("type")
+        if kind == "heartbeat":
+            for channel_id in self.subscriptions:
+                await presence.join(channel_id, self.user, self.channel_name)
+            return
+
+        try:
+            channel_id = int(content.get("channel"))
+        except (TypeError, ValueError):
+            await self.send_json({"type": "error", "detail": "Missing or invalid channel."})
+            return
+
+        if kind == "subscribe":
+            await self.subscribe(channel_id, content.get("last_seen_id"))
+        elif kind == "unsubscribe":
+            await self.unsubscribe(channel_id)
+        elif kind == "resume" and channel_id in self.subscriptions:
+            await self.replay(
+                self.subscriptions[channel_id], content.get("last_seen_id"), {"channel": channel_id}
+            )
+        elif channel_id not in self.subscriptions:
+            await self.error(channel_id, "Not subscribed to this channel.")
+        elif kind == "typing":
+            await self.set_typing(
+                self.subscriptions[channel_id], content.get("active", True) is not False
+            )
+        else:
+            text = content.get("text", "").strip()
+            if text:
+                await self.post_message(self.subscriptions[channel_id], text)
+
+    async def subscribe(self, channel_id: int, last_seen_id=None) -> None:
+        if channel_id not in self.subscriptions:
+            if len(self.subscriptions) >= settings.CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS:
+                await self.error(channel_id, "Too many subscriptions.")
+                return
+            channel = await self.get_channel(channel_id)
+            if channel is None:
+                await self.error(channel_id, "Channel not found.")
+                return
+            await self.channel_layer.group_add(group_name(channel_id), self.channel_name)
+            self.subscriptions[channel_id] = channel
+            await presence.join(channel_id, self.user, self.channel_name)
+
+        await self.send_json({"type": "subscribed", "channel": channel_id})
+        if last_seen_id is not None:
+            await self.replay(
+                self.subscriptions[channel_id], last_seen_id, {"channel": channel_id}
+            )
+
+    async def unsubscribe(self, channel_id: int) -> None:
+        if self.subscriptions.pop(channel_id, None) is not None:
+            await self.channel_layer.group_discard(group_name(channel_id), self.channel_name)
+            await presence.leave(channel_id, self.user, self.channel_name)
+            self._typing.discard(channel_id)
+        await self.send_json({"type": "unsubscribed", "channel": channel_id})
+
+    async def error(self, channel_id: int, detail: str) -> None:
+        await self.send_json({"type": "error", "channel": channel_id, "detail": detail})
+
+    def frame_for(self, event) -> str:
+        # Wrap the pre-encoded frame rather than decoding and re-encoding it.
+        return f'{{"channel":{int(event["channel"])},"message":{event["frame"]}}}'
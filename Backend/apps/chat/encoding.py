@@ -0,0 +1,44 @@
+"""
+JSON encoding for outbound WebSocket frames.
+
+Chat broadcasts are encoded once by the sender and forwarded verbatim by every
+receiving consumer, so the encoder runs once per message instead of once per
+subscriber. ``CHAT_JSON_ENCODER`` selects it:
+
+- ``"auto"`` (default): orjson when installed, else the stdlib.
+- ``"orjson"`` / ``"json"``: force one or the other.
+- a dotted path to any ``callable(obj) -> str``.
+"""
+
+import json
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:  # optional: pip install orjson
+    orjson = None
+
+
+def stdlib_dumps(obj) -> str:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def orjson_dumps(obj) -> str:
+    return orjson.dumps(obj).decode()
+
+
+def _select(name: str):
+    if name == "auto":
+        return orjson_dumps if orjson is not None else stdlib_dumps
+    if name == "orjson":
+        if orjson is None:
+            raise ImportError("CHAT_JSON_ENCODER='orjson' but orjson is not installed.")
+        return orjson_dumps
+    if name == "json":
+        return stdlib_dumps
+    return import_string(name)
+
+
+dumps = _select(settings.CHAT_JSON_ENCODER)
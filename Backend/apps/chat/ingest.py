@@ -0,0 +1,248 @@
+"""
+Write-behind persistence for WebSocket chat messages.
+
+With ``CHAT_WRITE_BEHIND`` enabled, ChatConsumer hands each message to the
+process-wide MessageWriter instead of inserting it inline. The writer stamps the
+message with a reserved primary key and its arrival time so it can be broadcast
+straight away, then persists queued rows with ``bulk_create`` whenever the batch
+fills up or the flush interval elapses.
+
+Durability: a consumer disconnect flushes the queue, the queue blocks senders
+once it holds ``CHAT_WRITE_BEHIND_MAX_PENDING`` rows, and an ``atexit`` hook
+drains whatever is left on interpreter shutdown. Only a hard kill between a
+broadcast and the next flush window can lose messages.
+
+Ordering: ids are unique but not monotonic across workers. Each worker
+reserves ``CHAT_WRITE_BEHIND_ID_BLOCK`` ids at a time, so with two workers a
+message can get a lower id than one stamped earlier by the other worker, and
+REST and ORM inserts take ids above every reserved block. Readers order by
+(created_at, id), the arrival time stamped here with the id as a tie-break,
+as resume replay (apps/chat/consumers.py) and history paging do; never
+treat "id greater than the last seen" as "newer than". A block size of 1
+keeps ids in arrival order again, at one sequence update per message.
+"""
+
+import asyncio
+import atexit
+import contextlib
+import contextvars
+import logging
+import threading
+from collections import deque
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    IntegrityError,
+    NotSupportedError,
+    connections,
+    router,
+    transaction,
+)
+from django.utils import timezone
+
+from .models import ChatMessage
+from .recent import recent_messages, serialize
+
+logger = logging.getLogger(__name__)
+
+
+def reserve_ids(model, count: int) -> list[int]:
+    """
+    Reserve ``count`` primary keys from the table's own sequence.
+
+    Reserved keys are never handed out by the database afterwards, so rows
+    inserted later with explicit ids cannot collide with rows created through
+    the ORM in the meantime (REST posts, admin, other workers).
+    """
+    table = model._meta.db_table
+    alias = router.db_for_write(model)
+    connection = connections[alias]
+
+    with transaction.atomic(using=alias), connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                "UPDATE sqlite_sequence SET seq = seq + %s WHERE name = %s",
+                [count, table],
+            )
+            if cursor.rowcount == 0:
+                # Table has never been inserted into; seed the sequence.
+                cursor.execute(
+                    f"SELECT COALESCE(MAX({connection.ops.quote_name(model._meta.pk.column)}), 0) "
+                    f"FROM {connection.ops.quote_name(table)}"
+                )
+                cursor.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)",
+                    [table, cursor.fetchone()[0] + count],
+                )
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+            end = cursor.fetchone()[0] + 1
+            return list(range(end - count, end))
+
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+                [table, model._meta.pk.column, count],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    raise NotSupportedError(f"Cannot reserve ids on {connection.vendor}.")
+
+
+class IdAllocator:
+    """
+    Hands out primary keys from blocks reserved with ``reserve_ids``.
+
+    Ids are increasing within one allocator only; see "Ordering" above.
+    """
+
+    def __init__(self, model, block_size: int):
+        self.model = model
+        self.block_size = block_size
+        self._ids: deque[int] = deque()
+        self._lock = asyncio.Lock()
+
+    async def allocate(self) -> int:
+        if not self._ids:
+            async with self._lock:
+                if not self._ids:
+                    block = await database_sync_to_async(reserve_ids)(
+                        self.model, self.block_size
+                    )
+                    self._ids.extend(block)
+        return self._ids.popleft()
+
+
+class MessageWriter:
+    """Buffers ChatMessage rows and persists them in batches."""
+
+    def __init__(
+        self,
+        batch_size: int,
+        flush_interval: float,
+        max_pending: int,
+        id_block: int,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.ids = IdAllocator(ChatMessage, id_block)
+        self._pending: list[ChatMessage] = []
+        # Guards _pending: the DB thread re-queues failed batches and the
+        # atexit hook drains from the main thread.
+        self._lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def enqueue(self, *, channel_id: int, sender, text: str) -> ChatMessage:
+        """Stamp a message with an id and timestamp and queue it for insert."""
+        msg = ChatMessage(
+            id=await self.ids.allocate(),
+            channel_id=channel_id,
+            sender=sender,
+            text=text,
+            created_at=timezone.now(),
+        )
+        with self._lock:
+            self._pending.append(msg)
+            pending = len(self._pending)
+
+        self._ensure_task()
+        if pending >= self.max_pending:
+            # Backpressure: don't let the buffer outrun the database.
+            await self.flush()
+        elif pending >= self.batch_size:
+            self._wakeup.set()
+        return msg
+
+    async def flush(self) -> None:
+        """Persist everything queued so far."""
+        async with self._flush_lock:
+            batch = self._take()
+            if batch:
+                await database_sync_to_async(self._write)(batch)
+
+    def drain(self) -> None:
+        """Synchronous flush for shutdown, when no event loop is running."""
+        batch = self._take()
+        if batch:
+            self._write(batch)
+
+    def _take(self) -> list[ChatMessage]:
+        with self._lock:
+            batch, self._pending = self._pending, []
+        return batch
+
+    def _write(self, batch: list[ChatMessage]) -> None:
+        try:
+            ChatMessage.objects.bulk_create(batch, batch_size=self.batch_size)
+        except IntegrityError:
+            # One bad row (e.g. its channel was deleted) must not sink the
+            # whole batch; fall back to row-by-row inserts.
+            batch = self._write_rows(batch)
+        except DatabaseError:
+            logger.exception("Write-behind flush failed; re-queueing %d messages", len(batch))
+            with self._lock:
+                self._pending[:0] = batch
+            return
+        # Only committed rows go into the recent-message buffers.
+        for msg in batch:
+            recent_messages.append(msg.channel_id, serialize(msg))
+
+    def _write_rows(self, batch: list[ChatMessage]) -> list[ChatMessage]:
+        written = []
+        for msg in batch:
+            try:
+                with transaction.atomic():
+                    ChatMessage.objects.bulk_create([msg])
+            except IntegrityError:
+                logger.warning(
+                    "Dropping message %s for channel %s: integrity error",
+                    msg.id,
+                    msg.channel_id,
+                )
+            else:
+                written.append(msg)
+        return written
+
+    def _ensure_task(self) -> None:
+        if self._task is None or self._task.done():
+            # A fresh context: the task outlives the connection that started it, whose
+            # routing state (config/routers.py) would otherwise mark every flush.
+            self._task = asyncio.get_running_loop().create_task(
+                self._run(), context=contextvars.Context()
+            )
+
+    async def _run(self) -> None:
+        while True:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            self._wakeup.clear()
+            if self._pending:
+                try:
+                    await self.flush()
+                except Exception:
+                    logger.exception("Write-behind flush loop error")
+
+
+_writer: MessageWriter | None = None
+
+
+def get_writer() -> MessageWriter:
+    """Return the process-wide MessageWriter, creating it on first use."""
+    global _writer
+    if _writer is None:
+        _writer = MessageWriter(
+            batch_size=settings.CHAT_WRITE_BEHIND_BATCH_SIZE,
+            flush_interval=settings.CHAT_WRITE_BEHIND_FLUSH_INTERVAL,
+            max_pending=settings.CHAT_WRITE_BEHIND_MAX_PENDING,
+            id_block=settings.CHAT_WRITE_BEHIND_ID_BLOCK,
+        )
+        atexit.register(_writer.drain)
+    return _writer
@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from apps.chat.archive import archive_month
+from apps.chat.models import ChatArchiveSegment, ChatMessage
+from apps.chat.search import search_backend
+
+
+class Command(BaseCommand):
+    help = "Move whole months of old chat messages into compressed archive segments."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days", type=int, default=settings.CHAT_ARCHIVE_AFTER_DAYS,
+            help="Archive months that ended at least this many days ago.",
+        )
+        parser.add_argument("--channel", type=int, action="append", help="Only these channel ids.")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        threshold = timezone.now() - timedelta(days=opts["older_than_days"])
+        # The month containing the threshold is still partly hot.
+        cutoff = threshold.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+        messages = ChatMessage.objects.filter(created_at__lt=cutoff)
+        if opts["channel"]:
+            messages = messages.filter(channel_id__in=opts["channel"])
+        months = (
+            messages.annotate(month=TruncMonth("created_at"))
+            .values_list("channel_id", "month")
+            .annotate(count=Count("id"))
+            .order_by("channel_id", "month")
+        )
+        done = set(ChatArchiveSegment.objects.values_list("channel_id", "month"))
+
+        archived = size = 0
+        for channel_id, month, count in months:
+            month = month.date()
+            if (channel_id, month) in done:
+                self.stderr.write(
+                    f"channel {channel_id} {month:%Y-%m}: already archived but has "
+                    f"{count} messages in the table; skipped"
+                )
+                continue
+            if opts["dry_run"]:
+                self.stdout.write(f"channel {channel_id} {month:%Y-%m}: {count} messages")
+                archived += count
+                continue
+            segment = archive_month(channel_id, month)
+            if segment is not None:
+                self.stdout.write(
+                    f"channel {channel_id} {month:%Y-%m}: {segment.count} messages, "
+                    f"{segment.size / 1024:,.0f} KiB"
+                )
+                archived += segment.count
+                size += segment.size
+
+        if archived and not opts["dry_run"]:
+            # Reclaim the search index space held by the deleted rows.
+            search_backend.optimize()
+
+        verb = "would archive" if opts["dry_run"] else "archived"
+        self.stdout.write(
+            f"{verb} {archived} messages from before {cutoff:%Y-%m-%d}"
+            + ("" if opts["dry_run"] else f" into {size / 2**20:,.1f} MiB of segments")
+        )
@@ -0,0 +1,188 @@
+import importlib
+import io
+import statistics
+import tempfile
+from base64 import b64encode
+from datetime import timedelta
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.chat import archive
+from apps.chat.models import ChatArchiveSegment, ChatChannel, ChatMessage
+from apps.chat.search import FTS5SearchBackend
+from apps.chat.views import ChatMessageListCreateView
+from config.benchmark import Timer, benchmark_database
+
+CHUNK = 100_000
+# The search index's INSERT trigger, as migration 0004 creates it.
+INSERT_TRIGGER = importlib.import_module("apps.chat.migrations.0004_message_fts").FORWARD[1]
+
+
+def _cursor(position: str, reverse: bool = False) -> str:
+    query = {"p": position, "r": 1} if reverse else {"p": position}
+    return b64encode(urlencode(query).encode()).decode()
+
+
+def _cursor_from(link: str) -> str:
+    return parse_qs(urlsplit(link).query)["cursor"][0]
+
+
+class Command(BaseCommand):
+    help = "Hot-table size before/after archive_chat, and history page latency hot vs cold."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2_000_000)
+        parser.add_argument("--channels", type=int, default=20)
+        parser.add_argument("--months", type=int, default=24)
+        parser.add_argument("--keep-days", type=int, default=180)
+        parser.add_argument("--reps", type=int, default=20)
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "sqlite":
+            self.stderr.write("bench_chat_archive reads table sizes from SQLite's dbstat.")
+            return
+        with benchmark_database(), tempfile.TemporaryDirectory() as tmp, override_settings(
+            CHAT_ARCHIVE_DIR=tmp
+        ):
+            self.factory = APIRequestFactory(SERVER_NAME="localhost")
+            self.view = ChatMessageListCreateView.as_view()
+            self.user = User.objects.create_user(username="bench")
+            channels = ChatChannel.objects.bulk_create(
+                ChatChannel(name=f"c{i}", created_by=self.user) for i in range(opts["channels"])
+            )
+            self._fill([c.id for c in channels], opts["messages"], opts["months"])
+            channel = channels[0]
+            total = ChatMessage.objects.filter(channel=channel).count()
+
+            before = self._sizes()
+            with Timer() as t:
+                call_command("archive_chat", older_than_days=opts["keep_days"], stdout=io.StringIO())
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM")
+            after = self._sizes()
+            segments = ChatArchiveSegment.objects.all()
+            archived = sum(s.count for s in segments)
+            segment_bytes = sum(s.size for s in segments)
+            self.stdout.write(
+                f"archived {archived:,} of {opts['messages']:,} messages into {len(segments)} "
+                f"segments in {t.elapsed:.1f}s: {segment_bytes / 2**20:,.1f} MiB on disk"
+            )
+            for name in before:
+                self.stdout.write(
+                    f"{name:>16}: {before[name] / 2**20:8,.1f} MiB -> {after[name] / 2**20:8,.1f} MiB "
+                    f"({1 - after[name] / before[name]:.0%} smaller)"
+                )
+
+            self._check_walk(channel, total)
+            self._latency(channel, opts["reps"])
+
+    def _fill(self, channel_ids, total, months):
+        now = timezone.now()
+        span = timedelta(days=30.5 * months)
+        raw = connection.connection
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER chat_message_fts_ai")
+        with Timer() as t:
+            for offset in range(0, total, CHUNK):
+                rows = [
+                    (
+                        channel_ids[i % len(channel_ids)],
+                        self.user.id,
+                        f"message {i} about war attacks, clan games and donations",
+                        connection.ops.adapt_datetimefield_value(now - span + span * (i / total)),
+                    )
+                    for i in range(offset, min(offset + CHUNK, total))
+                ]
+                with transaction.atomic():
+                    raw.executemany(
+                        "INSERT INTO chat_chatmessage (channel_id, sender_id, text, attachment, created_at)"
+                        " VALUES (?, ?, ?, '', ?)",
+                        rows,
+                    )
+            FTS5SearchBackend().rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute(INSERT_TRIGGER)
+        self.stdout.write(f"loaded {total:,} messages over {months} months in {t.elapsed:.0f}s")
+
+    def _sizes(self) -> dict[str, int]:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT SUM(pgsize) FROM dbstat WHERE name IN"
+                " (SELECT name FROM sqlite_master WHERE tbl_name = 'chat_chatmessage')"
+            )
+            table = cursor.fetchone()[0]
+            cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name LIKE 'chat_message_fts%'")
+            search = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_count")
+            pages = cursor.fetchone()[0]
+            cursor.execute("PRAGMA page_size")
+            return {
+                "messages+indexes": table,
+                "search index": search,
+                "database file": pages * cursor.fetchone()[0],
+            }
+
+    def _get(self, channel_id, cursor=None):
+        params = {"cursor": cursor} if cursor else {}
+        request = self.factory.get(f"/api/chat/channels/{channel_id}/messages/", params)
+        force_authenticate(request, self.user)
+        response = self.view(request, channel_id=channel_id)
+        assert response.status_code == 200, response.data
+        return response.data
+
+    def _check_walk(self, channel, total):
+        """Page the whole channel oldest-ward, then back, across the hot/cold boundary."""
+        seen, cursor, page = [], None, None
+        while True:
+            page = self._get(channel.id, cursor)
+            seen += [m["id"] for m in page["results"]]
+            if not page["next"]:
+                break
+            cursor = _cursor_from(page["next"])
+        oldest_page = len(page["results"])
+        back = []
+        while page["previous"]:
+            page = self._get(channel.id, _cursor_from(page["previous"]))
+            back += [m["id"] for m in page["results"]]
+        if len(seen) != total or len(set(seen)) != total or seen != sorted(seen, reverse=True):
+            raise CommandError(f"Forward walk returned {len(set(seen)):,} of {total:,} messages.")
+        if sorted(back, reverse=True) != seen[: total - oldest_page]:
+            raise CommandError("Backward walk skipped or repeated messages.")
+        self.stdout.write(f"walk check: {total:,} messages paged both ways across the boundary")
+
+    def _latency(self, channel, reps):
+        hot = ChatMessage.objects.filter(channel=channel).order_by("-created_at", "-id")
+        deep_at, deep_id = hot.values_list("created_at", "id")[1000]
+        oldest_hot = hot.last()
+        segments = list(ChatArchiveSegment.objects.filter(channel=channel).order_by("month"))
+        segment = segments[len(segments) // 2]
+        _, _, created_at, pk = segment.blocks[len(segment.blocks) // 2]
+        cases = {
+            "hot, first page": None,
+            "hot, depth 1,000": _cursor(f"{deep_at.isoformat()}|{deep_id}"),
+            "boundary": _cursor(f"{oldest_hot.created_at.isoformat()}|{oldest_hot.id}"),
+            "cold, mid-archive": _cursor(f"{created_at}|{pk}"),
+            "cold, newer": _cursor(f"{created_at}|{pk}", reverse=True),
+        }
+        self.stdout.write(f"{'page':>18} {'p50 cold cache':>15} {'p50 warm':>9}")
+        for label, cursor in cases.items():
+            cold, warm = [], []
+            for _ in range(reps):
+                archive._block.cache_clear()
+                with Timer() as t:
+                    self._get(channel.id, cursor)
+                cold.append(t.elapsed)
+                with Timer() as t:
+                    self._get(channel.id, cursor)
+                warm.append(t.elapsed)
+            self.stdout.write(
+                f"{label:>18} {statistics.median(cold) * 1000:13.2f}ms "
+                f"{statistics.median(warm) * 1000:7.2f}ms"
+            )
@@ -0,0 +1,154 @@
+import io
+import os
+import statistics
+import tempfile
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.chat import thumbnails
+from apps.chat.models import ChatAttachment, ChatChannel, ChatMessage
+from apps.chat.views import ChatMessageListCreateView, ChatUploadCreateView, ChatUploadView
+from config.benchmark import Timer, benchmark_database
+
+
+class LegacyView(ChatMessageListCreateView):
+    """The multipart path before content addressing: every upload is a new file."""
+
+    def perform_create(self, serializer):
+        serializer.save(sender=self.request.user, channel_id=self.kwargs["channel_id"])
+
+
+def _screenshot(width, height, fmt) -> bytes:
+    """Noisy RGB image: a worst case for size, roughly a busy base screenshot."""
+    bands = [Image.effect_noise((width, height), sigma) for sigma in (30, 45, 60)]
+    out = io.BytesIO()
+    Image.merge("RGB", bands).save(out, fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return out.getvalue()
+
+
+def _tree_size(path) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+
+
+class Command(BaseCommand):
+    help = "Attachment uploads: legacy multipart vs content-addressed and chunked; variant build cost."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument("--width", type=int, default=2560)
+        parser.add_argument("--height", type=int, default=1440)
+
+    def handle(self, *args, **opts):
+        self.factory = APIRequestFactory(SERVER_NAME="localhost")
+        # Django spools multipart files over FILE_UPLOAD_MAX_MEMORY_SIZE (2.5 MiB)
+        # to disk; the 1080p JPEG stays under it and is held in memory.
+        images = {
+            "1080p.jpg": _screenshot(1920, 1080, "JPEG"),
+            "full.jpg": _screenshot(opts["width"], opts["height"], "JPEG"),
+            "full.png": _screenshot(opts["width"], opts["height"], "PNG"),
+        }
+        with tempfile.TemporaryDirectory() as tmp, benchmark_database(), override_settings(
+            MEDIA_ROOT=os.path.join(tmp, "media"), CHAT_UPLOAD_DIR=os.path.join(tmp, "uploads")
+        ):
+            self.user = User.objects.create_user(username="bench")
+            self.channel = ChatChannel.objects.create(name="bench", created_by=self.user)
+            # Variants are timed separately below; keep them off the upload timings.
+            thumbnails.thumbnail_pool.workers = 0
+
+            self.stdout.write(f"{opts['repeat']} identical uploads of each image")
+            self.stdout.write(f"{'image':>9} {'path':>10} {'p50':>9} {'peak mem':>9} {'stored':>9}")
+            for label, data in images.items():
+                for path in ("legacy", "multipart", "chunked"):
+                    media = os.path.join(tmp, "media", path, label)
+                    with override_settings(MEDIA_ROOT=media):
+                        self._reset()
+                        times, peak = self._uploads(path, data, label, opts["repeat"])
+                        stored = _tree_size(media)
+                    self.stdout.write(
+                        f"{label:>9} {path:>10} {statistics.median(times) * 1000:7.1f}ms "
+                        f"{peak / 2**20:7.1f}MiB {stored / 2**20:7.1f}MiB"
+                    )
+
+            self.stdout.write("variants (built once per stored image, off the request path):")
+            for label, data in images.items():
+                self._reset()
+                self._uploads("chunked", data, label, 1)
+                attachment = ChatAttachment.objects.get()
+                with Timer() as t:
+                    thumbnails.build_variants(attachment.id)
+                attachment.refresh_from_db()
+                self.stdout.write(
+                    f"{label:>9}: {t.elapsed * 1000:6.0f}ms; original {attachment.size / 1024:,.0f} KiB, "
+                    f"preview {attachment.preview.size / 1024:,.0f} KiB, "
+                    f"thumbnail {attachment.thumbnail.size / 1024:,.1f} KiB"
+                )
+
+    def _reset(self):
+        ChatMessage.objects.all().delete()
+        ChatAttachment.objects.all().delete()
+
+    def _uploads(self, path, data, filename, repeat):
+        """Server time per upload and peak server-side allocation, request bodies excluded."""
+        times, self.peak = [], 0
+        for i in range(repeat):
+            # The first upload runs under tracemalloc for the peak; the rest are timed.
+            self.tracing, self.elapsed = i == 0, 0.0
+            if path == "chunked":
+                self._chunked(data, filename)
+            else:
+                self._multipart(path, data, filename)
+            if not self.tracing:
+                times.append(self.elapsed)
+        return times or [self.elapsed], self.peak
+
+    def _call(self, view, request, **kwargs):
+        force_authenticate(request, self.user)
+        if self.tracing:
+            tracemalloc.start()
+        with Timer() as t:
+            response = view(request, **kwargs)
+            # Closes any parsed upload, as the handler does after a real request.
+            request.close()
+        if self.tracing:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        self.elapsed += t.elapsed
+        assert response.status_code in (200, 201), response.data
+        return response
+
+    def _multipart(self, path, data, filename):
+        upload = io.BytesIO(data)
+        upload.name = filename
+        request = self.factory.post(
+            f"/api/chat/channels/{self.channel.id}/messages/",
+            {"text": "base", "attachment": upload},
+            format="multipart",
+        )
+        view = LegacyView if path == "legacy" else ChatMessageListCreateView
+        self._call(view.as_view(), request, channel_id=self.channel.id)
+
+    def _chunked(self, data, filename):
+        request = self.factory.post(
+            "/api/chat/uploads/", {"filename": filename, "size": len(data)}, format="json"
+        )
+        upload = self._call(ChatUploadCreateView.as_view(), request).data
+        view = ChatUploadView.as_view()
+        for offset in range(0, len(data), upload["chunk_size"]):
+            request = self.factory.put(
+                f"/api/chat/uploads/{upload['id']}/",
+                data[offset : offset + upload["chunk_size"]],
+                content_type="application/octet-stream",
+                HTTP_UPLOAD_OFFSET=str(offset),
+            )
+            response = self._call(view, request, pk=upload["id"])
+        request = self.factory.post(
+            f"/api/chat/channels/{self.channel.id}/messages/",
+            {"text": "base", "attachment_sha256": response.data["sha256"]},
+            format="json",
+        )
+        self._call(ChatMessageListCreateView.as_view(), request, channel_id=self.channel.id)
@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from apps.chat import encoding, outbound
+from apps.chat.models import ChatChannel, group_name
+from apps.chat.routing import websocket_urlpatterns
+from config.benchmark import Timer, benchmark_database
+
+# The stock InMemoryChannelLayer inbox size, stated explicitly.
+BENCH_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "CONFIG": {"capacity": 100},
+    },
+}
+
+
+class Client:
+    """
+    An ASGI WebSocket peer. A stalled client's ``websocket.send`` blocks until
+    it is released, the way a server applying backpressure blocks on a full
+    socket buffer.
+    """
+
+    def __init__(self, app, path, user, stalled=False):
+        self.frames: list[dict] = []
+        self.close_code = None
+        self.accepted = asyncio.Event()
+        self.released = asyncio.Event()
+        if not stalled:
+            self.released.set()
+        self._inbox: asyncio.Queue = asyncio.Queue()
+        scope = {"type": "websocket", "path": path, "query_string": b"", "user": user}
+        self.task = asyncio.create_task(app(scope, self._inbox.get, self._send))
+        self._inbox.put_nowait({"type": "websocket.connect"})
+
+    async def _send(self, message):
+        if message["type"] == "websocket.accept":
+            self.accepted.set()
+        elif message["type"] == "websocket.close":
+            self.close_code = message.get("code")
+        elif message["type"] == "websocket.send":
+            await self.released.wait()
+            self.frames.append(json.loads(message["text"]))
+
+    def send_json(self, content):
+        self._inbox.put_nowait({"type": "websocket.receive", "text": json.dumps(content)})
+
+    def messages(self) -> list[dict]:
+        return [f for f in self.frames if "id" in f]
+
+    async def close(self):
+        self._inbox.put_nowait({"type": "websocket.disconnect", "code": 1000})
+        try:
+            await asyncio.wait_for(self.task, 1)
+        except TimeoutError:
+            self.task.cancel()  # dispatch loop still blocked on a send
+
+
+class Command(BaseCommand):
+    help = "Stalled WebSocket readers: fast-reader delivery and drops under each outbound policy."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fast", type=int, default=20)
+        parser.add_argument("--stalled", type=int, default=5)
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument("--queue-size", type=int, default=256)
+
+    def handle(self, *args, **opts):
+        with benchmark_database():
+            user = User.objects.create_user(username="bench")
+            channel = ChatChannel.objects.create(name="bench", created_by=user)
+            for policy in ("off", "drop_oldest", "resync", "disconnect"):
+                outbound.metrics = outbound.OutboundMetrics()
+                with override_settings(
+                    CHANNEL_LAYERS=BENCH_LAYERS,
+                    CHAT_OUTBOUND_POLICY=policy,
+                    CHAT_OUTBOUND_QUEUE_SIZE=opts["queue_size"],
+                ):
+                    result = async_to_sync(self._run)(user, channel.id, opts)
+                stats = outbound.metrics.stats()
+                self.stdout.write(
+                    f"{policy:>11}: fast readers got {result['fast']:.1%} in "
+                    f"{result['elapsed']:.2f}s; stalled client's post delivered: "
+                    f"{'yes' if result['probe'] else 'no'}\n"
+                    f"{'':>13}stalled readers after release: {result['stalled']:.0f} msgs, "
+                    f"resync marker: {result['resync']}, closed: {result['closed']}; "
+                    f"max depth {stats['max_depth']}, dropped {stats['dropped']:,}, "
+                    f"resyncs {stats['resyncs']}, disconnects {stats['disconnects']}"
+                )
+
+    async def _run(self, user, channel_id, opts):
+        app = URLRouter(websocket_urlpatterns)
+        path = f"/ws/chat/{channel_id}/"
+        fast = [Client(app, path, user) for _ in range(opts["fast"])]
+        stalled = [Client(app, path, user, stalled=True) for _ in range(opts["stalled"])]
+        clients = fast + stalled
+        await asyncio.gather(*(c.accepted.wait() for c in clients))
+
+        layer = get_channel_layer()
+        group = group_name(channel_id)
+        total = opts["messages"]
+        with Timer() as t:
+            for i in range(total):
+                frame = encoding.dumps({"id": -1 - i, "text": f"msg {i}"})
+                await layer.group_send(
+                    group, {"type": "chat_message", "channel": channel_id, "frame": frame}
+                )
+                if i == total // 2:
+                    # A stalled client posts mid-run; everyone should see it.
+                    stalled[0].send_json({"type": "chat.message", "text": "probe"})
+                if i % 50 == 49:
+                    # Publish no faster than healthy readers keep up.
+                    await self._wait(lambda n=i + 1: all(len(c.messages()) >= n for c in fast))
+            await self._wait(lambda: all(len(c.messages()) >= total for c in fast))
+            await self._wait(lambda: self._probed(fast))
+        probe = self._probed(fast)
+
+        for client in stalled:
+            client.released.set()
+        await asyncio.sleep(0.2)
+
+        result = {
+            "elapsed": t.elapsed,
+            "fast": sum(min(len(c.messages()), total) for c in fast) / (total * len(fast)),
+            "probe": probe,
+            "stalled": sum(len(c.messages()) for c in stalled) / len(stalled),
+            "resync": sum(any(f.get("type") == "resync" for f in c.frames) for c in stalled),
+            "closed": sum(c.close_code == outbound.SLOW_CONSUMER_CLOSE_CODE for c in stalled),
+        }
+        await asyncio.gather(*(c.close() for c in clients))
+        return result
+
+    @staticmethod
+    def _probed(clients) -> bool:
+        return all(any(m.get("text") == "probe" for m in c.frames) for c in clients)
+
+    @staticmethod
+    async def _wait(condition, timeout=1.0):
+        for _ in range(int(timeout / 0.005)):
+            if condition():
+                return
+            await asyncio.sleep(0.005)
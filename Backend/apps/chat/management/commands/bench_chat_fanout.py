@@ -0,0 +1,65 @@
+import json
+import time
+
+import msgpack
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from apps.chat.consumers import ChatConsumer
+
+
+class LegacyConsumer(ChatConsumer):
+    """Ships the dict through the layer and re-encodes it per subscriber."""
+
+    def broadcast_event(self, message, channel_id):
+        return {"type": "chat_message", "message": message}
+
+    @classmethod
+    async def encode_json(cls, content):
+        return json.dumps(content)
+
+
+async def _discard(message):
+    pass
+
+
+class Command(BaseCommand):
+    help = "CPU per broadcast message: encode-once frames vs per-subscriber send_json."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscribers", type=int, nargs="+", default=[10, 100, 1000])
+        parser.add_argument("--messages", type=int, default=200)
+
+    def handle(self, *args, **opts):
+        message = {
+            "id": 123456,
+            "text": "Attack the left side first, then drop the queen walk on the eagle. 🦅",
+            "sender": {"id": 42, "username": "clanmate"},
+            "created_at": "2026-10-18T12:00:00.123456+00:00",
+        }
+        for subscribers in opts["subscribers"]:
+            for label, consumer in (("per-subscriber", LegacyConsumer), ("encode-once", ChatConsumer)):
+                cpu = async_to_sync(self._fanout)(consumer, subscribers, opts["messages"], message)
+                self.stdout.write(
+                    f"{subscribers:>5} subs {label:>15}: "
+                    f"{cpu / opts['messages'] * 1e6:9.1f} µs CPU/message"
+                )
+
+    async def _fanout(self, consumer_cls, subscribers, messages, message):
+        """
+        Replays the fan-out path without sockets: the sender builds the layer
+        event, the layer msgpack-serialises it per recipient (as channels_redis
+        does), and each consumer's chat_message handler produces its frame.
+        """
+        consumers = []
+        for _ in range(subscribers):
+            consumer = consumer_cls()
+            consumer.base_send = _discard
+            consumers.append(consumer)
+
+        start = time.process_time()
+        for _ in range(messages):
+            event = consumers[0].broadcast_event(message, 1)
+            for consumer in consumers:
+                await consumer.chat_message(msgpack.unpackb(msgpack.packb(event)))
+        return time.process_time() - start
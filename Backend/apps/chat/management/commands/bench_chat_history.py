@@ -0,0 +1,130 @@
+import datetime
+from base64 import b64encode
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.pagination import CursorPagination
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.chat.models import ChatChannel, ChatMessage
+from apps.chat.views import ChatMessageListCreateView
+from config.benchmark import Timer, benchmark_database
+
+
+class LegacyPagination(CursorPagination):
+    """The pre-keyset paginator: single-field position plus offset for ties."""
+
+    page_size = 50
+    ordering = "-created_at"
+    cursor_query_param = "cursor"
+
+
+class LegacyView(ChatMessageListCreateView):
+    pagination_class = LegacyPagination
+
+
+def _cursor(position: str) -> str:
+    return b64encode(urlencode({"p": position}).encode()).decode()
+
+
+def _cursor_from(link: str) -> str:
+    return parse_qs(urlsplit(link).query)["cursor"][0]
+
+
+class Command(BaseCommand):
+    help = "History page latency at increasing depth: keyset (created_at, id) vs legacy cursor."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--reps", type=int, default=20)
+
+    def handle(self, *args, **opts):
+        with benchmark_database():
+            self.factory = APIRequestFactory(SERVER_NAME="localhost")
+            self.user = User.objects.create_user(username="bench")
+            self._check_ties()
+
+            channel = ChatChannel.objects.create(name="big", created_by=self.user)
+            other = ChatChannel.objects.create(name="noise", created_by=self.user)
+            self._fill(channel, other, opts["rows"])
+
+            depths = [d for d in (0, 1_000, 100_000, opts["rows"] - 100) if d < opts["rows"]]
+            ordered = ChatMessage.objects.filter(channel=channel).order_by("-created_at", "-id")
+            anchors = {d: ordered.values_list("created_at", "id")[d] for d in depths}
+
+            keyset = ChatMessageListCreateView.as_view()
+            for depth, (created_at, pk) in anchors.items():
+                cursor = _cursor(f"{created_at.isoformat()}|{pk}") if depth else None
+                ms = self._time(keyset, channel.id, cursor, opts["reps"])
+                self.stdout.write(f"keyset  depth {depth:>9,}: {ms:8.2f} ms/page")
+
+            with connection.cursor() as cur:
+                cur.execute("DROP INDEX chat_msg_channel_created_idx")
+            legacy = LegacyView.as_view()
+            for depth, (created_at, _) in anchors.items():
+                cursor = _cursor(str(created_at)) if depth else None
+                ms = self._time(legacy, channel.id, cursor, opts["reps"])
+                self.stdout.write(f"legacy  depth {depth:>9,}: {ms:8.2f} ms/page")
+
+    def _get(self, view, channel_id, cursor):
+        params = {"cursor": cursor} if cursor else {}
+        request = self.factory.get(f"/api/chat/channels/{channel_id}/messages/", params)
+        force_authenticate(request, self.user)
+        response = view(request, channel_id=channel_id)
+        assert response.status_code == 200, response.data
+        return response.data
+
+    def _time(self, view, channel_id, cursor, reps):
+        with Timer() as t:
+            for _ in range(reps):
+                self._get(view, channel_id, cursor)
+        return t.elapsed / reps * 1000
+
+    def _check_ties(self):
+        """Walk a channel whose messages all share one timestamp, both directions."""
+        channel = ChatChannel.objects.create(name="ties", created_by=self.user)
+        stamp = datetime.datetime(2026, 1, 1, tzinfo=datetime.UTC)
+        ChatMessage.objects.bulk_create(
+            ChatMessage(channel=channel, sender=self.user, text=str(i), created_at=stamp)
+            for i in range(237)
+        )
+        view = ChatMessageListCreateView.as_view()
+
+        seen, cursor, page = [], None, None
+        while True:
+            page = self._get(view, channel.id, cursor)
+            seen += [m["id"] for m in page["results"]]
+            if not page["next"]:
+                break
+            cursor = _cursor_from(page["next"])
+        back = []
+        while page["previous"]:
+            page = self._get(view, channel.id, _cursor_from(page["previous"]))
+            back += [m["id"] for m in page["results"]]
+
+        if len(seen) != 237 or len(set(seen)) != 237 or len(set(back)) != 237 - 37:
+            raise CommandError("Tie-break paging skipped or duplicated messages.")
+        self.stdout.write("tie-break check: 237 same-timestamp messages paged without gaps")
+
+    def _fill(self, channel, other, rows):
+        start = datetime.datetime(2024, 1, 1, tzinfo=datetime.UTC)
+        batch = 50_000
+        sql = (
+            "INSERT INTO chat_chatmessage (channel_id, sender_id, text, attachment, created_at) "
+            "VALUES (%s, %s, %s, '', %s)"
+        )
+        with Timer() as t, transaction.atomic(), connection.cursor() as cur:
+            for offset in range(0, rows, batch):
+                params = []
+                for i in range(offset, min(offset + batch, rows)):
+                    # Three messages per millisecond, so ties are common.
+                    stamp = connection.ops.adapt_datetimefield_value(
+                        start + datetime.timedelta(milliseconds=i // 3)
+                    )
+                    params.append((channel.id, self.user.id, f"msg {i}", stamp))
+                    if i % 4 == 0:
+                        params.append((other.id, self.user.id, f"noise {i}", stamp))
+                cur.executemany(sql, params)
+        self.stdout.write(f"inserted {rows:,} rows (+{rows // 4:,} noise) in {t.elapsed:.1f}s")
@@ -0,0 +1,83 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.chat import ingest
+from apps.chat.models import ChatChannel, ChatMessage
+from apps.chat.routing import websocket_urlpatterns
+from config.benchmark import Timer, benchmark_database
+
+# Large enough that no client inbox overflows during the run.
+BENCH_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "CONFIG": {"capacity": 1_000_000},
+    },
+}
+
+
+class Command(BaseCommand):
+    help = "Compare WebSocket chat ingest throughput: inline INSERT vs write-behind batching."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=2000)
+        parser.add_argument("--clients", type=int, default=4)
+
+    def handle(self, *args, **opts):
+        with benchmark_database():
+            user = User.objects.create_user(username="bench")
+            channel = ChatChannel.objects.create(name="bench", created_by=user)
+
+            for label, write_behind in (("inline", False), ("write-behind", True)):
+                ChatMessage.objects.all().delete()
+                ingest._writer = None
+                with override_settings(
+                    CHAT_WRITE_BEHIND=write_behind, CHANNEL_LAYERS=BENCH_LAYERS
+                ), CaptureQueriesContext(connection) as queries:
+                    # async_to_sync keeps thread-sensitive DB calls on this
+                    # thread, so the query log sees the consumer's queries.
+                    elapsed = async_to_sync(self._run)(
+                        user, channel.id, opts["messages"], opts["clients"]
+                    )
+                stored = ChatMessage.objects.count()
+                total = opts["messages"] * opts["clients"]
+                self.stdout.write(
+                    f"{label:>13}: {total} msgs in {elapsed:.3f}s "
+                    f"= {total / elapsed:,.0f} msg/s, "
+                    f"{len(queries) / total:.3f} queries/msg (persisted {stored})"
+                )
+
+    async def _run(self, user, channel_id, messages, clients):
+        app = URLRouter(websocket_urlpatterns)
+        comms = []
+        for _ in range(clients):
+            comm = WebsocketCommunicator(app, f"/ws/chat/{channel_id}/")
+            comm.scope["user"] = user
+            connected, _ = await comm.connect()
+            assert connected
+            comms.append(comm)
+
+        async def send(comm):
+            for i in range(messages):
+                await comm.send_json_to({"type": "chat.message", "text": f"msg {i}"})
+
+        async def receive(comm):
+            # Every client sees every client's messages.
+            for _ in range(messages * clients):
+                await comm.receive_json_from(timeout=30)
+
+        async def drive(comm):
+            await asyncio.gather(send(comm), receive(comm))
+
+        with Timer() as t:
+            await asyncio.gather(*(drive(c) for c in comms))
+        for comm in comms:
+            await comm.disconnect()
+        return t.elapsed
@@ -0,0 +1,113 @@
+import tracemalloc
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.chat import consumers
+from apps.chat.auth_cache import user_cache
+from apps.chat.middleware import JWTAuthMiddleware
+from apps.chat.models import ChatChannel
+from apps.chat.presence import LocalPresenceStore, Presence
+from apps.chat.routing import websocket_urlpatterns
+from config.benchmark import Timer, benchmark_database
+
+BENCH_LAYERS = {
+    "default": {
+        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "CONFIG": {"capacity": 1_000_000},
+    },
+}
+
+
+class Command(BaseCommand):
+    help = "Memory and handshake cost per user: one socket per channel vs one multiplexed socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--channels", type=int, default=8)
+
+    def handle(self, *args, **opts):
+        with benchmark_database(), override_settings(CHANNEL_LAYERS=BENCH_LAYERS):
+            owner = User.objects.create_user(username="owner")
+            channel_ids = [
+                ChatChannel.objects.create(name=f"clan {i}", created_by=owner).id
+                for i in range(opts["channels"])
+            ]
+            tokens = [
+                str(AccessToken.for_user(User.objects.create_user(username=f"u{i}")))
+                for i in range(opts["users"])
+            ]
+
+            for label, connect in (
+                ("per-channel", self._per_channel),
+                ("multiplexed", self._multiplexed),
+            ):
+                user_cache.clear()
+                # One presence frame per channel, so the numbers are handshake cost
+                # rather than presence fan-out to every earlier socket.
+                consumers.presence = Presence(
+                    LocalPresenceStore(), 3600, settings.CHAT_PRESENCE_TTL, settings.CHAT_TYPING_TTL
+                )
+                with CaptureQueriesContext(connection) as queries:
+                    result = async_to_sync(self._run)(connect, tokens, channel_ids)
+                users = len(tokens)
+                self.stdout.write(
+                    f"{label:>12}: {result['sockets'] / users:4.1f} sockets/user, "
+                    f"{result['elapsed'] / users * 1000:7.2f} ms handshake/user, "
+                    f"{len(queries) / users:5.2f} queries/user, "
+                    f"{result['bytes'] / users / 1024:7.1f} KiB/user, "
+                    f"{result['registrations'] / users:4.1f} layer registrations/user"
+                )
+
+    async def _run(self, connect, tokens, channel_ids):
+        app = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+        layer = get_channel_layer()
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        with Timer() as t:
+            comms = []
+            for token in tokens:
+                comms += await connect(app, token, channel_ids)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        result = {
+            "sockets": len(comms),
+            "elapsed": t.elapsed,
+            "bytes": sum(stat.size_diff for stat in after.compare_to(before, "filename")),
+            "registrations": sum(len(members) for members in layer.groups.values()),
+        }
+        for comm in comms:
+            await comm.disconnect()
+        return result
+
+    async def _per_channel(self, app, token, channel_ids):
+        comms = []
+        for channel_id in channel_ids:
+            comm = WebsocketCommunicator(app, f"/ws/chat/{channel_id}/?token={token}")
+            connected, _ = await comm.connect()
+            assert connected
+            comms.append(comm)
+        return comms
+
+    async def _multiplexed(self, app, token, channel_ids):
+        comm = WebsocketCommunicator(app, f"/ws/chat/?token={token}")
+        connected, _ = await comm.connect()
+        assert connected
+        for channel_id in channel_ids:
+            await comm.send_json_to({"type": "subscribe", "channel": channel_id})
+            reply = await comm.receive_json_from()
+            while reply.get("type") == "presence":
+                reply = await comm.receive_json_from()
+            assert reply == {"type": "subscribed", "channel": channel_id}, reply
+        return [comm]
@@ -0,0 +1,112 @@
+import asyncio
+import random
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from apps.chat import consumers, encoding
+from apps.chat.models import ChatChannel, group_name
+from apps.chat.presence import LocalPresenceStore, Presence
+
+
+class CountingLayer(InMemoryChannelLayer):
+    group_sends = 0
+
+    async def group_send(self, group, message):
+        CountingLayer.group_sends += 1
+        await super().group_send(group, message)
+
+
+BENCH_LAYERS = {
+    "default": {
+        "BACKEND": f"{__name__}.CountingLayer",
+        "CONFIG": {"capacity": 1_000_000},
+    },
+}
+
+
+class NaiveConsumer(consumers.ChatConsumer):
+    """Broadcasts every typing event as it arrives."""
+
+    async def set_typing(self, channel, active):
+        frame = encoding.dumps(
+            {"type": "typing", "channel": channel.id, "user": self.user.id, "active": active}
+        )
+        await self.channel_layer.group_send(
+            group_name(channel.id), {"type": "chat_presence", "frame": frame}
+        )
+
+
+async def _discard(message):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Channel-layer messages per second as typers increase: per-keystroke vs coalesced."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--typers", type=int, nargs="+", default=[1, 10, 50, 200])
+        parser.add_argument("--seconds", type=float, default=5)
+
+    def handle(self, *args, **opts):
+        with override_settings(CHANNEL_LAYERS=BENCH_LAYERS):
+            for typers in opts["typers"]:
+                for label, consumer_cls in (
+                    ("per-keystroke", NaiveConsumer),
+                    ("coalesced", consumers.ChatConsumer),
+                ):
+                    consumers.presence = Presence(
+                        LocalPresenceStore(),
+                        settings.CHAT_PRESENCE_INTERVAL,
+                        settings.CHAT_PRESENCE_TTL,
+                        settings.CHAT_TYPING_TTL,
+                    )
+                    CountingLayer.group_sends = 0
+                    events = async_to_sync(self._run)(consumer_cls, typers, opts["seconds"])
+                    self.stdout.write(
+                        f"{typers:>4} typers {label:>13}: {events / opts['seconds']:8.0f} "
+                        f"typing events/s -> "
+                        f"{CountingLayer.group_sends / opts['seconds']:8.1f} layer messages/s "
+                        f"({CountingLayer.group_sends * typers / opts['seconds']:,.0f} deliveries/s)"
+                    )
+
+    async def _run(self, consumer_cls, typers, seconds):
+        """
+        Each typer types bursts of 5-30 keystrokes 100 ms apart, stops (as if
+        sending or abandoning the message), pauses 0.5-3 s, and repeats.
+        """
+        layer = get_channel_layer()
+        channel = ChatChannel(id=1, name="bench")
+        rng = random.Random(0)
+        events = 0
+
+        async def typist(i):
+            nonlocal events
+            consumer = consumer_cls()
+            consumer.user = User(id=i + 1, username=f"typist{i}")
+            consumer.channel = channel
+            consumer.channel_layer = layer
+            consumer.channel_name = f"bench.{i}"
+            consumer.base_send = _discard
+            await consumers.presence.join(channel.id, consumer.user, consumer.channel_name)
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + seconds
+            await asyncio.sleep(rng.uniform(0, 1))
+            while loop.time() < deadline:
+                for _ in range(rng.randint(5, 30)):
+                    if loop.time() >= deadline:
+                        break
+                    await consumer.receive_json({"type": "typing"})
+                    events += 1
+                    await asyncio.sleep(0.1)
+                await consumer.receive_json({"type": "typing", "active": False})
+                events += 1
+                await asyncio.sleep(rng.uniform(0.5, 3))
+
+        await asyncio.gather(*(typist(i) for i in range(typers)))
+        return events
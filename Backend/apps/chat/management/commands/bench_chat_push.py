@@ -0,0 +1,144 @@
+import asyncio
+import statistics
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from apps.chat import consumers, notify
+from apps.chat.models import ChatChannel, group_name
+from apps.chat.presence import LocalPresenceStore, Presence
+from apps.push import sender as push_sender
+from apps.push import services as push
+from apps.push.standin import StandInPushService
+from apps.push.webpush import b64url_encode
+from config.benchmark import Timer, benchmark_database
+
+BENCH_LAYERS = {"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}
+
+
+class PushEveryoneConsumer(consumers.ChatConsumer):
+    """Pushes every message to every other subscriber before returning."""
+
+    async def post_message(self, channel, text):
+        message = await self.save_message(channel, text)
+        await self.channel_layer.group_send(
+            group_name(channel.id), self.broadcast_event(message, channel.id)
+        )
+        subs = await push.subscriptions()
+        await push.deliver(
+            [s for s in subs if s.user_id != self.user.id],
+            {"title": f"#{channel.name}", "body": f"{self.user.username}: {text}"},
+        )
+
+
+async def _discard(message):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Chat message push: inline push to everyone vs offline-only, coalesced push."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=300)
+        parser.add_argument("--online", type=int, default=50)
+        # Users who opened the channel before: the "seen" audience.
+        parser.add_argument("--seen", type=int, default=150)
+        parser.add_argument("--messages", type=int, default=40)
+        parser.add_argument("--interval-ms", type=float, default=50)
+        parser.add_argument("--latency-ms", type=float, default=20)
+        parser.add_argument("--window", type=float, default=1.0)
+
+    def handle(self, *args, **opts):
+        vapid_key = ec.generate_private_key(ec.SECP256R1())
+        vapid_private = b64url_encode(vapid_key.private_numbers().private_value.to_bytes(32, "big"))
+        service = StandInPushService(opts["latency_ms"] / 1000)
+        port = service.start()
+
+        with benchmark_database(), override_settings(
+            CHANNEL_LAYERS=BENCH_LAYERS, VAPID_PRIVATE_KEY=vapid_private
+        ):
+            users = User.objects.bulk_create(
+                User(username=f"member{i}") for i in range(opts["users"])
+            )
+            service.subscribe(users, [f"http://127.0.0.1:{port}"])
+            channel = ChatChannel.objects.create(name="war", created_by=users[0])
+
+            for label, consumer_cls, audience in (
+                ("inline, everyone", PushEveryoneConsumer, notify.everyone),
+                ("coalesced, everyone", consumers.ChatConsumer, notify.everyone),
+                ("coalesced, seen", consumers.ChatConsumer, notify.seen),
+            ):
+                service.reset()
+                latencies, elapsed = async_to_sync(self._run)(
+                    consumer_cls, audience, channel, users, service, opts
+                )
+                latencies.sort()
+                self.stdout.write(
+                    f"{label:>19}: receive_json p50 {statistics.median(latencies) * 1000:7.2f} ms, "
+                    f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:7.2f} ms; "
+                    f"{service.requests:,} pushes for {len(latencies)} messages "
+                    f"({service.requests / len(latencies):.1f}/message) in {elapsed:.2f}s"
+                )
+            bodies = sorted({p["body"] for p in service.payloads})
+            self.stdout.write(f"  coalesced notifications: {bodies}")
+
+        if service.errors:
+            raise CommandError(f"Stand-in rejected pushes: {service.errors[:3]}")
+
+    async def _run(self, consumer_cls, audience, channel, users, service, opts):
+        """
+        ``--online`` users hold a socket in the channel and the first
+        ``--seen`` users have opened it before; two online users take turns
+        posting ``--messages`` messages ``--interval-ms`` apart.
+        """
+        consumers.presence = notify.presence = Presence(
+            LocalPresenceStore(),
+            settings.CHAT_PRESENCE_INTERVAL,
+            settings.CHAT_PRESENCE_TTL,
+            settings.CHAT_TYPING_TTL,
+        )
+        consumers.chat_push = notify.chat_push = notify.ChatPush(
+            opts["window"], consumers.presence, audience
+        )
+        for user in users[: opts["seen"]]:
+            await consumers.presence.saw(channel.id, user.id)
+        layer = get_channel_layer()
+
+        posters = []
+        for i, user in enumerate(users[: opts["online"]]):
+            consumer = consumer_cls()
+            consumer.user = user
+            consumer.channel = channel
+            consumer.channel_layer = layer
+            consumer.channel_name = f"bench.{i}"
+            consumer.base_send = _discard
+            await consumers.presence.join(channel.id, user, consumer.channel_name)
+            if i < 2:
+                posters.append(consumer)
+
+        latencies = []
+        with Timer() as t:
+            for i in range(opts["messages"]):
+                with Timer() as call:
+                    await posters[i % 2].receive_json({"type": "chat.message", "text": f"msg {i}"})
+                latencies.append(call.elapsed)
+                await asyncio.sleep(opts["interval_ms"] / 1000)
+            # Let the last coalescing window fire and deliver.
+            while consumers.chat_push._timers:
+                await asyncio.sleep(0.05)
+            await self._settle(service)
+        await push_sender.close_senders()
+        return latencies, t.elapsed
+
+    @staticmethod
+    async def _settle(service, quiet=0.3):
+        """Wait until the stand-in has seen no new pushes for ``quiet`` seconds."""
+        seen = -1
+        while seen != service.requests:
+            seen = service.requests
+            await asyncio.sleep(quiet)
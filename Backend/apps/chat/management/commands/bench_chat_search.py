@@ -0,0 +1,178 @@
+import importlib
+import random
+import statistics
+import string
+from datetime import UTC, datetime, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+
+from apps.chat.models import ChatChannel, ChatMessage
+from apps.chat.search import BasicSearchBackend, FTS5SearchBackend
+from config.benchmark import Timer, benchmark_database
+
+CHUNK = 100_000
+POOL = 200_000
+# The index's INSERT trigger, as migration 0004 creates it.
+INSERT_TRIGGER = importlib.import_module("apps.chat.migrations.0004_message_fts").FORWARD[1]
+
+
+def _vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = "Channel-scoped message search: LIKE scan vs the FTS5 index, plus index upkeep cost."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=10_000_000)
+        parser.add_argument("--channels", type=int, default=50)
+        parser.add_argument("--vocabulary", type=int, default=20_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "sqlite":
+            self.stderr.write("bench_chat_search needs SQLite (FTS5).")
+            return
+        rng = random.Random(0)
+        words = _vocabulary(rng, opts["vocabulary"])
+        # Zipf-like: a few words are in most messages, most words are rare.
+        weights = list(accumulate(1 / (rank + 1) for rank in range(len(words))))
+
+        with benchmark_database():
+            user = User.objects.create_user(username="bench")
+            channels = ChatChannel.objects.bulk_create(
+                ChatChannel(name=f"c{i}", created_by=user) for i in range(opts["channels"])
+            )
+            self._load(rng, words, weights, [c.id for c in channels], user.id, opts["messages"])
+            self._upkeep(rng, words, weights, channels, user)
+            self._queries(rng, words, channels, opts["repeat"])
+
+    def _load(self, rng, words, weights, channel_ids, sender_id, total):
+        pool = [
+            " ".join(rng.choices(words, cum_weights=weights, k=rng.randint(3, 15))) for _ in range(POOL)
+        ]
+        start = datetime(2024, 1, 1, tzinfo=UTC)
+        raw = connection.connection
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER chat_message_fts_ai")
+        with Timer() as load:
+            for offset in range(0, total, CHUNK):
+                rows = [
+                    (
+                        channel_ids[i % len(channel_ids)],
+                        sender_id,
+                        pool[(i * 7919) % POOL],
+                        (start + timedelta(seconds=i)).isoformat(),
+                    )
+                    for i in range(offset, min(offset + CHUNK, total))
+                ]
+                with transaction.atomic():
+                    raw.executemany(
+                        "INSERT INTO chat_chatmessage (channel_id, sender_id, text, created_at)"
+                        " VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+        with Timer() as build, transaction.atomic():
+            FTS5SearchBackend().rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute(INSERT_TRIGGER)
+            cursor.execute(
+                "SELECT name, SUM(pgsize) FROM dbstat"
+                " WHERE name IN ('chat_chatmessage', 'chat_message_fts_data',"
+                " 'chat_message_fts_idx') GROUP BY name"
+            )
+            sizes = dict(cursor.fetchall())
+        self.stdout.write(
+            f"loaded {total:,} messages in {load.elapsed:.0f}s; full index build "
+            f"{build.elapsed:.0f}s; table {sizes.get('chat_chatmessage', 0) / 2**20:,.0f} MiB, "
+            f"index {(sizes.get('chat_message_fts_data', 0) + sizes.get('chat_message_fts_idx', 0)) / 2**20:,.0f} MiB"
+        )
+
+    def _upkeep(self, rng, words, weights, channels, user, count=20_000, batch=200):
+        """Write-behind sized bulk inserts with the index trigger on and off."""
+        results = {}
+        for label, trigger in (("indexed", True), ("unindexed", False)):
+            if not trigger:
+                with connection.cursor() as cursor:
+                    cursor.execute("DROP TRIGGER chat_message_fts_ai")
+            first_id = ChatMessage.objects.order_by("-id").values_list("id", flat=True)[0]
+            with Timer() as t:
+                for _ in range(count // batch):
+                    with transaction.atomic():
+                        ChatMessage.objects.bulk_create(
+                            ChatMessage(
+                                channel=rng.choice(channels),
+                                sender=user,
+                                text=" ".join(rng.choices(words, cum_weights=weights, k=rng.randint(3, 15))),
+                            )
+                            for _ in range(batch)
+                        )
+            results[label] = t.elapsed / count
+            if not trigger:
+                with connection.cursor() as cursor:
+                    # Catch the index up on the rows written without the trigger.
+                    cursor.execute(
+                        "INSERT INTO chat_message_fts(rowid, text, channel_id)"
+                        " SELECT id, text, channel_id FROM chat_chatmessage WHERE id > %s",
+                        [first_id],
+                    )
+                    cursor.execute(INSERT_TRIGGER)
+        self.stdout.write(
+            f"bulk insert ({batch}/batch): {results['unindexed'] * 1e6:.0f} us/message "
+            f"without the index, {results['indexed'] * 1e6:.0f} us/message with it"
+        )
+
+    def _queries(self, rng, words, channels, repeat):
+        like, fts = BasicSearchBackend(), FTS5SearchBackend()
+        cases = {
+            "common word": words[0],
+            "mid word": words[200],
+            "rare word": words[-1],
+            "two words": f"{words[3]} {words[40]}",
+            "prefix": f"{words[100][:3]}*",
+        }
+        window = settings.CHAT_SEARCH_RANK_WINDOW
+        self.stdout.write(
+            f"{'query':>12} {'LIKE scan':>12} {'FTS5 rank all':>14} "
+            f"{f'FTS5 newest {window}':>17} {'page 2':>9}"
+        )
+        for label, query in cases.items():
+            timings = {"like": [], "all": [], "window": [], "page2": []}
+            for _ in range(repeat):
+                channel_id = rng.choice(channels).id
+                with Timer() as t:
+                    like.search(channel_id, query, 20)
+                timings["like"].append(t.elapsed)
+                with Timer() as t, override_settings(CHAT_SEARCH_RANK_WINDOW=0):
+                    fts.search(channel_id, query, 21)
+                timings["all"].append(t.elapsed)
+                with Timer() as t:
+                    hits = fts.search(channel_id, query, 21)
+                timings["window"].append(t.elapsed)
+                with Timer() as t:
+                    fts.search(channel_id, query, 21, after=hits[19] if len(hits) > 20 else None)
+                timings["page2"].append(t.elapsed)
+            self.stdout.write(
+                f"{label:>12} "
+                + " ".join(
+                    f"{statistics.median(timings[k]) * 1000:{w}.1f}ms"
+                    for k, w in (("like", 10), ("all", 12), ("window", 15), ("page2", 7))
+                )
+            )
+
+        with Timer() as t_like:
+            ChatMessage.objects.filter(text__icontains=words[-1]).order_by("-id")[:100].count()
+        with Timer() as t_fts:
+            fts.filter(ChatMessage.objects.all(), words[-1]).order_by("-id")[:100].count()
+        self.stdout.write(
+            f"admin search, all channels, rare word: LIKE {t_like.elapsed * 1000:,.0f}ms, "
+            f"FTS5 {t_fts.elapsed * 1000:,.1f}ms"
+        )
@@ -0,0 +1,144 @@
+import random
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from apps.chat.models import ChatChannel, ChatMessage
+from config.benchmark import Timer, benchmark_database
+from config.database import database_profile
+
+
+class Command(BaseCommand):
+    help = "Concurrent chat writes and history reads per DB_PROFILE: plain SQLite vs WAL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=8)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument("--seconds", type=float, default=5.0)
+        parser.add_argument("--profiles", nargs="+", default=["sqlite-basic", "sqlite"])
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "sqlite":
+            raise CommandError("Compares SQLite profiles; run it with a SQLite DB_PROFILE.")
+        original = dict(connection.settings_dict)
+        self.stdout.write(
+            f"{opts['writers']} writers, {opts['readers']} readers, {opts['seconds']:g}s; "
+            "every operation is one request (close_old_connections before and after)"
+        )
+        self.stdout.write(
+            f"{'profile':>13} {'writes/s':>9} {'w p50':>8} {'w p99':>8} "
+            f"{'reads/s':>8} {'r p99':>8} {'locked':>7} {'connect':>8}"
+        )
+        try:
+            for profile in opts["profiles"]:
+                self._use(profile)
+                with benchmark_database():
+                    self._report(profile, opts)
+        finally:
+            connection.close()
+            connection.settings_dict.clear()
+            connection.settings_dict.update(original)
+
+    def _use(self, profile):
+        """Switch the shared settings dict, so every thread's connection picks it up."""
+        connection.close()
+        settings_dict = connection.settings_dict
+        name = settings_dict["NAME"]
+        for key in ("OPTIONS", "CONN_MAX_AGE", "CONN_HEALTH_CHECKS"):
+            settings_dict.pop(key, None)
+        settings_dict.update({"OPTIONS": {}, "CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False})
+        settings_dict.update(database_profile(profile, name))
+
+    def _report(self, profile, opts):
+        user = User.objects.create_user(username="bench")
+        channels = [
+            ChatChannel.objects.create(name=f"bench {i}", created_by=user).id for i in range(8)
+        ]
+        ChatMessage.objects.bulk_create(
+            ChatMessage(channel_id=channels[i % 8], sender=user, text=f"seed {i}")
+            for i in range(20_000)
+        )
+        connection.close()
+
+        with Timer() as t:
+            for _ in range(50):
+                connection.ensure_connection()
+                connection.close()
+        connect = t.elapsed / 50
+
+        self.stop = threading.Event()
+        self.results = {"write": [], "read": [], "locked": 0}
+        self.lock = threading.Lock()
+        threads = [
+            threading.Thread(target=self._worker, args=(self._write, user.id, channels))
+            for _ in range(opts["writers"])
+        ] + [
+            threading.Thread(target=self._worker, args=(self._read, user.id, channels))
+            for _ in range(opts["readers"])
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(opts["seconds"])
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+
+        writes, reads = self.results["write"], self.results["read"]
+        stored = ChatMessage.objects.count() - 20_000
+        if stored != len(writes):
+            raise CommandError(f"{len(writes)} writes reported but {stored} stored.")
+        self.stdout.write(
+            f"{profile:>13} {len(writes) / opts['seconds']:9.0f} {_ms(writes, 50):>8} "
+            f"{_ms(writes, 99):>8} {len(reads) / opts['seconds']:8.0f} {_ms(reads, 99):>8} "
+            f"{self.results['locked']:7d} {connect * 1000:6.2f}ms"
+        )
+
+    def _worker(self, operation, user_id, channels):
+        rng = random.Random()
+        try:
+            while not self.stop.is_set():
+                # What request_started / request_finished do around a view.
+                close_old_connections()
+                try:
+                    with Timer() as t:
+                        kind = operation(user_id, rng.choice(channels))
+                except OperationalError as exc:
+                    if "locked" not in str(exc):
+                        raise
+                    with self.lock:
+                        self.results["locked"] += 1
+                else:
+                    with self.lock:
+                        self.results[kind].append(t.elapsed)
+                finally:
+                    close_old_connections()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _write(user_id, channel_id):
+        # A read before the insert in one transaction, as a view that validates
+        # against the channel and writes atomically does.
+        with transaction.atomic():
+            ChatChannel.objects.only("id").get(pk=channel_id)
+            ChatMessage.objects.create(channel_id=channel_id, sender_id=user_id, text="bench")
+        return "write"
+
+    @staticmethod
+    def _read(user_id, channel_id):
+        list(
+            ChatMessage.objects.filter(channel_id=channel_id)
+            .select_related("sender")
+            .order_by("-created_at", "-id")[:50]
+        )
+        return "read"
+
+
+def _ms(samples, percentile):
+    if len(samples) < 2:
+        return "-"
+    return f"{statistics.quantiles(samples, n=100)[percentile - 1] * 1000:.1f}ms"
@@ -0,0 +1,194 @@
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.chat.models import ChatChannel, ChatMessage
+from config.benchmark import Timer, benchmark_database
+from config.database import replica_profile
+from config.routers import refresh_sqlite_replica
+
+REPLICAS = ["replica1", "replica2"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replica routing over two SQLite stand-ins: read-your-writes, health "
+        "fallback, and the share and cost of reads moved off the primary."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--messages", type=int, default=20_000)
+        parser.add_argument("--pages", type=int, default=1000)
+
+    def handle(self, *args, **opts):
+        with tempfile.TemporaryDirectory() as tmp, benchmark_database():
+            for alias in REPLICAS:
+                connections.settings[alias] = replica_profile(
+                    connection.settings_dict, os.path.join(tmp, f"{alias}.sqlite3")
+                )
+            try:
+                with override_settings(
+                    DB_REPLICA_ALIASES=REPLICAS,
+                    DB_REPLICA_CHECK_INTERVAL=0,
+                    DB_STICKY_SECONDS=0.5,
+                    DB_STICKY_STORE="local",
+                    # Re-instantiates the router with the replicas above.
+                    DATABASE_ROUTERS=["config.routers.ReplicaRouter"],
+                ):
+                    self._seed(opts["messages"])
+                    self._check(tmp)
+                    self._refresh()
+                    self._measure(opts["pages"])
+            finally:
+                for alias in REPLICAS:
+                    connections[alias].close()
+                    del connections.settings[alias]
+
+    def _seed(self, messages):
+        self.users = [User.objects.create_user(username=f"bench{i}") for i in range(20)]
+        self.clients = [
+            Client(HTTP_HOST="localhost", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(u)}")
+            for u in self.users
+        ]
+        self.channel = ChatChannel.objects.create(name="general", created_by=self.users[0])
+        ChatMessage.objects.bulk_create(
+            ChatMessage(channel=self.channel, sender=self.users[i % 20], text=f"seed {i}")
+            for i in range(messages)
+        )
+        self._refresh()
+
+    def _refresh(self):
+        for alias in REPLICAS:
+            refresh_sqlite_replica(alias)
+
+    def _channels(self, client):
+        """Channel names a GET returns, and the aliases its queries ran on."""
+        with _Queries() as queries:
+            response = client.get("/api/chat/channels/")
+        assert response.status_code == 200, response.content
+        return {c["name"] for c in response.json()}, queries.aliases()
+
+    def _check(self, tmp):
+        alice, bob = self.clients[0], self.clients[1]
+
+        names, aliases = self._channels(alice)
+        _expect("a GET reads a replica", aliases <= set(REPLICAS) and aliases, aliases)
+
+        with _Queries() as queries:
+            response = alice.post("/api/chat/channels/", {"name": "war"})
+        assert response.status_code == 201, response.content
+        _expect("a POST reads and writes the primary", queries.aliases() == {"default"}, queries)
+
+        names, aliases = self._channels(alice)
+        _expect("the writer reads its write", "war" in names and aliases == {"default"}, aliases)
+        names, aliases = self._channels(bob)
+        _expect("others read the (stale) replica", "war" not in names, aliases)
+        time.sleep(0.6)
+        names, aliases = self._channels(alice)
+        _expect("stickiness expires", "war" not in names and "default" not in aliases, aliases)
+
+        # A replica file that went missing: SQLite opens an empty database.
+        broken = os.path.join(tmp, "replica1.sqlite3")
+        shutil.move(broken, broken + ".bak")
+        connections["replica1"].close()
+        for _ in range(5):
+            _, aliases = self._channels(bob)
+            _expect("a failed replica is skipped", aliases == {"replica2"}, aliases)
+        connections["replica2"].settings_dict["NAME"] = os.path.join(tmp, "missing.sqlite3")
+        connections["replica2"].close()
+        _, aliases = self._channels(bob)
+        _expect("no healthy replica falls back to the primary", aliases == {"default"}, aliases)
+
+        connections["replica1"].close()
+        shutil.move(broken + ".bak", broken)
+        connections["replica2"].settings_dict["NAME"] = os.path.join(tmp, "replica2.sqlite3")
+        connections["replica2"].close()
+        _, aliases = self._channels(bob)
+        _expect("recovered replicas are used again", aliases <= set(REPLICAS), aliases)
+        self.stdout.write(
+            "checks: GET on replica, POST on primary, read-your-writes, expiry, "
+            "failover, fallback, recovery ok"
+        )
+
+    def _measure(self, pages):
+        """History paging by 20 users, one in ten of whom has just posted."""
+        url = f"/api/chat/channels/{self.channel.id}/messages/"
+        cursors = []
+        response = self.clients[0].get(url)
+        for _ in range(10):
+            cursors.append(response.json()["next"])
+            response = self.clients[0].get(cursors[-1])
+
+        for label, routers in (
+            ("primary only", []),
+            ("with replicas", ["config.routers.ReplicaRouter"]),
+        ):
+            with override_settings(
+                DATABASE_ROUTERS=routers, DB_REPLICA_CHECK_INTERVAL=5
+            ), _Queries() as queries:
+                times = []
+                for i in range(pages):
+                    client = self.clients[i % 20]
+                    if i % 20 < 2:
+                        client.post(url, {"text": "hi"}, content_type="application/json")
+                    with Timer() as t:
+                        response = client.get(cursors[i % len(cursors)])
+                    assert response.status_code == 200, response.content
+                    times.append(t.elapsed)
+            reads = queries.by_alias("SELECT")
+            total = sum(reads.values())
+            share = ", ".join(f"{a} {n / total:.0%}" for a, n in sorted(reads.items()))
+            self.stdout.write(
+                f"{label:>13}: page p50 {statistics.median(times) * 1000:.2f}ms; "
+                f"{total} SELECTs: {share}"
+            )
+
+
+def _expect(label, ok, detail):
+    if not ok:
+        raise CommandError(f"{label}: {detail}")
+
+
+class _Queries:
+    """
+    CaptureQueriesContext on the primary and every replica at once, counting
+    queries on the chat tables only (not the JWT user lookup, which is not
+    routed, nor the router's health probes).
+    """
+
+    def __enter__(self):
+        self.contexts = {a: CaptureQueriesContext(connections[a]) for a in ["default", *REPLICAS]}
+        for context in self.contexts.values():
+            context.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        for context in self.contexts.values():
+            context.__exit__(*exc)
+
+    def by_alias(self, prefix=""):
+        return {
+            alias: n
+            for alias, context in self.contexts.items()
+            if (
+                n := sum(
+                    q["sql"].startswith(prefix) and '"chat_' in q["sql"]
+                    for q in context.captured_queries
+                )
+            )
+        }
+
+    def aliases(self):
+        return set(self.by_alias())
+
+    def __repr__(self):
+        return repr(self.by_alias())
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.urls import path
+from django.views.static import serve as static_serve
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.chat import media
+from config.benchmark import benchmark_database
+
+# This module doubles as the URLconf: the old static view next to the new one.
+urlpatterns = [
+    path("static-media/<path:path>", static_serve, {"document_root": None}, name="bench-static"),
+    path("media/<path:path>", media.serve, name="bench-media"),
+]
+
+SIZES = {"thumbnail": 48 * 1024, "screenshot": 2 * 2**20, "video": 32 * 2**20}
+
+
+async def _request(handler, url, headers=()):
+    """One request through Django's ASGI handler; (status, headers, body bytes)."""
+    url, _, query = url.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": url,
+        "raw_path": url.encode(),
+        "query_string": query.encode(),
+        "headers": [(b"host", b"localhost"), *((k.encode(), v.encode()) for k, v in headers)],
+        "server": ("localhost", 80),
+        "client": ("127.0.0.1", 50000),
+    }
+    sent = [False]
+
+    async def receive():
+        if not sent[0]:
+            sent[0] = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.Event().wait()  # no disconnect
+
+    result = {"size": 0}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["headers"] = {k.decode().lower(): v.decode() for k, v in message["headers"]}
+        else:
+            result["size"] += len(message.get("body", b""))
+
+    await handler(scope, receive, send)
+    return result["status"], result["headers"], result["size"]
+
+
+class Command(BaseCommand):
+    help = "Serving attachments: django.views.static vs apps.chat.media, in-process over ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seconds", type=float, default=3.0)
+
+    def handle(self, *args, **opts):
+        with tempfile.TemporaryDirectory() as root, benchmark_database(), override_settings(
+            MEDIA_ROOT=root, ROOT_URLCONF=__name__, CHAT_MEDIA_AUTH=True, DEBUG=False
+        ):
+            urlpatterns[0].default_args["document_root"] = root
+            for name, size in SIZES.items():
+                with open(os.path.join(root, f"{name}.bin"), "wb") as f:
+                    f.write(os.urandom(size))
+            token = str(AccessToken.for_user(User.objects.create_user(username="bench")))
+            asyncio.run(self._run(token, opts["seconds"]))
+
+    async def _run(self, token, seconds):
+        handler = ASGIHandler()
+        await self._check(handler, token)
+
+        self.stdout.write(f"{'file':>11} {'view':>7} {'req/s':>8} {'MiB/s':>8} {'peak mem':>9}")
+        for name, size in SIZES.items():
+            for label, url in (
+                ("static", f"/static-media/{name}.bin"),
+                ("media", media.signed_url(f"/media/{name}.bin")),
+            ):
+                rate, peak = await self._throughput(handler, url, (), seconds)
+                self.stdout.write(
+                    f"{name:>11} {label:>7} {rate:8.0f} {rate * size / 2**20:8.0f} "
+                    f"{peak / 2**20:7.1f}MiB"
+                )
+
+        # Seeking in a video: 256 KiB from the middle of the largest file.
+        middle = SIZES["video"] // 2
+        span = ("range", f"bytes={middle}-{middle + 256 * 1024 - 1}")
+        for label, url in (
+            ("static", "/static-media/video.bin"),
+            ("media", media.signed_url("/media/video.bin")),
+        ):
+            rate, _ = await self._throughput(handler, url, (span,), seconds)
+            self.stdout.write(f"256 KiB range of video, {label:>6}: {rate:8.0f} req/s")
+
+        _, headers, _ = await _request(handler, media.signed_url("/media/screenshot.bin"))
+        revalidate = (("if-none-match", headers["etag"]),)
+        rate, _ = await self._throughput(handler, media.signed_url("/media/screenshot.bin"), revalidate, seconds)
+        self.stdout.write(f"revalidation (304), media: {rate:8.0f} req/s")
+        with override_settings(CHAT_MEDIA_ACCEL="nginx"):
+            rate, _ = await self._throughput(handler, media.signed_url("/media/video.bin"), (), seconds)
+        self.stdout.write(f"X-Accel-Redirect, any size: {rate:8.0f} req/s")
+
+    async def _throughput(self, handler, url, headers, seconds):
+        tracemalloc.start()
+        await _request(handler, url, headers)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        count, start = 0, time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            await _request(handler, url, headers)
+            count += 1
+        return count / (time.perf_counter() - start), peak
+
+    async def _check(self, handler, token):
+        size = SIZES["screenshot"]
+        url = media.signed_url("/media/screenshot.bin")
+        cases = [
+            ("no token", "/media/screenshot.bin", (), 401, None),
+            ("query token", f"/media/screenshot.bin?token={token}", (), 401, None),
+            ("other path", url.replace("screenshot", "video"), (), 401, None),
+            ("traversal", "/media/../db.sqlite3", (("authorization", f"Bearer {token}"),), 404, None),
+            ("full", url, (), 200, size),
+            ("range", url, (("range", "bytes=10-19"),), 206, 10),
+            ("suffix", url, (("range", "bytes=-100"),), 206, 100),
+            ("open end", url, (("range", f"bytes={size - 5}-"),), 206, 5),
+            ("past end", url, (("range", f"bytes={size}-"),), 416, 0),
+            ("header token", "/media/screenshot.bin", (("authorization", f"Bearer {token}"),), 200, size),
+        ]
+        for label, target, headers, status, length in cases:
+            got, _, body = await _request(handler, target, headers)
+            if got != status or (length is not None and body != length):
+                raise CommandError(f"{label}: expected {status}/{length}, got {got}/{body}")
+        _, headers, _ = await _request(handler, url)
+        got, _, _ = await _request(handler, url, (("if-none-match", headers["etag"]),))
+        stale, _, body = await _request(
+            handler, url, (("range", "bytes=0-9"), ("if-range", '"stale"'))
+        )
+        if got != 304 or stale != 200 or body != size:
+            raise CommandError("Conditional requests misbehaved.")
+        self.stdout.write("checks: auth, signed URLs, traversal, ranges, 416, If-None-Match, If-Range ok")
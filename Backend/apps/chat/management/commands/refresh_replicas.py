@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from config.benchmark import Timer
+from config.routers import refresh_sqlite_replica
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database into each DB_REPLICAS file (local stand-in replicas)."
+
+    def handle(self, *args, **opts):
+        if connection.vendor != "sqlite":
+            raise CommandError("Only SQLite stand-ins need copying; real replicas replicate.")
+        if not settings.DB_REPLICA_ALIASES:
+            raise CommandError("DB_REPLICAS is empty.")
+        for alias in settings.DB_REPLICA_ALIASES:
+            with Timer() as t:
+                refresh_sqlite_replica(alias)
+            self.stdout.write(f"{alias}: copied in {t.elapsed * 1000:.0f}ms")
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import ProtectedError
+from django.utils import timezone
+
+from apps.chat.attachments import discard_upload
+from apps.chat.models import ChatAttachment, ChatUpload
+from apps.chat.thumbnails import build_variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Build variants the thumbnail pool skipped, and delete expired uploads "
+        "and attachments no message uses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age", type=int, default=60,
+            help="Seconds a pending attachment is left to the in-process pool.",
+        )
+
+    def handle(self, *args, **opts):
+        now = timezone.now()
+        pending = ChatAttachment.objects.filter(
+            variants=ChatAttachment.Variants.PENDING,
+            created_at__lt=now - timedelta(seconds=opts["min_age"]),
+        ).values_list("id", flat=True)
+        built = failed = 0
+        for attachment_id in pending:
+            if build_variants(attachment_id):
+                built += 1
+            else:
+                failed += 1
+
+        expired = now - timedelta(seconds=settings.CHAT_UPLOAD_EXPIRY)
+        uploads = 0
+        for upload in ChatUpload.objects.filter(created_at__lt=expired):
+            discard_upload(upload)
+            uploads += 1
+        # Deleting the rows removes their files (see apps.chat.signals). Archived
+        # messages are gone from the table but their segments still link the file.
+        orphans = 0
+        unused = ChatAttachment.objects.filter(
+            messages__isnull=True, archive_segments__isnull=True, created_at__lt=expired
+        )
+        for attachment in unused:
+            try:
+                attachment.delete()
+            except ProtectedError:
+                continue  # attached since the query ran
+            orphans += 1
+
+        self.stdout.write(
+            f"variants built {built}, failed {failed}; removed {uploads} expired uploads "
+            f"and {orphans} unused attachments"
+        )
@@ -0,0 +1,217 @@
+"""
+Authenticated serving of MEDIA_URL: chat attachments and their variants.
+
+Requests carry either the same JWT access token as the API, as
+``Authorization: Bearer <token>``, or a signed URL. The token is only
+verified, not looked up: serving a file costs no database query.
+``CHAT_MEDIA_AUTH=False`` serves media to anyone.
+
+``<img src>`` and other places a browser cannot add a header use the URLs
+the API returns, which ``signed_url`` gives an ``expires`` time and an HMAC
+of the path and that time. A URL lands in access logs and browser history,
+so it must not carry the access token: a leaked signed URL opens one file
+until it expires, not the account. Expiry is rounded up to a multiple of
+``CHAT_MEDIA_URL_TTL``, so a file's URL stays the same, and stays in the
+browser cache, for that long; it is valid for between one and two TTLs.
+
+Responses support conditional and range requests: a strong ETag (the content
+hash for content-addressed files, else size and mtime), Last-Modified,
+If-None-Match / If-Modified-Since revalidation, and one ``Range: bytes=``
+span per request (with If-Range). Content-addressed files never change, so
+they are cacheable for a year.
+
+The body is streamed without loading the file:
+
+- Under ASGI the file is read in ``CHAT_MEDIA_BLOCK_SIZE`` blocks from an
+  async iterator. Django's FileResponse (and so ``django.views.static``)
+  turns a file into a list of 4 KiB chunks there, holding the whole file in
+  memory before the first byte goes out.
+- Under WSGI it is a FileResponse, which servers with ``wsgi.file_wrapper``
+  (gunicorn, uWSGI) send with ``sendfile(2)``.
+
+``CHAT_MEDIA_ACCEL`` hands the body to the front proxy instead, after the
+token has been checked here: ``nginx`` answers with ``X-Accel-Redirect`` to
+``CHAT_MEDIA_ACCEL_PREFIX`` + path (an ``internal`` location aliased to
+MEDIA_ROOT), ``sendfile`` with ``X-Sendfile`` and the absolute path (Apache
+mod_xsendfile, lighttpd). The proxy then does ranges and zero-copy itself.
+"""
+
+import asyncio
+import mimetypes
+import re
+import stat
+import time
+from pathlib import Path
+from urllib.parse import unquote, urlencode, urlsplit
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Files stored by apps.chat.attachments: <sha256>[-variant].<ext>
+CONTENT_ADDRESSED_RE = re.compile(r"^([0-9a-f]{64})(-[a-z]+)?(\.[a-z0-9]+)?$")
+IMMUTABLE = "private, max-age=31536000, immutable"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def _signature(path: str, expires: int) -> str:
+    return salted_hmac(__name__, f"{path}\n{expires}", algorithm="sha256").hexdigest()
+
+
+def signed_url(url: str) -> str:
+    """``url`` (absolute or not) with an expiring signature of its path."""
+    ttl = settings.CHAT_MEDIA_URL_TTL
+    expires = (int(time.time()) // ttl + 2) * ttl
+    signature = _signature(unquote(urlsplit(url).path), expires)
+    query = urlencode({"expires": expires, "signature": signature})
+    return f"{url}{'&' if '?' in url else '?'}{query}"
+
+
+def authenticated(request) -> bool:
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        try:
+            AccessToken(header[7:])
+        except TokenError:
+            return False
+        return True
+    try:
+        expires = int(request.GET.get("expires", ""))
+    except ValueError:
+        return False
+    return expires > time.time() and constant_time_compare(
+        request.GET.get("signature", ""), _signature(request.path, expires)
+    )
+
+
+def byte_range(header: str, size: int) -> tuple[int, int] | None:
+    """(start, end inclusive) of a single-span Range header, or None to send it all."""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None  # malformed or several spans: a full response is allowed
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = max(size - int(last), 0), size - 1  # suffix: the last N bytes
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+class _Span:
+    """``length`` bytes of an open file from its current offset, for FileResponse."""
+
+    def __init__(self, file, length: int):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+async def _blocks(file, length: int, block_size: int):
+    try:
+        while length > 0:
+            data = await asyncio.to_thread(file.read, min(block_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def _validators(path: str, st) -> tuple[str, bool]:
+    """(ETag, immutable) for a file."""
+    match = CONTENT_ADDRESSED_RE.match(Path(path).name)
+    if match:
+        return f'"{match[1]}{match[2] or ""}"', True
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}"', False
+
+
+@require_safe
+async def serve(request, path):
+    if settings.CHAT_MEDIA_AUTH and not authenticated(request):
+        return HttpResponse(status=401, headers={"WWW-Authenticate": "Bearer"})
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+        st = Path(fullpath).stat()
+    except (SuspiciousFileOperation, OSError):
+        raise Http404 from None
+    if not stat.S_ISREG(st.st_mode):
+        raise Http404
+
+    etag, immutable = _validators(path, st)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": http_date(st.st_mtime),
+        "Cache-Control": IMMUTABLE if immutable else "private, no-cache",
+        "Accept-Ranges": "bytes",
+    }
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(st.st_mtime))
+    if not_modified is not None:
+        for name, value in headers.items():
+            not_modified[name] = value
+        return not_modified
+
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+    accel = settings.CHAT_MEDIA_ACCEL
+    if accel == "nginx":
+        headers["X-Accel-Redirect"] = settings.CHAT_MEDIA_ACCEL_PREFIX + path
+        return HttpResponse(content_type=content_type, headers=headers)
+    if accel == "sendfile":
+        headers["X-Sendfile"] = fullpath
+        return HttpResponse(content_type=content_type, headers=headers)
+
+    start, length, status = 0, st.st_size, 200
+    if_range = request.headers.get("If-Range")
+    if "Range" in request.headers and if_range in (None, etag, headers["Last-Modified"]):
+        try:
+            span = byte_range(request.headers["Range"], st.st_size)
+        except RangeNotSatisfiable:
+            return HttpResponse(status=416, headers={"Content-Range": f"bytes */{st.st_size}"})
+        if span:
+            start, length, status = span[0], span[1] - span[0] + 1, 206
+            headers["Content-Range"] = f"bytes {span[0]}-{span[1]}/{st.st_size}"
+    headers["Content-Length"] = str(length)
+
+    if request.method == "HEAD":
+        return HttpResponse(status=status, content_type=content_type, headers=headers)
+    file = open(fullpath, "rb")  # noqa: SIM115 - closed by the response
+    file.seek(start)
+    if isinstance(request, ASGIRequest):
+        return StreamingHttpResponse(
+            _blocks(file, length, settings.CHAT_MEDIA_BLOCK_SIZE),
+            status=status,
+            content_type=content_type,
+            headers=headers,
+        )
+    response = FileResponse(
+        _Span(file, length), status=status, content_type=content_type, headers=headers
+    )
+    response.block_size = settings.CHAT_MEDIA_BLOCK_SIZE
+    return response
@@ -2,26 +2,38 @@
 JWT authentication middleware for Django Channels WebSocket connections.
 
 Authenticates via query-string: ws://…/ws/chat/1/?token=<access_token>
+
+Users are resolved through apps.chat.auth_cache.user_cache, so reconnect
+storms cost one query per distinct user rather than one per handshake.
 """
 
 from urllib.parse import parse_qs
 
-from channels.db import database_sync_to_async
 from channels.middleware import BaseMiddleware
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
 from rest_framework_simplejwt.tokens import AccessToken
 
+from config import routers
+
+from .auth_cache import user_cache
+
 User = get_user_model()
 
 
-@database_sync_to_async
-def get_user_from_token(token_string: str):
+async def get_user_from_token(token_string: str):
     try:
         validated = AccessToken(token_string)
-        return User.objects.get(id=validated["user_id"])
+        # SimpleJWT may serialise the claim as a string; normalise it so the
+        # cache key matches the pk that signal handlers invalidate.
+        user_id = User._meta.pk.to_python(validated["user_id"])
+        user = await user_cache.get(user_id)
     except Exception:
         return AnonymousUser()
+    # A deactivated user's tokens stay valid until they expire; their sockets don't.
+    if user is None or not user.is_active:
+        return AnonymousUser()
+    return user
 
 
 class JWTAuthMiddleware(BaseMiddleware):
@@ -33,4 +45,9 @@ class JWTAuthMiddleware(BaseMiddleware):
         scope["user"] = (
             await get_user_from_token(token) if token else AnonymousUser()
         )
-        return await super().__call__(scope, receive, send)
+        # Reads on this socket follow the user's writes (config/routers.py).
+        routing_token = routers.bind(lambda: scope["user"], per_request=False)
+        try:
+            return await super().__call__(scope, receive, send)
+        finally:
+            routers.unbind(routing_token)
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 02:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_message_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['channel', 'created_at', 'id'], name='chat_msg_channel_created_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations
+
+# External-content FTS5 index over chat_chatmessage, kept current by triggers.
+# SQLite only; other databases use apps.chat.search.BasicSearchBackend.
+FORWARD = [
+    """
+    CREATE VIRTUAL TABLE chat_message_fts USING fts5(
+        text, channel_id,
+        content='chat_chatmessage', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_ai AFTER INSERT ON chat_chatmessage BEGIN
+        INSERT INTO chat_message_fts(rowid, text, channel_id)
+        VALUES (new.id, new.text, new.channel_id);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_ad AFTER DELETE ON chat_chatmessage BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, text, channel_id)
+        VALUES ('delete', old.id, old.text, old.channel_id);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_au AFTER UPDATE OF text, channel_id ON chat_chatmessage BEGIN
+        INSERT INTO chat_message_fts(chat_message_fts, rowid, text, channel_id)
+        VALUES ('delete', old.id, old.text, old.channel_id);
+        INSERT INTO chat_message_fts(rowid, text, channel_id)
+        VALUES (new.id, new.text, new.channel_id);
+    END
+    """,
+    "INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')",
+]
+
+BACKWARD = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_au",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_message_fts_ai",
+    "DROP TABLE IF EXISTS chat_message_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "sqlite":
+            for sql in statements:
+                schema_editor.execute(sql)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_channel_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(_run(FORWARD), _run(BACKWARD)),
+    ]
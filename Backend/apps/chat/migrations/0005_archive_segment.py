@@ -0,0 +1,33 @@
+# Generated by Django 5.1.15 on 2026-10-18 03:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatArchiveSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('path', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField()),
+                ('size', models.PositiveBigIntegerField()),
+                ('first_at', models.DateTimeField()),
+                ('last_at', models.DateTimeField()),
+                ('blocks', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_segments', to='chat.chatchannel')),
+            ],
+            options={
+                'ordering': ['channel', 'month'],
+                'constraints': [models.UniqueConstraint(fields=('channel', 'month'), name='chat_archive_channel_month_uniq')],
+            },
+        ),
+    ]
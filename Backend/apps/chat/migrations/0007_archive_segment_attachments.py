@@ -0,0 +1,42 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:34
+
+import gzip
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def link_attachments(apps, schema_editor):
+    """Record the files of segments archived before segments tracked them."""
+    ChatArchiveSegment = apps.get_model("chat", "ChatArchiveSegment")
+    ChatAttachment = apps.get_model("chat", "ChatAttachment")
+    for segment in ChatArchiveSegment.objects.iterator():
+        path = Path(settings.CHAT_ARCHIVE_DIR) / segment.path
+        if not path.exists():
+            continue
+        with gzip.open(path, "rt") as f:
+            hashes = {
+                row["attachment_info"]["sha256"]
+                for row in map(json.loads, f)
+                if row.get("attachment_info")
+            }
+        if hashes:
+            segment.attachments.set(ChatAttachment.objects.filter(sha256__in=hashes))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_attachment_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatarchivesegment',
+            name='attachments',
+            field=models.ManyToManyField(blank=True, related_name='archive_segments', to='chat.chatattachment'),
+        ),
+        migrations.RunPython(link_attachments, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,13 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+
+def group_name(channel_id: int) -> str:
+    """Channel-layer group holding every socket subscribed to a chat channel."""
+    return f"chat_{channel_id}"
 
 
 class ChatChannel(models.Model):
@@ -18,6 +26,56 @@ class ChatChannel(models.Model):
         return self.name
 
 
+class ChatAttachment(models.Model):
+    """
+    One stored file, addressed by the SHA-256 of its bytes and shared by
+    every message that attaches the same content (see apps.chat.attachments).
+    """
+
+    class Variants(models.TextChoices):
+        PENDING = "pending", "Pending"
+        READY = "ready", "Ready"
+        FAILED = "failed", "Failed"
+        NONE = "none", "Not an image"
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100, blank=True)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    thumbnail = models.FileField(max_length=255, blank=True)
+    preview = models.FileField(max_length=255, blank=True)
+    variants = models.CharField(
+        max_length=10, choices=Variants.choices, default=Variants.PENDING
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.size} bytes)"
+
+
+class ChatUpload(models.Model):
+    """A chunked upload in progress, staged under CHAT_UPLOAD_DIR."""
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="chat_uploads",
+    )
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
 class ChatMessage(models.Model):
     channel = models.ForeignKey(
         ChatChannel,
@@ -33,10 +91,64 @@ class ChatMessage(models.Model):
     attachment = models.FileField(
         upload_to="chat_attachments/", blank=True, null=True
     )
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set for attachments stored by content; ``attachment`` then names its file.
+    blob = models.ForeignKey(
+        ChatAttachment,
+        on_delete=models.PROTECT,
+        related_name="messages",
+        blank=True,
+        null=True,
+    )
+    # Not auto_now_add: write-behind ingest stamps messages on arrival and
+    # persists them later, so the timestamp must survive bulk_create.
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            # Serves history paging: WHERE channel_id = ? ORDER BY created_at, id.
+            models.Index(
+                fields=["channel", "created_at", "id"],
+                name="chat_msg_channel_created_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.sender.username}: {self.text[:50]}"
+
+
+class ChatArchiveSegment(models.Model):
+    """
+    One channel-month of messages moved out of ChatMessage into a compressed
+    file under CHAT_ARCHIVE_DIR (see apps.chat.archive).
+    """
+
+    channel = models.ForeignKey(
+        ChatChannel,
+        on_delete=models.CASCADE,
+        related_name="archive_segments",
+    )
+    month = models.DateField()  # first day of the month
+    path = models.CharField(max_length=255)  # relative to CHAT_ARCHIVE_DIR
+    count = models.PositiveIntegerField()
+    size = models.PositiveBigIntegerField()  # compressed bytes
+    first_at = models.DateTimeField()
+    last_at = models.DateTimeField()
+    # [[byte offset, byte length, first created_at, first id], ...], oldest first
+    blocks = models.JSONField(default=list)
+    # Files its rows attach; sweep_attachments keeps them while the segment exists.
+    attachments = models.ManyToManyField(
+        ChatAttachment, blank=True, related_name="archive_segments"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["channel", "month"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["channel", "month"], name="chat_archive_channel_month_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.channel_id} {self.month:%Y-%m} ({self.count} messages)"
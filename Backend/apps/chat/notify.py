@@ -0,0 +1,177 @@
+"""
+Web Push for chat messages, sent only to users who are not in the channel.
+
+Posting a message only counts it into the channel's pending window; nothing
+on the send path loads subscriptions or talks to a push service. The first
+message in a quiet channel starts a ``CHAT_PUSH_WINDOW``-second timer, and
+when it fires the channel is flushed in the background:
+
+1. look up the users with a live socket in the channel. The presence store
+   (apps.chat.presence) is the connection registry: consumers register on
+   connect and subscribe, refresh on heartbeat and leave on disconnect, and
+   with ``CHAT_PRESENCE_STORE=redis`` it covers every worker,
+2. load the push subscriptions of the audience minus those users, in one
+   query. ``CHAT_PUSH_AUDIENCE`` picks it: by default the users seen in the
+   channel (they opened or posted in it within ``CHAT_SEEN_DAYS``), not
+   every user with a subscription,
+3. send each of them one notification: the message itself if it was the
+   only one, otherwise "5 new messages in #war", never counting their own
+   messages.
+
+The pending windows live in the presence store as well. With ``redis``,
+every worker counts its messages into one shared window per channel. Only
+the worker that counted the window's first message runs its timer, and
+taking the window removes it atomically, so a burst spread over workers
+still sends one notification per user.
+
+Nothing is kept once a window is sent. Every notification carries a
+per-channel tag and the number of messages it covers, and the service
+worker (Frontend/public/sw.js) adds that number to the notification still
+shown under the tag. The device shows one running count per channel
+instead of stacking a notification per window, and the count starts over
+once the user dismisses or opens it.
+"""
+
+import asyncio
+import contextvars
+import logging
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from apps.push import services as push
+
+from .models import ChatChannel
+from .presence import presence
+
+logger = logging.getLogger(__name__)
+
+# Longest message body shown in a single-message notification.
+PREVIEW_CHARS = 120
+
+
+@dataclass
+class _Pending:
+    count: int = 0
+    by_sender: Counter = field(default_factory=Counter)
+    # (username, text) of the first message, shown when it is the only one.
+    first: tuple[str, str] | None = None
+
+
+async def seen(presence, channel_id: int) -> set[int]:
+    return await presence.seen_users(channel_id)
+
+
+async def everyone(presence, channel_id: int) -> None:
+    return None
+
+
+AUDIENCES = {"seen": seen, "everyone": everyone}
+
+
+class ChatPush:
+    def __init__(self, window: float, presence, audience=seen):
+        self.window = window
+        self.presence = presence
+        self.audience = audience
+        self.sent = 0
+        self._timers: dict[int, asyncio.Task] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.VAPID_PRIVATE_KEY)
+
+    async def message_posted(self, channel_id: int, sender, text: str) -> None:
+        """Record a new message; delivery happens later, off the caller's path."""
+        if not self.enabled:
+            return
+        await self.presence.saw(channel_id, sender.id)
+        count = await self.presence.store.add_pending(
+            channel_id, sender.id, sender.username, text, self.window * 3
+        )
+
+        loop = asyncio.get_running_loop()
+        task = self._timers.get(channel_id)
+        # The window's first message starts its timer, on whichever worker got
+        # it; so does one whose timer died with its event loop.
+        if count == 1 or (task is not None and (task.done() or task.get_loop() is not loop)):
+            # Not the poster's context: its DB routing state must not follow the flush.
+            self._timers[channel_id] = loop.create_task(
+                self._flush_later(channel_id), context=contextvars.Context()
+            )
+
+    async def _flush_later(self, channel_id: int) -> None:
+        await asyncio.sleep(self.window)
+        self._timers.pop(channel_id, None)
+        try:
+            await self.flush(channel_id)
+        except Exception:
+            logger.exception("Chat push for channel %s failed", channel_id)
+
+    async def flush(self, channel_id: int) -> None:
+        taken = await self.presence.store.take_pending(channel_id)
+        if taken is None:
+            return
+        count, by_sender, first = taken
+        pending = _Pending(count, Counter(by_sender), first)
+
+        online = await self.presence.online_users(channel_id)
+        audience = await self.audience(self.presence, channel_id)
+        if audience is None:
+            subs = await push.subscriptions(exclude_users=online)
+        elif audience - online:
+            subs = await push.subscriptions(user_id__in=sorted(audience - online))
+        else:
+            return
+        # Users with the same count get the same payload: one fan-out each.
+        by_count = defaultdict(list)
+        for sub in subs:
+            new = pending.count - pending.by_sender[sub.user_id]
+            if new > 0:
+                by_count[new].append(sub)
+        if not by_count:
+            return
+
+        name = await self._channel_name(channel_id)
+        if name is None:
+            return
+        results = await asyncio.gather(
+            *(
+                push.deliver(subs, self._payload(channel_id, name, count, pending))
+                for count, subs in by_count.items()
+            )
+        )
+        self.sent += sum(len(r) for r in results)
+
+    @staticmethod
+    def _payload(channel_id: int, name: str, count: int, pending: _Pending) -> dict:
+        if count == 1 and pending.count == 1:
+            username, text = pending.first
+            body = f"{username}: {text[:PREVIEW_CHARS]}"
+        else:
+            body = f"{count} new message{'s' if count > 1 else ''} in #{name}"
+        return {
+            "title": f"#{name}",
+            "body": body,
+            "url": f"/chat/{channel_id}",
+            "tag": f"chat-{channel_id}",
+            # The service worker adds it to the count of the notification it replaces.
+            "count": count,
+        }
+
+    @database_sync_to_async
+    def _channel_name(self, channel_id: int) -> str | None:
+        return ChatChannel.objects.filter(id=channel_id).values_list("name", flat=True).first()
+
+
+def _build() -> ChatPush:
+    name = settings.CHAT_PUSH_AUDIENCE
+    return ChatPush(
+        settings.CHAT_PUSH_WINDOW, presence, AUDIENCES.get(name) or import_string(name)
+    )
+
+
+chat_push = _build()
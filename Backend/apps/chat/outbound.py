@@ -0,0 +1,155 @@
+"""
+Bounded per-connection outbound queue for chat sockets.
+
+Sending a frame inline from a layer handler blocks that consumer's dispatch
+loop for as long as the client takes to read it. A client on a stalled link
+then stops draining its channel-layer inbox, which overflows and silently
+drops messages, and it can't process its own inbound frames either.
+
+With a queue, handlers only append the frame and return; one writer task per
+socket drains the queue into the socket. When the queue already holds
+``CHAT_OUTBOUND_QUEUE_SIZE`` frames, ``CHAT_OUTBOUND_POLICY`` decides:
+
+- ``drop_oldest``: discard the oldest queued frame.
+- ``resync``: discard everything queued and send one ``{"type": "resync"}``
+  marker instead; the client resumes from its last seen id.
+- ``disconnect``: close the socket with code 4008.
+- ``off`` (the default): no queue; frames are sent inline.
+
+The queue only fills if the ASGI server applies backpressure to
+``websocket.send`` (uvicorn does; Daphne buffers writes without bound), so
+turn a policy on only under such a server. Under Daphne it costs a deque
+and a writer task per socket and never acts.
+
+A send that fails in the writer task is logged and ends the queue; the
+consumer's ``on_error`` then closes the socket, whose client reconnects and
+resumes.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from collections.abc import Awaitable, Callable
+
+from . import encoding
+
+logger = logging.getLogger(__name__)
+
+RESYNC_FRAME = encoding.dumps({"type": "resync"})
+
+# Close code for sockets that can't keep up under the "disconnect" policy.
+SLOW_CONSUMER_CLOSE_CODE = 4008
+
+
+class OutboundMetrics:
+    """Process-wide counters across all outbound queues."""
+
+    def __init__(self):
+        self.connections = 0
+        self.depth = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.disconnects = 0
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "resyncs": self.resyncs,
+            "disconnects": self.disconnects,
+        }
+
+
+metrics = OutboundMetrics()
+
+
+class OutboundQueue:
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        maxsize: int,
+        policy: str,
+        on_error: Callable[[], Awaitable[None]] | None = None,
+    ):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.closed = False
+        self.max_depth = 0
+        self._send = send
+        self._on_error = on_error
+        self._frames: deque[str] = deque()
+        self._ready = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        metrics.connections += 1
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def put(self, frame: str) -> bool:
+        """Queue a frame; False means the socket should be closed."""
+        if self.closed:
+            return True
+        if len(self._frames) >= self.maxsize:
+            if self.policy == "disconnect":
+                logger.warning("Closing slow chat socket with %d frames queued", len(self._frames))
+                metrics.disconnects += 1
+                self.close()
+                return False
+            if self.policy == "resync":
+                if self._frames[0] is RESYNC_FRAME:
+                    self._frames.popleft()  # re-queued below; not a drop
+                    metrics.depth -= 1
+                else:
+                    metrics.resyncs += 1
+                self._discard(len(self._frames))
+                self._push(RESYNC_FRAME)
+                metrics.dropped += 1  # the frame being put
+                return True
+            self._discard(1)
+        self._push(frame)
+        return True
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            if self._task is not None:
+                self._task.cancel()
+            metrics.depth -= len(self._frames)
+            metrics.connections -= 1
+            self._frames.clear()
+
+    def _push(self, frame: str) -> None:
+        self._frames.append(frame)
+        self._ready.set()
+        metrics.depth += 1
+        self.max_depth = max(self.max_depth, len(self._frames))
+        metrics.max_depth = max(metrics.max_depth, self.max_depth)
+
+    def _discard(self, count: int) -> None:
+        for _ in range(count):
+            self._frames.popleft()
+        metrics.depth -= count
+        metrics.dropped += count
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                if not self._frames:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                frame = self._frames.popleft()
+                metrics.depth -= 1
+                await self._send(frame)
+                metrics.sent += 1
+        except Exception:
+            logger.exception("Chat socket writer failed; closing the socket")
+            self._task = None  # close() must not cancel the task running on_error
+            self.close()
+            if self._on_error is not None:
+                await self._on_error()
@@ -0,0 +1,359 @@
+"""
+Online presence and typing indicators, coalesced per channel.
+
+Sockets register presence on connect and refresh it with heartbeats; an entry
+that is not refreshed within ``CHAT_PRESENCE_TTL`` seconds expires. Typing
+entries work the same way with ``CHAT_TYPING_TTL``, so a client that stops
+sending keystroke events drops out on its own.
+
+Nothing is broadcast per keystroke or per heartbeat. Refreshing an existing
+entry only moves its expiry; only a membership change (join, leave, first
+keystroke, stop, expiry) marks the channel dirty. A dirty channel is flushed at
+most once per ``CHAT_PRESENCE_INTERVAL``: the flush reads the current state,
+and sends one ``presence`` frame with the online users and the ids of active
+typers, unless it is identical to the last frame sent for that channel.
+
+``CHAT_PRESENCE_STORE`` picks where the state lives:
+
+- ``local``: in-process dicts. Only correct with a single worker, like
+  InMemoryChannelLayer.
+- ``redis``: sorted sets under ``REDIS_URL`` scored by expiry. The flush slot
+  and the last-sent digest are shared too, so the one-frame-per-interval
+  bound holds across workers.
+
+The store also remembers who has been in each channel: a user seen on a
+socket there, or posting there, stays "seen" for ``CHAT_SEEN_DAYS``. Chat
+push (apps.chat.notify) notifies those users, and keeps its pending
+windows in the same store, so that with ``redis`` all workers count into
+one window per channel.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import time
+
+import redis.asyncio as aioredis
+from channels.layers import get_channel_layer
+from django.conf import settings
+
+from . import encoding
+from .models import group_name
+
+logger = logging.getLogger(__name__)
+
+# Digest recorded for a channel with nobody in it.
+EMPTY_DIGEST = hashlib.blake2b(b"", digest_size=16).digest()
+
+
+class LocalPresenceStore:
+    def __init__(self):
+        # channel_id -> {connection: (user_id, username, expires_at)}
+        self._online: dict[int, dict[str, tuple[int, str, float]]] = {}
+        # channel_id -> {user_id: expires_at}
+        self._typing: dict[int, dict[int, float]] = {}
+        self._claims: dict[int, float] = {}
+        self._sent: dict[int, bytes] = {}
+        # channel_id -> {user_id: expires_at}
+        self._seen: dict[int, dict[int, float]] = {}
+        # channel_id -> [count, {sender_id: count}, (username, text) of the first]
+        self._pending: dict[int, list] = {}
+
+    async def touch_online(self, channel_id, conn, user_id, username, expires_at) -> bool:
+        """Add or refresh a connection; True if it was not already present."""
+        members = self._online.setdefault(channel_id, {})
+        new = conn not in members or members[conn][2] <= time.time()
+        members[conn] = (user_id, username, expires_at)
+        return new
+
+    async def remove_online(self, channel_id, conn, user_id, username) -> bool:
+        return self._online.get(channel_id, {}).pop(conn, None) is not None
+
+    async def touch_typing(self, channel_id, user_id, expires_at) -> bool:
+        typers = self._typing.setdefault(channel_id, {})
+        new = typers.get(user_id, 0) <= time.time()
+        typers[user_id] = expires_at
+        return new
+
+    async def remove_typing(self, channel_id, user_id) -> bool:
+        return self._typing.get(channel_id, {}).pop(user_id, None) is not None
+
+    async def snapshot(self, channel_id, now):
+        """(online {user_id: username}, typing [user_id], next expiry or None)."""
+        members = self._online.get(channel_id, {})
+        typers = self._typing.get(channel_id, {})
+        for conn in [c for c, (_, _, exp) in members.items() if exp <= now]:
+            del members[conn]
+        for user_id in [u for u, exp in typers.items() if exp <= now]:
+            del typers[user_id]
+
+        expiries = [exp for _, _, exp in members.values()] + list(typers.values())
+        if not expiries:
+            # Nothing left to expire; forget the channel entirely.
+            self._online.pop(channel_id, None)
+            self._typing.pop(channel_id, None)
+        online = {user_id: username for user_id, username, _ in members.values()}
+        return online, sorted(typers), min(expiries, default=None)
+
+    async def claim(self, channel_id, interval) -> float:
+        """Take the channel's flush slot; 0 if taken, else seconds until it frees."""
+        now = time.monotonic()
+        free_at = self._claims.get(channel_id, 0)
+        if now < free_at:
+            return free_at - now
+        self._claims[channel_id] = now + interval
+        return 0
+
+    async def swap_sent(self, channel_id, digest: bytes, ttl) -> bytes | None:
+        previous = self._sent.get(channel_id)
+        if digest == EMPTY_DIGEST:
+            self._sent.pop(channel_id, None)
+        else:
+            self._sent[channel_id] = digest
+        return previous
+
+    async def touch_seen(self, channel_id, user_id, expires_at) -> None:
+        self._seen.setdefault(channel_id, {})[user_id] = expires_at
+
+    async def seen(self, channel_id, now) -> set[int]:
+        users = self._seen.get(channel_id, {})
+        for user_id in [u for u, exp in users.items() if exp <= now]:
+            del users[user_id]
+        return set(users)
+
+    async def add_pending(self, channel_id, sender_id, username, text, ttl) -> int:
+        """Count a message into the channel's push window; returns the window's count."""
+        pending = self._pending.setdefault(channel_id, [0, {}, (username, text)])
+        pending[0] += 1
+        pending[1][sender_id] = pending[1].get(sender_id, 0) + 1
+        return pending[0]
+
+    async def take_pending(self, channel_id):
+        """Remove and return the window as (count, {sender_id: count}, first), or None."""
+        pending = self._pending.pop(channel_id, None)
+        return None if pending is None else tuple(pending)
+
+
+class RedisPresenceStore:
+    def __init__(self, url: str):
+        self._redis = aioredis.Redis.from_url(url)
+
+    @staticmethod
+    def _key(channel_id, part) -> str:
+        return f"chat:presence:{channel_id}:{part}"
+
+    async def touch_online(self, channel_id, conn, user_id, username, expires_at):
+        key = self._key(channel_id, "online")
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zscore(key, f"{user_id}:{conn}:{username}")
+            pipe.zadd(key, {f"{user_id}:{conn}:{username}": expires_at})
+            pipe.expireat(key, int(expires_at) + 1)
+            score, *_ = await pipe.execute()
+        return score is None or score <= time.time()
+
+    async def remove_online(self, channel_id, conn, user_id, username):
+        member = f"{user_id}:{conn}:{username}"
+        return bool(await self._redis.zrem(self._key(channel_id, "online"), member))
+
+    async def touch_typing(self, channel_id, user_id, expires_at):
+        key = self._key(channel_id, "typing")
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zscore(key, user_id)
+            pipe.zadd(key, {user_id: expires_at})
+            pipe.expireat(key, int(expires_at) + 1)
+            score, *_ = await pipe.execute()
+        return score is None or score <= time.time()
+
+    async def remove_typing(self, channel_id, user_id):
+        return bool(await self._redis.zrem(self._key(channel_id, "typing"), user_id))
+
+    async def snapshot(self, channel_id, now):
+        online_key = self._key(channel_id, "online")
+        typing_key = self._key(channel_id, "typing")
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(online_key, "-inf", now)
+            pipe.zremrangebyscore(typing_key, "-inf", now)
+            pipe.zrange(online_key, 0, -1, withscores=True)
+            pipe.zrange(typing_key, 0, -1, withscores=True)
+            _, _, members, typers = await pipe.execute()
+
+        online = {}
+        for member, _ in members:
+            user_id, _, username = member.decode().split(":", 2)
+            online[int(user_id)] = username
+        expiries = [score for _, score in members] + [score for _, score in typers]
+        return online, sorted(int(m) for m, _ in typers), min(expiries, default=None)
+
+    async def claim(self, channel_id, interval):
+        key = self._key(channel_id, "tick")
+        if await self._redis.set(key, 1, nx=True, px=max(int(interval * 1000), 1)):
+            return 0
+        return max(await self._redis.pttl(key), 1) / 1000
+
+    async def swap_sent(self, channel_id, digest, ttl):
+        return await self._redis.set(self._key(channel_id, "sent"), digest, get=True, ex=int(ttl))
+
+    async def touch_seen(self, channel_id, user_id, expires_at):
+        key = self._key(channel_id, "seen")
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {user_id: expires_at})
+            pipe.expireat(key, int(expires_at) + 1)
+            await pipe.execute()
+
+    async def seen(self, channel_id, now):
+        key = self._key(channel_id, "seen")
+        async with self._redis.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(key, "-inf", now)
+            pipe.zrange(key, 0, -1)
+            _, users = await pipe.execute()
+        return {int(user_id) for user_id in users}
+
+    async def add_pending(self, channel_id, sender_id, username, text, ttl):
+        key = self._key(channel_id, "push")
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, "count", 1)
+            pipe.hincrby(key, f"s:{sender_id}", 1)
+            pipe.hsetnx(key, "first", json.dumps([username, text]))
+            # Set once per window (Redis 7): if the worker that owns the window
+            # dies, it expires and the next message opens a new one.
+            pipe.expire(key, max(int(ttl), 1), nx=True)
+            count, *_ = await pipe.execute()
+        return count
+
+    async def take_pending(self, channel_id):
+        key = self._key(channel_id, "push")
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hgetall(key)
+            pipe.delete(key)
+            fields, _ = await pipe.execute()
+        if not fields:
+            return None
+        fields = {name.decode(): value for name, value in fields.items()}
+        by_sender = {
+            int(name[2:]): int(value) for name, value in fields.items() if name.startswith("s:")
+        }
+        return int(fields["count"]), by_sender, tuple(json.loads(fields["first"]))
+
+
+class Presence:
+    """Per-process coalescer in front of a presence store."""
+
+    def __init__(
+        self, store, interval: float, ttl: float, typing_ttl: float, seen_ttl: float = 30 * 86400
+    ):
+        self.store = store
+        self.interval = interval
+        self.ttl = ttl
+        self.typing_ttl = typing_ttl
+        self.seen_ttl = seen_ttl
+        self.broadcasts = 0
+        # channel_id -> (due monotonic time, flush task)
+        self._timers: dict[int, tuple[float, asyncio.Task]] = {}
+
+    async def join(self, channel_id: int, user, conn: str) -> None:
+        """Register or refresh one socket's presence in a channel."""
+        expires_at = time.time() + self.ttl
+        if await self.store.touch_online(channel_id, conn, user.id, user.username, expires_at):
+            await self.saw(channel_id, user.id)
+            self._schedule(channel_id, 0)
+
+    async def leave(self, channel_id: int, user, conn: str) -> None:
+        changed = await self.store.remove_online(channel_id, conn, user.id, user.username)
+        changed = await self.store.remove_typing(channel_id, user.id) or changed
+        if changed:
+            self._schedule(channel_id, 0)
+
+    async def typing(self, channel_id: int, user, active: bool = True) -> None:
+        if active:
+            changed = await self.store.touch_typing(
+                channel_id, user.id, time.time() + self.typing_ttl
+            )
+        else:
+            changed = await self.store.remove_typing(channel_id, user.id)
+        if changed:
+            self._schedule(channel_id, 0)
+
+    async def saw(self, channel_id: int, user_id: int) -> None:
+        """Record that the user opened or posted in the channel."""
+        await self.store.touch_seen(channel_id, user_id, time.time() + self.seen_ttl)
+
+    async def seen_users(self, channel_id: int) -> set[int]:
+        """Ids of users who opened or posted in the channel within ``seen_ttl``."""
+        return await self.store.seen(channel_id, time.time())
+
+    async def online_users(self, channel_id: int) -> set[int]:
+        """Ids of users with a live socket in the channel, on any worker."""
+        online, _, _ = await self.store.snapshot(channel_id, time.time())
+        return set(online)
+
+    def _schedule(self, channel_id: int, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        due = time.monotonic() + delay
+        pending = self._timers.get(channel_id)
+        if pending is not None:
+            pending_due, task = pending
+            if not task.done() and task.get_loop() is loop:
+                if pending_due <= due:
+                    return
+                task.cancel()
+        # Not the caller's context: its DB routing state must not follow the flush.
+        task = loop.create_task(self._flush_later(channel_id, delay), context=contextvars.Context())
+        self._timers[channel_id] = (due, task)
+
+    async def _flush_later(self, channel_id: int, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._timers.pop(channel_id, None)
+        try:
+            await self.flush(channel_id)
+        except Exception:
+            # Like the write-behind loop: log and carry on; the next change reschedules.
+            logger.exception("Presence flush for channel %s failed", channel_id)
+
+    async def flush(self, channel_id: int) -> None:
+        wait = await self.store.claim(channel_id, self.interval)
+        if wait:
+            self._schedule(channel_id, wait)
+            return
+
+        now = time.time()
+        online, typing, next_expiry = await self.store.snapshot(channel_id, now)
+        frame = encoding.dumps(
+            {
+                "type": "presence",
+                "channel": channel_id,
+                "online": [{"id": uid, "username": name} for uid, name in sorted(online.items())],
+                "typing": typing,
+            }
+        )
+        digest = (
+            hashlib.blake2b(frame.encode(), digest_size=16).digest()
+            if online or typing
+            else EMPTY_DIGEST
+        )
+        previous = await self.store.swap_sent(channel_id, digest, self.ttl * 2)
+        if (previous or EMPTY_DIGEST) != digest:
+            self.broadcasts += 1
+            await get_channel_layer().group_send(
+                group_name(channel_id), {"type": "chat_presence", "frame": frame}
+            )
+        if next_expiry is not None:
+            self._schedule(channel_id, max(next_expiry - now, self.interval))
+
+
+def _build() -> Presence:
+    if settings.CHAT_PRESENCE_STORE == "redis":
+        store = RedisPresenceStore(settings.REDIS_URL)
+    else:
+        store = LocalPresenceStore()
+    return Presence(
+        store,
+        settings.CHAT_PRESENCE_INTERVAL,
+        settings.CHAT_PRESENCE_TTL,
+        settings.CHAT_TYPING_TTL,
+        settings.CHAT_SEEN_DAYS * 86400,
+    )
+
+
+presence = _build()
@@ -0,0 +1,244 @@
+"""
+Per-channel ring buffer of the newest serialized messages.
+
+Opening a channel fetches the newest history page, which is almost always the
+same few dozen rows. ChatMessageListCreateView serves cursorless requests from
+this buffer; cursor requests still go to SQL.
+
+Rows are stored newest first, already in ChatMessageSerializer's shape, and
+are appended only after they are committed. A channel's buffer exists only
+once it has been seeded from the database and appends to unseeded channels are
+dropped, so a present buffer is always the true head of the channel. Each
+append bumps a per-channel version; a seed is discarded if the version moved
+while its rows were being read.
+
+A buffer shorter than ``CHAT_RECENT_SIZE`` holds every hot row of its channel,
+so a short first page continues into the archive. Whether the channel has
+any archive segments is checked once, when the buffer is seeded, and kept
+with it; reads of a channel that has none skip the archive query. Archiving
+invalidates the buffer, so the marker cannot miss a new segment.
+``CHAT_RECENT_CACHE`` picks the backend:
+
+- ``local``: in-process, bounded by ``CHAT_RECENT_MAX_CHANNELS`` and
+  ``CHAT_RECENT_MAX_BYTES``; least recently read channels are evicted first.
+  Only correct with a single worker, like InMemoryChannelLayer.
+- ``redis``: one list per channel under ``REDIS_URL``, trimmed to
+  ``CHAT_RECENT_SIZE``; cold channels expire after ``CHAT_RECENT_TTL``.
+- ``off``: every read goes to SQL.
+"""
+
+import json
+import threading
+from collections import OrderedDict, deque
+
+import redis
+from django.conf import settings
+
+from . import encoding
+from .serializers import ChatMessageSerializer
+
+
+class RecentMessages:
+    """Backend interface; also the ``off`` backend."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, channel_id: int) -> list[dict] | None:
+        self.misses += 1
+        return None
+
+    def version(self, channel_id: int):
+        """Token to pass to seed(); read it before querying the rows."""
+        return None
+
+    def seed(self, channel_id: int, rows: list[dict], version, archived: bool = True) -> None:
+        """Store the channel's newest ``rows``; ``archived``: it has archive segments."""
+
+    def archived(self, channel_id: int) -> bool:
+        """False only if the buffer was seeded for a channel without archive segments."""
+        return True
+
+    def append(self, channel_id: int, row: dict) -> None:
+        pass
+
+    def invalidate(self, channel_id: int) -> None:
+        pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class LocalRecentMessages(RecentMessages):
+    def __init__(self, size: int, max_channels: int, max_bytes: int):
+        super().__init__(size)
+        self.max_channels = max_channels
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        # channel_id -> deque of (row, approx_bytes), newest first
+        self._channels: OrderedDict[int, deque] = OrderedDict()
+        self._versions: dict[int, int] = {}
+        self._unarchived: set[int] = set()
+        self._lock = threading.Lock()
+
+    def get(self, channel_id):
+        with self._lock:
+            buf = self._channels.get(channel_id)
+            if buf is None:
+                self.misses += 1
+                return None
+            self._channels.move_to_end(channel_id)
+            self.hits += 1
+            return [row for row, _ in buf]
+
+    def version(self, channel_id):
+        return self._versions.get(channel_id, 0)
+
+    def seed(self, channel_id, rows, version, archived=True):
+        buf = deque((row, len(encoding.dumps(row))) for row in rows[: self.size])
+        with self._lock:
+            if self._versions.get(channel_id, 0) != version:
+                return
+            self._drop(channel_id)
+            self._channels[channel_id] = buf
+            if not archived:
+                self._unarchived.add(channel_id)
+            self.bytes += sum(n for _, n in buf)
+            self._evict()
+
+    def archived(self, channel_id):
+        return channel_id not in self._unarchived
+
+    def append(self, channel_id, row):
+        with self._lock:
+            self._versions[channel_id] = self._versions.get(channel_id, 0) + 1
+            buf = self._channels.get(channel_id)
+            if buf is None:
+                return
+            n = len(encoding.dumps(row))
+            buf.appendleft((row, n))
+            self.bytes += n
+            while len(buf) > self.size:
+                self.bytes -= buf.pop()[1]
+            self._evict()
+
+    def invalidate(self, channel_id):
+        with self._lock:
+            self._versions[channel_id] = self._versions.get(channel_id, 0) + 1
+            self._drop(channel_id)
+
+    def stats(self):
+        return {**super().stats(), "channels": len(self._channels), "bytes": self.bytes}
+
+    def _drop(self, channel_id):
+        self._unarchived.discard(channel_id)
+        buf = self._channels.pop(channel_id, None)
+        if buf is not None:
+            self.bytes -= sum(n for _, n in buf)
+
+    def _evict(self):
+        while self._channels and (
+            len(self._channels) > self.max_channels or self.bytes > self.max_bytes
+        ):
+            channel_id, buf = self._channels.popitem(last=False)
+            self._unarchived.discard(channel_id)
+            self.bytes -= sum(n for _, n in buf)
+            self.evictions += 1
+
+
+class RedisRecentMessages(RecentMessages):
+    def __init__(self, size: int, url: str, ttl: int):
+        super().__init__(size)
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(url)
+
+    @staticmethod
+    def _key(channel_id) -> str:
+        return f"chat:recent:{channel_id}"
+
+    def get(self, channel_id):
+        raw = self._redis.lrange(self._key(channel_id), 0, -1)
+        if not raw:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [json.loads(item) for item in raw]
+
+    def version(self, channel_id):
+        return self._redis.get(self._key(channel_id) + ":v")
+
+    def seed(self, channel_id, rows, version, archived=True):
+        if not rows:
+            return  # Redis can't hold an empty list; empty channels are cheap.
+        key = self._key(channel_id)
+        with self._redis.pipeline() as pipe:
+            try:
+                pipe.watch(key + ":v")
+                if pipe.get(key + ":v") != version:
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                pipe.rpush(key, *(encoding.dumps(row) for row in rows[: self.size]))
+                pipe.expire(key, self.ttl)
+                pipe.set(key + ":a", int(archived), ex=self.ttl)
+                pipe.execute()
+            except redis.WatchError:
+                pass  # an append landed mid-seed; the next read re-seeds
+
+    def archived(self, channel_id):
+        return self._redis.get(self._key(channel_id) + ":a") != b"0"
+
+    def append(self, channel_id, row):
+        key = self._key(channel_id)
+        pipe = self._redis.pipeline()
+        pipe.incr(key + ":v")
+        pipe.expire(key + ":v", self.ttl)
+        pipe.lpushx(key, encoding.dumps(row))
+        pipe.ltrim(key, 0, self.size - 1)
+        pipe.expire(key, self.ttl)
+        pipe.expire(key + ":a", self.ttl)
+        pipe.execute()
+
+    def invalidate(self, channel_id):
+        key = self._key(channel_id)
+        pipe = self._redis.pipeline()
+        pipe.incr(key + ":v")
+        pipe.delete(key, key + ":a")
+        pipe.execute()
+
+
+def serialize(msg) -> dict:
+    """Cache row for ``msg``; attachment URLs stay relative until served."""
+    return dict(ChatMessageSerializer(msg).data)
+
+
+def serialize_many(messages) -> list[dict]:
+    """``serialize`` for many messages; the serializer's fields are built once."""
+    return [dict(row) for row in ChatMessageSerializer(messages, many=True).data]
+
+
+def _build() -> RecentMessages:
+    backend = settings.CHAT_RECENT_CACHE
+    if backend == "local":
+        return LocalRecentMessages(
+            settings.CHAT_RECENT_SIZE,
+            settings.CHAT_RECENT_MAX_CHANNELS,
+            settings.CHAT_RECENT_MAX_BYTES,
+        )
+    if backend == "redis":
+        return RedisRecentMessages(
+            settings.CHAT_RECENT_SIZE, settings.REDIS_URL, settings.CHAT_RECENT_TTL
+        )
+    return RecentMessages(settings.CHAT_RECENT_SIZE)
+
+
+recent_messages = _build()
@@ -7,4 +7,8 @@ websocket_urlpatterns = [
         r"ws/chat/(?P<channel_id>\d+)/$",
         consumers.ChatConsumer.as_asgi(),
     ),
+    re_path(
+        r"ws/chat/$",
+        consumers.MultiplexChatConsumer.as_asgi(),
+    ),
 ]
@@ -0,0 +1,159 @@
+"""
+Full-text search over chat messages.
+
+``CHAT_SEARCH_BACKEND`` picks the implementation: ``auto`` (FTS5 on SQLite,
+otherwise ``basic``), ``fts5``, ``basic``, or the dotted path of any class
+with the same ``search``/``filter`` methods.
+
+The FTS5 index is an external-content table over ``chat_chatmessage``, so
+the text is stored once. Triggers added by migration 0004 keep it in step
+with every INSERT, UPDATE and DELETE, including write-behind bulk inserts,
+with no application code on the write path. The channel id is indexed as a
+column of its own, so a channel-scoped query intersects two posting lists
+instead of filtering every match in every channel.
+
+Results are ranked by BM25 (best first, newest first among equals) and
+paginated by keyset on (rank, id). Ranking every match of a word found in
+half the channel costs hundreds of milliseconds at 10M messages, and almost
+all of it is bm25 scoring. So only the newest ``CHAT_SEARCH_RANK_WINDOW``
+matches are ranked; they can be found cheaply in rowid order. A broad query
+returns the best of its recent matches, and a narrow one, with fewer matches
+than the window, is ranked in full. Ranks move slightly as the index grows,
+so a later page may repeat or skip a hit near its boundary.
+"""
+
+import re
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import ChatMessage
+
+FTS_TABLE = "chat_message_fts"
+
+# Roughly what the unicode61 tokenizer treats as one token, plus an
+# optional trailing "*" asking for a prefix match.
+TERM_RE = re.compile(r"(\w+)(\*?)", re.UNICODE)
+
+
+class SearchHit(NamedTuple):
+    id: int
+    rank: float  # lower is better
+
+
+def terms(query: str) -> list[tuple[str, bool]]:
+    """(word, is_prefix) for each term of a user query."""
+    return [(word, bool(star)) for word, star in TERM_RE.findall(query)]
+
+
+class FTS5SearchBackend:
+    """SQLite FTS5, ranked by bm25 over the text column."""
+
+    def match_expression(self, query: str, channel_id: int | None = None) -> str | None:
+        """
+        Every term must match, as a whole word unless written ``war*``.
+        Terms are quoted, so FTS5 operators in the input are searched for
+        as text rather than parsed.
+        """
+        words = terms(query)
+        if not words:
+            return None
+        expression = " ".join(f'"{word}"*' if prefix else f'"{word}"' for word, prefix in words)
+        if channel_id is not None:
+            expression = f'channel_id:"{int(channel_id)}" AND ({expression})'
+        return expression
+
+    def search(
+        self, channel_id: int, query: str, limit: int, after: SearchHit | None = None
+    ) -> list[SearchHit]:
+        expression = self.match_expression(query, channel_id)
+        if expression is None:
+            return []
+        sql = (
+            f"SELECT id, score FROM ("
+            f"  SELECT rowid AS id, bm25({FTS_TABLE}, 1.0, 0.0) AS score"
+            f"  FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        )
+        params = [expression]
+        if settings.CHAT_SEARCH_RANK_WINDOW:
+            sql += " ORDER BY rowid DESC LIMIT %s"
+            params.append(settings.CHAT_SEARCH_RANK_WINDOW)
+        sql += ")"
+        if after is not None:
+            sql += " WHERE score > %s OR (score = %s AND id < %s)"
+            params += [after.rank, after.rank, after.id]
+        sql += " ORDER BY score, id DESC LIMIT %s"
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [SearchHit(pk, rank) for pk, rank in cursor.fetchall()]
+
+    def rebuild(self) -> None:
+        """Re-index every message, e.g. after loading rows with the triggers off."""
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+    def optimize(self) -> None:
+        """
+        Merge the index into one b-tree. Deleted rows only leave tombstones
+        until a merge, so run this after removing many rows (archive_chat).
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+    def filter(self, queryset, query: str):
+        """Narrow a ChatMessage queryset to matches in any channel (admin search)."""
+        expression = self.match_expression(query)
+        if expression is None:
+            return queryset.none()
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression]
+            )
+        )
+
+
+class BasicSearchBackend:
+    """
+    Case-insensitive substring match, newest first, for databases without
+    an index backend. Every hit ranks 0, so pages are keyed on id alone.
+    """
+
+    def search(
+        self, channel_id: int, query: str, limit: int, after: SearchHit | None = None
+    ) -> list[SearchHit]:
+        queryset = self.filter(ChatMessage.objects.filter(channel_id=channel_id), query)
+        if after is not None:
+            queryset = queryset.filter(id__lt=after.id)
+        ids = queryset.order_by("-id").values_list("id", flat=True)[:limit]
+        return [SearchHit(pk, 0.0) for pk in ids]
+
+    def rebuild(self) -> None:
+        pass
+
+    def optimize(self) -> None:
+        pass
+
+    def filter(self, queryset, query: str):
+        words = terms(query)
+        if not words:
+            return queryset.none()
+        for word, _ in words:
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+
+
+BACKENDS = {"fts5": FTS5SearchBackend, "basic": BasicSearchBackend}
+
+
+def _build():
+    name = settings.CHAT_SEARCH_BACKEND
+    if name == "auto":
+        name = "fts5" if connection.vendor == "sqlite" else "basic"
+    return (BACKENDS.get(name) or import_string(name))()
+
+
+search_backend = _build()
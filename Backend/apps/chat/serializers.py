@@ -1,6 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
 
-from .models import ChatChannel, ChatMessage
+from .models import ChatAttachment, ChatChannel, ChatMessage, ChatUpload
 
 
 class ChatChannelSerializer(serializers.ModelSerializer):
@@ -20,10 +21,57 @@ class ChatChannelSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_by", "created_at"]
 
 
+class ChatAttachmentSerializer(serializers.ModelSerializer):
+    """A stored attachment; thumbnail and preview stay null until built."""
+
+    class Meta:
+        model = ChatAttachment
+        fields = [
+            "sha256",
+            "size",
+            "content_type",
+            "width",
+            "height",
+            "thumbnail",
+            "preview",
+            "variants",
+        ]
+        read_only_fields = fields
+
+
+class ChatUploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ChatUpload
+        fields = ["id", "filename", "size", "received", "chunk_size", "created_at"]
+        read_only_fields = ["received", "created_at"]
+
+    def get_chunk_size(self, obj) -> int:
+        return settings.CHAT_UPLOAD_CHUNK_SIZE
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.CHAT_ATTACHMENT_MAX_SIZE:
+            raise serializers.ValidationError(
+                f"Size must be between 1 and {settings.CHAT_ATTACHMENT_MAX_SIZE} bytes."
+            )
+        return value
+
+
 class ChatMessageSerializer(serializers.ModelSerializer):
     sender_username = serializers.CharField(
         source="sender.username", read_only=True
     )
+    attachment_info = ChatAttachmentSerializer(source="blob", read_only=True)
+    # Attach a finished upload (or any stored content) by its hash.
+    attachment_sha256 = serializers.SlugRelatedField(
+        source="blob",
+        slug_field="sha256",
+        queryset=ChatAttachment.objects.all(),
+        write_only=True,
+        required=False,
+        allow_null=True,
+    )
 
     class Meta:
         model = ChatMessage
@@ -34,6 +82,8 @@ class ChatMessageSerializer(serializers.ModelSerializer):
             "sender_username",
             "text",
             "attachment",
+            "attachment_info",
+            "attachment_sha256",
             "created_at",
         ]
         read_only_fields = ["sender", "channel", "created_at"]
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .archive import remove_file
+from .auth_cache import user_cache
+from .models import ChatArchiveSegment, ChatAttachment, ChatMessage
+from .recent import recent_messages
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=ChatMessage)
+def invalidate_recent_on_edit(sender, instance, created, **kwargs):
+    # New rows are appended by the ingest paths; edits re-seed the buffer.
+    if not created:
+        recent_messages.invalidate(instance.channel_id)
+
+
+@receiver(post_delete, sender=ChatMessage)
+def invalidate_recent_on_delete(sender, instance, **kwargs):
+    recent_messages.invalidate(instance.channel_id)
+
+
+@receiver(post_delete, sender=ChatArchiveSegment)
+def remove_archive_file(sender, instance, **kwargs):
+    remove_file(instance)
+
+
+@receiver(post_delete, sender=ChatAttachment)
+def remove_attachment_files(sender, instance, **kwargs):
+    for field in (instance.file, instance.thumbnail, instance.preview):
+        if field:
+            field.delete(save=False)
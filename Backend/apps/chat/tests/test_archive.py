@@ -0,0 +1,124 @@
+import io
+import tempfile
+from datetime import UTC, date, datetime, timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.chat import archive
+from apps.chat.attachments import store
+from apps.chat.models import ChatAttachment, ChatChannel, ChatMessage
+from apps.chat.recent import serialize_many
+from apps.chat.views import MessageCursorPagination
+
+
+class ArchiveKeepsAttachmentsTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(CHAT_ARCHIVE_DIR=f"{tmp.name}/archive", MEDIA_ROOT=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        user = User.objects.create_user(username="archiver")
+        self.channel = ChatChannel.objects.create(name="war", created_by=user)
+        self.blob = store(ContentFile(b"base layout"), "layout.txt")
+        long_ago = timezone.now() - timedelta(days=400)
+        ChatAttachment.objects.filter(pk=self.blob.pk).update(created_at=long_ago)
+        message = ChatMessage.objects.create(
+            channel=self.channel, sender=user, text="our base", blob=self.blob,
+            attachment=self.blob.file.name,
+        )
+        ChatMessage.objects.filter(pk=message.pk).update(created_at=long_ago)
+        self.month = date(long_ago.year, long_ago.month, 1)
+
+    def sweep(self):
+        call_command("sweep_attachments", stdout=io.StringIO())
+
+    def test_sweep_keeps_archived_attachments(self):
+        segment = archive.archive_month(self.channel.id, self.month)
+        self.assertFalse(ChatMessage.objects.exists())
+        self.assertEqual(list(segment.attachments.all()), [self.blob])
+
+        self.sweep()
+        self.assertTrue(ChatAttachment.objects.filter(pk=self.blob.pk).exists())
+        self.assertTrue(default_storage.exists(self.blob.file.name))
+
+    def test_sweep_removes_attachments_of_deleted_segments(self):
+        archive.archive_month(self.channel.id, self.month).delete()
+
+        self.sweep()
+        self.assertFalse(ChatAttachment.objects.filter(pk=self.blob.pk).exists())
+        self.assertFalse(default_storage.exists(self.blob.file.name))
+
+
+class ArchivePagingTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(CHAT_ARCHIVE_DIR=tmp.name, CHAT_ARCHIVE_BLOCK_SIZE=4)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Blocks are cached by segment id, which each test's rollback reuses.
+        archive._block.cache_clear()
+        self.addCleanup(archive._block.cache_clear)
+
+        user = User.objects.create_user(username="archiver")
+        self.channel = ChatChannel.objects.create(name="war", created_by=user)
+        # Three months of 10, 7 and 13 messages, three to a timestamp, so
+        # ties straddle block boundaries and every month ends mid-block.
+        self.months = [date(2023, 1, 1), date(2023, 2, 1), date(2023, 3, 1)]
+        for month, count in zip(self.months, (10, 7, 13), strict=True):
+            start = datetime(month.year, month.month, 5, tzinfo=UTC)
+            ChatMessage.objects.bulk_create(
+                ChatMessage(
+                    channel=self.channel, sender=user, text=f"{month:%b} {i}",
+                    created_at=start + timedelta(seconds=i // 3),
+                )
+                for i in range(count)
+            )
+        messages = ChatMessage.objects.select_related("sender", "blob")
+        self.oldest_first = serialize_many(messages.order_by("created_at", "id"))
+        for month in self.months:
+            archive.archive_month(self.channel.id, month)
+
+    def walk(self, reverse, limit):
+        rows, position = [], None
+        while page := archive.page(self.channel.id, position, reverse, limit):
+            self.assertLessEqual(len(page), limit)
+            rows += page
+            position = archive.row_key(page[-1])
+        return rows
+
+    def test_pages_return_the_archived_rows_in_order(self):
+        self.assertFalse(ChatMessage.objects.exists())
+        for limit in (1, 3, 4, 5, 30):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.walk(False, limit), self.oldest_first[::-1])
+                self.assertEqual(self.walk(True, limit), self.oldest_first)
+
+    def test_history_view_pages_into_the_archive(self):
+        user = User.objects.get()
+        hot = ChatMessage.objects.create(channel=self.channel, sender=user, text="still hot")
+        client = APIClient(HTTP_HOST="localhost")
+        client.force_authenticate(user)
+        newest_first = [hot.id] + [row["id"] for row in self.oldest_first[::-1]]
+
+        with mock.patch.object(MessageCursorPagination, "page_size", 7):
+            page = client.get(f"/api/chat/channels/{self.channel.id}/messages/").json()
+            forward = [row["id"] for row in page["results"]]
+            while page["next"]:
+                page = client.get(page["next"]).json()
+                forward += [row["id"] for row in page["results"]]
+            backward = [row["id"] for row in page["results"]]
+            while page["previous"]:
+                page = client.get(page["previous"]).json()
+                backward = [row["id"] for row in page["results"]] + backward
+        self.assertEqual(forward, newest_first)
+        self.assertEqual(backward, newest_first)
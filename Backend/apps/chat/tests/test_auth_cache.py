@@ -0,0 +1,95 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.chat.auth_cache import LocalUserVersions, UserCache, user_cache
+from apps.chat.middleware import get_user_from_token
+
+
+class BrokenVersions:
+    async def current(self, user_id):
+        raise ConnectionError("redis down")
+
+    def bump(self, user_id):
+        raise ConnectionError("redis down")
+
+
+class UserCacheTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice")
+        self.cache = UserCache(maxsize=10, ttl=60)
+
+    def test_miss_then_hit(self):
+        with self.assertNumQueries(1):
+            first = async_to_sync(self.cache.get)(self.user.pk)
+            second = async_to_sync(self.cache.get)(self.user.pk)
+        self.assertEqual(first, self.user)
+        self.assertIs(second, first)
+        self.assertEqual(self.cache.stats(), {"size": 1, "hits": 1, "misses": 1, "coalesced": 0})
+
+    def test_unknown_user_is_not_cached(self):
+        for _ in range(2):
+            self.assertIsNone(async_to_sync(self.cache.get)(self.user.pk + 1))
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_concurrent_lookups_share_one_load(self):
+        async def storm():
+            return await asyncio.gather(*(self.cache.get(self.user.pk) for _ in range(5)))
+
+        with self.assertNumQueries(1):
+            users = async_to_sync(storm)()
+        self.assertEqual(users, [self.user] * 5)
+        self.assertEqual((self.cache.misses, self.cache.coalesced), (1, 4))
+
+    def test_invalidation_reaches_other_workers(self):
+        # Two workers' caches over one version store (Redis in production).
+        versions = LocalUserVersions()
+        here, there = UserCache(10, 60, versions), UserCache(10, 60, versions)
+        async_to_sync(here.get)(self.user.pk)
+        async_to_sync(there.get)(self.user.pk)
+
+        here.invalidate(self.user.pk)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertFalse(async_to_sync(there.get)(self.user.pk).is_active)
+        self.assertEqual(there.misses, 2)
+
+    def test_save_invalidates_the_shared_cache(self):
+        user_cache.clear()
+        async_to_sync(user_cache.get)(self.user.pk)
+        self.user.first_name = "Alice"
+        self.user.save()
+        self.assertEqual(async_to_sync(user_cache.get)(self.user.pk).first_name, "Alice")
+
+    def test_unreadable_versions_fall_back_to_the_database(self):
+        cache = UserCache(10, 60, BrokenVersions())
+        with self.assertLogs("apps.chat.auth_cache", "WARNING"):
+            for _ in range(2):
+                self.assertEqual(async_to_sync(cache.get)(self.user.pk), self.user)
+        self.assertEqual((cache.hits, cache.stats()["size"]), (0, 0))
+
+
+class HandshakeTests(TransactionTestCase):
+    def test_inactive_users_are_anonymous(self):
+        user = User.objects.create_user(username="bob")
+        token = str(AccessToken.for_user(user))
+        self.assertEqual(async_to_sync(get_user_from_token)(token), user)
+
+        user.is_active = False
+        user.save()
+        self.assertTrue(async_to_sync(get_user_from_token)(token).is_anonymous)
+
+
+class ChatStatsViewTests(TestCase):
+    def test_admin_only(self):
+        client = APIClient(HTTP_HOST="localhost")
+        client.force_authenticate(User.objects.create_user(username="member"))
+        self.assertEqual(client.get("/api/chat/stats/").status_code, 403)
+
+        client.force_authenticate(User.objects.create_superuser(username="ops"))
+        response = client.get("/api/chat/stats/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {"user_cache", "recent_messages", "outbound"})
@@ -0,0 +1,94 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.chat import encoding
+from apps.chat.consumers import BaseChatConsumer
+from apps.chat.models import ChatChannel, ChatMessage, group_name
+from apps.chat.routing import websocket_urlpatterns
+
+application = URLRouter(websocket_urlpatterns)
+
+
+@override_settings(CHAT_WRITE_BEHIND=False, CHAT_OUTBOUND_POLICY="off")
+class ChatConsumerIngestTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="poster")
+        self.channel = ChatChannel.objects.create(name="war", created_by=self.user)
+
+    async def connect(self, channel_id):
+        communicator = WebsocketCommunicator(application, f"/ws/chat/{channel_id}/")
+        communicator.scope["user"] = self.user
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    async def receive_message(self, communicator):
+        while True:
+            frame = await communicator.receive_json_from()
+            if "type" not in frame:  # presence frames arrive too
+                return frame
+
+    async def test_unknown_channel_is_rejected_at_connect(self):
+        communicator, connected, code = await self.connect(self.channel.id + 1)
+        self.assertFalse(connected)
+        self.assertEqual(code, 4004)
+
+    def test_channel_is_resolved_once_and_each_message_is_one_insert(self):
+        async def chat(texts):
+            communicator, connected, _ = await self.connect(self.channel.id)
+            self.assertTrue(connected)
+            for text in texts:
+                await communicator.send_json_to({"type": "chat.message", "text": text})
+                self.assertEqual((await self.receive_message(communicator))["text"], text)
+            await communicator.disconnect()
+
+        # The consumer's queries run on this thread (thread-sensitive sync_to_async).
+        with CaptureQueriesContext(connection) as queries:
+            async_to_sync(chat)(["first", "second", "third"])
+        statements = [q["sql"].split()[0] for q in queries]
+        self.assertEqual(statements, ["SELECT", "INSERT", "INSERT", "INSERT"], queries.captured_queries)
+        self.assertIn('"chat_chatchannel"', queries[0]["sql"])
+        self.assertEqual(ChatMessage.objects.filter(channel=self.channel).count(), 3)
+
+
+@override_settings(CHAT_WRITE_BEHIND=False, CHAT_OUTBOUND_POLICY="off")
+class ChatConsumerReplayTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="resumer")
+        self.channel = ChatChannel.objects.create(name="war", created_by=self.user)
+
+    async def test_live_message_during_replay_is_sent_after_it(self):
+        live = {"id": 99, "text": "live"}
+
+        async def get_missed(consumer, channel, last_seen_id):
+            # Broadcast while the replay is being built.
+            await get_channel_layer().group_send(
+                group_name(channel.id),
+                {"type": "chat_message", "channel": channel.id, "frame": encoding.dumps(live)},
+            )
+            await asyncio.sleep(0.05)
+            return [{"id": 98, "text": "missed"}]
+
+        communicator = WebsocketCommunicator(application, f"/ws/chat/{self.channel.id}/")
+        communicator.scope["user"] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        with mock.patch.object(BaseChatConsumer, "get_missed", get_missed):
+            await communicator.send_json_to({"type": "resume", "last_seen_id": 97})
+            frames = []
+            while len(frames) < 2:
+                frame = await communicator.receive_json_from()
+                if frame.get("type") != "presence":
+                    frames.append(frame)
+        await communicator.disconnect()
+
+        self.assertEqual(frames[0], {"type": "replay", "messages": [{"id": 98, "text": "missed"}]})
+        self.assertEqual(frames[1], live)
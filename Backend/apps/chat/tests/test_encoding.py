@@ -0,0 +1,53 @@
+import json
+from unittest import mock, skipIf
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+
+from apps.chat import encoding
+from apps.chat.consumers import message_payload
+from apps.chat.models import ChatChannel, ChatMessage
+
+FRAMES = [
+    {"id": 1, "text": "Hello!", "sender": {"id": 1, "username": "alice"},
+     "created_at": "2024-05-01T12:00:00.123456+00:00"},
+    {"text": "Ünïcödé, 中文, emoji 🏰⚔️, RTL مرحبا"},
+    {"text": 'quotes " and \\ backslashes / slashes'},
+    {"text": "controls \n\r\t\b\f \x00\x07\x1f and separators \u2028\u2029 \x7f"},
+    {"type": "presence", "channel": 7, "online": [{"id": 1, "username": "alice"}], "typing": []},
+    {"type": "replay", "messages": [], "nested": {"a": [None, True, False, 0, -1, 2**53]}},
+    {"ratio": 0.5, "big": 10**18, "empty": "", "list": [[], {}]},
+]
+
+
+@skipIf(encoding.orjson is None, "orjson is not installed")
+class EncoderParityTests(SimpleTestCase):
+    def test_orjson_and_stdlib_write_the_same_frames(self):
+        for frame in FRAMES:
+            with self.subTest(frame=frame):
+                self.assertEqual(encoding.orjson_dumps(frame), encoding.stdlib_dumps(frame))
+                self.assertEqual(json.loads(encoding.orjson_dumps(frame)), frame)
+
+
+@skipIf(encoding.orjson is None, "orjson is not installed")
+class MessagePayloadParityTests(TestCase):
+    def test_stored_message_encodes_identically(self):
+        user = User.objects.create_user(username="Zoë")
+        channel = ChatChannel.objects.create(name="war", created_by=user)
+        message = ChatMessage.objects.create(channel=channel, sender=user, text="attack at 18:00 🏹")
+        payload = message_payload(message)
+        self.assertEqual(encoding.orjson_dumps(payload), encoding.stdlib_dumps(payload))
+
+
+class EncoderSelectionTests(SimpleTestCase):
+    def test_names(self):
+        self.assertIs(encoding._select("json"), encoding.stdlib_dumps)
+        self.assertIs(encoding._select("apps.chat.encoding.stdlib_dumps"), encoding.stdlib_dumps)
+        expected = encoding.stdlib_dumps if encoding.orjson is None else encoding.orjson_dumps
+        self.assertIs(encoding._select("auto"), expected)
+
+    def test_without_orjson(self):
+        with mock.patch.object(encoding, "orjson", None):
+            self.assertIs(encoding._select("auto"), encoding.stdlib_dumps)
+            with self.assertRaises(ImportError):
+                encoding._select("orjson")
@@ -0,0 +1,59 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.chat.models import ChatChannel, ChatMessage
+from apps.chat.recent import recent_messages
+
+
+class TieSafePagingTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="reader")
+        self.channel = ChatChannel.objects.create(name="general", created_by=user)
+        recent_messages.invalidate(self.channel.id)
+        self.addCleanup(recent_messages.invalidate, self.channel.id)
+        self.client = APIClient(HTTP_HOST="localhost")
+        self.client.force_authenticate(user)
+
+        # 130 messages, 7 to a timestamp: page boundaries fall inside ties.
+        start = timezone.now() - timedelta(days=1)
+        ChatMessage.objects.bulk_create(
+            ChatMessage(
+                channel=self.channel, sender=user, text=str(i),
+                created_at=start + timedelta(milliseconds=i // 7),
+            )
+            for i in range(130)
+        )
+        # Ids run against time within a few ties, as write-behind ids can.
+        ChatMessage.objects.filter(text__in=["14", "15", "16"]).update(
+            created_at=start + timedelta(milliseconds=20)
+        )
+        self.newest_first = list(
+            ChatMessage.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_forward_and_backward_visit_every_message_once(self):
+        page = self.get(f"/api/chat/channels/{self.channel.id}/messages/")
+        forward = [[m["id"] for m in page["results"]]]
+        while page["next"]:
+            page = self.get(page["next"])
+            forward.append([m["id"] for m in page["results"]])
+        self.assertEqual([len(ids) for ids in forward], [50, 50, 30])
+        self.assertEqual(sum(forward, []), self.newest_first)
+        self.assertIsNone(page["next"])
+
+        backward = [[m["id"] for m in page["results"]]]
+        while page["previous"]:
+            page = self.get(page["previous"])
+            backward.append([m["id"] for m in page["results"]])
+        self.assertEqual(sum(reversed(backward), []), self.newest_first)
+        # Paging back stops at the newest message, in page-sized steps.
+        self.assertEqual([len(ids) for ids in backward], [30, 50, 50])
@@ -0,0 +1,123 @@
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from apps.chat import ingest
+from apps.chat.consumers import BaseChatConsumer
+from apps.chat.ingest import IdAllocator, MessageWriter
+from apps.chat.models import ChatChannel, ChatMessage
+from apps.chat.recent import recent_messages
+
+
+class WriteBehindTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="poster")
+        self.channel = ChatChannel.objects.create(name="war", created_by=self.user)
+        recent_messages.invalidate(self.channel.id)
+        self.addCleanup(recent_messages.invalidate, self.channel.id)
+
+    def writer(self, **kwargs):
+        options = {"batch_size": 100, "flush_interval": 60, "max_pending": 1000, "id_block": 10}
+        return MessageWriter(**{**options, **kwargs})
+
+    def stored(self):
+        return list(
+            ChatMessage.objects.filter(channel=self.channel)
+            .order_by("created_at", "id")
+            .values_list("id", "text")
+        )
+
+    def test_flush_writes_the_stamped_rows(self):
+        writer = self.writer()
+        recent_messages.seed(self.channel.id, [], recent_messages.version(self.channel.id))
+
+        async def post():
+            messages = [
+                await writer.enqueue(channel_id=self.channel.id, sender=self.user, text=text)
+                for text in ("one", "two", "three")
+            ]
+            self.assertEqual(writer.pending, 3)
+            await writer.flush()
+            return messages
+
+        messages = async_to_sync(post)()
+        self.assertEqual(writer.pending, 0)
+        self.assertEqual(self.stored(), [(m.id, m.text) for m in messages])
+        self.assertEqual(
+            [row["id"] for row in recent_messages.get(self.channel.id)],
+            [m.id for m in reversed(messages)],
+        )
+
+    def test_background_task_flushes_full_batches(self):
+        writer = self.writer(batch_size=2)
+
+        async def post():
+            for text in ("one", "two"):
+                await writer.enqueue(channel_id=self.channel.id, sender=self.user, text=text)
+            for _ in range(100):
+                if not writer.pending:
+                    break
+                await asyncio.sleep(0.01)
+
+        async_to_sync(post)()
+        self.assertEqual([text for _, text in self.stored()], ["one", "two"])
+
+    def test_drain_writes_what_is_left_at_exit(self):
+        with mock.patch.object(ingest, "_writer", None), \
+                mock.patch.object(ingest.atexit, "register") as register:
+            writer = ingest.get_writer()
+        register.assert_called_once_with(writer.drain)
+
+        writer = self.writer()
+
+        async def post():
+            await writer.enqueue(channel_id=self.channel.id, sender=self.user, text="late")
+
+        async_to_sync(post)()  # the loop is gone; nothing flushed the row
+        self.assertEqual(self.stored(), [])
+        writer.drain()
+        self.assertEqual([text for _, text in self.stored()], ["late"])
+
+
+class IdAllocatorTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="poster")
+        self.channel = ChatChannel.objects.create(name="war", created_by=self.user)
+
+    def test_ids_are_unique_across_workers_and_orm_inserts(self):
+        workers = [IdAllocator(ChatMessage, 3), IdAllocator(ChatMessage, 3)]
+
+        async def allocate(allocator, count):
+            return [await allocator.allocate() for _ in range(count)]
+
+        first = async_to_sync(allocate)(workers[0], 2)
+        second = async_to_sync(allocate)(workers[1], 2)
+        orm = ChatMessage.objects.create(channel=self.channel, sender=self.user, text="rest").id
+        later = async_to_sync(allocate)(workers[0], 3)
+
+        ids = first + second + [orm] + later
+        self.assertEqual(len(set(ids)), len(ids))
+        # Worker 0's remaining id predates worker 1's block: not monotonic.
+        self.assertLess(later[0], second[0])
+        self.assertGreater(later[1], orm)
+
+    def test_replay_follows_arrival_time_not_id(self):
+        workers = [IdAllocator(ChatMessage, 5), IdAllocator(ChatMessage, 5)]
+        low = async_to_sync(workers[0].allocate)()
+        high = async_to_sync(workers[1].allocate)()
+        now = timezone.now()
+        ChatMessage.objects.bulk_create([
+            ChatMessage(id=high, channel=self.channel, sender=self.user, text="seen", created_at=now),
+            ChatMessage(
+                id=low, channel=self.channel, sender=self.user, text="missed",
+                created_at=now + timedelta(milliseconds=1),
+            ),
+        ])
+
+        missed = async_to_sync(BaseChatConsumer().get_missed)(self.channel, high)
+        self.assertEqual([(m["id"], m["text"]) for m in missed], [(low, "missed")])
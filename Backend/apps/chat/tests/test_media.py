@@ -0,0 +1,148 @@
+import hashlib
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.chat import media
+from apps.chat.attachments import store
+from apps.chat.models import ChatChannel, ChatMessage
+from apps.chat.recent import recent_messages
+
+BODY = bytes(range(256)) * 40  # 10 KiB
+
+
+class MediaTestCase(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(
+            MEDIA_ROOT=tmp.name, CHAT_MEDIA_AUTH=True, CHAT_MEDIA_ACCEL="off", CHAT_MEDIA_URL_TTL=60
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        Path(tmp.name, "clip.bin").write_bytes(BODY)
+        self.user = User.objects.create_user(username="viewer")
+        self.bearer = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+
+class MediaAuthTests(MediaTestCase):
+    def test_bearer_token_or_signed_url(self):
+        self.assertEqual(self.client.get("/media/clip.bin", headers=self.bearer).status_code, 200)
+        response = self.client.get(media.signed_url("/media/clip.bin"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), BODY)
+
+    def test_rejects_missing_and_invalid_credentials(self):
+        token = AccessToken.for_user(self.user)
+        signed = media.signed_url("/media/clip.bin")
+        for label, url, headers in [
+            ("nothing", "/media/clip.bin", {}),
+            ("bad bearer", "/media/clip.bin", {"Authorization": "Bearer x"}),
+            # A JWT in the query string would end up in access logs.
+            ("query token", f"/media/clip.bin?token={token}", {}),
+            ("bad signature", signed[:-1] + ("0" if signed[-1] != "0" else "1"), {}),
+            ("other file", signed.replace("clip", "other"), {}),
+            ("bad expiry", "/media/clip.bin?expires=soon&signature=x", {}),
+        ]:
+            with self.subTest(label):
+                response = self.client.get(url, headers=headers)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response["WWW-Authenticate"], "Bearer")
+
+    def test_signed_urls_are_stable_then_expire(self):
+        now = time.time()
+        with mock.patch.object(media.time, "time", return_value=now):
+            url = media.signed_url("/media/clip.bin")
+            self.assertEqual(media.signed_url("/media/clip.bin"), url)
+        with mock.patch.object(media.time, "time", return_value=now + 60):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with mock.patch.object(media.time, "time", return_value=now + 121):
+            self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_history_returns_signed_attachment_urls(self):
+        channel = ChatChannel.objects.create(name="war", created_by=self.user)
+        recent_messages.invalidate(channel.id)
+        self.addCleanup(recent_messages.invalidate, channel.id)
+        blob = store(ContentFile(b"base layout"), "layout.txt")
+        ChatMessage.objects.create(
+            channel=channel, sender=self.user, text="plan", blob=blob, attachment=blob.file.name
+        )
+        api = APIClient(HTTP_HOST="localhost")
+        api.force_authenticate(self.user)
+        [row] = api.get(f"/api/chat/channels/{channel.id}/messages/").json()["results"]
+
+        self.assertIn("signature=", row["attachment"])
+        response = self.client.get(row["attachment"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"base layout")
+        # Content-addressed: the hash is the ETag and the file never changes.
+        self.assertEqual(response["ETag"], f'"{hashlib.sha256(b"base layout").hexdigest()}"')
+        self.assertIn("immutable", response["Cache-Control"])
+
+
+class MediaRangeTests(MediaTestCase):
+    def get(self, **headers):
+        return self.client.get("/media/clip.bin", headers={**self.bearer, **headers})
+
+    def body(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_single_ranges(self):
+        size = len(BODY)
+        for header, start, end in [
+            ("bytes=10-19", 10, 19),
+            ("bytes=-100", size - 100, size - 1),
+            (f"bytes={size - 5}-", size - 5, size - 1),
+            (f"bytes=0-{size * 2}", 0, size - 1),
+        ]:
+            with self.subTest(header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/{size}")
+                self.assertEqual(response["Content-Length"], str(end - start + 1))
+                self.assertEqual(self.body(response), BODY[start : end + 1])
+
+    def test_unsatisfiable_range_is_416(self):
+        response = self.get(Range=f"bytes={len(BODY)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(BODY)}")
+
+    def test_malformed_or_multiple_ranges_send_everything(self):
+        for header in ("bytes=5-1,7-9", "items=0-1", "bytes=-"):
+            with self.subTest(header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.body(response), BODY)
+
+    def test_if_range(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(Range="bytes=0-9", **{"If-Range": etag}).status_code, 206)
+        stale = self.get(Range="bytes=0-9", **{"If-Range": '"stale"'})
+        self.assertEqual(stale.status_code, 200)
+        self.assertEqual(self.body(stale), BODY)
+
+    def test_etag_revalidation_is_304(self):
+        etag = self.get()["ETag"]
+        response = self.get(**{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response.content, b"")
+
+    def test_asgi_streams_the_same_range(self):
+        async def fetch():
+            response = await AsyncClient().get(
+                "/media/clip.bin", headers={**self.bearer, "Range": "bytes=100-299"}
+            )
+            return response, b"".join([chunk async for chunk in response.streaming_content])
+
+        response, body = async_to_sync(fetch)()
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, BODY[100:300])
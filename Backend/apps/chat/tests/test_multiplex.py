@@ -0,0 +1,140 @@
+from asgiref.sync import sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.test import TransactionTestCase, override_settings
+
+from apps.chat.models import ChatChannel, ChatMessage
+from apps.chat.routing import websocket_urlpatterns
+
+application = URLRouter(websocket_urlpatterns)
+
+
+@override_settings(
+    CHAT_WRITE_BEHIND=False, CHAT_OUTBOUND_POLICY="off", CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS=3
+)
+class MultiplexConsumerTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="lurker")
+        self.war, self.trade = (
+            ChatChannel.objects.create(name=name, created_by=self.user) for name in ("war", "trade")
+        )
+
+    async def connect(self, path="/ws/chat/", user=None):
+        communicator = WebsocketCommunicator(application, path)
+        communicator.scope["user"] = user or self.user
+        connected, code = await communicator.connect()
+        self.assertTrue(connected, code)
+        return communicator
+
+    async def receive(self, communicator):
+        while True:
+            frame = await communicator.receive_json_from()
+            if frame.get("type") != "presence":
+                return frame
+
+    async def receives_nothing(self, communicator, timeout=0.2):
+        # receive_nothing() leaves the app running; a timed-out receive would cancel it.
+        while not await communicator.receive_nothing(timeout):
+            if (await communicator.receive_json_from()).get("type") != "presence":
+                return False
+        return True
+
+    async def subscribe(self, communicator, channel_id, **extra):
+        await communicator.send_json_to({"type": "subscribe", "channel": channel_id, **extra})
+        self.assertEqual(
+            await self.receive(communicator), {"type": "subscribed", "channel": channel_id}
+        )
+
+    async def test_anonymous_socket_is_closed(self):
+        communicator = WebsocketCommunicator(application, "/ws/chat/")
+        communicator.scope["user"] = AnonymousUser()
+        connected, code = await communicator.connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4001)
+
+    async def test_messages_are_tagged_with_their_channel(self):
+        mux = await self.connect()
+        await self.subscribe(mux, self.war.id)
+        await self.subscribe(mux, self.trade.id)
+        single = await self.connect(f"/ws/chat/{self.trade.id}/")
+
+        await mux.send_json_to({"type": "chat.message", "channel": self.war.id, "text": "go"})
+        frame = await self.receive(mux)
+        self.assertEqual(frame["channel"], self.war.id)
+        self.assertEqual(frame["message"]["text"], "go")
+
+        # A per-channel client and a multiplexed one share the group.
+        await single.send_json_to({"type": "chat.message", "text": "selling gems"})
+        frame = await self.receive(mux)
+        self.assertEqual((frame["channel"], frame["message"]["text"]), (self.trade.id, "selling gems"))
+        self.assertEqual((await self.receive(single))["text"], "selling gems")
+        await mux.disconnect()
+        await single.disconnect()
+
+    async def test_unsubscribe_stops_delivery(self):
+        mux = await self.connect()
+        await self.subscribe(mux, self.war.id)
+        # Subscribing twice is a no-op: one group membership, one delivery.
+        await self.subscribe(mux, self.war.id)
+        single = await self.connect(f"/ws/chat/{self.war.id}/")
+
+        await single.send_json_to({"type": "chat.message", "text": "first"})
+        self.assertEqual((await self.receive(mux))["message"]["text"], "first")
+        self.assertEqual((await self.receive(single))["text"], "first")
+        self.assertTrue(await self.receives_nothing(mux))
+
+        await mux.send_json_to({"type": "unsubscribe", "channel": self.war.id})
+        self.assertEqual(await self.receive(mux), {"type": "unsubscribed", "channel": self.war.id})
+        await single.send_json_to({"type": "chat.message", "text": "second"})
+        self.assertEqual((await self.receive(single))["text"], "second")
+        self.assertTrue(await self.receives_nothing(mux))
+
+        await mux.send_json_to({"type": "chat.message", "channel": self.war.id, "text": "x"})
+        self.assertEqual(
+            await self.receive(mux),
+            {"type": "error", "channel": self.war.id, "detail": "Not subscribed to this channel."},
+        )
+        count = await sync_to_async(ChatMessage.objects.filter(text="x").count)()
+        self.assertEqual(count, 0)
+        await mux.disconnect()
+        await single.disconnect()
+
+    async def test_subscribe_errors(self):
+        mux = await self.connect()
+        await mux.send_json_to({"type": "subscribe", "channel": "war"})
+        self.assertEqual(
+            await self.receive(mux), {"type": "error", "detail": "Missing or invalid channel."}
+        )
+        missing = self.trade.id + 100
+        await mux.send_json_to({"type": "subscribe", "channel": missing})
+        self.assertEqual(
+            await self.receive(mux),
+            {"type": "error", "channel": missing, "detail": "Channel not found."},
+        )
+
+        extra = await sync_to_async(
+            lambda: [ChatChannel.objects.create(name=f"c{i}", created_by=self.user) for i in range(2)]
+        )()
+        for channel in (self.war, self.trade, extra[0]):
+            await self.subscribe(mux, channel.id)
+        await mux.send_json_to({"type": "subscribe", "channel": extra[1].id})
+        self.assertEqual(
+            await self.receive(mux),
+            {"type": "error", "channel": extra[1].id, "detail": "Too many subscriptions."},
+        )
+        await mux.disconnect()
+
+    async def test_subscribe_with_last_seen_id_replays(self):
+        seen, missed = await sync_to_async(
+            lambda: [
+                ChatMessage.objects.create(channel=self.war, sender=self.user, text=text)
+                for text in ("seen", "missed")
+            ]
+        )()
+        mux = await self.connect()
+        await self.subscribe(mux, self.war.id, last_seen_id=seen.id)
+        frame = await self.receive(mux)
+        self.assertEqual((frame["type"], frame["channel"]), ("replay", self.war.id))
+        self.assertEqual([m["id"] for m in frame["messages"]], [missed.id])
+        await mux.disconnect()
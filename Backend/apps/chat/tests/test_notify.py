@@ -0,0 +1,106 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase, override_settings
+
+from apps.chat import notify
+from apps.chat.models import ChatChannel
+from apps.chat.presence import LocalPresenceStore, Presence
+from apps.push.models import PushSubscription
+
+
+def worker(store, audience=notify.seen):
+    """One worker's presence and chat push, over a store shared with the others."""
+    presence = Presence(store, interval=0.5, ttl=60, typing_ttl=6)
+    return notify.ChatPush(60, presence, audience)
+
+
+@override_settings(VAPID_PRIVATE_KEY="configured")
+class ChatPushTests(TransactionTestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol = (
+            User.objects.create_user(username=name) for name in ("alice", "bob", "carol")
+        )
+        self.channel = ChatChannel.objects.create(name="war", created_by=self.alice)
+        for user in (self.alice, self.bob, self.carol):
+            PushSubscription.objects.create(
+                user=user, endpoint=f"https://push.example/{user.username}", keys={}
+            )
+        self.delivered = []
+
+        async def deliver(subs, payload, **options):
+            self.delivered.append(({s.user_id for s in subs}, payload))
+            return []
+
+        patcher = mock.patch.object(notify.push, "deliver", deliver)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.store = LocalPresenceStore()
+
+    def run_flow(self, flow):
+        async def run():
+            await flow()
+            # The tests call flush() themselves; drop the timers that would.
+            for chat_push in self.workers:
+                for task in chat_push._timers.values():
+                    task.cancel()
+
+        async_to_sync(run)()
+
+    def test_notifies_only_offline_users_seen_in_the_channel(self):
+        chat_push = worker(self.store)
+        self.workers = [chat_push]
+
+        async def flow():
+            await chat_push.presence.join(self.channel.id, self.alice, "socket-a")
+            await chat_push.presence.saw(self.channel.id, self.bob.id)
+            await chat_push.message_posted(self.channel.id, self.alice, "attack at 6")
+            await chat_push.flush(self.channel.id)
+
+        self.run_flow(flow)
+        # alice is online, carol never opened the channel.
+        self.assertEqual(len(self.delivered), 1)
+        users, payload = self.delivered[0]
+        self.assertEqual(users, {self.bob.id})
+        self.assertEqual(payload["body"], "alice: attack at 6")
+        self.assertEqual((payload["tag"], payload["count"]), (f"chat-{self.channel.id}", 1))
+
+    def test_everyone_audience_notifies_every_offline_subscriber(self):
+        chat_push = worker(self.store, notify.everyone)
+        self.workers = [chat_push]
+
+        async def flow():
+            await chat_push.presence.join(self.channel.id, self.alice, "socket-a")
+            await chat_push.message_posted(self.channel.id, self.alice, "attack at 6")
+            await chat_push.flush(self.channel.id)
+
+        self.run_flow(flow)
+        self.assertEqual([users for users, _ in self.delivered], [{self.bob.id, self.carol.id}])
+
+    def test_window_is_shared_and_sent_once_across_workers(self):
+        first, second = worker(self.store), worker(self.store)
+        self.workers = [first, second]
+
+        async def flow():
+            await first.presence.saw(self.channel.id, self.carol.id)
+            await first.message_posted(self.channel.id, self.alice, "one")
+            await second.message_posted(self.channel.id, self.bob, "two")
+            await second.message_posted(self.channel.id, self.alice, "three")
+            # Only the worker that opened the window runs its timer.
+            self.assertEqual(list(first._timers), [self.channel.id])
+            self.assertEqual(second._timers, {})
+            await first.flush(self.channel.id)
+            await second.flush(self.channel.id)
+
+        self.run_flow(flow)
+        by_user = {}
+        for users, payload in self.delivered:
+            for user_id in users:
+                by_user[user_id] = payload["count"]
+        # One notification each, never counting their own messages.
+        self.assertEqual(by_user, {self.bob.id: 2, self.carol.id: 3, self.alice.id: 1})
+        self.assertEqual(
+            sorted(payload["body"] for _, payload in self.delivered),
+            ["1 new message in #war", "2 new messages in #war", "3 new messages in #war"],
+        )
@@ -0,0 +1,134 @@
+import asyncio
+from unittest import mock
+
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from apps.chat import encoding
+from apps.chat.consumers import BaseChatConsumer
+from apps.chat.models import ChatChannel, group_name
+from apps.chat.outbound import RESYNC_FRAME, SLOW_CONSUMER_CLOSE_CODE, OutboundQueue
+
+from .test_consumers import application
+
+
+class StalledReader:
+    """A client that reads nothing until ``resume``."""
+
+    def __init__(self):
+        self.frames = []
+        self._reading = asyncio.Event()
+
+    async def send(self, frame):
+        await self._reading.wait()
+        self.frames.append(frame)
+
+    async def resume(self, queue):
+        self._reading.set()
+        while len(queue):
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+
+class OutboundPolicyTests(SimpleTestCase):
+    async def fill(self, policy, count, maxsize=4):
+        reader = StalledReader()
+        queue = OutboundQueue(reader.send, maxsize, policy)
+        accepted = [queue.put(str(i)) for i in range(count)]
+        return reader, queue, accepted
+
+    async def test_drop_oldest_keeps_the_newest_frames(self):
+        reader, queue, accepted = await self.fill("drop_oldest", 10)
+        self.assertTrue(all(accepted))
+        self.assertEqual(len(queue), 4)
+        await reader.resume(queue)
+        self.assertEqual(reader.frames, ["6", "7", "8", "9"])
+        queue.close()
+
+    async def test_resync_replaces_the_backlog_with_one_marker(self):
+        reader, queue, accepted = await self.fill("resync", 6)
+        self.assertTrue(all(accepted))
+        # "4" found the queue full: it and the backlog became the marker.
+        await reader.resume(queue)
+        self.assertEqual(reader.frames, [RESYNC_FRAME, "5"])
+        queue.close()
+
+    async def test_resync_does_not_stack_markers(self):
+        reader, queue, _ = await self.fill("resync", 20, maxsize=2)
+        await reader.resume(queue)
+        self.assertEqual(reader.frames.count(RESYNC_FRAME), 1)
+        self.assertEqual(reader.frames[0], RESYNC_FRAME)
+        queue.close()
+
+    async def test_disconnect_refuses_the_frame_that_overflows(self):
+        with self.assertLogs("apps.chat.outbound", "WARNING"):
+            reader, queue, accepted = await self.fill("disconnect", 5)
+        self.assertEqual(accepted, [True, True, True, True, False])
+        self.assertTrue(queue.closed)
+        self.assertEqual(len(queue), 0)
+        await reader.resume(queue)
+        self.assertEqual(reader.frames, [])
+
+    async def test_a_reader_that_keeps_up_loses_nothing(self):
+        frames = []
+
+        async def send(frame):
+            frames.append(frame)
+
+        queue = OutboundQueue(send, 4, "disconnect")
+        for i in range(20):
+            self.assertTrue(queue.put(str(i)))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.assertEqual(frames, [str(i) for i in range(20)])
+        queue.close()
+
+    async def test_failed_send_is_logged_and_closes(self):
+        closed = asyncio.Event()
+
+        async def send(frame):
+            raise ConnectionResetError("peer went away")
+
+        async def on_error():
+            closed.set()
+
+        queue = OutboundQueue(send, 4, "resync", on_error=on_error)
+        with self.assertLogs("apps.chat.outbound", "ERROR"):
+            queue.put("0")
+            queue.put("1")
+            await asyncio.wait_for(closed.wait(), 1)
+        self.assertTrue(queue.closed)
+        self.assertEqual(len(queue), 0)
+        self.assertTrue(queue.put("2"))  # ignored once closed
+
+
+async def _stalled_write(self, frame):
+    await asyncio.Event().wait()
+
+
+@override_settings(
+    CHAT_WRITE_BEHIND=False, CHAT_OUTBOUND_POLICY="disconnect", CHAT_OUTBOUND_QUEUE_SIZE=4
+)
+class SlowConsumerTests(TransactionTestCase):
+    async def test_stalled_socket_is_closed_with_4008(self):
+        user = await User.objects.acreate(username="slow")
+        channel = await ChatChannel.objects.acreate(name="war", created_by=user)
+        communicator = WebsocketCommunicator(application, f"/ws/chat/{channel.id}/")
+        communicator.scope["user"] = user
+        with (
+            mock.patch.object(BaseChatConsumer, "_write", _stalled_write),
+            self.assertLogs("apps.chat.outbound", "WARNING"),
+        ):
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            layer = get_channel_layer()
+            for i in range(10):
+                await layer.group_send(
+                    group_name(channel.id),
+                    {"type": "chat_message", "channel": channel.id, "frame": encoding.dumps(i)},
+                )
+            output = await communicator.receive_output()
+        self.assertEqual(output, {"type": "websocket.close", "code": SLOW_CONSUMER_CLOSE_CODE})
+        await communicator.wait()
@@ -0,0 +1,120 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from apps.chat import presence as presence_module
+from apps.chat.presence import LocalPresenceStore, Presence
+
+ALICE = SimpleNamespace(id=1, username="alice")
+BOB = SimpleNamespace(id=2, username="bob")
+INTERVAL = 0.2
+
+
+class FakeLayer:
+    def __init__(self):
+        self.frames = []
+
+    async def group_send(self, group, event):
+        self.frames.append((group, json.loads(event["frame"])))
+
+
+class PresenceTests(SimpleTestCase):
+    def setUp(self):
+        self.layer = FakeLayer()
+        patcher = mock.patch.object(presence_module, "get_channel_layer", lambda: self.layer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_flow(self, flow, ttl=60):
+        presence = Presence(LocalPresenceStore(), interval=INTERVAL, ttl=ttl, typing_ttl=ttl)
+
+        async def run():
+            try:
+                await flow(presence)
+            finally:
+                for _, task in presence._timers.values():
+                    task.cancel()
+
+        async_to_sync(run)()
+        return presence
+
+    def frames(self):
+        return [
+            ([user["username"] for user in frame["online"]], frame["typing"])
+            for _, frame in self.layer.frames
+        ]
+
+    def test_a_burst_of_changes_is_one_frame_per_interval(self):
+        async def flow(presence):
+            await presence.join(7, ALICE, "a1")
+            await presence.join(7, BOB, "b1")
+            await presence.typing(7, ALICE)
+            await asyncio.sleep(INTERVAL / 4)
+            # Inside the interval: held back and sent together once it ends.
+            await presence.typing(7, BOB)
+            await presence.typing(7, ALICE, active=False)
+            await presence.join(7, ALICE, "a2")
+            await asyncio.sleep(INTERVAL / 4)
+            self.assertEqual(len(self.layer.frames), 1)
+            await asyncio.sleep(INTERVAL)
+
+        presence = self.run_flow(flow)
+        self.assertEqual(self.frames(), [(["alice", "bob"], [1]), (["alice", "bob"], [2])])
+        self.assertEqual({group for group, _ in self.layer.frames}, {"chat_7"})
+        self.assertEqual(presence.broadcasts, 2)
+
+    def test_heartbeats_send_nothing(self):
+        async def flow(presence):
+            await presence.join(7, ALICE, "a1")
+            await asyncio.sleep(INTERVAL / 4)
+            for _ in range(5):
+                await presence.join(7, ALICE, "a1")
+                await presence.typing(7, ALICE)
+                await presence.typing(7, ALICE)
+            await asyncio.sleep(INTERVAL * 1.5)
+
+        self.run_flow(flow)
+        # The first keystroke is a change; repeats only move its expiry.
+        self.assertEqual(self.frames(), [(["alice"], []), (["alice"], [1])])
+
+    def test_a_state_equal_to_the_last_frame_is_not_resent(self):
+        async def flow(presence):
+            await presence.join(7, ALICE, "a1")
+            await asyncio.sleep(INTERVAL / 4)
+            # Changes that cancel out within the interval.
+            await presence.typing(7, ALICE)
+            await presence.join(7, BOB, "b1")
+            await presence.leave(7, BOB, "b1")
+            await presence.typing(7, ALICE, active=False)
+            await asyncio.sleep(INTERVAL * 1.5)
+            await presence.flush(7)  # forced, after the interval: same digest
+
+        presence = self.run_flow(flow)
+        self.assertEqual(self.frames(), [(["alice"], [])])
+        self.assertEqual(presence.broadcasts, 1)
+
+    def test_emptying_a_channel_is_sent_once_and_forgotten(self):
+        async def flow(presence):
+            await presence.join(7, ALICE, "a1")
+            await asyncio.sleep(INTERVAL * 1.5)
+            await presence.leave(7, ALICE, "a1")
+            await asyncio.sleep(INTERVAL * 1.5)
+            await presence.flush(7)
+            self.assertEqual(presence.store._online, {})
+            self.assertNotIn(7, presence.store._sent)
+
+        self.run_flow(flow)
+        self.assertEqual(self.frames(), [(["alice"], []), ([], [])])
+
+    def test_expired_entries_are_dropped_by_a_scheduled_flush(self):
+        async def flow(presence):
+            await presence.join(7, ALICE, "a1")
+            await presence.typing(7, ALICE)
+            await asyncio.sleep(INTERVAL * 4)
+
+        self.run_flow(flow, ttl=INTERVAL * 2)
+        self.assertEqual(self.frames(), [(["alice"], [1]), ([], [])])
@@ -0,0 +1,125 @@
+import tempfile
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.chat import archive, encoding
+from apps.chat.models import ChatChannel, ChatMessage
+from apps.chat.recent import LocalRecentMessages, recent_messages
+
+
+def row(pk):
+    return {"id": pk, "text": f"message {pk}"}
+
+
+class LocalRecentMessagesTests(SimpleTestCase):
+    def setUp(self):
+        self.buffer = LocalRecentMessages(size=3, max_channels=2, max_bytes=1 << 20)
+
+    def test_append_keeps_the_newest_rows(self):
+        self.buffer.seed(1, [row(2), row(1)], self.buffer.version(1))
+        for pk in range(3, 7):
+            self.buffer.append(1, row(pk))
+        self.assertEqual(self.buffer.get(1), [row(6), row(5), row(4)])
+        self.assertEqual(
+            self.buffer.bytes, sum(len(encoding.dumps(row(pk))) for pk in (4, 5, 6))
+        )
+
+    def test_append_to_an_unseeded_channel_is_dropped(self):
+        self.buffer.append(1, row(1))
+        self.assertIsNone(self.buffer.get(1))
+        self.assertEqual(self.buffer.bytes, 0)
+
+    def test_seed_is_discarded_when_an_append_lands_first(self):
+        version = self.buffer.version(1)
+        self.buffer.append(1, row(2))  # committed after the seed's read
+        self.buffer.seed(1, [row(1)], version)
+        self.assertIsNone(self.buffer.get(1))
+
+        self.buffer.seed(1, [row(2), row(1)], self.buffer.version(1))
+        self.assertEqual(self.buffer.get(1), [row(2), row(1)])
+
+    def test_archive_marker_lives_and_dies_with_the_buffer(self):
+        self.assertTrue(self.buffer.archived(1))
+        self.buffer.seed(1, [row(1)], self.buffer.version(1), archived=False)
+        self.assertFalse(self.buffer.archived(1))
+        self.buffer.append(1, row(2))
+        self.assertFalse(self.buffer.archived(1))
+
+        self.buffer.invalidate(1)
+        self.assertTrue(self.buffer.archived(1))
+
+    def test_least_recently_read_channel_is_evicted(self):
+        for channel in (1, 2):
+            self.buffer.seed(channel, [row(channel)], self.buffer.version(channel), archived=False)
+        self.buffer.get(1)
+        self.buffer.seed(3, [row(3)], self.buffer.version(3))
+        self.assertIsNone(self.buffer.get(2))
+        self.assertTrue(self.buffer.archived(2))
+        self.assertEqual(self.buffer.get(1), [row(1)])
+        self.assertEqual(self.buffer.evictions, 1)
+
+
+class RecentFirstPageTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings = override_settings(CHAT_ARCHIVE_DIR=tmp.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = User.objects.create_user(username="reader")
+        self.channel = ChatChannel.objects.create(name="general", created_by=self.user)
+        # Ids are reused after each test's rollback; drop what an earlier test cached.
+        recent_messages.invalidate(self.channel.id)
+        self.addCleanup(recent_messages.invalidate, self.channel.id)
+        self.client = APIClient(HTTP_HOST="localhost")
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/chat/channels/{self.channel.id}/messages/"
+
+    def post(self, text, created_at=None):
+        message = ChatMessage.objects.create(channel=self.channel, sender=self.user, text=text)
+        if created_at is not None:
+            ChatMessage.objects.filter(pk=message.pk).update(created_at=created_at)
+        return message
+
+    def texts(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [message["text"] for message in response.json()["results"]]
+
+    def archive_old(self):
+        long_ago = timezone.now() - timedelta(days=400)
+        for i in range(2):
+            self.post(f"old {i}", long_ago + timedelta(seconds=i))
+        archive.archive_month(self.channel.id, date(long_ago.year, long_ago.month, 1))
+
+    def test_miss_seeds_the_buffer(self):
+        self.post("hello")
+        self.assertIsNone(recent_messages.get(self.channel.id))
+        # The newest rows, then whether the channel has archive segments.
+        with self.assertNumQueries(2):
+            self.assertEqual(self.texts(), ["hello"])
+        self.assertEqual(len(recent_messages.get(self.channel.id)), 1)
+
+    def test_hit_without_archive_runs_no_query(self):
+        self.post("hello")
+        self.texts()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.texts(), ["hello"])
+
+    def test_hit_with_archive_continues_into_it(self):
+        self.archive_old()
+        self.post("new")
+        self.texts()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.texts(), ["new", "old 1", "old 0"])
+
+    def test_archiving_resets_the_marker(self):
+        self.post("new")
+        self.texts()
+        self.archive_old()
+        self.assertEqual(self.texts(), ["new", "old 1", "old 0"])
@@ -0,0 +1,108 @@
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.chat.models import ChatChannel
+from config import routers
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """ReplicaRouter against a second SQLite database that lags the primary."""
+
+    @classmethod
+    def setUpClass(cls):
+        # A real second file, not a TEST MIRROR of the primary, so lag is visible.
+        cls.directory = tempfile.mkdtemp()
+        connections.settings["replica1"] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            "NAME": str(Path(cls.directory) / "replica1.sqlite3"),
+        }
+        # Set here, not on the class: the runner sets up (and checks) the
+        # databases it finds on test classes, and this one is not a test database.
+        cls.databases = {DEFAULT_DB_ALIAS, "replica1"}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica1"].close()
+        del connections["replica1"]
+        del connections.settings["replica1"]
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        settings = override_settings(DB_REPLICA_ALIASES=["replica1"], DB_REPLICA_CHECK_INTERVAL=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.router = routers.ReplicaRouter()
+        # Instances are accepted as routers; the setting change resets django.db.router.
+        routing = override_settings(DATABASE_ROUTERS=[self.router])
+        routing.enable()
+        self.addCleanup(routing.disable)
+        # Fresh stickiness marks for each test, in this process only.
+        self.addCleanup(setattr, routers, "write_marks", routers.write_marks)
+        routers.write_marks = routers.LocalWriteMarks()
+
+        self.alice = User.objects.create_user(username="alice")
+        self.bob = User.objects.create_user(username="bob")
+        ChatChannel.objects.create(name="replicated", created_by=self.alice)
+        routers.refresh_sqlite_replica("replica1")
+        # Written after the copy: only the primary has it.
+        ChatChannel.objects.create(name="lagging", created_by=self.alice)
+
+    def names(self, user):
+        token = routers.bind(lambda: user, per_request=True)
+        try:
+            return set(ChatChannel.objects.values_list("name", flat=True))
+        finally:
+            routers.unbind(token)
+
+    def client_for(self, user):
+        client = APIClient(HTTP_HOST="localhost")
+        client.force_authenticate(user)
+        return client
+
+    def test_request_reads_go_to_the_replica(self):
+        self.assertEqual(self.names(self.bob), {"replicated"})
+
+    def test_reads_outside_a_request_go_to_the_primary(self):
+        self.assertEqual(
+            set(ChatChannel.objects.values_list("name", flat=True)), {"replicated", "lagging"}
+        )
+
+    def test_writer_reads_the_primary_after_posting(self):
+        response = self.client_for(self.alice).post(
+            "/api/chat/channels/", {"name": "posted"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        listed = self.client_for(self.alice).get("/api/chat/channels/")
+        self.assertIn("posted", {channel["name"] for channel in listed.json()})
+        # Someone who did not write still reads the lagging replica.
+        listed = self.client_for(self.bob).get("/api/chat/channels/")
+        self.assertEqual({channel["name"] for channel in listed.json()}, {"replicated"})
+
+    def test_falls_back_to_the_primary_when_the_replica_is_down(self):
+        # A replica that applied other migrations than the primary fails its probe.
+        with connections["replica1"].cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM django_migrations WHERE id = (SELECT MAX(id) FROM django_migrations)"
+            )
+        with self.assertLogs("config.routers", "WARNING"):
+            self.assertEqual(self.names(self.bob), {"replicated", "lagging"})
+            self.assertEqual(self.router.health.healthy(), [])
+
+    def test_primary_block_overrides_routing(self):
+        token = routers.bind(lambda: self.bob, per_request=True)
+        try:
+            with routers.primary():
+                names = set(ChatChannel.objects.values_list("name", flat=True))
+            after = set(ChatChannel.objects.values_list("name", flat=True))
+        finally:
+            routers.unbind(token)
+        self.assertEqual(names, {"replicated", "lagging"})
+        self.assertEqual(after, {"replicated"})
@@ -0,0 +1,91 @@
+import sqlite3
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from apps.chat.models import ChatChannel, ChatMessage
+from apps.chat.search import FTS5SearchBackend
+
+
+def fts5_available() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+@skipUnless(connection.vendor == "sqlite" and fts5_available(), "SQLite without FTS5")
+class FTS5SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="searcher")
+        self.channel = ChatChannel.objects.create(name="war", created_by=self.user)
+        self.backend = FTS5SearchBackend()
+
+    def post(self, text, channel=None):
+        return ChatMessage.objects.create(
+            channel=channel or self.channel, sender=self.user, text=text
+        )
+
+    def found(self, query, channel=None):
+        hits = self.backend.search((channel or self.channel).id, query, 100)
+        return [hit.id for hit in hits]
+
+    def test_triggers_follow_inserts_updates_and_deletes(self):
+        message = self.post("attack the eastern wall")
+        [bulk] = ChatMessage.objects.bulk_create(
+            [ChatMessage(channel=self.channel, sender=self.user, text="wall breakers ready")]
+        )
+        self.assertEqual(set(self.found("wall")), {message.id, bulk.id})
+
+        message.text = "attack the western gate"
+        message.save()
+        self.assertEqual(self.found("wall"), [bulk.id])
+        self.assertEqual(self.found("western"), [message.id])
+
+        other = ChatChannel.objects.create(name="other", created_by=self.user)
+        ChatMessage.objects.filter(pk=bulk.pk).update(channel=other)
+        self.assertEqual(self.found("wall"), [])
+        self.assertEqual(self.found("wall", other), [bulk.id])
+
+        message.delete()
+        self.assertEqual(self.found("western"), [])
+        self.assertEqual(self.found("attack"), [])
+
+    def test_keyset_pages_match_the_unpaged_order(self):
+        # Repeated texts tie on rank, so pages must break ties on id.
+        texts = ["war", "war war", "war plan tonight", "war of the clans, war again"]
+        for i in range(45):
+            self.post(texts[i % len(texts)])
+        self.post("no match here")
+        everything = self.backend.search(self.channel.id, "war", 100)
+        self.assertEqual(len(everything), 45)
+
+        pages, after = [], None
+        while True:
+            page = self.backend.search(self.channel.id, "war", 7, after)
+            if not page:
+                break
+            pages.append(page)
+            after = page[-1]
+        self.assertEqual(sum(pages, []), everything)
+        self.assertEqual(everything, sorted(everything, key=lambda hit: (hit.rank, -hit.id)))
+
+    def test_search_view_follows_cursor_links(self):
+        for i in range(45):
+            self.post("raid" if i % 2 else "raid at dawn")
+        client = APIClient(HTTP_HOST="localhost")
+        client.force_authenticate(self.user)
+        url = f"/api/chat/channels/{self.channel.id}/messages/search/?q=raid"
+
+        ids = []
+        with mock.patch("apps.chat.views.search_backend", self.backend):
+            while url:
+                page = client.get(url).json()
+                ids += [message["id"] for message in page["results"]]
+                url = page["next"]
+        self.assertEqual(ids, self.found("raid"))
+        self.assertEqual(len(set(ids)), 45)
@@ -0,0 +1,108 @@
+"""
+Thumbnail and preview variants for image attachments.
+
+Variants are built off the request path by a small thread pool: decoding and
+resizing run in Pillow's C code with the GIL released, so threads use the
+cores without a separate worker process. ``CHAT_THUMBNAIL_WORKERS`` threads
+serve at most ``CHAT_THUMBNAIL_MAX_PENDING`` queued images; past that, submit
+declines and the attachment stays ``pending`` until ``manage.py
+sweep_attachments`` builds it. With 0 workers nothing is built in-process,
+for deployments that leave it to the sweep.
+
+Both variants are WebP, scaled to fit a square box. JPEGs are decoded at a
+reduced scale straight from the DCT coefficients (``Image.draft``), which
+skips most of the decoding work for a large photo.
+"""
+
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps
+
+from .models import ChatAttachment, ChatMessage
+from .recent import recent_messages
+
+logger = logging.getLogger(__name__)
+
+# (field, longest side in pixels, WebP quality)
+VARIANTS = [("preview", 1280, 80), ("thumbnail", 320, 70)]
+
+
+def build_variants(attachment_id: int) -> bool:
+    """Build and record the variants of one pending attachment; False if it failed."""
+    attachment = ChatAttachment.objects.get(pk=attachment_id)
+    if attachment.variants != ChatAttachment.Variants.PENDING:
+        return True
+    stem = attachment.file.name.rsplit(".", 1)[0]
+    try:
+        with attachment.file.open("rb") as f, Image.open(f) as img:
+            largest = VARIANTS[0][1]
+            img.draft("RGB", (largest, largest))
+            img = ImageOps.exif_transpose(img)
+            img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+            for field, side, quality in VARIANTS:
+                # Each variant is scaled from the previous, larger one.
+                img.thumbnail((side, side))
+                out = io.BytesIO()
+                img.save(out, "WEBP", quality=quality, method=4)
+                name = f"{stem}-{field}.webp"
+                # A second build (pool and sweep racing) replaces, not duplicates.
+                default_storage.delete(name)
+                setattr(attachment, field, default_storage.save(name, ContentFile(out.getvalue())))
+        attachment.variants = ChatAttachment.Variants.READY
+    except Exception:
+        logger.exception("Building variants for attachment %s failed", attachment_id)
+        attachment.variants = ChatAttachment.Variants.FAILED
+    attachment.save(update_fields=["thumbnail", "preview", "variants"])
+
+    # Cached history rows were serialized before the variants existed.
+    channel_ids = (
+        ChatMessage.objects.filter(blob=attachment).values_list("channel_id", flat=True).distinct()
+    )
+    for channel_id in channel_ids:
+        recent_messages.invalidate(channel_id)
+    return attachment.variants == ChatAttachment.Variants.READY
+
+
+class ThumbnailPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+
+    def submit(self, attachment_id: int) -> bool:
+        """Queue an attachment; False if the pool is off or full."""
+        if not self.workers or not self._slots.acquire(blocking=False):
+            return False
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="chat-thumbnails")
+        self._executor.submit(self._run, attachment_id)
+        return True
+
+    def _run(self, attachment_id: int) -> None:
+        try:
+            build_variants(attachment_id)
+        except Exception:
+            logger.exception("Thumbnail job for attachment %s failed", attachment_id)
+        finally:
+            close_old_connections()
+            self._slots.release()
+
+    def join(self) -> None:
+        """Wait for every queued job (benchmarks, shutdown)."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def _build() -> ThumbnailPool:
+    return ThumbnailPool(settings.CHAT_THUMBNAIL_WORKERS, settings.CHAT_THUMBNAIL_MAX_PENDING)
+
+
+thumbnail_pool = _build()
@@ -13,4 +13,12 @@ urlpatterns = [
         views.ChatMessageListCreateView.as_view(),
         name="message-list-create",
     ),
+    path(
+        "channels/<int:channel_id>/messages/search/",
+        views.ChatMessageSearchView.as_view(),
+        name="message-search",
+    ),
+    path("stats/", views.ChatStatsView.as_view(), name="chat-stats"),
+    path("uploads/", views.ChatUploadCreateView.as_view(), name="upload-create"),
+    path("uploads/<uuid:pk>/", views.ChatUploadView.as_view(), name="upload-detail"),
 ]
@@ -1,15 +1,208 @@
-from rest_framework import generics, permissions
-from rest_framework.pagination import CursorPagination
+import io
 
-from .models import ChatChannel, ChatMessage
-from .serializers import ChatChannelSerializer, ChatMessageSerializer
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import Cursor, CursorPagination
+from rest_framework.response import Response
+
+from config import routers
+
+from . import archive, media
+from .attachments import (
+    UploadConflict,
+    UploadError,
+    discard_upload,
+    finish_upload,
+    store,
+    write_chunk,
+)
+from .auth_cache import user_cache
+from .models import ChatChannel, ChatMessage, ChatUpload
+from .notify import chat_push
+from .outbound import metrics as outbound_metrics
+from .recent import recent_messages, serialize, serialize_many
+from .search import SearchHit, search_backend
+from .serializers import (
+    ChatAttachmentSerializer,
+    ChatChannelSerializer,
+    ChatMessageSerializer,
+    ChatUploadSerializer,
+)
+
+
+def media_url(url: str, request) -> str:
+    """An absolute media URL, signed for ``<img src>`` (see apps.chat.media)."""
+    url = request.build_absolute_uri(url)
+    return media.signed_url(url) if settings.CHAT_MEDIA_AUTH else url
+
+
+def variant_urls(info: dict, request) -> dict:
+    """An attachment's thumbnail and preview URLs through ``media_url``."""
+    return {**info, **{k: media_url(info[k], request) for k in ("thumbnail", "preview") if info[k]}}
+
+
+def absolute_urls(row: dict, request) -> dict:
+    """A serialized message with its media URLs through ``media_url``, copied if changed."""
+    if not row["attachment"]:
+        return row
+    row = {**row, "attachment": media_url(row["attachment"], request)}
+    if row.get("attachment_info"):
+        row["attachment_info"] = variant_urls(row["attachment_info"], request)
+    return row
 
 
 class MessageCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first.
+
+    The cursor position encodes both fields, so messages sharing a timestamp
+    are never skipped or repeated, and every page is a range scan on the
+    (channel, created_at, id) index regardless of depth. The response shape
+    matches DRF's CursorPagination.
+
+    Past the oldest row in the table, pages continue into the channel's
+    archive segments (apps/chat/archive.py), which hold serialized rows; a
+    page may mix both. The reads run outside ``transaction.atomic()``, which
+    under SQLite's IMMEDIATE transactions would take the write lock.
+    """
+
     page_size = 50
-    ordering = "-created_at"
+    ordering = ("-created_at", "-id")
+    cursor_query_param = "cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+
+        if self.cursor is None:
+            reverse, position = False, None
+        else:
+            reverse, position = self.cursor.reverse, self._parse_position(self.cursor.position)
+
+        if position is not None:
+            created_at, pk = position
+            # The leading range keeps the index seek; the OR breaks ties on id.
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk),
+                    created_at__gte=created_at,
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+                    created_at__lte=created_at,
+                )
+
+        channel_id = view.kwargs["channel_id"]
+        limit = self.page_size + 1
+        if reverse:
+            # Archived rows are all older than hot ones, so they come first.
+            rows = archive.page(channel_id, position, True, limit) if position else []
+            if len(rows) < limit:
+                rows += queryset.order_by("created_at", "id")[: limit - len(rows)]
+        else:
+            rows = list(queryset.order_by("-created_at", "-id")[:limit])
+            if len(rows) < limit:
+                anchor = archive.row_key(rows[-1]) if rows else position
+                rows += archive.page(channel_id, anchor, False, limit - len(rows))
+        has_more = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        return self.page
+
+    def get_recent_response(self, rows, request):
+        """First page from already-serialized, newest-first rows."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page = rows[: self.page_size]
+        self.has_next = len(rows) > self.page_size
+        self.has_previous = False
+        return self.get_paginated_response(self.page)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=self._position(self.page[-1]))
+        )
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=True, position=self._position(self.page[0]))
+        )
+
+    @staticmethod
+    def _position(instance) -> str:
+        if isinstance(instance, dict):
+            return f"{instance['created_at']}|{instance['id']}"
+        return f"{instance.created_at.isoformat()}|{instance.id}"
+
+    def _parse_position(self, position):
+        if position is None:
+            return None
+        created_at, _, pk = position.rpartition("|")
+        try:
+            parsed = parse_datetime(created_at)
+            pk = int(pk)
+        except ValueError:
+            parsed = None
+        if parsed is None:
+            raise NotFound(self.invalid_cursor_message)
+        return parsed, pk
+
+
+class SearchCursorPagination(CursorPagination):
+    """
+    Keyset pagination over search hits in (rank, id) order, forward only.
+
+    The cursor holds the last hit's rank and id; the backend resumes after it
+    rather than re-ranking and skipping an offset.
+    """
+
+    page_size = 20
     cursor_query_param = "cursor"
 
+    def paginate_hits(self, search, request) -> list[SearchHit]:
+        """``search(limit, after)`` returns hits from the backend."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        after = self._parse_position(self.cursor.position) if self.cursor else None
+        hits = search(self.page_size + 1, after)
+        self.has_next = len(hits) > self.page_size
+        self.hits = hits[: self.page_size]
+        return self.hits
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.hits[-1]
+        # repr() round-trips the float exactly, so the keyset comparison holds.
+        return self.encode_cursor(
+            Cursor(offset=0, reverse=False, position=f"{last.rank!r}|{last.id}")
+        )
+
+    def get_previous_link(self):
+        return None
+
+    def _parse_position(self, position):
+        rank, _, pk = (position or "").rpartition("|")
+        try:
+            return SearchHit(int(pk), float(rank))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message) from None
+
 
 class ChatChannelListCreateView(generics.ListCreateAPIView):
     queryset = ChatChannel.objects.select_related("created_by").all()
@@ -29,11 +222,161 @@ class ChatMessageListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         return (
             ChatMessage.objects.filter(channel_id=self.kwargs["channel_id"])
-            .select_related("sender")
+            .select_related("sender", "blob")
         )
 
+    def list(self, request, *args, **kwargs):
+        if not hasattr(self.paginator, "get_recent_response"):
+            # A plain paginator (subclasses, benches) knows no buffer or archive.
+            return super().list(request, *args, **kwargs)
+        channel_id = self.kwargs["channel_id"]
+        if request.query_params.get(self.paginator.cursor_query_param):
+            page = self.paginator.paginate_queryset(self.get_queryset(), request, view=self)
+            # Hot rows are instances, archived rows are already serialized.
+            hot = iter(serialize_many([row for row in page if not isinstance(row, dict)]))
+            rows = [row if isinstance(row, dict) else next(hot) for row in page]
+            return self.paginator.get_paginated_response(
+                [absolute_urls(row, request) for row in rows]
+            )
+
+        # Cursorless first page: serve from the recent-message buffer.
+        rows = recent_messages.get(channel_id)
+        if rows is None:
+            version = recent_messages.version(channel_id)
+            # From the primary: a lagging replica's head would pass the version check.
+            with routers.primary():
+                latest = self.get_queryset().order_by("-created_at", "-id")[: recent_messages.size]
+                rows = serialize_many(latest)
+                # Only a buffer that holds the channel's oldest hot row reaches the archive.
+                archived = len(rows) == recent_messages.size or archive.exists(channel_id)
+            recent_messages.seed(channel_id, rows, version, archived)
+            has_archive = archived
+        else:
+            has_archive = recent_messages.archived(channel_id)
+        page_size = self.paginator.page_size
+        if len(rows) <= page_size and has_archive:
+            # Few hot rows left (or none): continue into the archive.
+            anchor = archive.row_key(rows[-1]) if rows else None
+            rows = rows + archive.page(channel_id, anchor, False, page_size + 1 - len(rows))
+        return self.paginator.get_recent_response(
+            [absolute_urls(row, request) for row in rows], request
+        )
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        response.data = absolute_urls(response.data, request)
+        return response
+
     def perform_create(self, serializer):
+        # A multipart file is stored by content too; either way the message
+        # names the shared file.
+        upload = serializer.validated_data.get("attachment")
+        blob = store(upload, upload.name) if upload else serializer.validated_data.get("blob")
         serializer.save(
             sender=self.request.user,
             channel_id=self.kwargs["channel_id"],
+            **({"blob": blob, "attachment": blob.file.name} if blob else {}),
+        )
+        recent_messages.append(self.kwargs["channel_id"], serialize(serializer.instance))
+        if chat_push.enabled:
+            async_to_sync(chat_push.message_posted)(
+                serializer.instance.channel_id, self.request.user, serializer.instance.text
+            )
+
+
+class ChatMessageSearchView(generics.GenericAPIView):
+    """
+    GET ?q=<terms>[&cursor=...]: messages in the channel matching every term,
+    best match first. See apps.chat.search for the backends.
+    """
+
+    serializer_class = ChatMessageSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SearchCursorPagination
+
+    def get(self, request, channel_id):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This query parameter is required."})
+
+        hits = self.paginator.paginate_hits(
+            lambda limit, after: search_backend.search(channel_id, query, limit, after),
+            request,
+        )
+        found = ChatMessage.objects.select_related("sender", "blob").in_bulk([hit.id for hit in hits])
+        messages = [found[hit.id] for hit in hits if hit.id in found]
+        return self.paginator.get_paginated_response(
+            [absolute_urls(row, request) for row in serialize_many(messages)]
+        )
+
+
+class ChatUploadCreateView(generics.CreateAPIView):
+    """POST {filename, size}: start a chunked upload (see apps.chat.attachments)."""
+
+    serializer_class = ChatUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class ChatUploadView(generics.GenericAPIView):
+    """
+    GET: progress, to resume from ``received``.
+    PUT: the next chunk as the raw request body, at the byte offset given in
+    the ``Upload-Offset`` header. The last chunk stores the file and returns
+    201 with the attachment; pass its ``sha256`` as ``attachment_sha256``
+    when posting the message.
+    DELETE: abandon the upload.
+    """
+
+    serializer_class = ChatUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return ChatUpload.objects.filter(user=self.request.user)
+
+    def get(self, request, pk):
+        return Response(self.get_serializer(self.get_object()).data)
+
+    def put(self, request, pk):
+        upload = self.get_object()
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            raise ValidationError({"Upload-Offset": "Byte offset header is required."}) from None
+        try:
+            write_chunk(upload, offset, request.stream or io.BytesIO())
+        except UploadConflict as exc:
+            return Response(
+                {"detail": str(exc), "received": upload.received}, status=status.HTTP_409_CONFLICT
+            )
+        except UploadError as exc:
+            raise ValidationError({"detail": str(exc)}) from None
+
+        if upload.received < upload.size:
+            return Response(self.get_serializer(upload).data)
+        attachment = finish_upload(upload)
+        return Response(
+            variant_urls(ChatAttachmentSerializer(attachment).data, request),
+            status=status.HTTP_201_CREATED,
+        )
+
+    def delete(self, request, pk):
+        discard_upload(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ChatStatsView(generics.GenericAPIView):
+    """GET: this worker's chat cache and socket queue counters, for operators."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(
+            {
+                "user_cache": user_cache.stats(),
+                "recent_messages": recent_messages.stats(),
+                "outbound": outbound_metrics.stats(),
+            }
         )
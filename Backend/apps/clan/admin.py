@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Clan, ClanMember, Defense, Hero, Troop
+from .models import Clan, ClanMember, ClanSnapshot, ClanStats, Defense, Hero, MemberUnits, Troop
 
 
 @admin.register(Clan)
@@ -10,7 +10,7 @@ class ClanAdmin(admin.ModelAdmin):
 
 @admin.register(ClanMember)
 class ClanMemberAdmin(admin.ModelAdmin):
-    list_display = ["id", "user", "clan", "role", "war_opt_in"]
+    list_display = ["id", "user", "clan", "role", "player_tag", "war_opt_in"]
 
 
 @admin.register(Hero)
@@ -26,3 +26,20 @@ class TroopAdmin(admin.ModelAdmin):
 @admin.register(Defense)
 class DefenseAdmin(admin.ModelAdmin):
     list_display = ["id", "member", "name", "level"]
+
+
+@admin.register(ClanSnapshot)
+class ClanSnapshotAdmin(admin.ModelAdmin):
+    list_display = ["clan", "version", "built_at"]
+    exclude = ["data"]
+
+
+@admin.register(ClanStats)
+class ClanStatsAdmin(admin.ModelAdmin):
+    list_display = ["clan", "member_count", "max_hero_level", "updated_at"]
+
+
+@admin.register(MemberUnits)
+class MemberUnitsAdmin(admin.ModelAdmin):
+    list_display = ["member"]
+    exclude = ["heroes", "troops", "defenses"]
@@ -5,3 +5,6 @@ class ClanConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.clan"
     label = "clan"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,150 @@
+"""
+The unit catalog: every home village hero, troop and defense, each with a
+fixed index within its kind.
+
+A member's levels of one kind pack into ``bytes`` with one byte per catalog
+entry: the level at the unit's index, or 0 where the member has no row for
+the unit (see MemberUnits and apps/clan/units.py). Levels run from 1 to 255,
+so 0 never stands for a stored level. Indices are stable because the lists
+are append-only: a new unit goes at the end of its kind, so vectors packed
+before it was added stay valid and read it as 0. Never reorder or remove an
+entry; a unit the game retires keeps its slot.
+
+This module is plain data and functions (no models), so migrations can
+import it.
+"""
+
+HEROES = (
+    "Barbarian King",
+    "Archer Queen",
+    "Grand Warden",
+    "Royal Champion",
+    "Minion Prince",
+)
+
+TROOPS = (
+    # Elixir
+    "Barbarian",
+    "Archer",
+    "Giant",
+    "Goblin",
+    "Wall Breaker",
+    "Balloon",
+    "Wizard",
+    "Healer",
+    "Dragon",
+    "P.E.K.K.A",
+    "Baby Dragon",
+    "Miner",
+    "Electro Dragon",
+    "Yeti",
+    "Dragon Rider",
+    "Electro Titan",
+    "Root Rider",
+    "Thrower",
+    # Dark elixir
+    "Minion",
+    "Hog Rider",
+    "Valkyrie",
+    "Golem",
+    "Witch",
+    "Lava Hound",
+    "Bowler",
+    "Ice Golem",
+    "Headhunter",
+    "Apprentice Warden",
+    "Druid",
+    # Siege machines
+    "Wall Wrecker",
+    "Battle Blimp",
+    "Stone Slammer",
+    "Siege Barracks",
+    "Log Launcher",
+    "Flame Flinger",
+    "Battle Drill",
+    # Pets
+    "L.A.S.S.I",
+    "Electro Owl",
+    "Mighty Yak",
+    "Unicorn",
+    "Frosty",
+    "Diggy",
+    "Poison Lizard",
+    "Phoenix",
+    "Spirit Fox",
+    "Angry Jelly",
+)
+
+DEFENSES = (
+    "Cannon",
+    "Archer Tower",
+    "Mortar",
+    "Air Defense",
+    "Wizard Tower",
+    "Air Sweeper",
+    "Hidden Tesla",
+    "Bomb Tower",
+    "X-Bow",
+    "Inferno Tower",
+    "Eagle Artillery",
+    "Scattershot",
+    "Builder's Hut",
+    "Spell Tower",
+    "Monolith",
+    "Multi-Archer Tower",
+    "Ricochet Cannon",
+    "Firespitter",
+    "Multi-Gear Tower",
+    "Wall",
+    "Bomb",
+    "Spring Trap",
+    "Air Bomb",
+    "Giant Bomb",
+    "Seeking Air Mine",
+    "Skeleton Trap",
+    "Tornado Trap",
+    "Giga Bomb",
+)
+
+CATALOG = {"heroes": HEROES, "troops": TROOPS, "defenses": DEFENSES}
+INDEX = {kind: {name: i for i, name in enumerate(names)} for kind, names in CATALOG.items()}
+# Hero, Troop and Defense validate level against these. 0 is not a level: a
+# vector byte of 0 means the member has no row for the unit.
+MIN_LEVEL = 1
+MAX_LEVEL = 255
+
+
+def check(name: str, level: int) -> None:
+    """Raise ValueError unless ``level`` fits in a vector byte and does not read as absent."""
+    if not MIN_LEVEL <= level <= MAX_LEVEL:
+        raise ValueError(f"{name} level {level} is out of range ({MIN_LEVEL}-{MAX_LEVEL}).")
+
+
+def pack(kind: str, levels: dict[str, int]) -> tuple[bytes, list[str]]:
+    """
+    The packed vector of ``levels`` (name -> level) and the names that are
+    not in the catalog, which it cannot hold.
+    """
+    index = INDEX[kind]
+    vector = bytearray(len(index))
+    unknown = []
+    for name, level in levels.items():
+        i = index.get(name)
+        if i is None:
+            unknown.append(name)
+            continue
+        check(name, level)
+        vector[i] = level
+    return bytes(vector.rstrip(b"\0")), unknown
+
+
+def unpack(kind: str, vector: bytes) -> dict[str, int]:
+    """The unlocked units of a packed vector, name -> level, in catalog order."""
+    names = CATALOG[kind]
+    return {names[i]: level for i, level in enumerate(vector) if level}
+
+
+def level(kind: str, vector: bytes, name: str) -> int:
+    """One unit's level in a packed vector (0 if not unlocked)."""
+    i = INDEX[kind][name]
+    return vector[i] if i < len(vector) else 0
@@ -0,0 +1,166 @@
+"""
+Sync member progress from Clash of Clans player JSON.
+
+A clan dump is the clan's tag and one player object per member, as the game
+API's ``/players/{tag}`` returns it::
+
+    {"tag": "#2PP", "players": [{"tag": "#8Q2", "heroes": [...], "troops": [...]}]}
+
+Each unit is ``{"name": ..., "level": ..., "village": "home"}``; builder base
+units are skipped. The game API has no buildings, so ``defenses`` is this
+app's own key, in the same shape.
+
+``sync_clan`` reads the clan's current units with one ``values_list`` query
+per table, diffs the dump against them in memory and writes only the
+difference in one transaction: ``bulk_create`` for new units,
+``bulk_update`` for changed levels and one raw ``DELETE`` per table for units
+no longer listed. A re-sync with nothing changed writes nothing. Only the
+unit kinds present in a player object are synced, so a dump without
+``defenses`` leaves them alone.
+
+Bulk writes send no signals, so ``sync_clan`` invalidates the roster
+snapshot itself, hands the levels it added and removed to ``stats.update``
+as deltas and repacks the changed members' MemberUnits.
+
+Players are matched to members by ``ClanMember.player_tag``; players with no
+member in the app are counted as unmatched and skipped.
+"""
+
+from dataclasses import dataclass, field
+
+from django.db import connection, transaction
+
+from . import catalog, roster, stats, units
+from .models import Clan, ClanMember
+
+KINDS = units.MODELS
+
+
+class DumpError(ValueError):
+    pass
+
+
+@dataclass
+class SyncResult:
+    clan_tag: str
+    players: int = 0
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    unmatched: list[str] = field(default_factory=list)
+
+    @property
+    def writes(self) -> int:
+        return self.created + self.updated + self.deleted
+
+
+def _players(dump) -> tuple[str, list[dict]]:
+    """The clan tag and player objects of a dump, checked for shape."""
+    try:
+        tag, players = dump["tag"], dump["players"]
+    except (KeyError, TypeError):
+        raise DumpError("A clan dump needs 'tag' and 'players'.") from None
+    if not isinstance(players, list):
+        raise DumpError("'players' must be a list of player objects.")
+    for i, player in enumerate(players):
+        if not isinstance(player, dict) or not isinstance(player.get("tag"), str):
+            raise DumpError(f"Player {i}: expected an object with a 'tag', got {player!r:.80}")
+        for kind in KINDS:
+            if kind in player and not isinstance(player[kind], list):
+                raise DumpError(f"Player {player['tag']}: {kind} must be a list")
+    return tag, players
+
+
+def _units(player: dict, kind: str) -> dict[str, int]:
+    units = {}
+    for unit in player[kind]:
+        if not isinstance(unit, dict):
+            raise DumpError(f"Player {player['tag']}: bad {kind} entry {unit!r}")
+        if unit.get("village", "home") != "home":
+            continue
+        try:
+            name, level = str(unit["name"]), int(unit["level"])
+        except (KeyError, TypeError, ValueError):
+            raise DumpError(f"Player {player['tag']}: bad {kind} entry {unit!r}") from None
+        try:
+            catalog.check(name, level)
+        except ValueError as e:
+            raise DumpError(f"Player {player['tag']}: {e}") from None
+        units[name] = level
+    return units
+
+
+def sync_clan(dump: dict, *, dry_run: bool = False) -> SyncResult:
+    """Bring the units of one clan's members in line with ``dump``."""
+    tag, players = _players(dump)
+    clan = Clan.objects.filter(tag=tag).first()
+    if clan is None:
+        raise DumpError(f"No clan with tag {tag}.")
+
+    result = SyncResult(clan_tag=tag, players=len(players))
+    members = dict(
+        ClanMember.objects.filter(clan=clan).exclude(player_tag="").values_list("player_tag", "id")
+    )
+    changes, added, removed, touched = {}, {}, {}, set()
+    for kind, model in KINDS.items():
+        current = {
+            (member_id, name): (pk, level)
+            for pk, member_id, name, level in model.objects.filter(
+                member_id__in=members.values()
+            ).values_list("id", "member_id", "name", "level")
+        }
+        create, update, old_levels, synced = [], [], [], set()
+        for player in players:
+            member_id = members.get(player["tag"])
+            if member_id is None or kind not in player:
+                continue
+            synced.add(member_id)
+            for name, level in _units(player, kind).items():
+                existing = current.pop((member_id, name), None)
+                if existing is None:
+                    create.append(model(member_id=member_id, name=name, level=level))
+                elif existing[1] != level:
+                    update.append(model(id=existing[0], member_id=member_id, level=level))
+                    old_levels.append(existing[1])
+                else:
+                    result.unchanged += 1
+        # What is left of a synced member's units is no longer listed.
+        delete = []
+        for (owner, _), (pk, level) in current.items():
+            if owner in synced:
+                delete.append(pk)
+                old_levels.append(level)
+                touched.add(owner)
+        changes[model] = (create, update, delete)
+        touched.update(unit.member_id for unit in create + update)
+        added[model] = [unit.level for unit in create + update]
+        removed[model] = old_levels
+        result.created += len(create)
+        result.updated += len(update)
+        result.deleted += len(delete)
+    result.unmatched = [p["tag"] for p in players if p["tag"] not in members]
+
+    if dry_run or not result.writes:
+        return result
+    with transaction.atomic():
+        for model, (create, update, delete) in changes.items():
+            model.objects.bulk_create(create, batch_size=2000)
+            model.objects.bulk_update(update, ["level"], batch_size=500)
+            _delete(model, delete)
+        # Bulk writes send no signals.
+        roster.invalidate([clan.pk])
+        stats.update(clan.pk, added=added, removed=removed)
+        units.repack(touched)
+    return result
+
+
+def _delete(model, ids: list[int]) -> None:
+    # Raw DELETE: a queryset delete would load every row to send post_delete.
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), 500):
+            batch = ids[start : start + 500]
+            cursor.execute(
+                f"DELETE FROM {table} WHERE id IN ({', '.join(['%s'] * len(batch))})", batch
+            )
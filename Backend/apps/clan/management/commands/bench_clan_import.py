@@ -0,0 +1,157 @@
+import io
+import json
+import random
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from apps.clan import importer
+from apps.clan.models import Clan, ClanMember, Hero
+from config.benchmark import Timer, benchmark_database
+
+# 80 units per player, in the game's proportions.
+UNITS = {"heroes": 6, "troops": 44, "defenses": 30}
+FIXTURE = Path(__file__).resolve().parents[2] / "testdata" / "clan_dump.json"
+
+
+def naive_sync(dump):
+    """Row by row: one update_or_create per unit, the importer's baseline."""
+    with transaction.atomic():
+        for player in dump["players"]:
+            member = ClanMember.objects.get(clan__tag=dump["tag"], player_tag=player["tag"])
+            for kind, model in importer.KINDS.items():
+                for unit in player[kind]:
+                    model.objects.update_or_create(
+                        member=member, name=unit["name"], defaults={"level": unit["level"]}
+                    )
+
+
+class Command(BaseCommand):
+    help = "Sync clan dumps from files: diff + bulk writes vs row-by-row update_or_create."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clans", type=int, default=50)
+        parser.add_argument("--members", type=int, default=50)
+        parser.add_argument("--change", type=float, default=0.05, help="Share of units changed.")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(1)
+        with tempfile.TemporaryDirectory() as tmp, benchmark_database():
+            self.owner = User.objects.create_user(username="owner")
+            self._check()
+
+            dumps = [self._clan(n, opts["members"], rng) for n in range(opts["clans"])]
+            units = opts["clans"] * opts["members"] * sum(UNITS.values())
+            self.stdout.write(
+                f"{opts['clans']} clans x {opts['members']} players x "
+                f"{sum(UNITS.values())} units ({units:,} rows)"
+            )
+            self._sync("initial import", dumps, tmp)
+            for dump in dumps:
+                for player in dump["players"]:
+                    for kind in UNITS:
+                        for unit in player[kind]:
+                            if rng.random() < opts["change"]:
+                                unit["level"] += 1
+            self._sync(f"re-sync, {opts['change']:.0%} changed", dumps, tmp)
+            self._sync("re-sync, unchanged", dumps, tmp)
+
+            for dump in dumps[:2]:
+                for player in dump["players"]:
+                    for kind in UNITS:
+                        for unit in player[kind]:
+                            if rng.random() < opts["change"]:
+                                unit["level"] += 1
+            with CaptureQueriesContext(connection) as queries, Timer() as t:
+                for dump in dumps[:2]:
+                    naive_sync(dump)
+            per_clan = t.elapsed / 2
+            self.stdout.write(
+                f"{'update_or_create':>24}: {per_clan * 1000:8.1f}ms and "
+                f"{len(queries) // 2:,} queries per clan "
+                f"(~{per_clan * opts['clans']:.1f}s for {opts['clans']} clans)"
+            )
+
+    def _clan(self, n, members, rng):
+        tag = f"#C{n:04d}"
+        clan = Clan.objects.create(name=f"clan {n}", tag=tag, created_by=self.owner)
+        users = User.objects.bulk_create(
+            User(username=f"c{n}-{i}") for i in range(members)
+        )
+        ClanMember.objects.bulk_create(
+            ClanMember(clan=clan, user=u, player_tag=f"#P{n:04d}{i:03d}")
+            for i, u in enumerate(users)
+        )
+        players = [
+            {
+                "tag": f"#P{n:04d}{i:03d}",
+                **{
+                    kind: [
+                        {"name": f"{kind}-{j:02d}", "level": rng.randint(1, 15), "village": "home"}
+                        for j in range(count)
+                    ]
+                    for kind, count in UNITS.items()
+                },
+            }
+            for i in range(members)
+        ]
+        return {"tag": tag, "players": players}
+
+    def _sync(self, label, dumps, tmp):
+        """Write every dump to a file and time the import command over the directory."""
+        for path in Path(tmp).glob("*.json"):
+            path.unlink()
+        for dump in dumps:
+            (Path(tmp) / f"{dump['tag'][1:]}.json").write_text(json.dumps(dump))
+        with CaptureQueriesContext(connection) as queries, Timer() as t:
+            call_command("import_players", tmp, stdout=io.StringIO())
+        writes = sum(
+            not q["sql"].startswith(("SELECT", "SAVEPOINT", "RELEASE", "BEGIN", "COMMIT"))
+            for q in queries.captured_queries
+        )
+        self.stdout.write(
+            f"{label:>24}: {t.elapsed:6.2f}s, {t.elapsed / len(dumps) * 1000:6.1f}ms per clan; "
+            f"{len(queries):,} queries ({writes:,} writes)"
+        )
+
+    def _check(self):
+        """Behaviour against the sample dump: the 'tests' of the importer."""
+        dump = json.loads(FIXTURE.read_text())
+        clan = Clan.objects.create(name=dump["name"], tag=dump["tag"], created_by=self.owner)
+        chief, elder = (
+            ClanMember.objects.create(
+                clan=clan, user=User.objects.create_user(username=p["name"]), player_tag=p["tag"]
+            )
+            for p in dump["players"][:2]
+        )
+        # A unit the dump no longer lists, and one whose level it changes.
+        Hero.objects.create(member=chief, name="Royal Champion", level=20)
+        Hero.objects.create(member=chief, name="Barbarian King", level=70)
+
+        result = importer.sync_clan(dump, dry_run=True)
+        if Hero.objects.filter(member__clan=clan).count() != 2:
+            raise CommandError("A dry run wrote.")
+        result = importer.sync_clan(dump)
+        expect = (result.created, result.updated, result.deleted, result.unmatched)
+        if expect != (12, 1, 1, ["#PLV0G8U2"]):
+            raise CommandError(f"First sync: {result}")
+        levels = dict(chief.heroes.values_list("name", "level"))
+        if levels != {"Barbarian King": 75, "Archer Queen": 80, "Grand Warden": 50}:
+            raise CommandError(f"Chief's heroes after sync: {levels}")
+        if elder.defenses.exists():
+            raise CommandError("A dump without defenses created some.")
+
+        with CaptureQueriesContext(connection) as queries:
+            result = importer.sync_clan(dump)
+        if result.writes or len(queries) != 5:
+            raise CommandError(f"An unchanged re-sync: {result}, {len(queries)} queries")
+        self.stdout.write(
+            "checks: sample dump syncs, builder base skipped, stale units deleted, "
+            "dry run and unchanged re-sync write nothing (5 reads)"
+        )
+
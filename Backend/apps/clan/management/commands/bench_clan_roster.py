@@ -0,0 +1,133 @@
+import json
+import statistics
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.clan import roster
+from apps.clan.models import Clan, ClanMember, Defense, Hero, Troop
+from apps.clan.serializers import ClanRosterSerializer
+from apps.clan.views import ClanRosterView
+from config.benchmark import Timer, benchmark_database
+
+# 80 units per member, in the game's proportions.
+UNITS = {Hero: 6, Troop: 44, Defense: 30}
+
+
+def naive(clan_id):
+    """The roster without prefetching: every member's relations load lazily."""
+    return JSONRenderer().render(ClanRosterSerializer(Clan.objects.get(pk=clan_id)).data)
+
+
+class Command(BaseCommand):
+    help = "Clan roster reads at 50 members x 80 units: lazy loading vs prefetch vs snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=50)
+        parser.add_argument("--reps", type=int, default=30)
+
+    def handle(self, *args, **opts):
+        with benchmark_database():
+            self.owner = User.objects.create_user(username="owner")
+            small = self._clan("small", 5)
+            clan = self._clan("big", opts["members"])
+            self._check(small, clan)
+
+            self.stdout.write(f"{opts['members']} members x {sum(UNITS.values())} units")
+            self.stdout.write(f"{'path':>18} {'queries':>8} {'p50':>9} {'p95':>9}")
+            with override_settings(CLAN_ROSTER_SNAPSHOTS=False):
+                self._row("lazy (2 + 4N)", lambda: naive(clan.pk), opts["reps"])
+                self._row("prefetch", lambda: roster.build(clan.pk), opts["reps"])
+            roster.get(clan.pk)
+            self._row("snapshot hit", lambda: roster.get(clan.pk), opts["reps"] * 10)
+
+            def rebuild():
+                roster.invalidate([clan.pk])
+                return roster.get(clan.pk)
+
+            self._row("change + rebuild", rebuild, opts["reps"])
+
+            view = ClanRosterView.as_view()
+            factory = APIRequestFactory(SERVER_NAME="localhost")
+
+            def request():
+                req = factory.get(f"/api/clans/{clan.pk}/roster/")
+                force_authenticate(req, self.owner)
+                return view(req, pk=clan.pk)
+
+            self._row("GET roster/ (view)", request, opts["reps"] * 10)
+            size = len(roster.get(clan.pk))
+            self.stdout.write(f"roster JSON: {size / 1024:,.0f} KiB")
+
+    def _clan(self, name, members):
+        clan = Clan.objects.create(name=name, tag=f"#{name.upper()}", created_by=self.owner)
+        users = User.objects.bulk_create(
+            User(username=f"{name}-{i}") for i in range(members)
+        )
+        rows = ClanMember.objects.bulk_create(ClanMember(clan=clan, user=u) for u in users)
+        for model, count in UNITS.items():
+            prefix = model.__name__.lower()
+            model.objects.bulk_create(
+                model(member=m, name=f"{prefix}-{i:02d}", level=1 + (i * 7 + m.pk) % 15)
+                for m in rows
+                for i in range(count)
+            )
+        return clan
+
+    def _queries(self, fn):
+        with CaptureQueriesContext(connection) as queries:
+            result = fn()
+        return result, len(queries)
+
+    def _check(self, small, clan):
+        """Query counts: the 'tests' of this module."""
+        with override_settings(CLAN_ROSTER_SNAPSHOTS=False):
+            for c in (small, clan):
+                data, count = self._queries(lambda c=c: roster.build(c.pk))
+                if count != 5:
+                    raise CommandError(f"prefetch took {count} queries for {c.name}")
+                lazy, count = self._queries(lambda c=c: naive(c.pk))
+                members = c.members.count()
+                if count != 2 + 4 * members or lazy != data:
+                    raise CommandError(f"lazy roster: {count} queries, same JSON: {lazy == data}")
+
+        roster.get(clan.pk)
+        _, hit = self._queries(lambda: roster.get(clan.pk))
+        if hit != 1:
+            raise CommandError(f"A snapshot hit took {hit} queries.")
+
+        hero = Hero.objects.filter(member__clan=clan).first()
+        hero.level += 1
+        hero.save()
+        data, rebuild = self._queries(lambda: roster.get(clan.pk))
+        if rebuild != 1 + 5 + 1:
+            raise CommandError(f"A rebuild took {rebuild} queries (read, build, store).")
+        member = next(m for m in json.loads(data)["members"] if m["id"] == hero.member_id)
+        if member["heroes"][0] != {"name": hero.name, "level": hero.level}:
+            raise CommandError("The snapshot served stale data after a unit changed.")
+        leaving = ClanMember.objects.filter(clan=clan).last()
+        leaving_id = leaving.pk
+        leaving.delete()
+        if leaving_id in {m["id"] for m in json.loads(roster.get(clan.pk))["members"]}:
+            raise CommandError("The snapshot served stale data after a member left.")
+        self.stdout.write(
+            "checks: prefetch 5 queries at 5 and 50 members; snapshot hit 1 query, "
+            "invalidated by unit and member changes"
+        )
+
+    def _row(self, label, fn, reps):
+        _, count = self._queries(fn)
+        times = []
+        for _ in range(reps):
+            with Timer() as t:
+                fn()
+            times.append(t.elapsed)
+        p95 = statistics.quantiles(times, n=20)[-1]
+        self.stdout.write(
+            f"{label:>18} {count:>8} {statistics.median(times) * 1000:7.2f}ms {p95 * 1000:7.2f}ms"
+        )
@@ -0,0 +1,161 @@
+import io
+import random
+import statistics
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+from apps.clan import importer, stats
+from apps.clan.models import Clan, ClanMember, ClanStats, Hero, Troop
+from config.benchmark import Timer, benchmark_database
+
+UNITS = {Hero: 6, Troop: 44}
+ROLES = list(ClanMember.Role)
+
+
+class Command(BaseCommand):
+    help = "Clan dashboard stats: aggregate queries per view vs the delta-maintained row."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clans", type=int, default=500)
+        parser.add_argument("--members", type=int, default=30)
+        parser.add_argument("--reps", type=int, default=200)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(1)
+        with benchmark_database():
+            self.owner = User.objects.create_user(username="owner")
+            self._check(rng)
+
+            with Timer() as t:
+                clans = [self._clan(f"c{n}", opts["members"], rng) for n in range(opts["clans"])]
+            rows = opts["clans"] * opts["members"] * sum(UNITS.values())
+            self.stdout.write(
+                f"{opts['clans']} clans x {opts['members']} members x {sum(UNITS.values())} "
+                f"units ({rows:,} rows), seeded in {t.elapsed:.1f}s"
+            )
+            # Bulk inserts skip the signals: the repair command builds every row.
+            ClanStats.objects.all().delete()
+            with Timer() as t:
+                call_command("repair_clan_stats", stdout=io.StringIO())
+            self.stdout.write(f"repair_clan_stats, all clans: {t.elapsed:.2f}s")
+
+            picks = [rng.choice(clans).pk for _ in range(opts["reps"])]
+            self.stdout.write(f"{'':>22} {'queries':>8} {'p50':>9} {'p95':>9}")
+            self._row("aggregate per view", lambda i: stats.compute([picks[i]]), opts["reps"])
+            self._row("ClanStats row", lambda i: stats.get(picks[i]), opts["reps"])
+
+            heroes = list(Hero.objects.filter(member__clan_id__in=picks)[: opts["reps"]])
+
+            def level_up(i):
+                hero = heroes[i % len(heroes)]
+                hero.level += 1
+                hero.save()
+
+            self._row("hero save (+ delta)", level_up, len(heroes))
+            self._verify(picks)
+
+    def _clan(self, name, members, rng):
+        clan = Clan.objects.create(name=name, tag=f"#{name.upper()}", created_by=self.owner)
+        users = User.objects.bulk_create(User(username=f"{name}-{i}") for i in range(members))
+        rows = ClanMember.objects.bulk_create(
+            ClanMember(clan=clan, user=u, role=rng.choice(ROLES)) for u in users
+        )
+        for model, count in UNITS.items():
+            model.objects.bulk_create(
+                model(member=m, name=f"{model.__name__.lower()}-{j:02d}", level=rng.randint(1, 90))
+                for m in rows
+                for j in range(count)
+            )
+        return clan
+
+    def _verify(self, clan_ids):
+        clan_ids = sorted(set(clan_ids))
+        fresh = stats.compute(clan_ids)
+        stored = {
+            row["clan"]: row
+            for row in ClanStats.objects.filter(clan__in=clan_ids).values("clan", *stats.FIELDS)
+        }
+        for clan_id, values in fresh.items():
+            row = stored.get(clan_id)
+            if row is None or any(row[f] != v for f, v in values.items()):
+                raise CommandError(f"clan {clan_id}: stored {row}, computed {values}")
+
+    def _check(self, rng):
+        """Every kind of change, then stored == recomputed: the 'tests' of this module."""
+        a = self._clan("alpha", 5, rng)
+        b = self._clan("bravo", 5, rng)
+        stats.rebuild([a.pk, b.pk])
+        with CaptureQueriesContext(connection) as queries:
+            stats.get(a.pk)
+        if len(queries) != 1:
+            raise CommandError(f"A stats read took {len(queries)} queries.")
+
+        top = Hero.objects.filter(member__clan=a).order_by("-level").first()
+        top.level = 1  # lowers the maximum
+        top.save()
+        hero = Hero.objects.filter(member__clan=a).first()
+        hero.level = 99  # raises it
+        hero.save()
+        member = ClanMember.objects.filter(clan=a).first()
+        Hero.objects.create(member=member, name="Minion Prince", level=40)
+        Troop.objects.filter(member=member)[0].delete()
+        Troop.objects.filter(member=member, level__lt=30).delete()
+        member.role = ClanMember.Role.LEADER if member.role != "leader" else ClanMember.Role.ELDER
+        member.save()
+        newcomer = ClanMember.objects.create(
+            clan=a, user=User.objects.create_user(username="newcomer"), player_tag="#NEW"
+        )
+        Troop.objects.create(member=newcomer, name="Giant", level=5)
+        ClanMember.objects.filter(clan=a).exclude(pk=newcomer.pk).last().delete()
+        ClanMember.objects.filter(clan=b).last().user.delete()
+        mover = ClanMember.objects.filter(clan=b).first()
+        mover.clan = a
+        mover.save()
+        hero = Hero.objects.filter(member__clan=b).first()
+        hero.member = ClanMember.objects.filter(clan=a).first()
+        hero.save()
+        importer.sync_clan(
+            {
+                "tag": a.tag,
+                "players": [
+                    {
+                        "tag": "#NEW",
+                        "heroes": [{"name": "Barbarian King", "level": 95}],
+                        "troops": [{"name": "Dragon", "level": 3}],
+                    }
+                ],
+            }
+        )
+        self._verify([a.pk, b.pk])
+
+        ClanStats.objects.filter(pk=a.pk).update(member_count=0, max_hero_level=1)
+        out = io.StringIO()
+        call_command("repair_clan_stats", clan=[a.pk, b.pk], stdout=out)
+        if "fixed 1" not in out.getvalue():
+            raise CommandError(f"repair_clan_stats: {out.getvalue()}")
+        self._verify([a.pk, b.pk])
+        Clan.objects.filter(pk__in=[a.pk, b.pk]).delete()
+        self.stdout.write(
+            "checks: stats read 1 query; unit, member, role, user, move and import "
+            "deltas match a recompute; repair fixes drift"
+        )
+
+    def _row(self, label, fn, reps):
+        # The debug query log is capped: a full one makes the capture count 0.
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            fn(0)
+        times = []
+        for i in range(reps):
+            with Timer() as t:
+                fn(i)
+            times.append(t.elapsed)
+        p95 = statistics.quantiles(times, n=20)[-1]
+        self.stdout.write(
+            f"{label:>22} {len(queries):>8} {statistics.median(times) * 1000:7.3f}ms "
+            f"{p95 * 1000:7.3f}ms"
+        )
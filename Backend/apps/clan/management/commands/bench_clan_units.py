@@ -0,0 +1,255 @@
+import io
+import random
+import statistics
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+
+from apps.clan import catalog, importer, signals, units
+from apps.clan.models import Clan, ClanMember, Hero, MemberUnits
+from config.benchmark import Timer, benchmark_database
+
+ROW_TABLES = [model._meta.db_table for model in units.MODELS.values()]
+PACKED_TABLE = MemberUnits._meta.db_table
+
+
+def row_levels(member_id):
+    """A member's levels from the row tables, shaped like ``units.levels``."""
+    return {
+        kind: dict(model.objects.filter(member_id=member_id).values_list("name", "level"))
+        for kind, model in units.MODELS.items()
+    }
+
+
+def row_clan_levels(clan_id):
+    result = {}
+    for kind, model in units.MODELS.items():
+        rows = model.objects.filter(member__clan_id=clan_id).values_list("member_id", "name", "level")
+        for member_id, name, level in rows:
+            result.setdefault(member_id, {k: {} for k in units.MODELS})[kind][name] = level
+    return result
+
+
+def row_clan_matrix(clan_id, kind):
+    model, index = units.MODELS[kind], catalog.INDEX[kind]
+    ids = list(
+        ClanMember.objects.filter(clan_id=clan_id).order_by("pk").values_list("pk", flat=True)
+    )
+    position = {member_id: i for i, member_id in enumerate(ids)}
+    matrix = np.zeros((len(ids), len(index)), dtype=np.uint8)
+    rows = model.objects.filter(member__clan_id=clan_id).values_list("member_id", "name", "level")
+    for member_id, name, level in rows:
+        if name in index:
+            matrix[position[member_id], index[name]] = level
+    return np.array(ids), matrix
+
+
+class Command(BaseCommand):
+    help = "Unit levels as one row per unit vs one packed row per member: storage and reads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=10_000)
+        parser.add_argument("--clan-size", type=int, default=50)
+        parser.add_argument("--reps", type=int, default=200)
+
+    def handle(self, *args, **opts):
+        rng = random.Random(1)
+        with benchmark_database():
+            self.owner = User.objects.create_user(username="owner")
+            self._check()
+
+            with Timer() as t:
+                clans = self._seed(opts["members"], opts["clan_size"], rng)
+            rows = sum(m.objects.count() for m in units.MODELS.values())
+            self.stdout.write(
+                f"{opts['members']:,} members, {rows:,} unit rows, seeded in {t.elapsed:.1f}s"
+            )
+            with Timer() as t:
+                call_command("repack_units", stdout=io.StringIO())
+            self.stdout.write(f"repack_units (the data migration's work): {t.elapsed:.2f}s")
+            self._storage(rows, opts["members"])
+
+            clan_ids = [rng.choice(clans) for _ in range(opts["reps"])]
+            member_ids = list(
+                ClanMember.objects.order_by("?").values_list("pk", flat=True)[: opts["reps"]]
+            )
+            reps = min(opts["reps"], len(member_ids))
+            self.stdout.write(f"{'read':>24} {'layout':>7} {'queries':>8} {'p50':>9} {'p95':>9}")
+            self._pair(
+                "one member",
+                lambda i: row_levels(member_ids[i]),
+                lambda i: units.levels(member_ids[i]),
+                reps,
+            )
+            self._pair(
+                "one unit of a member",
+                lambda i: Hero.objects.filter(member_id=member_ids[i], name="Archer Queen")
+                .values_list("level", flat=True)
+                .first(),
+                lambda i: catalog.level(
+                    "heroes",
+                    MemberUnits.objects.filter(pk=member_ids[i])
+                    .values_list("heroes", flat=True)
+                    .first(),
+                    "Archer Queen",
+                ),
+                reps,
+            )
+            self._pair(
+                f"clan of {opts['clan_size']}",
+                lambda i: row_clan_levels(clan_ids[i]),
+                lambda i: units.clan_levels(clan_ids[i]),
+                reps,
+            )
+            self._pair(
+                "clan troop matrix",
+                lambda i: row_clan_matrix(clan_ids[i], "troops"),
+                lambda i: units.clan_matrix(clan_ids[i], "troops"),
+                reps,
+            )
+            self._write_cost(member_ids, reps)
+
+    def _seed(self, members, clan_size, rng):
+        clans = []
+        for n in range(0, members, clan_size):
+            clan = Clan.objects.create(name=f"clan {n}", tag=f"#C{n}", created_by=self.owner)
+            users = User.objects.bulk_create(
+                User(username=f"m{n + i}") for i in range(min(clan_size, members - n))
+            )
+            rows = ClanMember.objects.bulk_create(ClanMember(clan=clan, user=u) for u in users)
+            for kind, model in units.MODELS.items():
+                model.objects.bulk_create(
+                    (
+                        model(member=m, name=name, level=rng.randint(1, 40))
+                        for m in rows
+                        for name in catalog.CATALOG[kind]
+                        # Late-game units are not unlocked by everyone.
+                        if rng.random() < 0.9
+                    ),
+                    batch_size=5000,
+                )
+            clans.append(clan.pk)
+        return clans
+
+    def _storage(self, rows, members):
+        """Bytes of each layout's tables and their indexes."""
+        if connection.vendor == "sqlite":
+            sql = (
+                "SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat s "
+                "JOIN sqlite_master m ON m.name = s.name GROUP BY m.tbl_name"
+            )
+        elif connection.vendor == "postgresql":
+            sql = (
+                "SELECT relname, pg_total_relation_size(oid) FROM pg_class "
+                "WHERE relkind = 'r'"
+            )
+        else:
+            self.stdout.write(f"storage: not measured on {connection.vendor}")
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            sizes = dict(cursor.fetchall())
+        per_row = sum(sizes[t] for t in ROW_TABLES)
+        packed = sizes[PACKED_TABLE]
+        self.stdout.write(
+            f"storage, tables + indexes: rows {per_row / 2**20:,.1f} MiB "
+            f"({per_row / rows:.0f} B/unit), packed {packed / 2**20:,.1f} MiB "
+            f"({packed / members:.0f} B/member), {per_row / packed:.1f}x smaller"
+        )
+        # The rows stay, so the packed table is added on top of them.
+        self.stdout.write(
+            f"storage kept, both layouts: {(per_row + packed) / 2**20:,.1f} MiB "
+            f"(+{packed / per_row:.1%} over the rows alone)"
+        )
+
+    def _write_cost(self, member_ids, reps):
+        """One hero level save, with and without the write into the packed row."""
+        heroes = list(Hero.objects.filter(member_id__in=member_ids[:reps], name="Archer Queen"))
+        self.stdout.write(f"{'write':>24} {'packed':>7} {'queries':>8} {'p50':>9} {'p95':>9}")
+        for packed in (False, True):
+            if not packed:
+                post_save.disconnect(signals.pack_unit, sender=Hero)
+            try:
+                times, count = [], None
+                for hero in heroes:
+                    hero.level = hero.level % 40 + 1
+                    with CaptureQueriesContext(connection) as queries, Timer() as t:
+                        hero.save()
+                    times.append(t.elapsed)
+                    count = len(queries) if count is None else count
+            finally:
+                post_save.connect(signals.pack_unit, sender=Hero)
+            p95 = statistics.quantiles(times, n=20)[-1]
+            self.stdout.write(
+                f"{'hero level save' if not packed else '':>24} {'yes' if packed else 'no':>7} "
+                f"{count:>8} {statistics.median(times) * 1000:7.3f}ms {p95 * 1000:7.3f}ms"
+            )
+
+    def _check(self):
+        """Packed reads match the rows through every write path: the 'tests' of this module."""
+        clan = Clan.objects.create(name="check", tag="#CHECK", created_by=self.owner)
+        member = ClanMember.objects.create(
+            clan=clan, user=User.objects.create_user(username="check"), player_tag="#P1"
+        )
+        Hero.objects.create(member=member, name="Archer Queen", level=80)
+        Hero.objects.create(member=member, name="Sea Serpent", level=3)  # not in the catalog
+        hero = Hero.objects.create(member=member, name="Grand Warden", level=50)
+        hero.level = 51
+        hero.save()
+        Hero.objects.filter(name="Archer Queen").delete()
+        importer.sync_clan(
+            {
+                "tag": clan.tag,
+                "players": [
+                    {
+                        "tag": "#P1",
+                        "troops": [{"name": "Dragon", "level": 9}, {"name": "Angry Jelly", "level": 2}],
+                        "defenses": [{"name": "Cannon", "level": 21}],
+                    }
+                ],
+            }
+        )
+        expected = row_levels(member.pk)
+        del expected["heroes"]["Sea Serpent"]
+        if units.levels(member.pk) != expected:
+            raise CommandError(f"packed {units.levels(member.pk)} != rows {expected}")
+        if units.repack([member.pk]) != {"Sea Serpent"}:
+            raise CommandError("repack did not report the unit missing from the catalog.")
+        ids, matrix = units.clan_matrix(clan.pk, "troops")
+        if matrix[0, catalog.INDEX["troops"]["Dragon"]] != 9 or list(ids) != [member.pk]:
+            raise CommandError(f"clan_matrix: {ids} {matrix}")
+        for level in (0, catalog.MAX_LEVEL + 1):
+            try:
+                Hero.objects.create(member=member, name="Royal Champion", level=level)
+            except ValueError:
+                continue
+            raise CommandError(f"A hero save at level {level} was packed instead of refused.")
+        vector, _ = catalog.pack("troops", {"Barbarian": 1})
+        if len(vector) != 1 or catalog.level("troops", vector, "Angry Jelly") != 0:
+            raise CommandError("A short vector must read units past its end as 0.")
+        clan.delete()
+        self.stdout.write(
+            "checks: packed levels follow creates, saves, deletes and imports; "
+            "unknown units reported; out-of-range levels refused; short vectors read as 0"
+        )
+
+    def _pair(self, label, rows_fn, packed_fn, reps):
+        for layout, fn in (("rows", rows_fn), ("packed", packed_fn)):
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                fn(0)
+            times = []
+            for i in range(reps):
+                with Timer() as t:
+                    fn(i)
+                times.append(t.elapsed)
+            p95 = statistics.quantiles(times, n=20)[-1]
+            self.stdout.write(
+                f"{label if layout == 'rows' else '':>24} {layout:>7} {len(queries):>8} "
+                f"{statistics.median(times) * 1000:7.3f}ms {p95 * 1000:7.3f}ms"
+            )
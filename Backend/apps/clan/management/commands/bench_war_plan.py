@@ -0,0 +1,154 @@
+import itertools
+import math
+import statistics
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.clan import war
+from apps.clan.models import Clan, ClanMember, Defense, Hero, Troop
+from apps.clan.views import ClanWarPlanView
+from config.benchmark import Timer, benchmark_database
+
+# 80 units per member, in the game's proportions.
+UNITS = {Hero: 6, Troop: 44, Defense: 30}
+BUDGET = 0.100  # seconds, for a whole 50v50 plan
+
+
+def python_stars(ours, theirs):
+    """The expected-stars matrix with a Python loop per pair, for comparison."""
+    attack = [war.HERO_WEIGHT * h + t for h, t in zip(ours.heroes, ours.troops, strict=True)]
+    defense = [d + war.HERO_WEIGHT * h for d, h in zip(theirs.defenses, theirs.heroes, strict=True)]
+    joined = attack + defense
+    mean = sum(joined) / len(joined)
+    std = math.sqrt(sum((x - mean) ** 2 for x in joined) / len(joined)) or 1.0
+    return [
+        [3.0 / (1.0 + math.exp(-war.SLOPE * ((a - mean) / std - (d - mean) / std))) for d in defense]
+        for a in attack
+    ]
+
+
+def greedy(stars):
+    """Best remaining pair first: the obvious heuristic the exact solver replaces."""
+    order = np.dstack(np.unravel_index(np.argsort(-stars, axis=None), stars.shape))[0]
+    rows, cols, total = set(), set(), 0.0
+    for i, j in order:
+        if i not in rows and j not in cols:
+            rows.add(i)
+            cols.add(j)
+            total += stars[i, j]
+    return total
+
+
+class Command(BaseCommand):
+    help = "War planning for 50v50: matrix build, scoring and exact assignment, under 100 ms."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--members", type=int, default=50)
+        parser.add_argument("--reps", type=int, default=50)
+
+    def handle(self, *args, **opts):
+        self._check_assign()
+        with benchmark_database():
+            self.owner = User.objects.create_user(username="owner")
+            rng = np.random.default_rng(1)
+            ours = self._clan("ours", opts["members"], rng)
+            theirs = self._clan("theirs", opts["members"], rng)
+            self._check_plan(ours, theirs, opts["members"])
+
+            sides = war.load([ours.pk, theirs.pk])
+            a, b = sides[ours.pk], sides[theirs.pk]
+            stars = war.expected_stars(a, b)
+            view = ClanWarPlanView.as_view()
+            factory = APIRequestFactory(SERVER_NAME="localhost")
+
+            def request():
+                req = factory.get(f"/api/clans/{ours.pk}/war-plan/", {"opponent": theirs.pk})
+                force_authenticate(req, self.owner)
+                response = view(req, pk=ours.pk)
+                response.render()
+                return response
+
+            self.stdout.write(f"{opts['members']}v{opts['members']}, {sum(UNITS.values())} units each")
+            self._row("load (4 queries)", lambda: war.load([ours.pk, theirs.pk]), opts["reps"])
+            self._row("score (numpy)", lambda: war.expected_stars(a, b), opts["reps"])
+            self._row("score (python)", lambda: python_stars(a, b), opts["reps"])
+            self._row("assign (exact)", lambda: war.assign(-stars), opts["reps"])
+            self._row("greedy", lambda: greedy(stars), opts["reps"])
+            p50 = self._row("GET war-plan/", request, opts["reps"])
+
+            optimal = stars[np.arange(len(stars)), war.assign(-stars)].sum()
+            self.stdout.write(
+                f"expected stars: exact {optimal:.2f}, greedy {greedy(stars):.2f}"
+            )
+            if p50 > BUDGET:
+                raise CommandError(f"A plan took {p50 * 1000:.1f}ms, over {BUDGET * 1000:.0f}ms.")
+
+    def _clan(self, name, members, rng):
+        clan = Clan.objects.create(name=name, tag=f"#{name.upper()}", created_by=self.owner)
+        users = User.objects.bulk_create(User(username=f"{name}-{i}") for i in range(members))
+        rows = ClanMember.objects.bulk_create(ClanMember(clan=clan, user=u) for u in users)
+        # A spread of town halls: unit levels scale with a per-member progress.
+        progress = rng.uniform(0.2, 1.0, members)
+        for model, count in UNITS.items():
+            levels = np.clip(rng.normal(progress[:, None] * 15, 1.5, (members, count)), 1, 15)
+            model.objects.bulk_create(
+                model(member=m, name=f"{model.__name__.lower()}-{j:02d}", level=int(levels[i, j]))
+                for i, m in enumerate(rows)
+                for j in range(count)
+            )
+        # One member sitting this war out.
+        ClanMember.objects.filter(pk=rows[-1].pk).update(war_opt_in=False)
+        return clan
+
+    def _check_assign(self):
+        """The solver against brute force: the 'tests' of this module."""
+        rng = np.random.default_rng(0)
+        for shape in [(1, 1), (4, 4), (6, 6), (4, 7), (7, 4), (5, 5)]:
+            for _ in range(20):
+                cost = rng.integers(0, 10, shape).astype(float)
+                rows, cols = shape
+                best = min(
+                    sum(cost[i, j] for i, j in zip(range(rows), perm, strict=True))
+                    if rows <= cols
+                    else sum(cost[i, j] for i, j in zip(perm, range(cols), strict=True))
+                    for perm in itertools.permutations(range(max(shape)), min(shape))
+                )
+                result = war.assign(cost)
+                picked = [(i, j) for i, j in enumerate(result) if j >= 0]
+                if len(picked) != min(shape) or len({j for _, j in picked}) != len(picked):
+                    raise CommandError(f"Not an assignment for {shape}: {result}")
+                total = sum(cost[i, j] for i, j in picked)
+                if not math.isclose(total, best):
+                    raise CommandError(f"Assignment cost {total}, optimum {best}, for\n{cost}")
+        self.stdout.write("checks: exact assignment matches brute force on square and rectangular")
+
+    def _check_plan(self, ours, theirs, members):
+        with CaptureQueriesContext(connection) as queries:
+            attacks = war.plan(ours.pk, theirs.pk)
+        if len(queries) != 4:
+            raise CommandError(f"A plan took {len(queries)} queries.")
+        opted_out = set(
+            ClanMember.objects.filter(war_opt_in=False).values_list("id", flat=True)
+        )
+        targets = [a.target for a in attacks]
+        if len(attacks) != members - 1 or len(set(targets)) != len(targets):
+            raise CommandError(f"{len(attacks)} attacks on {len(set(targets))} bases.")
+        if opted_out & ({a.attacker for a in attacks} | set(targets)):
+            raise CommandError("A member who opted out is in the plan.")
+        self.stdout.write("checks: 4 queries, one attack per opted-in member, distinct bases")
+
+    def _row(self, label, fn, reps):
+        times = []
+        for _ in range(reps):
+            with Timer() as t:
+                fn()
+            times.append(t.elapsed)
+        p50 = statistics.median(times)
+        p95 = statistics.quantiles(times, n=20)[-1]
+        self.stdout.write(f"{label:>18} {p50 * 1000:8.2f}ms {p95 * 1000:8.2f}ms")
+        return p50
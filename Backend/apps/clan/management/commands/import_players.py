@@ -0,0 +1,47 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.clan.importer import DumpError, sync_clan
+
+
+class Command(BaseCommand):
+    help = (
+        "Sync member hero, troop and defense levels from clan dumps (JSON files of "
+        "game API player objects; see apps/clan/importer.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Dump files, or directories of *.json dumps.")
+        parser.add_argument("--dry-run", action="store_true", help="Report changes without writing.")
+
+    def handle(self, *args, **opts):
+        files = []
+        for path in map(Path, opts["paths"]):
+            if path.is_dir():
+                files += sorted(path.glob("*.json"))
+            elif path.exists():
+                files.append(path)
+            else:
+                raise CommandError(f"{path}: no such file or directory")
+
+        failed = 0
+        for path in files:
+            try:
+                result = sync_clan(json.loads(path.read_text()), dry_run=opts["dry_run"])
+            except (DumpError, json.JSONDecodeError) as exc:
+                self.stderr.write(f"{path}: {exc}")
+                failed += 1
+                continue
+            self.stdout.write(
+                f"{result.clan_tag}: {result.players} players, {result.created} created, "
+                f"{result.updated} updated, {result.deleted} deleted, "
+                f"{result.unchanged} unchanged"
+            )
+            if result.unmatched:
+                self.stderr.write(
+                    f"{result.clan_tag}: no member with tag {', '.join(result.unmatched)}"
+                )
+        if failed:
+            raise CommandError(f"{failed} of {len(files)} dumps failed.")
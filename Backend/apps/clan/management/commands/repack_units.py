@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from apps.clan import units
+from apps.clan.models import ClanMember
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild every member's packed unit levels (MemberUnits) from the hero, "
+        "troop and defense rows; see apps/clan/units.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clan", type=int, action="append", help="Only these clan ids.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        members = ClanMember.objects.order_by("pk")
+        if opts["clan"]:
+            members = members.filter(clan_id__in=opts["clan"])
+        member_ids = list(members.values_list("pk", flat=True))
+        unknown = set()
+        for start in range(0, len(member_ids), opts["batch_size"]):
+            unknown |= units.repack(member_ids[start : start + opts["batch_size"]])
+        self.stdout.write(f"{len(member_ids)} members repacked")
+        if unknown:
+            self.stderr.write(f"not in the catalog, kept as rows only: {', '.join(sorted(unknown))}")
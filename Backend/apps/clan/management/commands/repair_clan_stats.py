@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from apps.clan import stats
+from apps.clan.models import Clan, ClanStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute ClanStats from the member, hero and troop rows and fix rows "
+        "that drifted (see apps/clan/stats.py)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clan", type=int, action="append", help="Only these clan ids.")
+        parser.add_argument("--dry-run", action="store_true", help="Report drift without writing.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **opts):
+        clans = Clan.objects.order_by("pk")
+        if opts["clan"]:
+            clans = clans.filter(pk__in=opts["clan"])
+        clan_ids = list(clans.values_list("pk", flat=True))
+
+        drifted = []
+        for start in range(0, len(clan_ids), opts["batch_size"]):
+            batch = clan_ids[start : start + opts["batch_size"]]
+            stored = {
+                row["clan"]: row
+                for row in ClanStats.objects.filter(clan__in=batch).values("clan", *stats.FIELDS)
+            }
+            for clan_id, fresh in stats.compute(batch).items():
+                row = stored.get(clan_id)
+                if row is None:
+                    self.stdout.write(f"clan {clan_id}: missing")
+                    drifted.append(clan_id)
+                    continue
+                wrong = {f: (row[f], v) for f, v in fresh.items() if row[f] != v}
+                if wrong:
+                    detail = ", ".join(f"{f} {old} -> {new}" for f, (old, new) in wrong.items())
+                    self.stdout.write(f"clan {clan_id}: {detail}")
+                    drifted.append(clan_id)
+
+        if drifted and not opts["dry_run"]:
+            stats.rebuild(drifted, batch_size=opts["batch_size"])
+        verb = "would fix" if opts["dry_run"] else "fixed"
+        self.stdout.write(f"{len(clan_ids)} clans checked, {verb} {len(drifted)}")
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clan', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClanSnapshot',
+            fields=[
+                ('clan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='clan.clan')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('data', models.TextField(blank=True, null=True)),
+                ('built_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
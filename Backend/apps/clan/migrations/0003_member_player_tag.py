@@ -0,0 +1,24 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clan', '0002_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clanmember',
+            name='player_tag',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='clanmember',
+            constraint=models.UniqueConstraint(condition=models.Q(('player_tag', ''), _negated=True), fields=('clan', 'player_tag'), name='clan_member_unique_player_tag'),
+        ),
+    ]
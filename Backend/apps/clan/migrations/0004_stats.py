@@ -0,0 +1,31 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clan', '0003_member_player_tag'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClanStats',
+            fields=[
+                ('clan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='clan.clan')),
+                ('member_count', models.IntegerField(default=0)),
+                ('leaders', models.IntegerField(default=0)),
+                ('co_leaders', models.IntegerField(default=0)),
+                ('elders', models.IntegerField(default=0)),
+                ('members', models.IntegerField(default=0)),
+                ('hero_count', models.IntegerField(default=0)),
+                ('hero_level_sum', models.BigIntegerField(default=0)),
+                ('max_hero_level', models.IntegerField(default=0)),
+                ('troop_count', models.IntegerField(default=0)),
+                ('troop_level_sum', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clan', '0004_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberUnits',
+            fields=[
+                ('member', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='packed_units', serialize=False, to='clan.clanmember')),
+                ('heroes', models.BinaryField(default=b'')),
+                ('troops', models.BinaryField(default=b'')),
+                ('defenses', models.BinaryField(default=b'')),
+            ],
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+from apps.clan import catalog
+
+KINDS = {"heroes": "Hero", "troops": "Troop", "defenses": "Defense"}
+
+
+def pack_members(apps, schema_editor):
+    ClanMember = apps.get_model("clan", "ClanMember")
+    MemberUnits = apps.get_model("clan", "MemberUnits")
+    models = {kind: apps.get_model("clan", name) for kind, name in KINDS.items()}
+    # Rows saved before levels were validated may hold levels a byte cannot,
+    # or 0, which a vector reads as "no row". Refuse rather than pack them
+    # as something else: fix or delete these rows, then migrate again.
+    bad = [
+        f"{KINDS[kind]} {pk} (member {member_id}): level {level}"
+        for kind, model in models.items()
+        for pk, member_id, level in model.objects.exclude(
+            level__range=(catalog.MIN_LEVEL, catalog.MAX_LEVEL)
+        ).values_list("pk", "member_id", "level")[:20]
+    ]
+    if bad:
+        raise ValueError(
+            f"Unit levels outside {catalog.MIN_LEVEL}-{catalog.MAX_LEVEL} cannot be packed: "
+            + "; ".join(bad)
+        )
+    member_ids = list(ClanMember.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(member_ids), 500):
+        batch = member_ids[start : start + 500]
+        levels = {member_id: {kind: {} for kind in KINDS} for member_id in batch}
+        for kind, model in models.items():
+            rows = model.objects.filter(member_id__in=batch).values_list("member_id", "name", "level")
+            for member_id, name, level in rows:
+                levels[member_id][kind][name] = level
+        # Units missing from the catalog stay in the row tables only.
+        MemberUnits.objects.bulk_create(
+            MemberUnits(
+                member_id=member_id,
+                **{kind: catalog.pack(kind, by_name)[0] for kind, by_name in kinds.items()},
+            )
+            for member_id, kinds in levels.items()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("clan", "0005_member_units"),
+    ]
+
+    operations = [
+        migrations.RunPython(pack_members, migrations.RunPython.noop),
+    ]
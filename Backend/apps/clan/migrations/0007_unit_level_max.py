@@ -0,0 +1,29 @@
+# Generated by Django 5.1.15 on 2026-10-18 04:38
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clan', '0006_pack_member_units'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='defense',
+            name='level',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MaxValueValidator(255)]),
+        ),
+        migrations.AlterField(
+            model_name='hero',
+            name='level',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MaxValueValidator(255)]),
+        ),
+        migrations.AlterField(
+            model_name='troop',
+            name='level',
+            field=models.PositiveIntegerField(default=1, validators=[django.core.validators.MaxValueValidator(255)]),
+        ),
+    ]
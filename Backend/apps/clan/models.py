@@ -3,8 +3,11 @@ Placeholder models for future Clash of Clans clan features.
 """
 
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
+from . import catalog
+
 
 class Clan(models.Model):
     name = models.CharField(max_length=255)
@@ -37,11 +40,20 @@ class ClanMember(models.Model):
     )
     role = models.CharField(
         max_length=20, choices=Role.choices, default=Role.MEMBER)
+    # In-game player tag ("#2PP..."), matched by the importer (apps.clan.importer).
+    player_tag = models.CharField(max_length=20, blank=True)
     war_opt_in = models.BooleanField(default=True)
     joined_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ["clan", "user"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["clan", "player_tag"],
+                condition=~models.Q(player_tag=""),
+                name="clan_member_unique_player_tag",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} ({self.clan.name})"
@@ -53,7 +65,10 @@ class Hero(models.Model):
     member = models.ForeignKey(
         ClanMember, on_delete=models.CASCADE, related_name="heroes")
     name = models.CharField(max_length=100)
-    level = models.PositiveIntegerField(default=1)
+    level = models.PositiveIntegerField(
+        default=1,
+        validators=[MinValueValidator(catalog.MIN_LEVEL), MaxValueValidator(catalog.MAX_LEVEL)],
+    )
 
     def __str__(self):
         return f"{self.name} Lv{self.level}"
@@ -65,7 +80,10 @@ class Troop(models.Model):
     member = models.ForeignKey(
         ClanMember, on_delete=models.CASCADE, related_name="troops")
     name = models.CharField(max_length=100)
-    level = models.PositiveIntegerField(default=1)
+    level = models.PositiveIntegerField(
+        default=1,
+        validators=[MinValueValidator(catalog.MIN_LEVEL), MaxValueValidator(catalog.MAX_LEVEL)],
+    )
 
     def __str__(self):
         return f"{self.name} Lv{self.level}"
@@ -77,7 +95,80 @@ class Defense(models.Model):
     member = models.ForeignKey(
         ClanMember, on_delete=models.CASCADE, related_name="defenses")
     name = models.CharField(max_length=100)
-    level = models.PositiveIntegerField(default=1)
+    level = models.PositiveIntegerField(
+        default=1,
+        validators=[MinValueValidator(catalog.MIN_LEVEL), MaxValueValidator(catalog.MAX_LEVEL)],
+    )
 
     def __str__(self):
         return f"{self.name} Lv{self.level}"
+
+
+class ClanSnapshot(models.Model):
+    """
+    The serialized roster of one clan (apps.clan.roster), served as stored.
+    Any change to the clan bumps ``version`` and clears ``data``; the next
+    read rebuilds it.
+    """
+
+    clan = models.OneToOneField(
+        Clan, on_delete=models.CASCADE, primary_key=True, related_name="snapshot")
+    version = models.PositiveBigIntegerField(default=0)
+    data = models.TextField(null=True, blank=True)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Roster of clan {self.clan_id} (v{self.version})"
+
+
+class ClanStats(models.Model):
+    """
+    Dashboard aggregates of one clan (apps.clan.stats), kept current by
+    adding deltas on every member and unit change instead of recomputing.
+    Signed on purpose: a row that drifted (bulk writes that skipped the
+    deltas) must not make a delete fail; repair_clan_stats fixes it.
+    """
+
+    clan = models.OneToOneField(
+        Clan, on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    member_count = models.IntegerField(default=0)
+    # By role; ``members`` counts the plain Member role.
+    leaders = models.IntegerField(default=0)
+    co_leaders = models.IntegerField(default=0)
+    elders = models.IntegerField(default=0)
+    members = models.IntegerField(default=0)
+    hero_count = models.IntegerField(default=0)
+    hero_level_sum = models.BigIntegerField(default=0)
+    max_hero_level = models.IntegerField(default=0)
+    troop_count = models.IntegerField(default=0)
+    troop_level_sum = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def avg_hero_level(self) -> float:
+        return self.hero_level_sum / self.hero_count if self.hero_count else 0.0
+
+    @property
+    def avg_troop_level(self) -> float:
+        return self.troop_level_sum / self.troop_count if self.troop_count else 0.0
+
+    def __str__(self):
+        return f"Stats of clan {self.clan_id}"
+
+
+class MemberUnits(models.Model):
+    """
+    A member's hero, troop and defense levels packed one byte per unit, at
+    the unit's index in apps.clan.catalog: about 80 bytes in one row instead
+    of 80 rows. Kept in step with the Hero/Troop/Defense rows by
+    apps.clan.units; units not in the catalog exist only as rows.
+    """
+
+    member = models.OneToOneField(
+        ClanMember, on_delete=models.CASCADE, primary_key=True, related_name="packed_units")
+    heroes = models.BinaryField(default=b"")
+    troops = models.BinaryField(default=b"")
+    defenses = models.BinaryField(default=b"")
+
+    def __str__(self):
+        return f"Units of member {self.member_id}"
@@ -0,0 +1,100 @@
+"""
+Clan rosters: a clan with every member and their hero, troop and defense
+levels.
+
+Loading one naively costs 2 + 4N queries for N members (the clan, its members,
+then per member its user and each of its three unit lists). ``roster_queryset``
+fetches it in five, whatever the clan's size: the clan, its members joined to
+their users, then all heroes, all troops and all defenses of those members,
+one ``IN`` query each.
+
+With ``CLAN_ROSTER_SNAPSHOTS`` on, the serialized roster is also kept in
+ClanSnapshot and served as stored: a hit is one single-row read and no
+serialization. Saving or deleting a clan, member, unit or member's user
+bumps the snapshot's ``version`` and clears it (apps/clan/signals.py), in the
+same transaction as the change. The next read rebuilds it and stores the
+result only if the version it started from is still current, so a rebuild
+racing a change cannot store stale data. Rebuilds read the primary: rows
+from a lagging replica would pass that check. Bulk writes that skip signals
+(``bulk_create``, ``QuerySet.update``) call ``invalidate`` themselves.
+
+Neither a hit nor a rebuild runs in ``transaction.atomic()``: with SQLite's
+IMMEDIATE transactions (config/database.py) that would hold the write lock
+for the whole build. Only the first read of a clan opens a savepoint, in the
+``get_or_create`` that writes its snapshot row.
+"""
+
+from django.conf import settings
+from django.db.models import F, Prefetch
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from config import routers
+
+from .models import Clan, ClanMember, ClanSnapshot, Defense, Hero, Troop
+from .serializers import ClanRosterSerializer
+
+
+def roster_queryset():
+    # (member_id, id) is the order the member_id index already yields.
+    units = {
+        name: Prefetch(name, queryset=model.objects.order_by("member_id", "id"))
+        for name, model in (("heroes", Hero), ("troops", Troop), ("defenses", Defense))
+    }
+    members = ClanMember.objects.select_related("user").prefetch_related(*units.values())
+    return Clan.objects.prefetch_related(Prefetch("members", queryset=members.order_by("id")))
+
+
+def build(clan_id: int) -> bytes | None:
+    """The roster JSON of a clan from its rows, or None if there is no such clan."""
+    clan = roster_queryset().filter(pk=clan_id).first()
+    if clan is None:
+        return None
+    return JSONRenderer().render(ClanRosterSerializer(clan).data)
+
+
+def get(clan_id: int) -> bytes | None:
+    """The roster JSON of a clan: from its snapshot when current, else rebuilt."""
+    if not settings.CLAN_ROSTER_SNAPSHOTS:
+        return build(clan_id)
+    stored = ClanSnapshot.objects.filter(pk=clan_id).values_list("data", "version")
+    row = stored.first()
+    if row is not None and row[0] is not None:
+        return row[0].encode()
+
+    with routers.primary():
+        row = stored.first()
+        if row is not None and row[0] is not None:
+            return row[0].encode()  # rebuilt since the replica's copy
+        if row is None:
+            if not Clan.objects.filter(pk=clan_id).exists():
+                return None
+            # Created before the build, so a change made while building bumps it.
+            snapshot, _ = ClanSnapshot.objects.get_or_create(clan_id=clan_id)
+            version = snapshot.version
+        else:
+            version = row[1]
+        data = build(clan_id)
+    if data is not None:
+        ClanSnapshot.objects.filter(pk=clan_id, version=version).update(
+            data=data.decode(), built_at=timezone.now()
+        )
+    return data
+
+
+def invalidate(clan_ids=None, *, member_ids=None, user_ids=None) -> None:
+    """Mark the snapshots of these clans (or those of these members or users) stale."""
+    snapshots = ClanSnapshot.objects.all()
+    if clan_ids is not None:
+        snapshots = snapshots.filter(clan_id__in=clan_ids)
+    elif member_ids is not None:
+        snapshots = snapshots.filter(
+            clan_id__in=ClanMember.objects.filter(pk__in=member_ids).values("clan_id")
+        )
+    elif user_ids is not None:
+        snapshots = snapshots.filter(
+            clan_id__in=ClanMember.objects.filter(user_id__in=user_ids).values("clan_id")
+        )
+    else:
+        raise ValueError("Pass clan_ids, member_ids or user_ids.")
+    snapshots.update(version=F("version") + 1, data=None)
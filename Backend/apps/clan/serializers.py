@@ -0,0 +1,83 @@
+from rest_framework import serializers
+
+from . import stats
+from .models import Clan, ClanMember, ClanStats, Defense, Hero, Troop
+
+
+class HeroSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Hero
+        fields = ["name", "level"]
+
+
+class TroopSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Troop
+        fields = ["name", "level"]
+
+
+class DefenseSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Defense
+        fields = ["name", "level"]
+
+
+class ClanMemberSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source="user.username", read_only=True)
+    heroes = HeroSerializer(many=True, read_only=True)
+    troops = TroopSerializer(many=True, read_only=True)
+    defenses = DefenseSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ClanMember
+        fields = [
+            "id",
+            "user",
+            "username",
+            "role",
+            "player_tag",
+            "war_opt_in",
+            "joined_at",
+            "heroes",
+            "troops",
+            "defenses",
+        ]
+
+
+class ClanSerializer(serializers.ModelSerializer):
+    member_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Clan
+        fields = ["id", "name", "tag", "description", "member_count", "created_at"]
+
+
+class ClanRosterSerializer(serializers.ModelSerializer):
+    """A clan with every member's progress; build it from roster.roster_queryset()."""
+
+    members = ClanMemberSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Clan
+        fields = ["id", "name", "tag", "description", "created_at", "members"]
+
+
+class ClanStatsSerializer(serializers.ModelSerializer):
+    roles = serializers.SerializerMethodField()
+    avg_hero_level = serializers.FloatField(read_only=True)
+    avg_troop_level = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ClanStats
+        fields = [
+            "clan",
+            "member_count",
+            "roles",
+            "avg_hero_level",
+            "max_hero_level",
+            "avg_troop_level",
+            "updated_at",
+        ]
+
+    def get_roles(self, obj):
+        return {str(role): getattr(obj, field) for role, field in stats.ROLE_FIELDS.items()}
@@ -0,0 +1,183 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import catalog, roster, stats, units
+from .models import Clan, ClanMember, ClanStats, Defense, Hero, MemberUnits, Troop
+
+User = get_user_model()
+_KINDS = {model: kind for kind, model in units.MODELS.items()}
+
+
+def _cascade_from(origin, *models) -> bool:
+    """True if a delete started at an instance or queryset of one of ``models``."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in models
+
+
+@receiver(post_save, sender=Clan)
+def invalidate_roster_on_clan(sender, instance, created, **kwargs):
+    if not created:
+        roster.invalidate([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=ClanMember)
+def invalidate_roster_on_member(sender, instance, origin=None, **kwargs):
+    # Deleting the clan removes its snapshot too.
+    if not _cascade_from(origin, Clan):
+        # A member that moved leaves the clan it was in (see stash_member).
+        previous = getattr(instance, "_previous", None)
+        roster.invalidate({instance.clan_id, previous[0] if previous else instance.clan_id})
+
+
+@receiver([post_save, post_delete], sender=Hero)
+@receiver([post_save, post_delete], sender=Troop)
+@receiver([post_save, post_delete], sender=Defense)
+def invalidate_roster_on_unit(sender, instance, origin=None, **kwargs):
+    # A cascade from a member, clan or user is covered by the member's handler.
+    if not _cascade_from(origin, Clan, ClanMember, User):
+        roster.invalidate(member_ids=[instance.member_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_roster_on_user(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login, which no roster shows.
+    if not created and (update_fields is None or set(update_fields) != {"last_login"}):
+        roster.invalidate(user_ids=[instance.pk])
+
+
+# ── Stats: deltas into ClanStats (apps/clan/stats.py) ────────────────
+# Fixture loads (raw saves) are skipped: run repair_clan_stats after loaddata.
+
+
+@receiver(post_save, sender=Clan)
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        ClanStats.objects.get_or_create(clan=instance)
+
+
+def _stash_previous(instance, *fields):
+    """The values the row had before this save, or None for a new row."""
+    instance._previous = (
+        type(instance).objects.filter(pk=instance.pk).values_list(*fields).first()
+        if instance.pk is not None
+        else None
+    )
+
+
+@receiver(pre_save, sender=ClanMember)
+def stash_member(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _stash_previous(instance, "clan_id", "role")
+
+
+@receiver(post_save, sender=ClanMember)
+def count_member(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous", None)
+    if previous is None:
+        stats.update(instance.clan_id, roles={instance.role: 1})
+        return
+    clan_id, role = previous
+    if clan_id != instance.clan_id:
+        # The member's units moved clans with it.
+        stats.rebuild([clan_id, instance.clan_id])
+    elif role != instance.role:
+        stats.update(clan_id, roles={role: -1, instance.role: 1})
+
+
+@receiver(pre_delete, sender=ClanMember)
+def stash_member_units(sender, instance, origin=None, **kwargs):
+    # A deleted clan takes its stats row with it.
+    if not _cascade_from(origin, Clan):
+        instance._stats_units = {
+            model: list(model.objects.filter(member_id=instance.pk).values_list("level", flat=True))
+            for model in stats.UNIT_FIELDS
+        }
+
+
+@receiver(post_delete, sender=ClanMember)
+def uncount_member(sender, instance, origin=None, **kwargs):
+    units = instance.__dict__.pop("_stats_units", None)
+    if units is not None:
+        stats.update(instance.clan_id, roles={instance.role: -1}, removed=units)
+
+
+@receiver(pre_save, sender=Hero)
+@receiver(pre_save, sender=Troop)
+@receiver(pre_save, sender=Defense)
+def check_unit_level(sender, instance, raw=False, **kwargs):
+    # save() does not run validators, and a packed vector cannot hold the level.
+    if not raw:
+        catalog.check(instance.name, instance.level)
+
+
+@receiver(pre_save, sender=Hero)
+@receiver(pre_save, sender=Troop)
+@receiver(pre_save, sender=Defense)
+def stash_unit(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _stash_previous(instance, "member_id", "level", "name")
+
+
+@receiver(post_save, sender=Hero)
+@receiver(post_save, sender=Troop)
+def count_unit(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous", None)
+    if previous is None:
+        stats.update(member_id=instance.member_id, added={sender: [instance.level]})
+        return
+    member_id, level, _ = previous
+    if member_id != instance.member_id:
+        stats.update(member_id=member_id, removed={sender: [level]})
+        stats.update(member_id=instance.member_id, added={sender: [instance.level]})
+    elif level != instance.level:
+        stats.update(
+            member_id=member_id, added={sender: [instance.level]}, removed={sender: [level]}
+        )
+
+
+@receiver(post_delete, sender=Hero)
+@receiver(post_delete, sender=Troop)
+def uncount_unit(sender, instance, origin=None, **kwargs):
+    # A cascade from a member, clan or user is covered by the member's handler.
+    if not _cascade_from(origin, Clan, ClanMember, User):
+        stats.update(member_id=instance.member_id, removed={sender: [instance.level]})
+
+
+# ── Packed units: MemberUnits (apps/clan/units.py) ───────────────────
+# Raw saves are skipped here too: run repack_units after loaddata.
+
+
+@receiver(post_save, sender=ClanMember)
+def create_member_units(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        MemberUnits.objects.get_or_create(member=instance)
+
+
+@receiver(post_save, sender=Hero)
+@receiver(post_save, sender=Troop)
+@receiver(post_save, sender=Defense)
+def pack_unit(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    kind = _KINDS[sender]
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        member_id, _, name = previous
+        if (member_id, name) != (instance.member_id, instance.name):
+            units.set_levels(member_id, kind, {name: None})
+    units.set_levels(instance.member_id, kind, {instance.name: instance.level})
+
+
+@receiver(post_delete, sender=Hero)
+@receiver(post_delete, sender=Troop)
+@receiver(post_delete, sender=Defense)
+def unpack_unit(sender, instance, origin=None, **kwargs):
+    # A deleted member takes its MemberUnits row with it.
+    if not _cascade_from(origin, Clan, ClanMember, User):
+        units.set_levels(instance.member_id, _KINDS[sender], {instance.name: None})
@@ -0,0 +1,154 @@
+"""
+Clan dashboard statistics: member count, members by role, average and
+maximum hero level and average troop level.
+
+Aggregating members, heroes and troops on every dashboard view costs three
+grouped scans of the clan's rows. Instead each clan has a ClanStats row that
+holds counts and level sums, which every change adjusts by its delta in one
+``UPDATE ... SET x = x + delta`` (``update``):
+
+- apps/clan/signals.py reports single saves and deletes of members, heroes
+  and troops, with the values they had before (read in ``pre_save``).
+- apps/clan/importer.py reports the levels its bulk writes added and removed.
+
+Averages are sum / count, so they follow from deltas. A maximum does not: it
+rises with ``GREATEST`` but can only fall by looking at the remaining rows.
+That recompute (one aggregate subquery) runs only when a level at or above
+the stored maximum was removed or lowered, never for a level going up.
+
+``rebuild`` recomputes rows from scratch, for clans whose row is missing and
+for ``repair_clan_stats``; it reads the primary, since the stored row is
+trusted until the next delta. ``get`` is the dashboard's read: one row lookup.
+"""
+
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from config import routers
+
+from .models import Clan, ClanMember, ClanStats, Hero, Troop
+
+ROLE_FIELDS = {
+    ClanMember.Role.LEADER: "leaders",
+    ClanMember.Role.CO_LEADER: "co_leaders",
+    ClanMember.Role.ELDER: "elders",
+    ClanMember.Role.MEMBER: "members",
+}
+UNIT_FIELDS = {Hero: ("hero_count", "hero_level_sum"), Troop: ("troop_count", "troop_level_sum")}
+FIELDS = [
+    "member_count",
+    *ROLE_FIELDS.values(),
+    *(field for pair in UNIT_FIELDS.values() for field in pair),
+    "max_hero_level",
+]
+
+
+def _max_hero_level():
+    return Coalesce(
+        Subquery(
+            Hero.objects.filter(member__clan_id=OuterRef("clan_id"))
+            .values("member__clan_id")
+            .annotate(level=Max("level"))
+            .values("level")
+        ),
+        Value(0),
+    )
+
+
+def update(clan_id=None, *, member_id=None, roles=None, added=None, removed=None) -> None:
+    """
+    Apply a change to the stats of ``clan_id`` (or of ``member_id``'s clan).
+
+    ``roles`` maps roles to member count deltas; ``added`` and ``removed``
+    map unit models to the levels of units added and removed (models other
+    than Hero and Troop are ignored). A level change is the old level removed
+    and the new one added.
+    """
+    roles, added, removed = roles or {}, added or {}, removed or {}
+    changes = {}
+    if any(roles.values()):
+        changes["member_count"] = F("member_count") + sum(roles.values())
+        for role, delta in roles.items():
+            field = ROLE_FIELDS[role]
+            changes[field] = F(field) + delta
+    for model, (count, total) in UNIT_FIELDS.items():
+        plus, minus = added.get(model, ()), removed.get(model, ())
+        if plus or minus:
+            changes[count] = F(count) + (len(plus) - len(minus))
+            changes[total] = F(total) + (sum(plus) - sum(minus))
+    if added.get(Hero):
+        changes["max_hero_level"] = Greatest(F("max_hero_level"), Value(max(added[Hero])))
+    if not changes:
+        return
+
+    if clan_id is not None:
+        stats = ClanStats.objects.filter(pk=clan_id)
+    else:
+        clan_id = Subquery(ClanMember.objects.filter(pk=member_id).values("clan_id"))
+        stats = ClanStats.objects.filter(pk=clan_id)
+    if not stats.update(**changes, updated_at=timezone.now()):
+        # No row yet: the rows as they are now already include this change.
+        rebuild(Clan.objects.filter(pk=clan_id).values_list("pk", flat=True))
+    elif removed.get(Hero) and max(removed[Hero]) > max(added.get(Hero) or [0]):
+        # Only a removed level above everything added can have been the maximum.
+        stats.filter(max_hero_level__lte=max(removed[Hero])).update(
+            max_hero_level=_max_hero_level()
+        )
+
+
+def compute(clan_ids) -> dict[int, dict]:
+    """Fresh stats for these clans, from three grouped aggregate queries."""
+    clan_ids = list(clan_ids)
+    result = {clan_id: dict.fromkeys(FIELDS, 0) for clan_id in clan_ids}
+    members = (
+        ClanMember.objects.filter(clan_id__in=clan_ids)
+        .values_list("clan_id", "role")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    for clan_id, role, n in members:
+        result[clan_id]["member_count"] += n
+        result[clan_id][ROLE_FIELDS[role]] = n
+    for model, (count, total) in UNIT_FIELDS.items():
+        aggregates = {"n": Count("id"), "total": Sum("level")}
+        if model is Hero:
+            aggregates["top"] = Max("level")
+        rows = (
+            model.objects.filter(member__clan_id__in=clan_ids)
+            .values("member__clan_id")
+            .annotate(**aggregates)
+            .order_by()
+        )
+        for row in rows:
+            stats = result[row["member__clan_id"]]
+            stats[count], stats[total] = row["n"], row["total"]
+            if model is Hero:
+                stats["max_hero_level"] = row["top"]
+    return result
+
+
+def rebuild(clan_ids, *, batch_size=500) -> int:
+    """Recompute and store the stats of these clans; returns how many."""
+    with routers.primary():
+        clan_ids = list(clan_ids)
+        now = timezone.now()
+        for start in range(0, len(clan_ids), batch_size):
+            fresh = compute(clan_ids[start : start + batch_size])
+            ClanStats.objects.bulk_create(
+                [ClanStats(clan_id=pk, updated_at=now, **values) for pk, values in fresh.items()],
+                update_conflicts=True,
+                unique_fields=["clan"],
+                update_fields=[*FIELDS, "updated_at"],
+            )
+    return len(clan_ids)
+
+
+def get(clan_id: int) -> ClanStats | None:
+    """The stats of a clan: one row, built on first use."""
+    stats = ClanStats.objects.filter(pk=clan_id).first()
+    if stats is None:
+        with routers.primary():
+            if rebuild(Clan.objects.filter(pk=clan_id).values_list("pk", flat=True)):
+                stats = ClanStats.objects.get(pk=clan_id)
+    return stats
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from apps.clan.importer import DumpError, sync_clan
+from apps.clan.models import Clan, ClanMember, Hero
+
+
+class DumpShapeTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username="owner")
+        self.clan = Clan.objects.create(name="Raiders", tag="#RAID", created_by=owner)
+        ClanMember.objects.create(clan=self.clan, user=owner, player_tag="#P1")
+
+    def test_malformed_dumps_raise_dump_error(self):
+        hero = {"name": "Archer Queen", "level": 90}
+        cases = {
+            "not an object": [],
+            "players not a list": {"tag": "#RAID", "players": {"#P1": {}}},
+            "player not an object": {"tag": "#RAID", "players": ["#P1"]},
+            "player without a tag": {"tag": "#RAID", "players": [{"heroes": [hero]}]},
+            "units not a list": {"tag": "#RAID", "players": [{"tag": "#P1", "heroes": hero}]},
+            "unit not an object": {"tag": "#RAID", "players": [{"tag": "#P1", "heroes": [90]}]},
+            "unit without a level": {
+                "tag": "#RAID",
+                "players": [{"tag": "#P1", "heroes": [{"name": "Archer Queen"}]}],
+            },
+        }
+        for label, dump in cases.items():
+            with self.subTest(label), self.assertRaises(DumpError):
+                sync_clan(dump)
+        self.assertFalse(Hero.objects.exists())
+
+    def test_errors_name_the_player(self):
+        dump = {"tag": "#RAID", "players": [{"tag": "#P1", "troops": "Dragon"}]}
+        with self.assertRaisesMessage(DumpError, "Player #P1: troops must be a list"):
+            sync_clan(dump)
+
+    def test_valid_dump_syncs(self):
+        dump = {
+            "tag": "#RAID",
+            "players": [
+                {"tag": "#P1", "heroes": [{"name": "Archer Queen", "level": 90}]},
+                {"tag": "#GONE", "heroes": []},
+            ],
+        }
+        result = sync_clan(dump)
+        self.assertEqual((result.created, result.unmatched), (1, ["#GONE"]))
+        self.assertEqual(sync_clan(dump).writes, 0)
@@ -0,0 +1,105 @@
+import json
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.clan import roster
+from apps.clan.models import Clan, ClanMember, ClanSnapshot, Defense, Hero, Troop
+
+
+class RosterTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner")
+        self.clan = Clan.objects.create(name="Raiders", tag="#RAID", created_by=self.owner)
+
+    def add_members(self, clan, count, units=3):
+        for _ in range(count):
+            user = User.objects.create_user(username=f"m{User.objects.count()}")
+            member = ClanMember.objects.create(clan=clan, user=user)
+            for model in (Hero, Troop, Defense):
+                model.objects.bulk_create(
+                    model(member=member, name=f"unit {i}", level=i + 1) for i in range(units)
+                )
+
+
+class RosterQueryCountTests(RosterTestCase):
+    def test_build_is_five_queries_whatever_the_size(self):
+        for members in (1, 10, 50):
+            clan = Clan.objects.create(name=f"c{members}", tag=f"#C{members}", created_by=self.owner)
+            self.add_members(clan, members)
+            with self.assertNumQueries(5):
+                data = json.loads(roster.build(clan.pk))
+            self.assertEqual(len(data["members"]), members)
+            self.assertEqual(len(data["members"][0]["troops"]), 3)
+
+    def test_missing_clan_builds_nothing(self):
+        with self.assertNumQueries(1):
+            self.assertIsNone(roster.build(self.clan.pk + 1))
+
+
+@override_settings(CLAN_ROSTER_SNAPSHOTS=True)
+class RosterSnapshotTests(RosterTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_members(self.clan, 5)
+
+    def test_hit_is_one_single_row_read(self):
+        first = roster.get(self.clan.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(roster.get(self.clan.pk), first)
+
+    def test_changes_invalidate_the_snapshot(self):
+        roster.get(self.clan.pk)
+        hero = Hero.objects.filter(member__clan=self.clan).first()
+        hero.level = 90
+        hero.save()
+        self.assertIsNone(ClanSnapshot.objects.get(clan=self.clan).data)
+
+        data = json.loads(roster.get(self.clan.pk))
+        levels = [h["level"] for m in data["members"] for h in m["heroes"]]
+        self.assertIn(90, levels)
+
+    def test_moving_a_member_invalidates_both_clans(self):
+        other = Clan.objects.create(name="Others", tag="#OTHER", created_by=self.owner)
+        roster.get(self.clan.pk)
+        roster.get(other.pk)
+        member = ClanMember.objects.filter(clan=self.clan).first()
+        member.clan = other
+        member.save()
+
+        self.assertEqual(len(json.loads(roster.get(self.clan.pk))["members"]), 4)
+        self.assertEqual(len(json.loads(roster.get(other.pk))["members"]), 1)
+
+    def test_reads_open_no_transaction(self):
+        # Under IMMEDIATE transactions (config/database.py) any atomic block,
+        # savepoints included, would take the SQLite write lock.
+        roster.get(self.clan.pk)
+        Hero.objects.filter(member__clan=self.clan).update(level=50)
+        roster.invalidate([self.clan.pk])
+        with CaptureQueriesContext(connection) as rebuild:
+            roster.get(self.clan.pk)
+        with CaptureQueriesContext(connection) as hit:
+            roster.get(self.clan.pk)
+        for query in rebuild.captured_queries + hit.captured_queries:
+            self.assertNotRegex(query["sql"], r"^(BEGIN|SAVEPOINT)")
+
+
+class RosterViewTests(RosterTestCase):
+    def setUp(self):
+        super().setUp()
+        self.add_members(self.clan, 2)
+        self.client = APIClient(HTTP_HOST="localhost")
+        self.client.force_authenticate(self.owner)
+
+    def test_roster(self):
+        response = self.client.get(f"/api/clans/{self.clan.pk}/roster/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(len(response.json()["members"]), 2)
+
+    def test_unknown_clan(self):
+        response = self.client.get(f"/api/clans/{self.clan.pk + 1}/roster/")
+        self.assertEqual(response.status_code, 404)
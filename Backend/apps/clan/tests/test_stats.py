@@ -0,0 +1,218 @@
+import random
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from apps.clan import stats
+from apps.clan.importer import sync_clan
+from apps.clan.models import Clan, ClanMember, ClanStats, Hero, Troop
+
+Role = ClanMember.Role
+
+
+class StatsTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner")
+        self.raid = Clan.objects.create(name="Raiders", tag="#RAID", created_by=self.owner)
+        self.wall = Clan.objects.create(name="Walls", tag="#WALL", created_by=self.owner)
+
+    def member(self, clan, role=Role.MEMBER, heroes=(), troops=(), tag=""):
+        user = User.objects.create_user(username=f"player{User.objects.count()}")
+        member = ClanMember.objects.create(clan=clan, user=user, role=role, player_tag=tag)
+        for i, level in enumerate(heroes):
+            Hero.objects.create(member=member, name=f"hero{i}", level=level)
+        for i, level in enumerate(troops):
+            Troop.objects.create(member=member, name=f"troop{i}", level=level)
+        return member
+
+    def stored(self):
+        return {
+            row.pop("clan"): row
+            for row in ClanStats.objects.order_by("clan").values("clan", *stats.FIELDS)
+        }
+
+    def assertMatchesRecompute(self, msg=None):
+        clan_ids = Clan.objects.values_list("pk", flat=True)
+        self.assertEqual(self.stored(), stats.compute(clan_ids), msg)
+
+
+class StatsDeltaTests(StatsTestCase):
+    def test_adding_members_and_units(self):
+        self.assertMatchesRecompute()
+        for role in Role:
+            self.member(self.raid, role, heroes=[10, 30], troops=[5])
+            self.assertMatchesRecompute(role)
+        self.member(self.wall, troops=[1, 2, 3])
+        self.assertMatchesRecompute()
+        row = ClanStats.objects.get(pk=self.raid.pk)
+        self.assertEqual((row.member_count, row.leaders, row.co_leaders), (4, 1, 1))
+        self.assertEqual((row.hero_count, row.hero_level_sum, row.max_hero_level), (8, 160, 30))
+        self.assertEqual(ClanStats.objects.get(pk=self.wall.pk).max_hero_level, 0)
+
+    def test_level_changes(self):
+        member = self.member(self.raid, heroes=[40, 25])
+        top, other = member.heroes.order_by("-level")
+        for hero, level in [(other, 60), (other, 20), (top, 35), (top, 10), (other, 10)]:
+            hero.level = level
+            hero.save()
+            self.assertMatchesRecompute((hero.name, level))
+        # Both heroes are at 10 now: lowering one keeps the maximum.
+        top.level = 5
+        top.save()
+        self.assertEqual(ClanStats.objects.get(pk=self.raid.pk).max_hero_level, 10)
+        troop = Troop.objects.create(member=member, name="troop", level=3)
+        troop.level = 9
+        troop.save()
+        self.assertMatchesRecompute()
+
+    def test_deleting_units_and_members(self):
+        strong = self.member(self.raid, Role.LEADER, heroes=[80, 50], troops=[9])
+        weak = self.member(self.raid, Role.ELDER, heroes=[70], troops=[4, 4])
+        strong.heroes.get(level=80).delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(ClanStats.objects.get(pk=self.raid.pk).max_hero_level, 70)
+        weak.troops.first().delete()
+        self.assertMatchesRecompute()
+        # Deleting a member or its user cascades to its units.
+        weak.delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(ClanStats.objects.get(pk=self.raid.pk).max_hero_level, 50)
+        strong.user.delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(self.stored()[self.raid.pk], dict.fromkeys(stats.FIELDS, 0))
+
+    def test_role_changes_and_moves(self):
+        member = self.member(self.raid, heroes=[90], troops=[7])
+        self.member(self.wall, heroes=[20])
+        member.role = Role.CO_LEADER
+        member.save()
+        self.assertMatchesRecompute()
+        member.clan = self.wall
+        member.role = Role.ELDER
+        member.save()
+        self.assertMatchesRecompute()
+        hero = member.heroes.get()
+        hero.member = self.member(self.raid)
+        hero.save()
+        self.assertMatchesRecompute()
+
+    def test_deleting_a_clan_drops_its_row(self):
+        self.member(self.raid, heroes=[10])
+        self.member(self.wall, heroes=[20])
+        self.raid.delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(list(self.stored()), [self.wall.pk])
+
+    def test_random_changes(self):
+        rng = random.Random(24)
+        members = [self.member(self.raid), self.member(self.wall)]
+        for step in range(120):
+            action = rng.choice(["member", "unit", "level", "unit delete", "member delete"])
+            if action == "member" or not members:
+                clan = rng.choice([self.raid, self.wall])
+                members.append(self.member(clan, rng.choice(list(Role))))
+            elif action == "unit":
+                model = rng.choice([Hero, Troop])
+                model.objects.create(
+                    member=rng.choice(members), name=f"u{step}", level=rng.randint(1, 100)
+                )
+            elif action in ("level", "unit delete"):
+                units = [*Hero.objects.all(), *Troop.objects.all()]
+                if not units:
+                    continue
+                unit = rng.choice(units)
+                if action == "level":
+                    unit.level = rng.randint(1, 100)
+                    unit.save()
+                else:
+                    unit.delete()
+            else:
+                members.pop(rng.randrange(len(members))).delete()
+            self.assertMatchesRecompute((step, action))
+
+    def test_raising_a_level_does_not_recompute_the_maximum(self):
+        member = self.member(self.raid, heroes=[40, 30])
+        hero = member.heroes.get(level=30)
+        hero.level = 50
+        with CaptureQueriesContext(connection) as queries:
+            hero.save()
+        stats_queries = [q["sql"] for q in queries if "clan_clanstats" in q["sql"]]
+        self.assertEqual(len(stats_queries), 1)
+        # GREATEST only: no aggregate subquery over the heroes.
+        self.assertNotIn("clan_hero", stats_queries[0])
+        self.assertMatchesRecompute()
+
+
+class StatsImportTests(StatsTestCase):
+    def test_sync_clan_applies_its_deltas(self):
+        self.member(self.raid, tag="#P1", heroes=[5])
+        self.member(self.raid, tag="#P2")
+
+        def dump(queen, king, dragon):
+            return {
+                "tag": "#RAID",
+                "players": [
+                    {
+                        "tag": "#P1",
+                        "heroes": [
+                            {"name": "Archer Queen", "level": queen},
+                            {"name": "Barbarian King", "level": king},
+                        ],
+                        "troops": [{"name": "Dragon", "level": dragon}],
+                    },
+                    {"tag": "#P2", "heroes": [{"name": "Archer Queen", "level": 30}]},
+                ],
+            }
+
+        # Creates, raises, lowers the maximum, lowers another hero, then deletes.
+        for levels in [(60, 40, 5), (70, 40, 6), (20, 40, 6), (20, 10, 1)]:
+            sync_clan(dump(*levels))
+            self.assertMatchesRecompute(levels)
+        sync_clan({"tag": "#RAID", "players": [{"tag": "#P1", "heroes": []}]})
+        self.assertMatchesRecompute()
+        self.assertEqual(ClanStats.objects.get(pk=self.raid.pk).max_hero_level, 30)
+
+
+class StatsRepairTests(StatsTestCase):
+    def test_repair_fixes_drift_from_bulk_writes(self):
+        member = self.member(self.raid, heroes=[50, 20], troops=[3])
+        self.member(self.wall, heroes=[10])
+        # QuerySet.update and a missing row bypass the signals.
+        Hero.objects.filter(member=member).update(level=1)
+        ClanStats.objects.filter(pk=self.wall.pk).delete()
+
+        out = StringIO()
+        call_command("repair_clan_stats", "--dry-run", stdout=out)
+        self.assertIn(
+            f"clan {self.raid.pk}: hero_level_sum 70 -> 2, max_hero_level 50 -> 1", out.getvalue()
+        )
+        self.assertIn(f"clan {self.wall.pk}: missing", out.getvalue())
+        self.assertIn("2 clans checked, would fix 2", out.getvalue())
+        self.assertEqual(ClanStats.objects.get(pk=self.raid.pk).max_hero_level, 50)
+
+        call_command("repair_clan_stats", stdout=StringIO())
+        self.assertMatchesRecompute()
+        out = StringIO()
+        call_command("repair_clan_stats", stdout=out)
+        self.assertIn("fixed 0", out.getvalue())
+
+
+class StatsViewTests(StatsTestCase):
+    def test_view_reads_the_delta_maintained_row(self):
+        self.member(self.raid, Role.LEADER, heroes=[40, 20], troops=[10, 20])
+        self.member(self.raid, heroes=[30])
+        ClanStats.objects.filter(pk=self.raid.pk).delete()  # built on first read
+        client = APIClient(HTTP_HOST="localhost")
+        client.force_authenticate(self.owner)
+
+        data = client.get(f"/api/clans/{self.raid.pk}/stats/").json()
+        self.assertEqual(data["member_count"], 2)
+        self.assertEqual((data["avg_hero_level"], data["max_hero_level"]), (30.0, 40))
+        self.assertEqual(data["avg_troop_level"], 15.0)
+        self.assertMatchesRecompute()
+        self.assertEqual(client.get("/api/clans/9999/stats/").status_code, 404)
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from apps.clan import catalog, importer, units
+from apps.clan.models import Clan, ClanMember, Hero, Troop
+
+
+class LevelRangeTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username="owner")
+        self.clan = Clan.objects.create(name="Raiders", tag="#RAID", created_by=owner)
+        self.member = ClanMember.objects.create(clan=self.clan, user=owner, player_tag="#P1")
+
+    def test_validation_rejects_levels_a_vector_cannot_hold(self):
+        hero = Hero(member=self.member, name="Archer Queen", level=catalog.MAX_LEVEL + 1)
+        with self.assertRaises(ValidationError):
+            hero.full_clean()
+
+    def test_validation_rejects_level_zero(self):
+        # 0 in a packed vector means "no row".
+        with self.assertRaises(ValidationError):
+            Hero(member=self.member, name="Archer Queen", level=0).full_clean()
+
+    def test_unvalidated_save_is_refused_not_clamped(self):
+        for level in (0, 300):
+            with self.subTest(level=level), self.assertRaisesMessage(ValueError, "Archer Queen"):
+                Hero.objects.create(member=self.member, name="Archer Queen", level=level)
+        self.assertFalse(Hero.objects.exists())
+        self.assertEqual(units.levels(self.member.pk)["heroes"], {})
+
+    def test_repack_rejects_out_of_range_rows(self):
+        Hero.objects.create(member=self.member, name="Archer Queen", level=80)
+        # update() runs neither validators nor signals.
+        Hero.objects.update(level=300)
+        with self.assertRaisesMessage(ValueError, f"Member {self.member.pk}"):
+            units.repack([self.member.pk])
+        self.assertEqual(units.levels(self.member.pk)["heroes"], {"Archer Queen": 80})
+
+    def test_clearing_a_unit_reads_as_absent(self):
+        hero = Hero.objects.create(member=self.member, name="Archer Queen", level=1)
+        self.assertEqual(units.levels(self.member.pk)["heroes"], {"Archer Queen": 1})
+        hero.delete()
+        self.assertEqual(units.levels(self.member.pk)["heroes"], {})
+
+    def test_import_rejects_out_of_range_levels(self):
+        dump = {
+            "tag": self.clan.tag,
+            "players": [{"tag": "#P1", "troops": [{"name": "Dragon", "level": 256}]}],
+        }
+        for level in (0, 256):
+            dump["players"][0]["troops"][0]["level"] = level
+            with self.subTest(level=level), self.assertRaisesMessage(importer.DumpError, "#P1"):
+                importer.sync_clan(dump)
+        self.assertFalse(Troop.objects.exists())
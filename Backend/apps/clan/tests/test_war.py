@@ -0,0 +1,134 @@
+from itertools import permutations
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from rest_framework.test import APIClient
+
+from apps.clan import war
+from apps.clan.models import Clan, ClanMember, Defense, Hero, Troop
+
+
+def brute_force(cost: np.ndarray) -> float:
+    """The cheapest total over every way to give each row (or column) its own partner."""
+    n, m = cost.shape
+    if n <= m:
+        return min(cost[np.arange(n), list(cols)].sum() for cols in permutations(range(m), n))
+    return min(cost[list(rows), np.arange(m)].sum() for rows in permutations(range(n), m))
+
+
+class AssignTests(SimpleTestCase):
+    def check(self, cost):
+        columns = war.assign(cost)
+        n, m = cost.shape
+        self.assertEqual(columns.shape, (n,))
+        taken = columns[columns >= 0]
+        self.assertEqual(len(taken), min(n, m))
+        self.assertEqual(len(set(taken.tolist())), len(taken))
+        total = cost[np.flatnonzero(columns >= 0), taken].sum()
+        self.assertAlmostEqual(total, brute_force(cost), places=9)
+
+    def test_matches_brute_force_on_small_matrices(self):
+        rng = np.random.default_rng(2024)
+        for n in range(1, 7):
+            for m in range(1, 7):
+                for _ in range(5):
+                    with self.subTest(shape=(n, m)):
+                        self.check(rng.random((n, m)))
+
+    def test_ties_and_negative_costs(self):
+        rng = np.random.default_rng(7)
+        for _ in range(40):
+            n, m = rng.integers(1, 7, size=2)
+            self.check(rng.integers(-3, 3, size=(n, m)).astype(float))
+        self.check(np.zeros((4, 4)))
+
+    def test_maximizing_stars(self):
+        stars = np.array([[3.0, 2.9, 0.1], [2.0, 0.5, 0.2]])
+        self.assertEqual(war.assign(-stars).tolist(), [1, 0])
+
+
+class WarTestCase(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner")
+        self.ours = Clan.objects.create(name="Raiders", tag="#RAID", created_by=self.owner)
+        self.theirs = Clan.objects.create(name="Walls", tag="#WALL", created_by=self.owner)
+
+    def member(self, clan, level, opt_in=True):
+        user = User.objects.create_user(username=f"{clan.tag}-{level}-{User.objects.count()}")
+        member = ClanMember.objects.create(clan=clan, user=user, war_opt_in=opt_in)
+        for model in (Hero, Troop, Defense):
+            model.objects.create(member=member, name="unit", level=level)
+        return member
+
+
+class PlanTests(WarTestCase):
+    def test_load_sums_levels_per_opted_in_member(self):
+        strong, weak = self.member(self.ours, 40), self.member(self.ours, 10)
+        self.member(self.ours, 50, opt_in=False)
+        base = self.member(self.theirs, 20)
+        Hero.objects.create(member=strong, name="second", level=5)
+
+        with self.assertNumQueries(4):
+            sides = war.load([self.ours.id, self.theirs.id])
+        ours = sides[self.ours.id]
+        self.assertEqual(ours.ids.tolist(), [strong.id, weak.id])
+        self.assertEqual(ours.heroes.tolist(), [45, 10])
+        self.assertEqual(ours.troops.tolist(), [40, 10])
+        self.assertEqual(sides[self.theirs.id].ids.tolist(), [base.id])
+
+    def test_each_attacker_gets_its_own_base(self):
+        attackers = [self.member(self.ours, level) for level in (10, 30, 50)]
+        bases = [self.member(self.theirs, level) for level in (20, 40)]
+
+        attacks = war.plan(self.ours.id, self.theirs.id)
+        # Two bases: the attacker who would add the fewest stars sits out.
+        self.assertEqual(len(attacks), 2)
+        self.assertEqual({a.target for a in attacks}, {b.id for b in bases})
+        self.assertNotIn(attackers[0].id, {a.attacker for a in attacks})
+        self.assertEqual(attacks, sorted(attacks, key=lambda a: -a.expected_stars))
+        for attack in attacks:
+            self.assertTrue(0 <= attack.expected_stars <= 3)
+
+    def test_nobody_opted_in(self):
+        self.member(self.ours, 10, opt_in=False)
+        self.member(self.theirs, 10)
+        self.assertEqual(war.plan(self.ours.id, self.theirs.id), [])
+
+
+class WarPlanViewTests(WarTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient(HTTP_HOST="localhost")
+        self.client.force_authenticate(self.owner)
+        self.url = f"/api/clans/{self.ours.id}/war-plan/"
+
+    def test_plan(self):
+        self.member(self.ours, 30)
+        self.member(self.theirs, 20)
+        response = self.client.get(self.url, {"opponent": self.theirs.id})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data["clan"], data["opponent"]), (self.ours.id, self.theirs.id))
+        [attack] = data["attacks"]
+        self.assertEqual(data["expected_stars"], attack["expected_stars"])
+        self.assertEqual(
+            set(attack),
+            {"attacker", "attacker_username", "target", "target_username", "expected_stars"},
+        )
+
+    def test_rejects_bad_opponents(self):
+        for params, status in [
+            ({}, 400),
+            ({"opponent": "walls"}, 400),
+            ({"opponent": self.ours.id}, 400),
+            ({"opponent": self.theirs.id + 100}, 404),
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, status)
+        missing = f"/api/clans/{self.theirs.id + 100}/war-plan/"
+        self.assertEqual(self.client.get(missing, {"opponent": self.theirs.id}).status_code, 404)
+
+    def test_requires_authentication(self):
+        response = APIClient(HTTP_HOST="localhost").get(self.url, {"opponent": self.theirs.id})
+        self.assertEqual(response.status_code, 401)
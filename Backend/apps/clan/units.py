@@ -0,0 +1,139 @@
+"""
+Packed unit levels: reading and maintaining MemberUnits.
+
+Hero, Troop and Defense store one row per unit per member, with the unit's
+name repeated in every row and two indexes on top. MemberUnits stores the
+same levels as three short byte strings per member, one byte per entry of
+apps/clan/catalog.py, so a member's whole progress is one row and a clan's
+is one query.
+
+The row tables stay the source of truth (rosters, stats and the war planner
+read them, and they hold units the catalog does not know); the packed row
+follows them:
+
+- apps/clan/signals.py writes single unit saves and deletes into the
+  member's vector (``set_levels``);
+- apps/clan/importer.py repacks (``repack``) the members its bulk writes
+  touched;
+- migration 0006 packed every member that existed before, and
+  ``repack_units`` repacks all of them again after other bulk writes.
+
+``levels``, ``clan_levels`` and ``clan_matrix`` are the read side.
+
+The packed row is a second copy, not a replacement, and it is paid for on
+the write side. Every single unit save or delete adds a SELECT and an UPDATE
+of the member's MemberUnits row, on top of the row write and the stats
+delta. The packed table adds about 100 bytes per member to the row tables
+instead of shrinking them. ``bench_clan_units`` prints both costs next to
+the read gains.
+
+A level that does not fit in a byte, or 0, which a vector reserves for
+"no row", is rejected rather than packed as something else:
+apps/clan/signals.py refuses the save, and ``repack`` raises ValueError.
+"""
+
+import numpy as np
+
+from . import catalog
+from .models import ClanMember, Defense, Hero, MemberUnits, Troop
+
+MODELS = {"heroes": Hero, "troops": Troop, "defenses": Defense}
+
+
+def _checked(member_id: int, name: str, level: int) -> int:
+    try:
+        catalog.check(name, level)
+    except ValueError as e:
+        raise ValueError(f"Member {member_id}: {e}") from None
+    return level
+
+
+def repack(member_ids) -> set[str]:
+    """
+    Rebuild the packed levels of these members from their rows; returns the
+    unit names that are not in the catalog and so were left out. Raises
+    ValueError, writing nothing, if a row's level is out of range.
+    """
+    member_ids = list(member_ids)
+    existing = set(ClanMember.objects.filter(pk__in=member_ids).values_list("pk", flat=True))
+    levels = {member_id: {kind: {} for kind in MODELS} for member_id in existing}
+    for kind, model in MODELS.items():
+        rows = model.objects.filter(member_id__in=existing).values_list("member_id", "name", "level")
+        for member_id, name, level in rows:
+            levels[member_id][kind][name] = _checked(member_id, name, level)
+    unknown = set()
+    packed = []
+    for member_id, kinds in levels.items():
+        vectors = {}
+        for kind, by_name in kinds.items():
+            vectors[kind], missing = catalog.pack(kind, by_name)
+            unknown.update(missing)
+        packed.append(MemberUnits(member_id=member_id, **vectors))
+    MemberUnits.objects.bulk_create(
+        packed,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=["member"],
+        update_fields=list(MODELS),
+    )
+    return unknown
+
+
+def set_levels(member_id: int, kind: str, changes: dict[str, int | None]) -> None:
+    """
+    Write a few levels (None to clear) into a member's packed vector of one
+    kind: a read and an update, or a full ``repack`` if the member has no row
+    yet.
+    """
+    index = catalog.INDEX[kind]
+    changes = {
+        index[name]: 0 if level is None else _checked(member_id, name, level)
+        for name, level in changes.items()
+        if name in index
+    }
+    if not changes:
+        return
+    row = MemberUnits.objects.filter(pk=member_id).values_list(kind, flat=True).first()
+    if row is None:
+        repack([member_id])
+        return
+    vector = bytearray(row)
+    vector.extend(bytes(max(0, max(changes) + 1 - len(vector))))
+    for i, level in changes.items():
+        vector[i] = level
+    MemberUnits.objects.filter(pk=member_id).update(**{kind: bytes(vector.rstrip(b"\0"))})
+
+
+def _unpack(row) -> dict[str, dict[str, int]]:
+    return {
+        kind: catalog.unpack(kind, bytes(vector)) for kind, vector in zip(MODELS, row, strict=True)
+    }
+
+
+def levels(member_id: int) -> dict[str, dict[str, int]] | None:
+    """A member's levels by kind, name -> level, in one single-row query."""
+    row = MemberUnits.objects.filter(pk=member_id).values_list(*MODELS).first()
+    return None if row is None else _unpack(row)
+
+
+def clan_levels(clan_id: int) -> dict[int, dict[str, dict[str, int]]]:
+    """Every member's levels by member id, in one query."""
+    rows = MemberUnits.objects.filter(member__clan_id=clan_id).values_list("member_id", *MODELS)
+    return {row[0]: _unpack(row[1:]) for row in rows}
+
+
+def clan_matrix(clan_id: int, kind: str, *, war_opt_in=None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    The member ids of a clan and a members × catalog ``uint8`` matrix of
+    their levels of one kind (column ``i`` is ``catalog.CATALOG[kind][i]``).
+    """
+    members = MemberUnits.objects.filter(member__clan_id=clan_id)
+    if war_opt_in is not None:
+        members = members.filter(member__war_opt_in=war_opt_in)
+    rows = members.order_by("member_id").values_list("member_id", kind)
+    ids = np.empty(len(rows), dtype=np.int64)
+    matrix = np.zeros((len(rows), len(catalog.CATALOG[kind])), dtype=np.uint8)
+    for i, (member_id, vector) in enumerate(rows):
+        ids[i] = member_id
+        matrix[i, : len(vector)] = np.frombuffer(vector, dtype=np.uint8)
+    return ids, matrix
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path("", views.ClanListView.as_view(), name="clan-list"),
+    path("<int:pk>/roster/", views.ClanRosterView.as_view(), name="clan-roster"),
+    path("<int:pk>/stats/", views.ClanStatsView.as_view(), name="clan-stats"),
+    path("<int:pk>/war-plan/", views.ClanWarPlanView.as_view(), name="clan-war-plan"),
+]
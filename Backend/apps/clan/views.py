@@ -0,0 +1,66 @@
+from django.db.models import Count
+from django.http import HttpResponse
+from rest_framework import generics, permissions
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+
+from . import roster, stats, war
+from .models import Clan
+from .serializers import ClanSerializer, ClanStatsSerializer
+
+
+class ClanListView(generics.ListAPIView):
+    queryset = Clan.objects.annotate(member_count=Count("members")).order_by("name")
+    serializer_class = ClanSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+
+class ClanRosterView(generics.GenericAPIView):
+    """A clan with every member's progress; see apps/clan/roster.py."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        data = roster.get(pk)
+        if data is None:
+            raise NotFound()
+        # Already JSON: skip the renderer and its parse-and-encode round trip.
+        return HttpResponse(data, content_type="application/json")
+
+
+class ClanStatsView(generics.GenericAPIView):
+    """Dashboard aggregates of a clan, kept current by deltas; see apps/clan/stats.py."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        row = stats.get(pk)
+        if row is None:
+            raise NotFound()
+        return Response(ClanStatsSerializer(row).data)
+
+
+class ClanWarPlanView(generics.GenericAPIView):
+    """Attack assignments against ``?opponent=<clan id>``; see apps/clan/war.py."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        try:
+            opponent = int(request.query_params["opponent"])
+        except (KeyError, ValueError):
+            raise ValidationError({"opponent": "A clan id is required."}) from None
+        if opponent == pk:
+            raise ValidationError({"opponent": "A clan cannot war itself."})
+        if Clan.objects.filter(pk__in=[pk, opponent]).count() != 2:
+            raise NotFound()
+        attacks = war.plan(pk, opponent)
+        return Response(
+            {
+                "clan": pk,
+                "opponent": opponent,
+                "expected_stars": round(sum(a.expected_stars for a in attacks), 2),
+                "attacks": [a._asdict() for a in attacks],
+            }
+        )
@@ -0,0 +1,159 @@
+"""
+War planning: which of our members should attack which enemy base.
+
+Every member who opted into war (``ClanMember.war_opt_in``) on either side is
+loaded in one query and their unit levels in one ``values_list`` query per
+unit table. ``np.bincount`` then sums them per member into three arrays
+(hero, troop and defense level totals), so no Python loop runs per unit or
+per pair.
+
+A member's attack strength is ``HERO_WEIGHT * heroes + troops`` and a base's
+defense strength is ``defenses + HERO_WEIGHT * heroes`` (heroes defend their
+own base). Both are standardized over the two clans together, and an attack's
+expected stars are ``3 * sigmoid(SLOPE * (attack - defense))``: the whole
+attackers × bases matrix is one broadcast expression.
+
+The plan gives every attacker one base and every base at most one attacker,
+maximizing the total of expected stars: the assignment problem. ``assign``
+solves it exactly with the Hungarian algorithm (shortest augmenting paths
+with potentials, O(n³)), its inner loop vectorized over the columns, which
+for 50v50 is a few milliseconds. If there are more attackers than bases, the
+attackers who would add the fewest stars are left out.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from .models import ClanMember, Defense, Hero, Troop
+
+HERO_WEIGHT = 3.0
+SLOPE = 1.5
+
+
+class Side(NamedTuple):
+    ids: np.ndarray
+    usernames: list[str]
+    heroes: np.ndarray
+    troops: np.ndarray
+    defenses: np.ndarray
+
+
+class Attack(NamedTuple):
+    attacker: int
+    attacker_username: str
+    target: int
+    target_username: str
+    expected_stars: float
+
+
+def load(clan_ids) -> dict[int, Side]:
+    """The war_opt_in members of these clans and their level totals, in 4 queries."""
+    members = list(
+        ClanMember.objects.filter(clan_id__in=clan_ids, war_opt_in=True)
+        .order_by("id")
+        .values_list("id", "clan_id", "user__username")
+    )
+    ids = np.fromiter((m[0] for m in members), dtype=np.int64, count=len(members))
+    clans = np.fromiter((m[1] for m in members), dtype=np.int64, count=len(members))
+    totals = {}
+    for name, model in (("heroes", Hero), ("troops", Troop), ("defenses", Defense)):
+        rows = np.array(
+            model.objects.filter(member_id__in=ids.tolist()).values_list("member_id", "level"),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        # ids is sorted, so each unit's member position is a binary search away.
+        index = np.searchsorted(ids, rows[:, 0])
+        totals[name] = np.bincount(index, weights=rows[:, 1], minlength=len(ids))
+    sides = {}
+    for clan_id in clan_ids:
+        mask = clans == clan_id
+        sides[clan_id] = Side(
+            ids=ids[mask],
+            usernames=[m[2] for m, keep in zip(members, mask, strict=True) if keep],
+            **{name: total[mask] for name, total in totals.items()},
+        )
+    return sides
+
+
+def _standardize(*arrays):
+    joined = np.concatenate(arrays)
+    scale = joined.std() or 1.0
+    return [(a - joined.mean()) / scale for a in arrays]
+
+
+def expected_stars(attackers: Side, defenders: Side) -> np.ndarray:
+    """The attackers × bases matrix of expected stars."""
+    attack = HERO_WEIGHT * attackers.heroes + attackers.troops
+    defense = defenders.defenses + HERO_WEIGHT * defenders.heroes
+    attack, defense = _standardize(attack, defense)
+    margin = attack[:, None] - defense[None, :]
+    return 3.0 / (1.0 + np.exp(-SLOPE * margin))
+
+
+def assign(cost: np.ndarray) -> np.ndarray:
+    """
+    The minimum-cost assignment of rows to columns, as the column of each row
+    (-1 for rows left out when there are more rows than columns).
+    """
+    if cost.shape[0] > cost.shape[1]:
+        columns = assign(cost.T)
+        rows = np.full(cost.shape[0], -1)
+        rows[columns] = np.arange(cost.shape[1])
+        return rows
+    n, m = cost.shape
+    # 1-based with a dummy column 0, as in the textbook formulation.
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    owner = np.zeros(m + 1, dtype=np.int64)  # row matched to each column, 0 for none
+    way = np.zeros(m + 1, dtype=np.int64)
+    for row in range(1, n + 1):
+        owner[0] = row
+        col = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[col] = True
+            reduced = cost[owner[col] - 1] - u[owner[col]] - v[1:]
+            better = ~used[1:] & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = col
+            nxt = int(np.argmin(np.where(used[1:], np.inf, minv[1:]))) + 1
+            delta = minv[nxt]
+            u[owner[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            col = nxt
+            if owner[col] == 0:
+                break
+        while col:
+            prev = way[col]
+            owner[col] = owner[prev]
+            col = prev
+    result = np.full(n, -1)
+    matched = np.flatnonzero(owner[1:])
+    result[owner[1:][matched] - 1] = matched
+    return result
+
+
+def plan(clan_id: int, opponent_id: int) -> list[Attack]:
+    """One attack per opted-in member of ``clan_id`` on ``opponent_id``, most stars first."""
+    sides = load([clan_id, opponent_id])
+    ours, theirs = sides[clan_id], sides[opponent_id]
+    if not len(ours.ids) or not len(theirs.ids):
+        return []
+    stars = expected_stars(ours, theirs)
+    targets = assign(-stars)
+    attacks = [
+        Attack(
+            attacker=int(ours.ids[i]),
+            attacker_username=ours.usernames[i],
+            target=int(theirs.ids[j]),
+            target_username=theirs.usernames[j],
+            expected_stars=round(float(stars[i, j]), 2),
+        )
+        for i, j in enumerate(targets)
+        if j >= 0
+    ]
+    attacks.sort(key=lambda a: -a.expected_stars)
+    return attacks
@@ -0,0 +1,103 @@
+import json
+
+import requests
+from asgiref.sync import async_to_sync
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+
+from apps.clan.models import Clan, ClanMember
+from apps.push import sender as push_sender
+from apps.push.models import PushSubscription
+from apps.push.services import send_to_clan
+from apps.push.standin import StandInPushService
+from apps.push.webpush import Vapid, b64url_encode, encrypt
+from config.benchmark import Timer, benchmark_database
+
+PAYLOAD = {"title": "War starts in 1 hour", "body": "Attacks open at 18:00.", "url": "/clan"}
+PAYLOAD_BYTES = json.dumps(PAYLOAD, separators=(",", ":")).encode()
+
+
+class Command(BaseCommand):
+    help = "Web Push fan-out to a clan against a local stand-in push service."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--subscriptions", type=int, default=1000)
+        parser.add_argument("--latency-ms", type=float, default=20)
+        parser.add_argument("--flaky", type=float, default=0.01)
+        parser.add_argument("--dead", type=float, default=0.05)
+        parser.add_argument("--baseline", type=int, default=100)
+
+    def handle(self, *args, **opts):
+        vapid_key = ec.generate_private_key(ec.SECP256R1())
+        vapid_private = b64url_encode(vapid_key.private_numbers().private_value.to_bytes(32, "big"))
+        service = StandInPushService(
+            opts["latency_ms"] / 1000, opts["flaky"], opts["dead"], expected=PAYLOAD_BYTES
+        )
+        port = service.start()
+        # Two origins for one server, so the sender keeps two pools and two VAPID tokens.
+        origins = [f"http://127.0.0.1:{port}", f"http://localhost:{port}"]
+
+        with benchmark_database(), override_settings(
+            VAPID_PRIVATE_KEY=vapid_private, PUSH_MAX_RETRIES=3
+        ):
+            clan = self._fill(opts["subscriptions"], origins, service)
+            subs = list(PushSubscription.objects.all()[: opts["baseline"]])
+
+            service.reset()
+            with Timer() as t:
+                for sub in subs:
+                    self._send_naive(sub, vapid_private)
+            self.stdout.write(
+                f"  one request per push, new connection: {len(subs) / t.elapsed:8,.0f} "
+                f"notifications/s ({len(subs)} sent, {len(service.connections)} connections)"
+            )
+
+            for run in ("first", "second"):
+                service.reset()
+                results, elapsed = async_to_sync(self._fan_out)(clan.id)
+                self.stdout.write(
+                    f"  pooled concurrent fan-out ({run}):   {len(results) / elapsed:8,.0f} "
+                    f"notifications/s ({sum(r.ok for r in results)}/{len(results)} delivered "
+                    f"in {elapsed:.2f}s, {sum(r.attempts > 1 for r in results)} retried, "
+                    f"{sum(r.gone for r in results)} gone, "
+                    f"{len(service.connections)} connections; "
+                    f"{PushSubscription.objects.count()} subscriptions left)"
+                )
+
+        if service.errors:
+            raise CommandError(f"Stand-in rejected pushes: {service.errors[:3]}")
+        self.stdout.write(f"  stand-in decrypted and verified {len(service.payloads)} payloads")
+
+    async def _fan_out(self, clan_id):
+        with Timer() as t:
+            results = await send_to_clan(clan_id, PAYLOAD)
+        await push_sender.close_senders()
+        return results, t.elapsed
+
+    def _send_naive(self, sub, vapid_private):
+        """What a per-call library send does: sign, encrypt, open a connection, post."""
+        vapid = Vapid(vapid_private, "mailto:bench@localhost")
+        response = requests.post(
+            sub.endpoint,
+            data=encrypt(PAYLOAD_BYTES, sub.keys["p256dh"], sub.keys["auth"]),
+            headers={
+                "Content-Encoding": "aes128gcm",
+                "TTL": "60",
+                "Connection": "close",
+                **vapid.headers(sub.endpoint),
+            },
+            timeout=10,
+        )
+        assert response.status_code in (201, 410, 503), response.status_code
+
+    def _fill(self, count, origins, service):
+        with transaction.atomic():
+            owner = User.objects.create_user(username="leader")
+            clan = Clan.objects.create(name="Bench", tag="#BENCH", created_by=owner)
+            users = User.objects.bulk_create(User(username=f"member{i}") for i in range(count))
+            ClanMember.objects.bulk_create(ClanMember(clan=clan, user=u) for u in users)
+            service.subscribe(users, origins)
+        return clan
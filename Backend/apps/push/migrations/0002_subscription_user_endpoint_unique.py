@@ -0,0 +1,36 @@
+# Generated by Django 5.1.15 on 2026-10-18 02:59
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicates(apps, schema_editor):
+    """Keep the newest row per (user, endpoint) so the constraint can be added."""
+    PushSubscription = apps.get_model("push", "PushSubscription")
+    keep = (
+        PushSubscription.objects.values("user", "endpoint")
+        .annotate(newest=Max("id"))
+        .values("newest")
+    )
+    PushSubscription.objects.exclude(id__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('push', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pushsubscription',
+            index=models.Index(fields=['endpoint'], name='push_sub_endpoint_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='pushsubscription',
+            constraint=models.UniqueConstraint(fields=('user', 'endpoint'), name='push_sub_user_endpoint_uniq'),
+        ),
+    ]
@@ -16,6 +16,16 @@ class PushSubscription(models.Model):
 
     class Meta:
         ordering = ["-created_at"]
+        constraints = [
+            # One row per browser per user; subscribe upserts on this.
+            models.UniqueConstraint(
+                fields=["user", "endpoint"], name="push_sub_user_endpoint_uniq"
+            ),
+        ]
+        indexes = [
+            # Dead endpoints are pruned by endpoint across all users.
+            models.Index(fields=["endpoint"], name="push_sub_endpoint_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.username}: {self.endpoint[:60]}"
@@ -0,0 +1,197 @@
+"""
+Concurrent Web Push delivery.
+
+One aiohttp session per event loop keeps a keep-alive connection pool per
+push-service origin (FCM, Mozilla autopush, Apple...), so a fan-out to a
+thousand subscriptions reuses a handful of TLS connections instead of
+opening one per notification. ``PUSH_CONCURRENCY`` bounds in-flight requests
+overall and ``PUSH_CONNECTIONS_PER_ORIGIN`` bounds each pool.
+
+429, 5xx and connection errors are retried up to ``PUSH_MAX_RETRIES`` times
+with exponential backoff and jitter, honouring ``Retry-After``. 404 and 410
+mean the subscription is gone and are reported as such, not retried. So is a
+subscription whose keys cannot be used to encrypt (``invalid``): it can
+never be delivered to, and one bad row must not abort the fan-out.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import random
+from dataclasses import dataclass
+
+import aiohttp
+from django.conf import settings
+
+from .webpush import Vapid, encrypt
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+GONE_STATUSES = frozenset({404, 410})
+MAX_BACKOFF = 30.0
+
+
+@dataclass(frozen=True)
+class PushResult:
+    subscription_id: int | None
+    endpoint: str
+    status: int | None  # None if every attempt failed before a response
+    attempts: int
+    invalid: bool = False  # malformed keys: nothing was sent
+
+    @property
+    def ok(self) -> bool:
+        return self.status is not None and 200 <= self.status < 300
+
+    @property
+    def gone(self) -> bool:
+        return self.invalid or self.status in GONE_STATUSES
+
+
+class PushSender:
+    def __init__(
+        self,
+        vapid: Vapid,
+        concurrency: int = 100,
+        per_origin: int = 20,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 10.0,
+    ):
+        self.vapid = vapid
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=concurrency, limit_per_host=per_origin),
+            timeout=aiohttp.ClientTimeout(total=timeout),
+        )
+
+    async def close(self) -> None:
+        await self._session.close()
+
+    async def send_many(
+        self, subscriptions, payload: dict, ttl: int | None = None, urgency: str | None = None
+    ) -> list[PushResult]:
+        """Deliver one payload to every subscription; results keep input order."""
+        body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+        subscriptions = list(subscriptions)
+        outcomes = await asyncio.gather(
+            *(self.send(sub, body, ttl=ttl, urgency=urgency) for sub in subscriptions),
+            return_exceptions=True,
+        )
+        results = []
+        for sub, outcome in zip(subscriptions, outcomes, strict=True):
+            if isinstance(outcome, BaseException):
+                if not isinstance(outcome, Exception):
+                    raise outcome  # cancellation
+                logger.error("Push to %s crashed", sub.endpoint[:60], exc_info=outcome)
+                outcome = PushResult(getattr(sub, "id", None), sub.endpoint, None, 0)
+            results.append(outcome)
+        return results
+
+    async def send(
+        self, subscription, body: bytes, ttl: int | None = None, urgency: str | None = None
+    ) -> PushResult:
+        """``subscription`` is a PushSubscription or anything with endpoint/keys/id."""
+        endpoint = subscription.endpoint
+        headers = {
+            "Content-Encoding": "aes128gcm",
+            "Content-Type": "application/octet-stream",
+            "TTL": str(settings.PUSH_TTL if ttl is None else ttl),
+            **self.vapid.headers(endpoint),
+        }
+        if urgency:
+            headers["Urgency"] = urgency
+        # ECDH + HKDF per push is ~0.2 ms of CPU; off the loop, a big fan-out
+        # doesn't stall the chat sockets sharing it.
+        try:
+            data = await asyncio.to_thread(
+                encrypt, body, subscription.keys["p256dh"], subscription.keys["auth"]
+            )
+        except (KeyError, TypeError, ValueError) as exc:
+            logger.warning("Push subscription %s has unusable keys: %s", endpoint[:60], exc)
+            return PushResult(getattr(subscription, "id", None), endpoint, None, 0, invalid=True)
+
+        status = None
+        attempt = 0
+        while True:
+            attempt += 1
+            retry_after = None
+            try:
+                async with self._semaphore, self._session.post(
+                    endpoint, data=data, headers=headers
+                ) as response:
+                    status = response.status
+                    await response.read()
+                    retry_after = response.headers.get("Retry-After")
+            except (aiohttp.ClientError, TimeoutError) as exc:
+                status = None
+                logger.info("Push to %s failed (attempt %d): %s", endpoint[:60], attempt, exc)
+
+            if (status is not None and status not in RETRY_STATUSES) or (
+                attempt > self.max_retries
+            ):
+                break
+            await asyncio.sleep(self._delay(attempt, retry_after))
+
+        return PushResult(getattr(subscription, "id", None), endpoint, status, attempt)
+
+    def _delay(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after is not None and retry_after.isdigit():
+            return min(float(retry_after), MAX_BACKOFF)
+        return min(self.backoff * 2 ** (attempt - 1), MAX_BACKOFF) * random.uniform(0.5, 1.0)
+
+
+_senders: dict[asyncio.AbstractEventLoop, PushSender] = {}
+
+
+def get_sender() -> PushSender:
+    """The PushSender for the running event loop, created on first use."""
+    loop = asyncio.get_running_loop()
+    sender = _senders.get(loop)
+    if sender is None:
+        for stale in [other for other in _senders if other.is_closed()]:
+            # Its loop closed without shutting down async generators (see
+            # _close_at_shutdown), so there is no loop left to close it on.
+            logger.warning("Push sender of a closed event loop was never closed; dropping it")
+            del _senders[stale]
+        sender = _senders[loop] = PushSender(
+            Vapid(settings.VAPID_PRIVATE_KEY, settings.VAPID_SUBJECT),
+            concurrency=settings.PUSH_CONCURRENCY,
+            per_origin=settings.PUSH_CONNECTIONS_PER_ORIGIN,
+            max_retries=settings.PUSH_MAX_RETRIES,
+            timeout=settings.PUSH_TIMEOUT,
+        )
+        _close_at_shutdown(loop, sender)
+    return sender
+
+
+def _close_at_shutdown(loop: asyncio.AbstractEventLoop, sender: PushSender) -> None:
+    # asyncio.run(), and so every async_to_sync() call that makes its own loop
+    # (the push views under WSGI), finalizes the loop's async generators
+    # before closing it. Parking one here closes the session on its own loop.
+    async def until_shutdown():
+        try:
+            yield
+        finally:
+            if _senders.get(loop) is sender:
+                del _senders[loop]
+            await sender.close()
+
+    # The loop only holds it weakly; collected early, it would close the sender now.
+    sender._until_shutdown = until_shutdown()
+    with contextlib.suppress(StopIteration):
+        sender._until_shutdown.asend(None).send(None)  # run to the yield, registering it
+
+
+async def close_senders() -> None:
+    """
+    Shutdown hook: close the running loop's sender. Call it before stopping a
+    long-lived loop that does not finalize async generators.
+    """
+    sender = _senders.pop(asyncio.get_running_loop(), None)
+    if sender is not None:
+        await sender.close()
@@ -1,6 +1,23 @@
+import binascii
+
+from cryptography.hazmat.primitives.asymmetric import ec
 from rest_framework import serializers
 
 from .models import PushSubscription
+from .webpush import b64url_decode
+
+
+def _decode(keys: dict, name: str, length: int) -> bytes:
+    value = keys.get(name)
+    if not isinstance(value, str):
+        raise serializers.ValidationError(f"'{name}' is required.")
+    try:
+        raw = b64url_decode(value)
+    except (binascii.Error, ValueError):
+        raise serializers.ValidationError(f"'{name}' is not base64url.") from None
+    if len(raw) != length:
+        raise serializers.ValidationError(f"'{name}' must be {length} bytes, not {len(raw)}.")
+    return raw
 
 
 class PushSubscriptionSerializer(serializers.ModelSerializer):
@@ -8,3 +25,17 @@ class PushSubscriptionSerializer(serializers.ModelSerializer):
         model = PushSubscription
         fields = ["id", "endpoint", "keys", "created_at"]
         read_only_fields = ["created_at"]
+
+    def validate_keys(self, keys):
+        # Rows that cannot be encrypted for would only fail every fan-out.
+        if not isinstance(keys, dict):
+            raise serializers.ValidationError("Expected an object with p256dh and auth.")
+        p256dh = _decode(keys, "p256dh", 65)
+        try:
+            ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), p256dh)
+        except ValueError:
+            raise serializers.ValidationError(
+                "'p256dh' is not an uncompressed P-256 point."
+            ) from None
+        _decode(keys, "auth", 16)
+        return {"p256dh": keys["p256dh"], "auth": keys["auth"]}
@@ -0,0 +1,62 @@
+"""
+Push fan-out: resolve who to notify, deliver through apps.push.sender, then
+prune subscriptions the push service reported as gone (404/410), and those
+whose keys could not be encrypted for, in one DELETE, so fan-out lists don't
+keep paying for dead endpoints.
+"""
+
+import logging
+
+from channels.db import database_sync_to_async
+from django.db.models import Q
+
+from .models import PushSubscription
+from .sender import PushResult, get_sender
+
+logger = logging.getLogger(__name__)
+
+
+@database_sync_to_async
+def subscriptions(*, exclude_users=(), **filters) -> list[PushSubscription]:
+    subs = PushSubscription.objects.filter(**filters)
+    if exclude_users:
+        subs = subs.exclude(user_id__in=exclude_users)
+    return list(subs.only("id", "user_id", "endpoint", "keys"))
+
+
+@database_sync_to_async
+def prune(results: list[PushResult]) -> int:
+    """Delete every subscription whose endpoint came back 404/410 or whose keys are invalid."""
+    gone = {r.endpoint for r in results if r.gone and not r.invalid}
+    invalid = {r.subscription_id for r in results if r.invalid and r.subscription_id}
+    if not gone and not invalid:
+        return 0
+    # An endpoint is dead for every user that registered it; bad keys only for their row.
+    deleted, _ = PushSubscription.objects.filter(
+        Q(endpoint__in=gone) | Q(pk__in=invalid)
+    ).delete()
+    logger.info("Pruned %d dead push subscriptions", deleted)
+    return deleted
+
+
+async def deliver(subs, payload: dict, **options) -> list[PushResult]:
+    """Send one payload to already-loaded subscriptions and prune the dead ones."""
+    results = await get_sender().send_many(subs, payload, **options)
+    await prune(results)
+    return results
+
+
+async def send_to_users(user_ids, payload: dict, **options) -> list[PushResult]:
+    """Notify every subscription of the given users."""
+    subs = await subscriptions(user_id__in=list(user_ids))
+    return await deliver(subs, payload, **options)
+
+
+async def send_to_clan(
+    clan_id: int, payload: dict, exclude_user_id: int | None = None, **options
+) -> list[PushResult]:
+    """Notify every member of a clan in one fan-out (one query, one gather)."""
+    subs = await subscriptions(user__clan_memberships__clan_id=clan_id)
+    if exclude_user_id is not None:
+        subs = [s for s in subs if s.user_id != exclude_user_id]
+    return await deliver(subs, payload, **options)
@@ -0,0 +1,144 @@
+"""
+A local stand-in push service for the ``bench_*`` commands.
+
+It speaks enough of the Web Push protocol to exercise the real sender: it
+verifies the VAPID JWT and audience, decrypts a sample of bodies with the
+subscription's private key, and can answer slowly, fail first attempts or
+report subscriptions as gone.
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+
+import jwt
+from aiohttp import web
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from .models import PushSubscription
+from .webpush import b64url_decode, b64url_encode, decrypt, public_key_bytes
+
+# Bodies decrypted and checked per run; the rest are only counted.
+DECRYPT_SAMPLE = 50
+
+
+class StandInPushService:
+    """
+    Answers 201 after ``latency`` seconds, fails a ``flaky`` fraction of
+    first attempts with ``flaky_status`` (503; with a ``Retry-After`` header
+    when ``retry_after`` is given) and answers ``dead_status`` (410) for a
+    ``dead`` fraction of subscriptions. Decrypted bodies must equal
+    ``expected`` when given and are kept in ``payloads``.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        flaky: float = 0.0,
+        dead: float = 0.0,
+        expected: bytes | None = None,
+        *,
+        flaky_status: int = 503,
+        dead_status: int = 410,
+        retry_after: str | None = None,
+    ):
+        self.latency = latency
+        self.flaky = flaky
+        self.dead = dead
+        self.expected = expected
+        self.flaky_status = flaky_status
+        self.dead_status = dead_status
+        self.retry_after = retry_after
+        self.receivers: dict[str, tuple] = {}  # endpoint key -> (ua private key, auth secret)
+        self.requests = 0
+        self.connections: set[int] = set()
+        self.payloads: list[dict] = []
+        self.errors: list[str] = []
+        self._tokens: set[str] = set()
+        self._failed: set[str] = set()
+        self._rng = random.Random(0)
+
+    async def handle(self, request):
+        self.requests += 1
+        self.connections.add(id(request.transport))
+        key = request.match_info["key"]
+        body = await request.read()
+        try:
+            self._check(request, key, body)
+        except Exception as exc:  # noqa: BLE001 - report, don't crash the server
+            self.errors.append(f"{type(exc).__name__}: {exc}")
+            return web.Response(status=400)
+        await asyncio.sleep(self.latency)
+        if int(key) % 1000 < self.dead * 1000:
+            return web.Response(status=self.dead_status)
+        if key not in self._failed and self._rng.random() < self.flaky:
+            self._failed.add(key)
+            headers = {"Retry-After": self.retry_after} if self.retry_after is not None else None
+            return web.Response(status=self.flaky_status, headers=headers)
+        return web.Response(status=201)
+
+    def _check(self, request, key, body):
+        token, public = request.headers["Authorization"].removeprefix("vapid t=").split(", k=")
+        if token not in self._tokens:
+            public_key = ec.EllipticCurvePublicKey.from_encoded_point(
+                ec.SECP256R1(), b64url_decode(public)
+            )
+            claims = jwt.decode(token, public_key, algorithms=["ES256"], options={"verify_aud": False})
+            if claims["aud"] != f"{request.scheme}://{request.host}":
+                raise ValueError(f"aud {claims['aud']} does not match {request.host}")
+            self._tokens.add(token)
+        if request.headers["Content-Encoding"] != "aes128gcm":
+            raise ValueError("wrong Content-Encoding")
+        if len(self.payloads) < DECRYPT_SAMPLE:
+            ua_key, auth = self.receivers[key]
+            plaintext = decrypt(body, ua_key, auth)
+            if self.expected is not None and plaintext != self.expected:
+                raise ValueError("payload did not round-trip")
+            self.payloads.append(json.loads(plaintext))
+
+    def start(self) -> int:
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            app = web.Application()
+            app.router.add_post("/push/{key}", self.handle)
+            runner = web.AppRunner(app, access_log=None)
+            self.loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            self.loop.run_until_complete(site.start())
+            self.port = runner.addresses[0][1]
+            ready.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self.port
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def reset(self):
+        self.requests = 0
+        self.connections.clear()
+        self.payloads.clear()
+        self._failed.clear()
+
+    def subscribe(self, users, origins: list[str]) -> list[PushSubscription]:
+        """Create one subscription per user, spread over ``origins``, that this service accepts."""
+        subs = []
+        for user in users:
+            key = str(len(self.receivers))
+            ua_key = ec.generate_private_key(ec.SECP256R1())
+            auth = b64url_encode(os.urandom(16))
+            self.receivers[key] = (ua_key, auth)
+            subs.append(
+                PushSubscription(
+                    user=user,
+                    endpoint=f"{origins[int(key) % len(origins)]}/push/{key}",
+                    keys={"p256dh": b64url_encode(public_key_bytes(ua_key.public_key())), "auth": auth},
+                )
+            )
+        return PushSubscription.objects.bulk_create(subs)
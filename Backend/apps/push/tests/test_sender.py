@@ -0,0 +1,85 @@
+import json
+
+from asgiref.sync import async_to_sync
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.contrib.auth.models import User
+from django.test import TransactionTestCase, override_settings
+
+from apps.push import sender, services
+from apps.push.models import PushSubscription
+from apps.push.standin import StandInPushService
+from apps.push.webpush import b64url_encode
+
+PAYLOAD = {"title": "War starts in 1 hour", "body": "Attacks open at 18:00.", "url": "/clan"}
+
+
+class StandInDeliveryTests(TransactionTestCase):
+    """The real sender and pruning against the stand-in push service."""
+
+    def setUp(self):
+        key = ec.generate_private_key(ec.SECP256R1())
+        private = b64url_encode(key.private_numbers().private_value.to_bytes(32, "big"))
+        overrides = override_settings(VAPID_PRIVATE_KEY=private, PUSH_MAX_RETRIES=3)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user(username="alice")
+
+    def serve(self, users=1, **options):
+        service = StandInPushService(
+            expected=json.dumps(PAYLOAD, separators=(",", ":")).encode(), **options
+        )
+        port = service.start()
+        self.addCleanup(service.stop)
+        subs = service.subscribe([self.user] * users, [f"http://127.0.0.1:{port}"])
+        return service, subs
+
+    def deliver(self, subs):
+        return async_to_sync(services.deliver)(subs, PAYLOAD)
+
+    def test_delivers_encrypted_payload_with_vapid(self):
+        service, subs = self.serve(users=2)
+        results = self.deliver(subs)
+        # The stand-in answers 400 to a bad VAPID token or body and records why.
+        self.assertEqual(service.errors, [])
+        self.assertEqual([(r.status, r.attempts) for r in results], [(201, 1), (201, 1)])
+        self.assertEqual(service.payloads, [PAYLOAD, PAYLOAD])
+        self.assertEqual(PushSubscription.objects.count(), 2)
+
+    def test_retries_throttled_and_failing_pushes(self):
+        for status in (429, 500, 503):
+            with self.subTest(status=status):
+                service, subs = self.serve(flaky=1.0, flaky_status=status, retry_after="0")
+                [result] = self.deliver(subs)
+                self.assertEqual((result.status, result.attempts), (201, 2))
+                self.assertEqual(service.requests, 2)
+
+    def test_prunes_gone_subscriptions(self):
+        for status in (404, 410):
+            with self.subTest(status=status):
+                service, [sub] = self.serve(dead=1.0, dead_status=status)
+                [result] = self.deliver([sub])
+                self.assertTrue(result.gone)
+                self.assertEqual(result.attempts, 1)
+                self.assertFalse(PushSubscription.objects.filter(pk=sub.pk).exists())
+
+    def test_prunes_unusable_keys_without_sending(self):
+        service, [sub] = self.serve()
+        sub.keys = {"p256dh": "not a key", "auth": "x"}
+        sub.save()
+        with self.assertLogs("apps.push.sender", "WARNING"):
+            [result] = self.deliver([sub])
+        self.assertTrue(result.invalid)
+        self.assertEqual(service.requests, 0)
+        self.assertFalse(PushSubscription.objects.exists())
+
+    def test_session_is_closed_with_its_event_loop(self):
+        _, subs = self.serve()
+        used = []
+
+        async def deliver():
+            used.append(sender.get_sender())
+            return await services.deliver(subs, PAYLOAD)
+
+        async_to_sync(deliver)()
+        self.assertTrue(used[0]._session.closed)
+        self.assertNotIn(used[0], sender._senders.values())
@@ -0,0 +1,100 @@
+from asgiref.sync import async_to_sync
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from apps.push import services
+from apps.push.models import PushSubscription
+from apps.push.sender import PushResult
+from apps.push.webpush import b64url_encode
+
+ENDPOINT = "https://push.example.com/send/abc"
+
+
+def browser_keys() -> dict:
+    public = ec.generate_private_key(ec.SECP256R1()).public_key().public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+    return {"p256dh": b64url_encode(public), "auth": b64url_encode(b"0123456789abcdef")}
+
+
+class SubscribeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="alice")
+        self.client = APIClient(HTTP_HOST="localhost")
+        self.client.force_authenticate(self.user)
+
+    def subscribe(self, keys, endpoint=ENDPOINT):
+        return self.client.post(
+            "/api/push/subscribe/", {"endpoint": endpoint, "keys": keys}, format="json"
+        )
+
+    def test_resubscribing_updates_the_keys_in_place(self):
+        first = self.subscribe(browser_keys())
+        self.assertEqual(first.status_code, 201)
+        keys = browser_keys()
+        second = self.subscribe(keys)
+        self.assertEqual(second.status_code, 201)
+
+        [row] = PushSubscription.objects.filter(user=self.user)
+        self.assertEqual(row.keys, keys)
+        self.assertEqual(second.json()["id"], first.json()["id"])
+        self.assertEqual(row.pk, first.json()["id"])
+
+    def test_same_endpoint_is_one_row_per_user(self):
+        self.subscribe(browser_keys())
+        other = User.objects.create_user(username="bob")
+        self.client.force_authenticate(other)
+        self.subscribe(browser_keys())
+        self.assertEqual(PushSubscription.objects.filter(endpoint=ENDPOINT).count(), 2)
+
+    def test_rejects_keys_that_cannot_be_encrypted_for(self):
+        bad = {
+            "p256dh": b64url_encode(b"\x04" + b"\x00" * 64),  # not on the curve
+            "auth": b64url_encode(b"0123456789abcdef"),
+        }
+        for keys in (bad, {**browser_keys(), "auth": "short"}, {"p256dh": "x"}):
+            with self.subTest(keys=keys):
+                response = self.subscribe(keys)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("keys", response.json())
+        self.assertFalse(PushSubscription.objects.exists())
+
+
+class PruneTests(TransactionTestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=name) for name in ("alice", "bob")]
+
+    def add(self, user, endpoint):
+        return PushSubscription.objects.create(user=user, endpoint=endpoint, keys=browser_keys())
+
+    def test_deletes_gone_endpoints_for_every_user_and_invalid_rows(self):
+        alice, bob = self.users
+        gone = [self.add(user, "https://push.example.com/gone") for user in self.users]
+        invalid = self.add(alice, "https://push.example.com/bad-keys")
+        shared = self.add(bob, "https://push.example.com/bad-keys")
+        alive = self.add(alice, "https://push.example.com/alive")
+
+        results = [
+            PushResult(gone[0].pk, gone[0].endpoint, 410, 1),
+            PushResult(invalid.pk, invalid.endpoint, None, 0, invalid=True),
+            PushResult(alive.pk, alive.endpoint, 201, 1),
+            PushResult(None, "https://push.example.com/throttled", 429, 3),
+        ]
+        with self.assertLogs("apps.push.services", "INFO"):
+            deleted = async_to_sync(services.prune)(results)
+
+        # Both users' rows for the dead endpoint go; bob's row with the
+        # endpoint alice registered bad keys for stays.
+        self.assertEqual(deleted, 3)
+        self.assertEqual(
+            set(PushSubscription.objects.values_list("pk", flat=True)), {shared.pk, alive.pk}
+        )
+
+    def test_nothing_to_prune_runs_no_query(self):
+        alive = self.add(self.users[0], "https://push.example.com/alive")
+        with self.assertNumQueries(0):
+            deleted = async_to_sync(services.prune)([PushResult(alive.pk, alive.endpoint, 201, 1)])
+        self.assertEqual(deleted, 0)
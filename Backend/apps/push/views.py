@@ -1,9 +1,12 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 
 from .models import PushSubscription
 from .serializers import PushSubscriptionSerializer
+from .services import send_to_users
 
 
 class PushSubscribeView(generics.CreateAPIView):
@@ -11,32 +14,40 @@ class PushSubscribeView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        # Upsert: remove prior subscription with same endpoint for this user.
-        PushSubscription.objects.filter(
-            user=self.request.user,
-            endpoint=serializer.validated_data["endpoint"],
-        ).delete()
-        serializer.save(user=self.request.user)
+        # One INSERT ... ON CONFLICT (user, endpoint) DO UPDATE: re-subscribing
+        # refreshes the keys, and concurrent subscribes can't duplicate rows.
+        subscription = PushSubscription(user=self.request.user, **serializer.validated_data)
+        PushSubscription.objects.bulk_create(
+            [subscription],
+            update_conflicts=True,
+            unique_fields=["user", "endpoint"],
+            update_fields=["keys"],
+        )
+        serializer.instance = subscription
 
 
 @api_view(["POST"])
 @permission_classes([permissions.IsAuthenticated])
 def push_test(request):
-    """
-    Stub endpoint for testing push notifications.
-    In production, use pywebpush + VAPID keys to actually send a push.
-    Requirements: pip install pywebpush, VAPID_PUBLIC_KEY / VAPID_PRIVATE_KEY in .env
-    """
-    sub = PushSubscription.objects.filter(user=request.user).first()
-    if not sub:
+    """Send a test notification to all of the current user's subscriptions."""
+    if not settings.VAPID_PRIVATE_KEY:
+        return Response(
+            {"detail": "Web Push is not configured: set VAPID_PRIVATE_KEY."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+    results = async_to_sync(send_to_users)(
+        [request.user.id],
+        {"title": "COC Clan", "body": "Test notification", "url": "/profile"},
+    )
+    if not results:
         return Response(
             {"detail": "No push subscription found. Subscribe first."},
             status=status.HTTP_400_BAD_REQUEST,
         )
     return Response(
         {
-            "detail": "Test notification would be sent here.",
-            "subscription_endpoint": sub.endpoint,
-            "note": "Install pywebpush and configure VAPID keys for real push.",
+            "detail": f"Delivered to {sum(r.ok for r in results)} of {len(results)} "
+            "subscriptions.",
+            "results": [{"endpoint": r.endpoint, "status": r.status} for r in results],
         }
     )
@@ -0,0 +1,118 @@
+"""
+Web Push message encryption (RFC 8291, aes128gcm) and VAPID (RFC 8292).
+
+Keys use the same unpadded base64url encoding as the browser's
+PushSubscription and ``npx web-push generate-vapid-keys``.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import time
+from urllib.parse import urlsplit
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# One aes128gcm record; push services accept bodies up to 4096 bytes.
+RECORD_SIZE = 4096
+# Body = 86-byte header + payload + 1 delimiter byte + 16-byte tag.
+MAX_PAYLOAD = RECORD_SIZE - 86 - 17
+
+
+def b64url_decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def b64url_encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode()
+
+
+def hkdf(salt: bytes, ikm: bytes, info: bytes, length: int) -> bytes:
+    # Single-block HKDF (RFC 5869); every output here is <= 32 bytes.
+    prk = hmac.new(salt, ikm, hashlib.sha256).digest()
+    return hmac.new(prk, info + b"\x01", hashlib.sha256).digest()[:length]
+
+
+def public_key_bytes(key) -> bytes:
+    return key.public_bytes(
+        serialization.Encoding.X962, serialization.PublicFormat.UncompressedPoint
+    )
+
+
+def encrypt(payload: bytes, p256dh: str, auth: str) -> bytes:
+    """Encrypt ``payload`` for one subscription as a single aes128gcm record."""
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Push payload is {len(payload)} bytes; the limit is {MAX_PAYLOAD}.")
+
+    ua_public = b64url_decode(p256dh)
+    ua_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), ua_public)
+    as_key = ec.generate_private_key(ec.SECP256R1())
+    as_public = public_key_bytes(as_key.public_key())
+
+    ikm = hkdf(
+        b64url_decode(auth),
+        as_key.exchange(ec.ECDH(), ua_key),
+        b"WebPush: info\x00" + ua_public + as_public,
+        32,
+    )
+    salt = os.urandom(16)
+    cek = hkdf(salt, ikm, b"Content-Encoding: aes128gcm\x00", 16)
+    nonce = hkdf(salt, ikm, b"Content-Encoding: nonce\x00", 12)
+
+    header = salt + RECORD_SIZE.to_bytes(4, "big") + bytes([len(as_public)]) + as_public
+    return header + AESGCM(cek).encrypt(nonce, payload + b"\x02", None)
+
+
+def decrypt(body: bytes, ua_key: ec.EllipticCurvePrivateKey, auth: str) -> bytes:
+    """Receiving side of ``encrypt``, for stand-in push services and checks."""
+    salt, idlen = body[:16], body[20]
+    as_public, ciphertext = body[21 : 21 + idlen], body[21 + idlen :]
+    ua_public = public_key_bytes(ua_key.public_key())
+    as_key = ec.EllipticCurvePublicKey.from_encoded_point(ec.SECP256R1(), as_public)
+    ikm = hkdf(
+        b64url_decode(auth),
+        ua_key.exchange(ec.ECDH(), as_key),
+        b"WebPush: info\x00" + ua_public + as_public,
+        32,
+    )
+    cek = hkdf(salt, ikm, b"Content-Encoding: aes128gcm\x00", 16)
+    nonce = hkdf(salt, ikm, b"Content-Encoding: nonce\x00", 12)
+    plaintext = AESGCM(cek).decrypt(nonce, ciphertext, None)
+    return plaintext.rstrip(b"\x00")[:-1]  # drop padding, then the delimiter
+
+
+class Vapid:
+    """
+    Signs VAPID ``Authorization`` headers.
+
+    ES256 signing costs far more than the rest of a send, so one token is
+    minted per push-service origin and reused until close to its expiry.
+    """
+
+    def __init__(self, private_key: str, subject: str, lifetime: int = 12 * 3600):
+        self.subject = subject
+        self.lifetime = lifetime
+        self._key = ec.derive_private_key(
+            int.from_bytes(b64url_decode(private_key), "big"), ec.SECP256R1()
+        )
+        self.public_key = b64url_encode(public_key_bytes(self._key.public_key()))
+        self._tokens: dict[str, tuple[str, float]] = {}
+
+    def headers(self, endpoint: str) -> dict[str, str]:
+        parts = urlsplit(endpoint)
+        audience = f"{parts.scheme}://{parts.netloc}"
+        now = time.time()
+        cached = self._tokens.get(audience)
+        if cached is None or cached[1] - now < 3600:
+            expires = now + self.lifetime
+            token = jwt.encode(
+                {"aud": audience, "exp": int(expires), "sub": self.subject},
+                self._key,
+                algorithm="ES256",
+            )
+            cached = self._tokens[audience] = (token, expires)
+        return {"Authorization": f"vapid t={cached[0]}, k={self.public_key}"}
@@ -0,0 +1,192 @@
+"""
+Process-wide cache of Google's ID-token signing certificates.
+
+``google_id_token.verify_token`` fetches the cert set through whatever
+``google.auth.transport.Request`` it is given. CertCache is such a transport:
+requests for its cert URL are answered from memory, so ID tokens are verified
+locally and a login only touches the network when the cache is cold.
+
+- The cached set lives for the response's ``Cache-Control: max-age`` and is
+  refreshed on a background thread once it is within ``refresh_margin``
+  seconds of expiring.
+- If a refresh fails, the last good set keeps being served and the refresh
+  is retried after ``min_refresh_interval`` seconds.
+- A token signed with an unknown key id forces one refresh (rate limited), to
+  pick up a key rotation before the old set expires.
+
+The cert URL comes from ``GOOGLE_CERTS_URL`` so tests and benchmarks can point
+it at a local stand-in server.
+"""
+
+import base64
+import json
+import logging
+import re
+import threading
+import time
+
+import requests
+from django.conf import settings
+from google.auth import exceptions, transport
+from google.auth.transport import requests as google_requests
+from google.oauth2 import id_token as google_id_token
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class _CachedResponse(transport.Response):
+    def __init__(self, data: bytes):
+        self._data = data
+
+    @property
+    def status(self):
+        return 200
+
+    @property
+    def headers(self):
+        return {}
+
+    @property
+    def data(self):
+        return self._data
+
+
+class CertCache(transport.Request):
+    def __init__(
+        self,
+        url: str,
+        refresh_margin: float = 300,
+        default_max_age: float = 3600,
+        min_refresh_interval: float = 30,
+        timeout: float = 5,
+    ):
+        self.url = url
+        self.refresh_margin = refresh_margin
+        self.default_max_age = default_max_age
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        # One pooled session: refreshes reuse the keep-alive connection.
+        self._transport = google_requests.Request(session=requests.Session())
+        self._body: bytes | None = None
+        self._kids: frozenset[str] = frozenset()
+        self._expires_at = 0.0
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def __call__(self, url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if url != self.url or method != "GET":
+            return self._transport(
+                url, method=method, body=body, headers=headers, timeout=timeout, **kwargs
+            )
+        body = self.get()
+        if body is None:
+            raise exceptions.TransportError(f"Could not fetch certificates at {self.url}")
+        return _CachedResponse(body)
+
+    def get(self) -> bytes | None:
+        """Return the cached cert set, fetching it first if it has expired."""
+        now = time.monotonic()
+        if self._body is not None and now < self._expires_at:
+            if now >= self._expires_at - self.refresh_margin:
+                self._refresh_in_background()
+            return self._body
+
+        with self._lock:
+            if self._body is None or time.monotonic() >= self._expires_at:
+                self._refresh_locked()
+            return self._body
+
+    def knows(self, kid: str | None) -> bool:
+        return kid in self._kids
+
+    def force_refresh(self) -> bool:
+        """Refresh now unless one was attempted recently. Returns True if it ran."""
+        with self._lock:
+            if time.monotonic() - self._last_attempt < self.min_refresh_interval:
+                return False
+            self._refresh_locked()
+            return True
+
+    def _refresh_in_background(self) -> None:
+        # Held: a refresh is running, and the cached set is still good to serve.
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            # After a failed refresh the set expires sooner than the margin;
+            # wait out the same interval as a forced refresh before retrying.
+            if self._refreshing or (
+                time.monotonic() - self._last_attempt < self.min_refresh_interval
+            ):
+                return
+            self._refreshing = True
+        finally:
+            self._lock.release()
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self) -> None:
+        try:
+            with self._lock:
+                self._refresh_locked()
+        finally:
+            self._refreshing = False
+
+    def _refresh_locked(self) -> None:
+        self._last_attempt = time.monotonic()
+        try:
+            response = self._transport(self.url, method="GET", timeout=self.timeout)
+            if response.status != 200:
+                raise exceptions.TransportError(f"HTTP {response.status} from {self.url}")
+            certs = json.loads(response.data.decode("utf-8"))
+        except Exception as exc:
+            if self._body is None:
+                logger.warning("Google cert fetch failed with no cached set: %s", exc)
+                return
+            # Keep serving the last good set; retry after the rate-limit window.
+            logger.warning("Google cert refresh failed, serving cached set: %s", exc)
+            self._expires_at = self._last_attempt + self.min_refresh_interval
+            return
+
+        match = _MAX_AGE_RE.search(response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else self.default_max_age
+        self._body = response.data
+        if "keys" in certs:  # JWK set
+            self._kids = frozenset(key.get("kid") for key in certs["keys"])
+        else:  # {kid: x509 PEM}
+            self._kids = frozenset(certs)
+        self._expires_at = self._last_attempt + max_age
+
+
+def _unverified_kid(raw_token: str) -> str | None:
+    try:
+        header = raw_token.split(".", 1)[0]
+        header += "=" * (-len(header) % 4)
+        return json.loads(base64.urlsafe_b64decode(header)).get("kid")
+    except (ValueError, AttributeError):
+        return None
+
+
+def verify_id_token(raw_token: str, audience: str) -> dict:
+    """
+    Verify a Google ID token against the cached cert set.
+
+    Raises ValueError if the token is invalid, like
+    ``google_id_token.verify_oauth2_token``. Issuer checks are left to the
+    caller.
+    """
+    try:
+        return google_id_token.verify_token(
+            raw_token, cert_cache, audience=audience, certs_url=cert_cache.url
+        )
+    except ValueError:
+        kid = _unverified_kid(raw_token)
+        if kid and not cert_cache.knows(kid) and cert_cache.force_refresh():
+            return google_id_token.verify_token(
+                raw_token, cert_cache, audience=audience, certs_url=cert_cache.url
+            )
+        raise
+
+
+cert_cache = CertCache(settings.GOOGLE_CERTS_URL)
@@ -0,0 +1,121 @@
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from django.core.management.base import BaseCommand
+from google.auth import crypt, jwt
+from google.auth.transport import requests as google_requests
+from google.oauth2 import id_token as google_id_token
+from rest_framework.test import APIRequestFactory
+
+from apps.users import google_certs, views
+from config.benchmark import Timer, benchmark_database
+
+KID = "bench-key"
+
+
+def _make_key_and_cert():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench")])
+    now = datetime.datetime.now(datetime.UTC)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now)
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    key_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    return key_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def _serve_certs(cert_pem: str, latency: float):
+    body = json.dumps({KID: cert_pem}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)  # stand-in for the round trip to Google
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", "public, max-age=3600")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/certs"
+
+
+class Command(BaseCommand):
+    help = "Logins/sec through GoogleLoginView with a warm cert cache vs per-login cert fetches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=500)
+        parser.add_argument("--latency-ms", type=float, default=50)
+
+    def handle(self, *args, **opts):
+        key_pem, cert_pem = _make_key_and_cert()
+        server, url = _serve_certs(cert_pem, opts["latency_ms"] / 1000)
+        signer = crypt.RSASigner.from_string(key_pem, key_id=KID)
+        now = int(time.time())
+        token = jwt.encode(
+            signer,
+            {
+                "iss": "https://accounts.google.com",
+                "aud": views.GOOGLE_CLIENT_ID,
+                "sub": "bench-sub",
+                "email": "bench@example.com",
+                "email_verified": True,
+                "name": "Bench",
+                "iat": now,
+                "exp": now + 3600,
+            },
+        ).decode()
+        n = opts["logins"]
+
+        try:
+            with Timer() as t:
+                for _ in range(n):
+                    google_id_token.verify_token(
+                        token, google_requests.Request(), views.GOOGLE_CLIENT_ID, certs_url=url
+                    )
+            self.stdout.write(f"  fetch per login: {n / t.elapsed:,.0f} verifications/s")
+
+            google_certs.cert_cache = google_certs.CertCache(url)
+            google_certs.cert_cache.get()  # warm
+            with Timer() as t:
+                for _ in range(n):
+                    google_certs.verify_id_token(token, views.GOOGLE_CLIENT_ID)
+            self.stdout.write(f"       warm cache: {n / t.elapsed:,.0f} verifications/s")
+
+            with benchmark_database():
+                factory = APIRequestFactory()
+                view = views.GoogleLoginView.as_view()
+                with Timer() as t:
+                    for _ in range(n):
+                        response = view(
+                            factory.post("/api/auth/google/", {"id_token": token}, format="json")
+                        )
+                        assert response.status_code == 200, response.data
+                self.stdout.write(f"  logins, warm:    {n / t.elapsed:,.0f} logins/s")
+        finally:
+            server.shutdown()
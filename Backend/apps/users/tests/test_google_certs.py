@@ -0,0 +1,175 @@
+import datetime
+import json
+import threading
+from unittest import mock
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from django.test import SimpleTestCase
+from google.auth import crypt, exceptions, jwt
+
+from apps.users import google_certs
+from apps.users.google_certs import CertCache
+
+URL = "https://certs.example/oauth2/v1/certs"
+AUDIENCE = "client.apps.googleusercontent.com"
+
+
+def make_key(kid):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, kid)])
+    now = datetime.datetime.now(datetime.UTC)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    return crypt.RSASigner.from_string(pem, key_id=kid), cert.public_bytes(
+        serialization.Encoding.PEM
+    ).decode()
+
+
+class FakeResponse:
+    def __init__(self, certs, max_age):
+        self.status = 200
+        self.headers = {"cache-control": f"public, max-age={max_age}"}
+        self.data = json.dumps(certs).encode()
+
+
+class RotatingCerts:
+    """Google's cert endpoint: serves ``certs``, or raises ``error``; counts fetches."""
+
+    def __init__(self, certs, max_age=3600):
+        self.certs = certs
+        self.max_age = max_age
+        self.error = None
+        self.fetches = 0
+        self.fetched = threading.Event()
+        self.gate = threading.Event()  # cleared: fetches wait for it
+        self.gate.set()
+
+    def __call__(self, url, method="GET", timeout=None, **kwargs):
+        assert url == URL
+        self.fetches += 1
+        self.fetched.set()
+        self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return FakeResponse(dict(self.certs), self.max_age)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CertCacheTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.old_signer, cls.old_cert = make_key("old")
+        cls.new_signer, cls.new_cert = make_key("new")
+
+    def setUp(self):
+        self.endpoint = RotatingCerts({"old": self.old_cert})
+        self.cache = CertCache(URL, refresh_margin=300, min_refresh_interval=30)
+        self.cache._transport = self.endpoint
+        patcher = mock.patch.object(google_certs, "cert_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.clock = Clock()
+        patcher = mock.patch.object(google_certs.time, "monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def token(self, signer):
+        now = int(datetime.datetime.now(datetime.UTC).timestamp())
+        payload = {
+            "iss": "https://accounts.google.com",
+            "aud": AUDIENCE,
+            "sub": "123",
+            "iat": now,
+            "exp": now + 600,
+        }
+        return jwt.encode(signer, payload).decode()
+
+    def verify(self, signer):
+        return google_certs.verify_id_token(self.token(signer), AUDIENCE)
+
+    def test_cert_set_is_fetched_once_and_served_from_memory(self):
+        for _ in range(3):
+            self.assertEqual(self.verify(self.old_signer)["sub"], "123")
+        self.assertEqual(self.endpoint.fetches, 1)
+
+    def test_rotated_key_verifies_after_exactly_one_forced_fetch(self):
+        self.verify(self.old_signer)
+        self.clock.now += 60  # past min_refresh_interval, well before expiry
+        self.endpoint.certs = {"old": self.old_cert, "new": self.new_cert}
+        self.assertEqual(self.verify(self.new_signer)["sub"], "123")
+        self.assertEqual(self.endpoint.fetches, 2)
+        self.verify(self.new_signer)
+        self.verify(self.old_signer)
+        self.assertEqual(self.endpoint.fetches, 2)
+
+    def test_unknown_key_forces_at_most_one_fetch_per_interval(self):
+        self.verify(self.old_signer)  # "new" is never published
+        self.clock.now += 60
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.verify(self.new_signer)
+        self.assertEqual(self.endpoint.fetches, 2)
+        self.clock.now += 30
+        with self.assertRaises(ValueError):
+            self.verify(self.new_signer)
+        self.assertEqual(self.endpoint.fetches, 3)
+
+    def test_refreshes_in_the_background_before_expiry(self):
+        self.cache.get()
+        self.endpoint.certs = {"new": self.new_cert}
+        self.endpoint.fetched.clear()
+        self.endpoint.gate.clear()
+        self.clock.now += 3600 - 299  # inside refresh_margin
+        # The caller is served the cached set at once; a thread fetches the next.
+        self.assertIn(b'"old"', self.cache.get())
+        self.assertTrue(self.endpoint.fetched.wait(5))
+        self.assertIn(b'"old"', self.cache.get())
+        self.endpoint.gate.set()
+        with self.cache._lock:  # held by the refresh until it is stored
+            pass
+        self.assertEqual(self.endpoint.fetches, 2)
+        self.assertTrue(self.cache.knows("new"))
+        self.assertIn(b'"new"', self.cache.get())
+
+    def test_failed_refresh_keeps_serving_the_last_good_set(self):
+        self.verify(self.old_signer)
+        self.endpoint.error = exceptions.TransportError("connection reset")
+        self.clock.now += 3600
+        with self.assertLogs("apps.users.google_certs", "WARNING"):
+            self.assertEqual(self.verify(self.old_signer)["sub"], "123")
+        # Retried only after min_refresh_interval.
+        self.verify(self.old_signer)
+        self.assertEqual(self.endpoint.fetches, 2)
+        self.clock.now += 30
+        self.endpoint.error = None
+        self.verify(self.old_signer)
+        self.assertEqual(self.endpoint.fetches, 3)
+
+    def test_failed_first_fetch_fails_verification(self):
+        self.endpoint.error = exceptions.TransportError("connection refused")
+        with self.assertLogs("apps.users.google_certs", "WARNING"), self.assertRaises(
+            exceptions.TransportError
+        ):
+            self.verify(self.old_signer)
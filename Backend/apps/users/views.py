@@ -2,13 +2,12 @@ import logging
 
 from django.conf import settings
 from django.contrib.auth.models import User
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token as google_id_token
 from rest_framework import permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from .google_certs import verify_id_token
 from .models import UserProfile
 from .serializers import GoogleLoginSerializer, UserSerializer
 
@@ -39,13 +38,9 @@ class GoogleLoginView(APIView):
         ser.is_valid(raise_exception=True)
         raw_token = ser.validated_data["id_token"]
 
-        # ── 1. Verify Google ID token ──────────────────────────────
+        # ── 1. Verify Google ID token (certs served from cert_cache) ─
         try:
-            idinfo = google_id_token.verify_oauth2_token(
-                raw_token,
-                google_requests.Request(),
-                GOOGLE_CLIENT_ID,
-            )
+            idinfo = verify_id_token(raw_token, GOOGLE_CLIENT_ID)
         except ValueError as exc:
             logger.warning("Google token verification failed: %s", exc)
             return Response(
@@ -0,0 +1,46 @@
+"""
+Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks run against a throwaway database built from the current migrations,
+so they never touch real data. On SQLite the throwaway database is an on-disk
+file rather than Django's usual in-memory test database, so write latency is
+representative of a deployment.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+@contextmanager
+def benchmark_database(alias: str = "default", verbosity: int = 0):
+    connection = connections[alias]
+    old_name = connection.settings_dict["NAME"]
+    tmpdir = None
+    if connection.vendor == "sqlite":
+        tmpdir = tempfile.mkdtemp(prefix="coc-bench-")
+        connection.settings_dict.setdefault("TEST", {})
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tmpdir, "bench.sqlite3")
+
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+class Timer:
+    """``with Timer() as t: ...`` then read ``t.elapsed`` (seconds)."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,112 @@
+"""
+Database profiles, chosen with ``DB_PROFILE``.
+
+``sqlite`` (the default) is tuned for an ASGI server with concurrent writers:
+
+- ``journal_mode=WAL``: readers never block the writer and the writer never
+  blocks readers; only writers queue behind each other.
+- ``synchronous=NORMAL``: in WAL mode a commit no longer waits for fsync. A
+  power loss can undo the last transactions but cannot corrupt the file.
+- ``busy_timeout``: a writer waits for the lock instead of failing at once
+  with "database is locked".
+- ``mmap_size`` and ``cache_size``: reads are served from a memory map and a
+  larger page cache instead of a 2 MiB cache and ``read()`` calls.
+- Transactions start ``IMMEDIATE``, so a transaction that reads before it
+  writes takes the write lock up front. A deferred one that tries to upgrade
+  while another connection writes gets SQLITE_BUSY without waiting at all,
+  whatever the busy timeout. The flip side is that every
+  ``transaction.atomic()`` block, and every savepoint such as the one
+  ``get_or_create`` opens, takes the write lock on entry even if it only
+  reads. Read paths (the roster snapshot, message pagination) therefore stay
+  out of ``atomic()``; wrap only code that writes.
+- ``DB_CONN_MAX_AGE`` defaults to 0: a connection per request. Under ASGI,
+  sync views and ``database_sync_to_async`` calls run on executor threads,
+  and a persistent connection belongs to the thread that opened it, so
+  each thread would hold its own file handle and page cache and
+  ``request_finished`` would not reliably close them. WSGI deployments,
+  where a worker thread serves one request at a time, can set it to e.g.
+  600; ``CONN_HEALTH_CHECKS`` then drops a connection that went bad.
+
+``sqlite-basic`` is the bare file the project started with (rollback journal,
+a connection per request), kept for comparison in ``bench_db_contention``.
+
+``postgres`` uses Django's psycopg connection pool (``pip install
+"psycopg[binary,pool]"``). Each process holds ``DB_POOL_MIN_SIZE`` to
+``DB_POOL_MAX_SIZE`` connections; a pool replaces persistent connections, so
+``CONN_MAX_AGE`` stays 0.
+
+Each entry of ``DB_REPLICAS`` (a SQLite path, or ``host[:port]`` for
+PostgreSQL) becomes a ``replicaN`` alias with the primary's settings; see
+config/routers.py.
+"""
+
+import os
+from pathlib import Path
+
+PROFILES = ("sqlite", "sqlite-basic", "postgres")
+
+
+def sqlite_pragmas() -> dict[str, str]:
+    return {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": os.getenv("SQLITE_BUSY_TIMEOUT", "5000"),  # ms
+        "mmap_size": os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)),
+        # Negative: KiB rather than pages.
+        "cache_size": os.getenv("SQLITE_CACHE_SIZE", str(-64 * 1024)),
+        # Truncate the WAL back to this size after a checkpoint.
+        "journal_size_limit": str(64 * 1024 * 1024),
+    }
+
+
+def database_profile(profile: str, sqlite_path) -> dict:
+    """The ``DATABASES["default"]`` entry for a profile."""
+    if profile == "sqlite":
+        return {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": sqlite_path,
+            "OPTIONS": {
+                "init_command": "".join(
+                    f"PRAGMA {name}={value};" for name, value in sqlite_pragmas().items()
+                ),
+                "transaction_mode": "IMMEDIATE",
+            },
+            # 0 under ASGI; see the module docstring before raising it.
+            "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "0")),
+            "CONN_HEALTH_CHECKS": True,
+        }
+    if profile == "sqlite-basic":
+        return {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": sqlite_path,
+        }
+    if profile == "postgres":
+        return {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.getenv("POSTGRES_DB", "coc"),
+            "USER": os.getenv("POSTGRES_USER", "coc"),
+            "PASSWORD": os.getenv("POSTGRES_PASSWORD", ""),
+            "HOST": os.getenv("POSTGRES_HOST", "localhost"),
+            "PORT": os.getenv("POSTGRES_PORT", "5432"),
+            "OPTIONS": {
+                "pool": {
+                    "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+                    "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+                    "timeout": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+                },
+            },
+        }
+    raise ValueError(f"Unknown DB_PROFILE {profile!r}; expected one of {', '.join(PROFILES)}.")
+
+
+def replica_profile(primary: dict, location: str) -> dict:
+    """A read replica of ``primary`` at a SQLite path or a PostgreSQL host[:port]."""
+    replica = {**primary, "OPTIONS": dict(primary.get("OPTIONS", {}))}
+    if primary["ENGINE"].endswith("sqlite3"):
+        replica["NAME"] = Path(primary["NAME"]).parent / location
+    else:
+        host, _, port = location.partition(":")
+        replica.update(HOST=host, PORT=port or primary["PORT"])
+    # Tests and benchmarks read the test primary through the replica alias.
+    replica["TEST"] = {"MIRROR": "default"}
+    return replica
@@ -0,0 +1,306 @@
+"""
+Read replicas for chat history, channel lists and clan data.
+
+``DB_REPLICAS`` adds one database alias per replica (``replica1``, ...; see
+config/database.py). ReplicaRouter then sends reads of the models named in
+``DB_REPLICA_MODELS`` (``app_label`` or ``app_label.Model``) to a replica,
+but only while serving a request or a WebSocket. Management commands,
+background threads (thumbnails, the write-behind flush) and anything inside
+a transaction read the primary. Every write goes to the primary.
+
+Read-your-writes:
+
+- A POST/PUT/PATCH/DELETE request reads the primary throughout, and so does
+  any request after its first write.
+- A user who wrote is pinned to the primary for ``DB_STICKY_SECONDS``, over
+  REST and over their sockets alike, so a history page fetched right after
+  posting includes the post. The marks live in-process (``local``) or under
+  ``REDIS_URL`` (``redis``, shared by every worker), per ``DB_STICKY_STORE``.
+- One request reads one replica, so its queries see one snapshot.
+- Code that fills a cache other readers trust (the recent-message buffer,
+  roster snapshots, clan stats) reads inside ``primary()``: a lagging
+  replica's rows would pass its version check and be stored as current.
+
+Health: every ``DB_REPLICA_CHECK_INTERVAL`` seconds each replica is probed.
+One that cannot be reached, has applied a different set of migrations than
+the primary, or (PostgreSQL) replays more than ``DB_REPLICA_MAX_LAG`` seconds
+behind, gets no reads until a later probe passes. With no healthy replica,
+reads fall back to the primary.
+
+Locally, two SQLite files stand in: ``DB_REPLICAS=replica1.sqlite3`` and
+``python manage.py refresh_replicas`` to copy the primary into them, which
+plays the part of replication (with as much lag as you leave between runs).
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import redis
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class LocalWriteMarks:
+    def __init__(self):
+        self._until: dict[int, float] = {}
+
+    def mark(self, user_id: int, seconds: float) -> None:
+        now = time.monotonic()
+        if len(self._until) > 10_000:
+            self._until = {u: t for u, t in self._until.items() if t > now}
+        self._until[user_id] = now + seconds
+
+    def marked(self, user_id: int) -> bool:
+        return self._until.get(user_id, 0) > time.monotonic()
+
+
+class RedisWriteMarks:
+    def __init__(self, url: str, prefix: str = "db:wrote:"):
+        self._redis = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def mark(self, user_id: int, seconds: float) -> None:
+        self._redis.set(f"{self._prefix}{user_id}", 1, px=max(int(seconds * 1000), 1))
+
+    def marked(self, user_id: int) -> bool:
+        return bool(self._redis.exists(f"{self._prefix}{user_id}"))
+
+
+class RoutingState:
+    """
+    What the router knows about the request or socket being served.
+
+    ``user`` is called lazily: DRF authenticates inside the view, after the
+    middleware has run, and sets the user on the Django request.
+    """
+
+    def __init__(self, user, marks, sticky_seconds: float, per_request: bool):
+        self._user = user
+        self._marks = marks
+        self._sticky_seconds = sticky_seconds
+        # A socket lives for hours; only a request pins itself and caches.
+        self.per_request = per_request
+        self.pinned = False
+        self.replica = None
+        self._sticky = None
+        self._marked = False
+
+    def user_id(self):
+        user = self._user()
+        return user.pk if user is not None and user.is_authenticated else None
+
+    def sticky(self) -> bool:
+        if self._sticky is None or not self.per_request:
+            user_id = self.user_id()
+            self._sticky = user_id is not None and self._marks.marked(user_id)
+        return self._sticky
+
+    def wrote(self) -> None:
+        if self.per_request:
+            self.pinned = True
+        if not self._marked or not self.per_request:
+            user_id = self.user_id()
+            if user_id is not None:
+                self._marks.mark(user_id, self._sticky_seconds)
+                self._marked = True
+
+
+_state: ContextVar[RoutingState | None] = ContextVar("db_routing_state", default=None)
+_primary: ContextVar[bool] = ContextVar("db_routing_primary", default=False)
+
+
+class ReplicaHealth:
+    def __init__(self, aliases: list[str], interval: float, max_lag: float):
+        self.aliases = aliases
+        self.interval = interval
+        self.max_lag = max_lag
+        self._healthy: list[str] = []
+        self._checked = float("-inf")
+        self._lock = threading.Lock()
+
+    def healthy(self) -> list[str]:
+        """Replicas that passed the last probe; probes again when it is stale."""
+        if time.monotonic() - self._checked >= self.interval and self._lock.acquire(
+            blocking=False
+        ):
+            # One thread probes; the others keep using the previous result.
+            try:
+                self._healthy = self.check()
+                self._checked = time.monotonic()
+            finally:
+                self._lock.release()
+        return self._healthy
+
+    def check(self) -> list[str]:
+        try:
+            expected = _applied_migrations(DEFAULT_DB_ALIAS)
+        except DatabaseError:
+            logger.exception("Cannot read the primary's migrations; reading the primary")
+            return []
+        return [alias for alias in self.aliases if self._probe(alias, expected)]
+
+    def _probe(self, alias: str, expected: int) -> bool:
+        connection = connections[alias]
+        try:
+            applied = _applied_migrations(alias)
+            lag = 0.0
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()"
+                        " THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())"
+                        " END"
+                    )
+                    lag = float(cursor.fetchone()[0] or 0)
+        except DatabaseError as exc:
+            connection.close()
+            logger.warning("Replica %s is unavailable: %s", alias, exc)
+            return False
+        if applied != expected:
+            logger.warning("Replica %s has %d migrations, primary %d", alias, applied, expected)
+            return False
+        if lag > self.max_lag:
+            logger.warning("Replica %s is %.1fs behind", alias, lag)
+            return False
+        return True
+
+
+def _applied_migrations(alias: str) -> int:
+    with connections[alias].cursor() as cursor:
+        cursor.execute("SELECT COUNT(*) FROM django_migrations")
+        return cursor.fetchone()[0]
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self.replicas = list(settings.DB_REPLICA_ALIASES)
+        self.health = ReplicaHealth(
+            self.replicas, settings.DB_REPLICA_CHECK_INTERVAL, settings.DB_REPLICA_MAX_LAG
+        )
+        labels = [label.strip().lower() for label in settings.DB_REPLICA_MODELS.split(",")]
+        self._apps = {label for label in labels if label and "." not in label}
+        self._models = {label for label in labels if "." in label}
+
+    def _routed(self, model) -> bool:
+        meta = model._meta
+        return meta.app_label in self._apps or meta.label_lower in self._models
+
+    def db_for_read(self, model, **hints):
+        if not self.replicas or not self._routed(model):
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db  # related objects come from the same database
+        state = _state.get()
+        if (
+            state is None
+            or state.pinned
+            or _primary.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or state.sticky()
+        ):
+            return DEFAULT_DB_ALIAS
+        healthy = self.health.healthy()
+        if state.replica not in healthy:
+            state.replica = random.choice(healthy) if healthy else None
+        return state.replica or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if not self.replicas:
+            return None
+        state = _state.get()
+        if state is not None:
+            state.wrote()
+        # Explicitly, or saving an instance read from a replica would write there.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not self.replicas:
+            return None
+        aliases = {DEFAULT_DB_ALIAS, *self.replicas}
+        return obj1._state.db in aliases and obj2._state.db in aliases or None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        return False if db in self.replicas else None
+
+
+def _build_marks():
+    if settings.DB_STICKY_STORE == "redis":
+        return RedisWriteMarks(settings.REDIS_URL)
+    return LocalWriteMarks()
+
+
+write_marks = _build_marks()
+
+
+def bind(user, *, per_request: bool, pinned: bool = False):
+    """Route the current context's reads for ``user`` (a callable); returns a reset token."""
+    state = RoutingState(user, write_marks, settings.DB_STICKY_SECONDS, per_request=per_request)
+    state.pinned = pinned
+    return _state.set(state)
+
+
+def unbind(token) -> None:
+    _state.reset(token)
+
+
+@contextmanager
+def primary():
+    """Read the primary inside this block, whatever the current context's routing."""
+    token = _primary.set(True)
+    try:
+        yield
+    finally:
+        _primary.reset(token)
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    def start(request):
+        return bind(
+            lambda: getattr(request, "user", None),
+            per_request=True,
+            pinned=request.method not in SAFE_METHODS,
+        )
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            token = start(request)
+            try:
+                return await get_response(request)
+            finally:
+                unbind(token)
+
+    else:
+
+        def middleware(request):
+            token = start(request)
+            try:
+                return get_response(request)
+            finally:
+                unbind(token)
+
+    return middleware
+
+
+def refresh_sqlite_replica(alias: str) -> None:
+    """Copy the primary SQLite database into a replica file: local stand-in replication."""
+    primary = connections[DEFAULT_DB_ALIAS]
+    replica = connections[alias]
+    primary.ensure_connection()
+    replica.ensure_connection()
+    # The backup API copies a consistent snapshot, page by page, under the
+    # replica's own locks; its open connections see the new contents.
+    primary.connection.backup(replica.connection)
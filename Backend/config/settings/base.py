@@ -5,6 +5,8 @@ from pathlib import Path
 
 from dotenv import load_dotenv
 
+from config.database import database_profile, replica_profile
+
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
 load_dotenv(BASE_DIR / ".env")
 
@@ -42,6 +44,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "config.routers.replica_routing_middleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -68,12 +71,29 @@ WSGI_APPLICATION = "config.wsgi.application"
 ASGI_APPLICATION = "config.asgi.application"
 
 # ── Database ──────────────────────────────────────────────────────────
+# DB_PROFILE (config/database.py): "sqlite" (WAL, tuned pragmas, persistent
+# connections), "sqlite-basic" (plain file) or "postgres" (pooled).
+DB_PROFILE = os.getenv("DB_PROFILE", "sqlite")
 DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
-    }
+    "default": database_profile(DB_PROFILE, BASE_DIR / "db.sqlite3"),
 }
+# Read replicas (config/routers.py): comma-separated SQLite paths (relative to
+# the primary's directory) or Postgres host[:port], one "replicaN" alias each.
+# Reads of DB_REPLICA_MODELS made while serving a request go to a healthy
+# replica, except for DB_STICKY_SECONDS after the user's last write.
+DB_REPLICAS = [r.strip() for r in os.getenv("DB_REPLICAS", "").split(",") if r.strip()]
+for _i, _location in enumerate(DB_REPLICAS, 1):
+    DATABASES[f"replica{_i}"] = replica_profile(DATABASES["default"], _location)
+DB_REPLICA_ALIASES = [f"replica{i}" for i in range(1, len(DB_REPLICAS) + 1)]
+DB_REPLICA_MODELS = os.getenv(
+    "DB_REPLICA_MODELS",
+    "chat.ChatChannel,chat.ChatMessage,chat.ChatAttachment,chat.ChatArchiveSegment,clan",
+)
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "2"))
+DB_STICKY_SECONDS = float(os.getenv("DB_STICKY_SECONDS", "5"))
+DB_STICKY_STORE = os.getenv("DB_STICKY_STORE", "redis" if os.getenv("REDIS_URL") else "local")
+DATABASE_ROUTERS = ["config.routers.ReplicaRouter"]
 
 # ── Auth ──────────────────────────────────────────────────────────────
 AUTH_PASSWORD_VALIDATORS = [
@@ -145,12 +165,128 @@ else:
         stacklevel=1,
     )
 
+# ── Chat / WebSocket ─────────────────────────────────────────────────
+# Write-behind mode broadcasts WebSocket messages immediately and persists
+# them in batches (see apps/chat/ingest.py). Off by default. Each worker
+# reserves ids in blocks of CHAT_WRITE_BEHIND_ID_BLOCK, so ids from different
+# workers interleave out of order; history and replay order by (created_at, id).
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "False").lower() in ("true", "1", "yes")
+CHAT_WRITE_BEHIND_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BEHIND_BATCH_SIZE", "200"))
+CHAT_WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_BEHIND_FLUSH_INTERVAL", "0.05"))
+CHAT_WRITE_BEHIND_MAX_PENDING = int(os.getenv("CHAT_WRITE_BEHIND_MAX_PENDING", "5000"))
+CHAT_WRITE_BEHIND_ID_BLOCK = int(os.getenv("CHAT_WRITE_BEHIND_ID_BLOCK", "1000"))
+
+# Most messages replayed to a resuming WebSocket before it is told to
+# refetch over REST instead.
+CHAT_REPLAY_LIMIT = int(os.getenv("CHAT_REPLAY_LIMIT", "200"))
+
+# Channels one multiplexed socket (ws/chat/) may subscribe to.
+CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS = int(os.getenv("CHAT_MULTIPLEX_MAX_SUBSCRIPTIONS", "50"))
+
+# Encoder for broadcast frames: "auto", "orjson", "json" or a dotted path
+# to a callable(obj) -> str (apps/chat/encoding.py).
+CHAT_JSON_ENCODER = os.getenv("CHAT_JSON_ENCODER", "auto")
+
+# Ring buffer of the newest serialized messages per channel, serving
+# cursorless history reads (apps/chat/recent.py): "local", "redis" or "off".
+CHAT_RECENT_CACHE = os.getenv("CHAT_RECENT_CACHE", "redis" if REDIS_URL else "local")
+CHAT_RECENT_SIZE = int(os.getenv("CHAT_RECENT_SIZE", "100"))
+CHAT_RECENT_MAX_CHANNELS = int(os.getenv("CHAT_RECENT_MAX_CHANNELS", "2000"))
+CHAT_RECENT_MAX_BYTES = int(os.getenv("CHAT_RECENT_MAX_BYTES", str(64 * 1024 * 1024)))
+CHAT_RECENT_TTL = int(os.getenv("CHAT_RECENT_TTL", "86400"))
+
+# Message search (apps/chat/search.py): "auto" (FTS5 on SQLite, else
+# "basic"), "fts5", "basic" or a dotted path to a backend class.
+CHAT_SEARCH_BACKEND = os.getenv("CHAT_SEARCH_BACKEND", "auto")
+# Only the newest N matches are ranked (0 ranks every match).
+CHAT_SEARCH_RANK_WINDOW = int(os.getenv("CHAT_SEARCH_RANK_WINDOW", "1000"))
+
+# Presence and typing indicators (apps/chat/presence.py): at most one
+# presence frame per channel per interval. Store is "local" or "redis".
+CHAT_PRESENCE_STORE = os.getenv("CHAT_PRESENCE_STORE", "redis" if REDIS_URL else "local")
+CHAT_PRESENCE_INTERVAL = float(os.getenv("CHAT_PRESENCE_INTERVAL", "0.5"))
+CHAT_PRESENCE_TTL = float(os.getenv("CHAT_PRESENCE_TTL", "60"))
+CHAT_TYPING_TTL = float(os.getenv("CHAT_TYPING_TTL", "6"))
+# Users who opened or posted in a channel within this many days are "seen"
+# there: the audience of its Web Push notifications.
+CHAT_SEEN_DAYS = float(os.getenv("CHAT_SEEN_DAYS", "30"))
+
+# Per-socket outbound queue (apps/chat/outbound.py). Policy when a slow
+# client's queue is full: "resync", "drop_oldest", "disconnect" or "off".
+# Off by default: the queue only fills under an ASGI server with send
+# backpressure (uvicorn); under Daphne it is a task per socket for nothing.
+CHAT_OUTBOUND_POLICY = os.getenv("CHAT_OUTBOUND_POLICY", "off")
+CHAT_OUTBOUND_QUEUE_SIZE = int(os.getenv("CHAT_OUTBOUND_QUEUE_SIZE", "256"))
+
+# Web Push for new messages to users not in the channel (apps/chat/notify.py):
+# one coalesced notification per user and channel per window, in seconds.
+CHAT_PUSH_WINDOW = float(os.getenv("CHAT_PUSH_WINDOW", "10"))
+# Who is notified: "seen" (users seen in the channel, see CHAT_SEEN_DAYS),
+# "everyone" with a subscription, or the dotted path of an async function
+# (presence, channel_id) -> set of user ids, or None for everyone.
+CHAT_PUSH_AUDIENCE = os.getenv("CHAT_PUSH_AUDIENCE", "seen")
+
+# Cold storage for old history (apps/chat/archive.py): archive_chat moves whole
+# months older than CHAT_ARCHIVE_AFTER_DAYS into gzip segments, in blocks of
+# CHAT_ARCHIVE_BLOCK_SIZE messages.
+CHAT_ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", str(BASE_DIR / "archive"))
+CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "180"))
+CHAT_ARCHIVE_BLOCK_SIZE = int(os.getenv("CHAT_ARCHIVE_BLOCK_SIZE", "256"))
+
+# Attachments (apps/chat/attachments.py): chunked uploads are staged under
+# CHAT_UPLOAD_DIR and stored by SHA-256. Unfinished uploads expire (seconds).
+CHAT_UPLOAD_DIR = os.getenv("CHAT_UPLOAD_DIR", str(BASE_DIR / "uploads"))
+CHAT_UPLOAD_CHUNK_SIZE = int(os.getenv("CHAT_UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+CHAT_UPLOAD_EXPIRY = int(os.getenv("CHAT_UPLOAD_EXPIRY", "86400"))
+CHAT_ATTACHMENT_MAX_SIZE = int(os.getenv("CHAT_ATTACHMENT_MAX_SIZE", str(25 * 1024 * 1024)))
+# Thumbnail/preview pool (apps/chat/thumbnails.py); 0 workers leaves it to
+# manage.py sweep_attachments.
+CHAT_THUMBNAIL_WORKERS = int(os.getenv("CHAT_THUMBNAIL_WORKERS", "2"))
+CHAT_THUMBNAIL_MAX_PENDING = int(os.getenv("CHAT_THUMBNAIL_MAX_PENDING", "200"))
+
+# Serving MEDIA_URL (apps/chat/media.py): a JWT or a signed URL is required
+# unless CHAT_MEDIA_AUTH is off. Signed URLs in API responses stay the same
+# for CHAT_MEDIA_URL_TTL seconds and expire one to two TTLs after issue.
+# CHAT_MEDIA_ACCEL hands bodies to the proxy: "off", "nginx"
+# (X-Accel-Redirect to CHAT_MEDIA_ACCEL_PREFIX) or "sendfile" (X-Sendfile).
+CHAT_MEDIA_AUTH = os.getenv("CHAT_MEDIA_AUTH", "True").lower() in ("true", "1", "yes")
+CHAT_MEDIA_URL_TTL = int(os.getenv("CHAT_MEDIA_URL_TTL", "3600"))
+CHAT_MEDIA_ACCEL = os.getenv("CHAT_MEDIA_ACCEL", "off")
+CHAT_MEDIA_ACCEL_PREFIX = os.getenv("CHAT_MEDIA_ACCEL_PREFIX", "/protected-media/")
+CHAT_MEDIA_BLOCK_SIZE = int(os.getenv("CHAT_MEDIA_BLOCK_SIZE", str(512 * 1024)))
+
+# WebSocket handshake user cache (apps/chat/auth_cache.py).
+WS_USER_CACHE_SIZE = int(os.getenv("WS_USER_CACHE_SIZE", "10000"))
+WS_USER_CACHE_TTL = float(os.getenv("WS_USER_CACHE_TTL", "300"))
+# Where invalidations are published to other workers: "redis" or "local".
+WS_USER_CACHE_VERSIONS = os.getenv(
+    "WS_USER_CACHE_VERSIONS", "redis" if REDIS_URL else "local"
+)
+
+# ── Clan ─────────────────────────────────────────────────────────────
+# Serve rosters from a per-clan JSON snapshot, rebuilt on the first read
+# after a change (apps/clan/roster.py), instead of serializing every read.
+CLAN_ROSTER_SNAPSHOTS = os.getenv("CLAN_ROSTER_SNAPSHOTS", "True").lower() in ("true", "1", "yes")
+
 # ── VAPID (Web Push) ─────────────────────────────────────────────────
 VAPID_PUBLIC_KEY = os.getenv("VAPID_PUBLIC_KEY", "")
 VAPID_PRIVATE_KEY = os.getenv("VAPID_PRIVATE_KEY", "")
+VAPID_SUBJECT = os.getenv("VAPID_SUBJECT", "mailto:admin@localhost")
+
+# Delivery engine (apps/push/sender.py).
+PUSH_TTL = int(os.getenv("PUSH_TTL", "86400"))
+PUSH_CONCURRENCY = int(os.getenv("PUSH_CONCURRENCY", "100"))
+PUSH_CONNECTIONS_PER_ORIGIN = int(os.getenv("PUSH_CONNECTIONS_PER_ORIGIN", "20"))
+PUSH_MAX_RETRIES = int(os.getenv("PUSH_MAX_RETRIES", "3"))
+PUSH_TIMEOUT = float(os.getenv("PUSH_TIMEOUT", "10"))
 
 # ── Google OAuth ──────────────────────────────────────────────────────
 GOOGLE_CLIENT_ID = os.getenv(
     "GOOGLE_CLIENT_ID",
     "527161504748-g7cunsdg6m0i7ebncershnftj5l66tqa.apps.googleusercontent.com",
 )
+# Signing certs for ID-token verification, cached per Cache-Control max-age
+# (apps/users/google_certs.py). Override to point at a local stand-in.
+GOOGLE_CERTS_URL = os.getenv(
+    "GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs"
+)
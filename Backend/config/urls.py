@@ -1,11 +1,12 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 
+from apps.chat import media
+
 
 @api_view(["GET"])
 @permission_classes([AllowAny])
@@ -18,9 +19,8 @@ urlpatterns = [
     path("api/health/", health_check, name="health-check"),
     path("api/auth/", include("apps.users.urls")),
     path("api/chat/", include("apps.chat.urls")),
+    path("api/clans/", include("apps.clan.urls")),
     path("api/push/", include("apps.push.urls")),
+    # Attachments, in production too; see apps/chat/media.py.
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:path>", media.serve, name="media"),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL,
-                          document_root=settings.MEDIA_ROOT)
@@ -50,18 +50,36 @@ self.addEventListener("fetch", (event) => {
 // Push notification handler
 self.addEventListener("push", (event) => {
   const data = event.data ? event.data.json() : {};
+  event.waitUntil(showPush(data));
+});
+
+async function showPush(data) {
   const title = data.title || "COC Clan";
-  const options = {
-    body: data.body || "You have a new notification.",
+  let body = data.body || "You have a new notification.";
+  let count = data.count || 0;
+  if (data.tag && count) {
+    // Chat pushes count the messages since the last push; add the count still shown.
+    const [shown] = await self.registration.getNotifications({ tag: data.tag });
+    const previous = (shown && shown.data && shown.data.count) || 0;
+    if (previous) {
+      count += previous;
+      body = `${count} new messages in ${title}`;
+    }
+  }
+  return self.registration.showNotification(title, {
+    body,
     icon: "/icons/icon-192.png",
     badge: "/icons/icon-192.png",
-    data: data.url || "/",
-  };
-  event.waitUntil(self.registration.showNotification(title, options));
-});
+    data: { url: data.url || "/", count },
+    // Chat pushes share a per-channel tag, so the running count replaces the old one.
+    tag: data.tag,
+    renotify: Boolean(data.tag),
+  });
+}
 
 // Notification click
 self.addEventListener("notificationclick", (event) => {
   event.notification.close();
-  event.waitUntil(clients.openWindow(event.notification.data));
+  const { data } = event.notification;
+  event.waitUntil(clients.openWindow(typeof data === "string" ? data : data.url));
 });
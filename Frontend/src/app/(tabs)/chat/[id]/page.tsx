@@ -6,6 +6,7 @@ import { useQuery, useQueryClient } from "@tanstack/react-query";
 import { Virtuoso, type VirtuosoHandle } from "react-virtuoso";
 import { api } from "@/lib/api";
 import { useChatSocket } from "@/hooks/use-chat-socket";
+import { useAuthStore } from "@/stores/auth-store";
 import type { ChatMessage, WsChatMessage } from "@/lib/types";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
@@ -19,6 +20,7 @@ export default function ChannelDetailPage() {
   const channelId = Number(params.id);
   const virtuosoRef = useRef<VirtuosoHandle>(null);
   const queryClient = useQueryClient();
+  const user = useAuthStore((s) => s.user);
 
   const [text, setText] = useState("");
   const [showEmoji, setShowEmoji] = useState(false);
@@ -37,9 +39,17 @@ export default function ChannelDetailPage() {
   });
 
   // WebSocket
-  const { connected, messages: wsMessages, send, reset } = useChatSocket(
-    channelId || null
-  );
+  const {
+    connected,
+    messages: wsMessages,
+    presence,
+    send,
+    sendTyping,
+    reset,
+  } = useChatSocket(channelId || null);
+  const typingNames = presence.online
+    .filter((u) => presence.typing.includes(u.id) && u.id !== user?.id)
+    .map((u) => u.username);
 
   // Reset WS messages when channel changes
   useEffect(() => {
@@ -140,6 +150,13 @@ export default function ChannelDetailPage() {
         />
       </div>
 
+      {typingNames.length > 0 && (
+        <p className="px-4 pb-1 text-xs text-muted-foreground">
+          {typingNames.join(", ")} {typingNames.length === 1 ? "is" : "are"}{" "}
+          typing…
+        </p>
+      )}
+
       {/* Composer */}
       <motion.div
         initial={{ opacity: 0, y: 20 }}
@@ -159,7 +176,10 @@ export default function ChannelDetailPage() {
           <Input
             placeholder="Type a message…"
             value={text}
-            onChange={(e) => setText(e.target.value)}
+            onChange={(e) => {
+              setText(e.target.value);
+              sendTyping(e.target.value.length > 0);
+            }}
             onKeyDown={(e) => {
               if (e.key === "Enter" && !e.shiftKey) {
                 e.preventDefault();
@@ -2,38 +2,80 @@
 
 import { useCallback, useEffect, useRef, useState } from "react";
 import { useAuthStore } from "@/stores/auth-store";
-import type { WsChatMessage } from "@/lib/types";
+import type { WsChatMessage, WsPresence } from "@/lib/types";
 
 const WS_URL = process.env.NEXT_PUBLIC_WS_URL || "ws://localhost:8000";
+// Well inside the server's CHAT_PRESENCE_TTL / CHAT_TYPING_TTL.
+const HEARTBEAT_MS = 25_000;
+const TYPING_REFRESH_MS = 2_000;
+const NO_PRESENCE: WsPresence = { online: [], typing: [] };
 
 export function useChatSocket(channelId: number | null) {
   const wsRef = useRef<WebSocket | null>(null);
+  const lastSeenRef = useRef<{ channelId: number; id: number } | null>(null);
   const [connected, setConnected] = useState(false);
   const [messages, setMessages] = useState<WsChatMessage[]>([]);
+  const [presence, setPresence] = useState<WsPresence>(NO_PRESENCE);
+  const typingSentRef = useRef(0);
   const accessToken = useAuthStore((s) => s.accessToken);
 
   // Connect
   useEffect(() => {
     if (!channelId || !accessToken) return;
 
-    const url = `${WS_URL}/ws/chat/${channelId}/?token=${accessToken}`;
+    // Reconnects (e.g. after a token refresh) resume from the last message seen.
+    const lastSeen = lastSeenRef.current;
+    const resume =
+      lastSeen?.channelId === channelId ? `&last_seen_id=${lastSeen.id}` : "";
+    const url = `${WS_URL}/ws/chat/${channelId}/?token=${accessToken}${resume}`;
     const ws = new WebSocket(url);
     wsRef.current = ws;
 
+    const heartbeat = setInterval(() => {
+      if (ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({ type: "heartbeat" }));
+      }
+    }, HEARTBEAT_MS);
+
     ws.onopen = () => setConnected(true);
     ws.onclose = () => setConnected(false);
     ws.onerror = () => setConnected(false);
 
+    const append = (incoming: WsChatMessage[]) => {
+      if (!incoming.length) return;
+      lastSeenRef.current = { channelId, id: incoming[incoming.length - 1].id };
+      setMessages((prev) => {
+        const seen = new Set(prev.map((m) => m.id));
+        return [...prev, ...incoming.filter((m) => !seen.has(m.id))];
+      });
+    };
+
     ws.onmessage = (event) => {
       try {
-        const data: WsChatMessage = JSON.parse(event.data);
-        setMessages((prev) => [...prev, data]);
+        const data = JSON.parse(event.data);
+        if (data.type === "replay") {
+          append(data.messages);
+        } else if (data.type === "resync") {
+          // We fell behind and the server dropped frames; resume from the
+          // last message we have.
+          const seen = lastSeenRef.current;
+          if (seen?.channelId === channelId) {
+            ws.send(JSON.stringify({ type: "resume", last_seen_id: seen.id }));
+          }
+        } else if (data.type === "presence") {
+          setPresence({ online: data.online, typing: data.typing });
+        } else if (!data.type) {
+          append([data as WsChatMessage]);
+        }
+        // "replay.gap": history is refetched over REST by the page query.
       } catch {
         /* ignore non-JSON */
       }
     };
 
     return () => {
+      clearInterval(heartbeat);
+      setPresence(NO_PRESENCE);
       ws.close();
       wsRef.current = null;
       setConnected(false);
@@ -45,13 +87,28 @@ export function useChatSocket(channelId: number | null) {
     (text: string) => {
       if (wsRef.current?.readyState === WebSocket.OPEN) {
         wsRef.current.send(JSON.stringify({ type: "chat.message", text }));
+        typingSentRef.current = 0; // the server clears typing on send
       }
     },
     []
   );
 
+  // Typing: keystrokes only refresh the server-side entry, so throttle them.
+  const sendTyping = useCallback((active: boolean) => {
+    const ws = wsRef.current;
+    if (ws?.readyState !== WebSocket.OPEN) return;
+    const now = Date.now();
+    if (active && now - typingSentRef.current < TYPING_REFRESH_MS) return;
+    if (!active && !typingSentRef.current) return;
+    typingSentRef.current = active ? now : 0;
+    ws.send(JSON.stringify({ type: "typing", active }));
+  }, []);
+
   // Reset messages (when switching channels)
-  const reset = useCallback(() => setMessages([]), []);
+  const reset = useCallback(() => {
+    lastSeenRef.current = null;
+    setMessages([]);
+  }, []);
 
-  return { connected, messages, send, reset };
+  return { connected, messages, presence, send, sendTyping, reset };
 }
@@ -19,6 +19,18 @@ export interface ChatChannel {
   created_at: string;
 }
 
+export interface ChatAttachment {
+  sha256: string;
+  size: number;
+  content_type: string;
+  width: number | null;
+  height: number | null;
+  /** WebP variants; null until built (see `variants`). */
+  thumbnail: string | null;
+  preview: string | null;
+  variants: "pending" | "ready" | "failed" | "none";
+}
+
 export interface ChatMessage {
   id: number;
   channel: number;
@@ -26,6 +38,7 @@ export interface ChatMessage {
   sender_username: string;
   text: string;
   attachment?: string | null;
+  attachment_info?: ChatAttachment | null;
   created_at: string;
 }
 
@@ -36,7 +49,73 @@ export interface WsChatMessage {
   created_at: string;
 }
 
+export interface WsPresence {
+  online: { id: number; username: string }[];
+  typing: number[];
+}
+
 export interface PushSubscriptionPayload {
   endpoint: string;
   keys: { p256dh: string; auth: string };
 }
+
+export interface ClanSummary {
+  id: number;
+  name: string;
+  tag: string;
+  description: string;
+  member_count: number;
+  created_at: string;
+}
+
+export interface ClanUnit {
+  name: string;
+  level: number;
+}
+
+export interface ClanRosterMember {
+  id: number;
+  user: number;
+  username: string;
+  role: "leader" | "co_leader" | "elder" | "member";
+  player_tag: string;
+  war_opt_in: boolean;
+  joined_at: string;
+  heroes: ClanUnit[];
+  troops: ClanUnit[];
+  defenses: ClanUnit[];
+}
+
+export interface ClanRoster {
+  id: number;
+  name: string;
+  tag: string;
+  description: string;
+  created_at: string;
+  members: ClanRosterMember[];
+}
+
+export interface ClanStats {
+  clan: number;
+  member_count: number;
+  roles: Record<ClanRosterMember["role"], number>;
+  avg_hero_level: number;
+  max_hero_level: number;
+  avg_troop_level: number;
+  updated_at: string;
+}
+
+export interface WarAttack {
+  attacker: number;
+  attacker_username: string;
+  target: number;
+  target_username: string;
+  expected_stars: number;
+}
+
+export interface WarPlan {
+  clan: number;
+  opponent: number;
+  expected_stars: number;
+  attacks: WarAttack[];
+}